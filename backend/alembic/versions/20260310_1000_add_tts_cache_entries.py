@@ -0,0 +1,37 @@
+"""Add tts_cache_entries table (persistent TTS cache manifest)
+
+Revision ID: 20260310_1000
+Revises: 20260303_1000
+Create Date: 2026-03-10 10:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20260310_1000"
+down_revision = "20260303_1000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create tts_cache_entries table (idempotent)
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tts_cache_entries (
+            cache_key VARCHAR(32) PRIMARY KEY,
+            url VARCHAR(500) NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_tts_cache_entries_created_at "
+        "ON tts_cache_entries (created_at)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_tts_cache_entries_created_at")
+    op.execute("DROP TABLE IF EXISTS tts_cache_entries")
@@ -0,0 +1,56 @@
+"""Add background_jobs table (job queue for long-running work)
+
+Revision ID: 20260317_1000
+Revises: 20260310_1000
+Create Date: 2026-03-17 10:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20260317_1000"
+down_revision = "20260310_1000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create background_jobs table (idempotent)
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS background_jobs (
+            id VARCHAR(36) PRIMARY KEY,
+            job_type VARCHAR(64) NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'queued',
+            payload JSONB,
+            result JSONB,
+            error TEXT,
+            progress INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            idempotency_key VARCHAR(255) UNIQUE,
+            created_by VARCHAR(64),
+            run_after TIMESTAMPTZ DEFAULT NOW(),
+            locked_by VARCHAR(64),
+            locked_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ
+        )
+    """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_background_jobs_status_run_after "
+        "ON background_jobs (status, run_after)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_background_jobs_created_by "
+        "ON background_jobs (created_by)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_background_jobs_created_by")
+    op.execute("DROP INDEX IF EXISTS ix_background_jobs_status_run_after")
+    op.execute("DROP TABLE IF EXISTS background_jobs")
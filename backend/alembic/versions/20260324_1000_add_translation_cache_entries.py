@@ -0,0 +1,41 @@
+"""Add translation_cache_entries table (persistent word-translation cache)
+
+Revision ID: 20260324_1000
+Revises: 20260317_1000
+Create Date: 2026-03-24 10:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20260324_1000"
+down_revision = "20260317_1000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create translation_cache_entries table (idempotent)
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS translation_cache_entries (
+            cache_key VARCHAR(32) PRIMARY KEY,
+            mode VARCHAR(16) NOT NULL,
+            target_lang VARCHAR(16) NOT NULL,
+            prompt_version INTEGER NOT NULL,
+            source_text TEXT NOT NULL,
+            result JSONB NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_translation_cache_entries_prompt_version "
+        "ON translation_cache_entries (prompt_version)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_translation_cache_entries_prompt_version")
+    op.execute("DROP TABLE IF EXISTS translation_cache_entries")
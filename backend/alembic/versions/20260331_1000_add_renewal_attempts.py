@@ -0,0 +1,49 @@
+"""Add renewal_attempts table (monthly auto-renewal checkpoints)
+
+Revision ID: 20260331_1000
+Revises: 20260324_1000
+Create Date: 2026-03-31 10:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20260331_1000"
+down_revision = "20260324_1000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create renewal_attempts table (idempotent)
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS renewal_attempts (
+            id SERIAL PRIMARY KEY,
+            teacher_id INTEGER NOT NULL REFERENCES teachers(id) ON DELETE CASCADE,
+            renewal_month VARCHAR(7) NOT NULL,
+            order_number VARCHAR(64) NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'charging',
+            plan_name VARCHAR(64),
+            amount INTEGER,
+            run_id VARCHAR(36),
+            rec_trade_id VARCHAR(64),
+            error TEXT,
+            gateway_response JSONB,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW(),
+            CONSTRAINT uq_renewal_attempts_teacher_month
+                UNIQUE (teacher_id, renewal_month)
+        )
+    """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_renewal_attempts_month_status "
+        "ON renewal_attempts (renewal_month, status)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_renewal_attempts_month_status")
+    op.execute("DROP TABLE IF EXISTS renewal_attempts")
@@ -0,0 +1,48 @@
+"""Add email_outbox table (queued outgoing emails)
+
+Revision ID: 20260407_1000
+Revises: 20260331_1000
+Create Date: 2026-04-07 10:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20260407_1000"
+down_revision = "20260331_1000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create email_outbox table (idempotent)
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id SERIAL PRIMARY KEY,
+            from_email VARCHAR(255) NOT NULL,
+            to_email VARCHAR(255) NOT NULL,
+            subject VARCHAR(500),
+            raw_message TEXT NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            last_error TEXT,
+            next_attempt_at TIMESTAMPTZ DEFAULT NOW(),
+            locked_by VARCHAR(64),
+            locked_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            sent_at TIMESTAMPTZ
+        )
+    """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_email_outbox_status_next_attempt "
+        "ON email_outbox (status, next_attempt_at)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_email_outbox_status_next_attempt")
+    op.execute("DROP TABLE IF EXISTS email_outbox")
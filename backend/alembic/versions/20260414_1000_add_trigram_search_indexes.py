@@ -0,0 +1,50 @@
+"""Add pg_trgm GIN indexes for student / teacher / classroom search
+
+Revision ID: 20260414_1000
+Revises: 20260407_1000
+Create Date: 2026-04-14 10:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20260414_1000"
+down_revision = "20260407_1000"
+branch_labels = None
+depends_on = None
+
+# (index name, table, column)
+TRIGRAM_INDEXES = [
+    ("ix_students_name_trgm", "students", "name"),
+    ("ix_students_student_number_trgm", "students", "student_number"),
+    ("ix_students_email_trgm", "students", "email"),
+    ("ix_teachers_name_trgm", "teachers", "name"),
+    ("ix_teachers_email_trgm", "teachers", "email"),
+    ("ix_classrooms_name_trgm", "classrooms", "name"),
+    ("ix_organizations_name_trgm", "organizations", "name"),
+    ("ix_organizations_display_name_trgm", "organizations", "display_name"),
+]
+
+
+def upgrade() -> None:
+    # ILIKE '%term%' 與 similarity() 排序可使用 trigram GIN index（PostgreSQL only）
+    # SQLite 沒有 pg_trgm，搜尋退回一般 LIKE
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index_name, table, column in TRIGRAM_INDEXES:
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} "
+            f"ON {table} USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for index_name, _, _ in TRIGRAM_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
+    # pg_trgm extension 保留（其他物件可能使用）
@@ -0,0 +1,402 @@
+"""Add assignment_mastery aggregate (incremental word-selection mastery)
+
+Revision ID: 20260421_1000
+Revises: 20260414_1000
+Create Date: 2026-04-21 10:00:00.000000
+
+calculate_assignment_mastery() 每次作答都要掃過作業內所有單字。
+這裡加入每個 StudentAssignment 一列的彙總（strength 總和、已練習字數、
+已精熟字數、總字數），由 update_memory_strength() 以差值增量更新：
+
+- read_assignment_mastery()：回傳欄位與 calculate_assignment_mastery() 相同，
+  只讀彙總列；彙總列不存在、被標記為 stale、或 target_proficiency 改變時
+  才呼叫 refresh_assignment_mastery() 重算
+- content_items / student_content_progress 新增或刪除、user_word_progress 刪除時，
+  statement-level trigger 把受影響的彙總列標記為 stale
+- 其他漂移由 /api/cron/reconcile-mastery 定期修正
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20260421_1000"
+down_revision = "20260414_1000"
+branch_labels = None
+depends_on = None
+
+# 作答後套用到彙總列的差值（v_old_strength 為作答前的 strength，新單字為 NULL）
+AGGREGATE_UPDATE = """
+            UPDATE assignment_mastery am SET
+                strength_sum = am.strength_sum
+                    + v_progress.memory_strength - COALESCE(v_old_strength, 0),
+                practiced_words = am.practiced_words
+                    + CASE WHEN v_old_strength IS NULL THEN 1 ELSE 0 END,
+                words_mastered = am.words_mastered
+                    + CASE WHEN v_progress.memory_strength >= am.mastery_threshold
+                        THEN 1 ELSE 0 END
+                    - CASE WHEN v_old_strength >= am.mastery_threshold
+                        THEN 1 ELSE 0 END,
+                updated_at = NOW()
+            WHERE am.student_assignment_id = p_student_assignment_id
+                AND NOT am.stale;
+"""
+
+# update_memory_strength 的計算與 8a67d41aff56 相同，
+# 只改成新單字與既有單字共用同一個結尾，方便插入彙總更新
+UPDATE_MEMORY_STRENGTH = """
+        CREATE OR REPLACE FUNCTION update_memory_strength(
+            p_student_assignment_id INTEGER,
+            p_content_item_id INTEGER,
+            p_is_correct BOOLEAN
+        ) RETURNS TABLE (
+            memory_strength DECIMAL,
+            next_review_at TIMESTAMPTZ,
+            easiness_factor DECIMAL,
+            repetition_count INTEGER
+        ) AS $$
+        DECLARE
+            v_progress user_word_progress%ROWTYPE;
+            v_old_strength DECIMAL;
+            v_time_since_last_review INTERVAL;
+            v_new_strength DECIMAL;
+            v_new_easiness DECIMAL;
+            v_new_interval DECIMAL;
+            v_student_id INTEGER;
+        BEGIN
+            SELECT * INTO v_progress
+            FROM user_word_progress
+            WHERE student_assignment_id = p_student_assignment_id
+                AND content_item_id = p_content_item_id;
+
+            IF NOT FOUND THEN
+                v_old_strength := NULL;
+
+                SELECT sa.student_id INTO v_student_id
+                FROM student_assignments sa
+                WHERE sa.id = p_student_assignment_id;
+
+                INSERT INTO user_word_progress (
+                    student_id,
+                    student_assignment_id,
+                    content_item_id,
+                    memory_strength,
+                    last_review_at,
+                    next_review_at,
+                    total_attempts,
+                    correct_count,
+                    incorrect_count,
+                    repetition_count
+                ) VALUES (
+                    v_student_id,
+                    p_student_assignment_id,
+                    p_content_item_id,
+                    CASE WHEN p_is_correct THEN 0.5 ELSE 0.2 END,
+                    NOW(),
+                    NOW() + INTERVAL '1 day',
+                    1,
+                    CASE WHEN p_is_correct THEN 1 ELSE 0 END,
+                    CASE WHEN p_is_correct THEN 0 ELSE 1 END,
+                    CASE WHEN p_is_correct THEN 1 ELSE 0 END
+                )
+                RETURNING * INTO v_progress;
+            ELSE
+                v_old_strength := v_progress.memory_strength;
+
+                -- Ebbinghaus forgetting curve: R = e^(-t/S)
+                v_time_since_last_review :=
+                    NOW() - COALESCE(v_progress.last_review_at, NOW());
+                v_new_strength := v_progress.memory_strength *
+                    EXP(
+                        -EXTRACT(EPOCH FROM v_time_since_last_review) /
+                        (86400.0 * v_progress.easiness_factor)
+                    );
+
+                IF p_is_correct THEN
+                    v_new_strength := LEAST(1.0, v_new_strength + 0.3);
+
+                    -- SM-2 easiness factor and interval
+                    v_new_easiness := v_progress.easiness_factor +
+                        (0.1 - (5 - 4) * (0.08 + (5 - 4) * 0.02));
+                    v_new_easiness := GREATEST(1.3, v_new_easiness);
+
+                    IF v_progress.repetition_count = 0 THEN
+                        v_new_interval := 1;
+                    ELSIF v_progress.repetition_count = 1 THEN
+                        v_new_interval := 6;
+                    ELSE
+                        v_new_interval := v_progress.interval_days * v_new_easiness;
+                    END IF;
+
+                    UPDATE user_word_progress SET
+                        memory_strength = v_new_strength,
+                        repetition_count = user_word_progress.repetition_count + 1,
+                        correct_count = user_word_progress.correct_count + 1,
+                        total_attempts = user_word_progress.total_attempts + 1,
+                        easiness_factor = v_new_easiness,
+                        interval_days = v_new_interval,
+                        last_review_at = NOW(),
+                        next_review_at = NOW() + (v_new_interval || ' days')::INTERVAL,
+                        accuracy_rate = (user_word_progress.correct_count + 1)::DECIMAL
+                            / (user_word_progress.total_attempts + 1),
+                        updated_at = NOW()
+                    WHERE id = v_progress.id
+                    RETURNING * INTO v_progress;
+                ELSE
+                    v_new_strength := GREATEST(0.1, v_new_strength * 0.5);
+                    v_new_easiness := GREATEST(1.3, v_progress.easiness_factor - 0.2);
+                    v_new_interval := 1;
+
+                    UPDATE user_word_progress SET
+                        memory_strength = v_new_strength,
+                        repetition_count = 0,
+                        incorrect_count = user_word_progress.incorrect_count + 1,
+                        total_attempts = user_word_progress.total_attempts + 1,
+                        easiness_factor = v_new_easiness,
+                        interval_days = v_new_interval,
+                        last_review_at = NOW(),
+                        next_review_at = NOW() + INTERVAL '1 day',
+                        accuracy_rate = user_word_progress.correct_count::DECIMAL
+                            / (user_word_progress.total_attempts + 1),
+                        updated_at = NOW()
+                    WHERE id = v_progress.id
+                    RETURNING * INTO v_progress;
+                END IF;
+            END IF;
+{aggregate_update}
+            RETURN QUERY SELECT
+                v_progress.memory_strength,
+                v_progress.next_review_at,
+                v_progress.easiness_factor,
+                v_progress.repetition_count;
+        END;
+        $$ LANGUAGE plpgsql;
+"""
+
+# (trigger, table, event)：事件發生時把受影響的彙總列標記為 stale
+STALE_TRIGGERS = [
+    ("trg_mastery_stale_items_ins", "content_items", "INSERT", "NEW"),
+    ("trg_mastery_stale_items_del", "content_items", "DELETE", "OLD"),
+    ("trg_mastery_stale_scp_ins", "student_content_progress", "INSERT", "NEW"),
+    ("trg_mastery_stale_scp_del", "student_content_progress", "DELETE", "OLD"),
+    ("trg_mastery_stale_uwp_del", "user_word_progress", "DELETE", "OLD"),
+]
+
+
+def upgrade() -> None:
+    # user_word_progress 與 PL/pgSQL 函式只存在於 PostgreSQL
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS assignment_mastery (
+            student_assignment_id INTEGER PRIMARY KEY
+                REFERENCES student_assignments(id) ON DELETE CASCADE,
+            strength_sum NUMERIC NOT NULL DEFAULT 0,
+            practiced_words INTEGER NOT NULL DEFAULT 0,
+            words_mastered INTEGER NOT NULL DEFAULT 0,
+            total_words INTEGER NOT NULL DEFAULT 0,
+            mastery_threshold NUMERIC(6, 4) NOT NULL,
+            stale BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_assignment_mastery_updated_at "
+        "ON assignment_mastery (updated_at)"
+    )
+    # content_items 的 stale trigger 以 content_id 找受影響的作業
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_student_content_progress_content_id "
+        "ON student_content_progress (content_id)"
+    )
+
+    # 全量重算一個 StudentAssignment 的彙總（規則同 calculate_assignment_mastery）
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_assignment_mastery(
+            p_student_assignment_id INTEGER
+        ) RETURNS assignment_mastery AS $$
+        DECLARE
+            v_target DECIMAL;
+            v_row assignment_mastery%ROWTYPE;
+        BEGIN
+            -- 先鎖住既有彙總列，與同時進行的增量更新序列化
+            PERFORM 1 FROM assignment_mastery
+            WHERE student_assignment_id = p_student_assignment_id
+            FOR UPDATE;
+
+            SELECT COALESCE(a.target_proficiency, 80) / 100.0 INTO v_target
+            FROM student_assignments sa
+            JOIN assignments a ON a.id = sa.assignment_id
+            WHERE sa.id = p_student_assignment_id;
+
+            INSERT INTO assignment_mastery AS am (
+                student_assignment_id,
+                strength_sum,
+                practiced_words,
+                words_mastered,
+                total_words,
+                mastery_threshold,
+                stale,
+                updated_at
+            )
+            SELECT
+                p_student_assignment_id,
+                COALESCE(SUM(uwp.memory_strength), 0),
+                COUNT(*),
+                COUNT(*) FILTER (WHERE uwp.memory_strength >= v_target * 0.8),
+                (
+                    SELECT COUNT(DISTINCT ci.id)
+                    FROM student_content_progress scp
+                    JOIN content_items ci ON ci.content_id = scp.content_id
+                    WHERE scp.student_assignment_id = p_student_assignment_id
+                ),
+                v_target * 0.8,
+                FALSE,
+                NOW()
+            FROM user_word_progress uwp
+            WHERE uwp.student_assignment_id = p_student_assignment_id
+            ON CONFLICT (student_assignment_id) DO UPDATE SET
+                strength_sum = EXCLUDED.strength_sum,
+                practiced_words = EXCLUDED.practiced_words,
+                words_mastered = EXCLUDED.words_mastered,
+                total_words = EXCLUDED.total_words,
+                mastery_threshold = EXCLUDED.mastery_threshold,
+                stale = FALSE,
+                updated_at = NOW()
+            RETURNING am.* INTO v_row;
+
+            RETURN v_row;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+    )
+
+    # O(1) 讀取；回傳欄位與 calculate_assignment_mastery() 相同
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION read_assignment_mastery(
+            p_student_assignment_id INTEGER
+        ) RETURNS TABLE (
+            current_mastery DECIMAL,
+            target_mastery DECIMAL,
+            achieved BOOLEAN,
+            words_mastered INTEGER,
+            total_words INTEGER
+        ) AS $$
+        DECLARE
+            v_target DECIMAL;
+            v_agg assignment_mastery%ROWTYPE;
+            v_avg DECIMAL;
+        BEGIN
+            SELECT COALESCE(a.target_proficiency, 80) / 100.0 INTO v_target
+            FROM student_assignments sa
+            JOIN assignments a ON a.id = sa.assignment_id
+            WHERE sa.id = p_student_assignment_id;
+
+            IF v_target IS NULL THEN
+                RETURN QUERY SELECT 0::DECIMAL, NULL::DECIMAL, FALSE, 0, 0;
+                RETURN;
+            END IF;
+
+            SELECT * INTO v_agg
+            FROM assignment_mastery am
+            WHERE am.student_assignment_id = p_student_assignment_id;
+
+            IF NOT FOUND
+                OR v_agg.stale
+                OR v_agg.mastery_threshold <> v_target * 0.8
+            THEN
+                v_agg := refresh_assignment_mastery(p_student_assignment_id);
+            END IF;
+
+            IF v_agg.total_words = 0 THEN
+                RETURN QUERY SELECT 0::DECIMAL, v_target, FALSE, 0, 0;
+                RETURN;
+            END IF;
+
+            -- 未練習的單字以 0 計（分母取總字數與已練習字數的較大者）
+            v_avg := CASE
+                WHEN v_agg.practiced_words = 0 THEN 0
+                ELSE v_agg.strength_sum
+                    / GREATEST(v_agg.total_words, v_agg.practiced_words)
+            END;
+
+            RETURN QUERY SELECT
+                v_avg,
+                v_target,
+                v_avg >= v_target,
+                v_agg.words_mastered,
+                v_agg.total_words;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+    )
+
+    op.execute(UPDATE_MEMORY_STRENGTH.format(aggregate_update=AGGREGATE_UPDATE))
+
+    # content_items 變動：以 content_id 找到有該內容的作業
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION mark_mastery_stale_by_content()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            UPDATE assignment_mastery am SET stale = TRUE
+            FROM student_content_progress scp
+            WHERE scp.content_id IN (SELECT content_id FROM changed_rows)
+                AND am.student_assignment_id = scp.student_assignment_id
+                AND NOT am.stale;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+    )
+    # student_content_progress / user_word_progress 變動：直接以 student_assignment_id 標記
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION mark_mastery_stale_by_assignment()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            UPDATE assignment_mastery am SET stale = TRUE
+            WHERE am.student_assignment_id IN (
+                SELECT student_assignment_id FROM changed_rows
+            )
+                AND NOT am.stale;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+    )
+
+    for trigger, table, event, transition in STALE_TRIGGERS:
+        function = (
+            "mark_mastery_stale_by_content"
+            if table == "content_items"
+            else "mark_mastery_stale_by_assignment"
+        )
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+        op.execute(
+            f"CREATE TRIGGER {trigger} AFTER {event} ON {table} "
+            f"REFERENCING {transition} TABLE AS changed_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for trigger, table, _, _ in STALE_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS mark_mastery_stale_by_content()")
+    op.execute("DROP FUNCTION IF EXISTS mark_mastery_stale_by_assignment()")
+
+    # 還原不更新彙總的 update_memory_strength
+    op.execute(UPDATE_MEMORY_STRENGTH.format(aggregate_update=""))
+
+    op.execute("DROP FUNCTION IF EXISTS read_assignment_mastery(INTEGER)")
+    op.execute("DROP FUNCTION IF EXISTS refresh_assignment_mastery(INTEGER)")
+    op.execute("DROP INDEX IF EXISTS ix_student_content_progress_content_id")
+    op.execute("DROP TABLE IF EXISTS assignment_mastery")
@@ -0,0 +1,40 @@
+"""Add indexes for the teacher dashboard summary queries
+
+Revision ID: 20260428_1000
+Revises: 20260421_1000
+Create Date: 2026-04-28 10:00:00.000000
+
+儀表板摘要（services/teacher_dashboard.py）快取未命中時：
+- 依 teacher_id 取有效班級
+- 依 classroom_id 彙總有效學生數與每班前 3 位學生
+兩個查詢原本都沒有可用的 index。
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20260428_1000"
+down_revision = "20260421_1000"
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns)
+DASHBOARD_INDEXES = [
+    ("ix_classrooms_teacher_active", "classrooms", "teacher_id, is_active"),
+    (
+        "ix_classroom_students_classroom_active",
+        "classroom_students",
+        "classroom_id, is_active, id",
+    ),
+    ("ix_classroom_students_student_id", "classroom_students", "student_id"),
+]
+
+
+def upgrade() -> None:
+    for index_name, table, columns in DASHBOARD_INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+
+
+def downgrade() -> None:
+    for index_name, _, _ in DASHBOARD_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
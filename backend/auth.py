@@ -1,5 +1,6 @@
-from datetime import datetime, timedelta  # noqa: F401
-from typing import Optional, Dict, Any  # noqa: F401
+import asyncio
+from datetime import date, datetime, timedelta  # noqa: F401
+from typing import Optional, Dict, Any, Iterable, List  # noqa: F401
 from jose import JWTError, jwt
 import bcrypt
 from sqlalchemy.orm import Session
@@ -7,6 +8,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from models import Teacher, Student
 from database import get_session_local, SessionLocal
+from core.thread_pool import PASSWORD_THREAD_POOL_SIZE, get_password_thread_pool
 import os
 from dotenv import load_dotenv
 
@@ -30,6 +32,10 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "30"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
+# 等待密碼線程池的 bcrypt 工作上限（超過時回 503，避免登入尖峰把請求無限堆積）
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "200"))
+_password_tasks_pending = 0
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """驗證密碼"""
@@ -91,6 +97,60 @@ def get_password_hash(password: str) -> str:
     return hashed.decode("utf-8")
 
 
+async def _run_password_task(func, *args):
+    """在密碼線程池執行 bcrypt，不阻塞 event loop"""
+    global _password_tasks_pending
+    if _password_tasks_pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again later",
+            headers={"Retry-After": "1"},
+        )
+    _password_tasks_pending += 1
+    try:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(get_password_thread_pool(), func, *args)
+    finally:
+        _password_tasks_pending -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """驗證密碼（async handler 使用）"""
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """密碼雜湊（async handler 使用）"""
+    return await _run_password_task(get_password_hash, password)
+
+
+async def get_password_hashes_async(passwords: Iterable[str]) -> List[str]:
+    """
+    批次密碼雜湊（批次匯入學生用）
+
+    以線程池平行計算，每個密碼仍使用各自的 salt；
+    同時送出的數量不超過線程數，不會佔滿等待上限
+    """
+    passwords = list(passwords)
+    semaphore = asyncio.Semaphore(PASSWORD_THREAD_POOL_SIZE)
+
+    async def hash_one(password: str) -> str:
+        async with semaphore:
+            return await get_password_hash_async(password)
+
+    return list(await asyncio.gather(*(hash_one(p) for p in passwords)))
+
+
+async def get_default_password_hashes(birthdates: Iterable[date]) -> List[str]:
+    """
+    批次匯入的預設密碼（生日 YYYYMMDD）雜湊
+
+    每位學生各自計算（相同生日也使用不同的 salt），依輸入順序回傳；
+    只應傳入確定會建立學生（或重設密碼）的列
+    """
+    return await get_password_hashes_async(b.strftime("%Y%m%d") for b in birthdates)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """建立 JWT token"""
     to_encode = data.copy()
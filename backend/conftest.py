@@ -123,12 +123,17 @@ def disable_rate_limit():
     - scope="session": 整個測試 session 只執行一次
     """
     from core.limiter import limiter
+    from middleware.global_rate_limiter import get_global_rate_limiter
 
     # 停用 rate limiter
     original_enabled = limiter.enabled
     limiter.enabled = False
+    global_limiter = get_global_rate_limiter()
+    original_global_enabled = global_limiter.enabled
+    global_limiter.enabled = False
 
     yield
 
     # 恢復原狀（雖然測試結束後不重要，但保持良好習慣）
     limiter.enabled = original_enabled
+    global_limiter.enabled = original_global_enabled
@@ -0,0 +1,284 @@
+"""
+Adaptive Admission Controller for Azure Speech API
+
+取代固定的 asyncio.Semaphore(18)：
+- 依實際觀察到的 Azure 延遲與 429 動態調整並發上限（AIMD）
+  * 成功且延遲正常 → 每個 RTT 約 +1（加法增加）
+  * 429 → 上限 × 0.7；逾時或延遲過高 → 上限 × 0.9（乘法減少）
+- 排隊有上限（長度與等待時間），超過時立即拒絕並附 Retry-After 建議
+- 上限不超過語音線程池大小，避免請求卡在 executor 內部佇列
+- 即時上限與排隊長度透過 core.thread_pool.get_thread_pool_stats() 公開
+"""
+
+import asyncio
+import collections
+import math
+import os
+import time
+import logging
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejectedError(Exception):
+    """排隊已滿或等待逾時，請求被拒絕（應回傳 503 + Retry-After）"""
+
+    def __init__(self, message: str, retry_after: int, queue_length: int = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.queue_length = queue_length
+
+
+class AdaptiveAdmissionController:
+    """
+    AIMD 並發控制器（每個 event loop 一個實例）
+
+    可直接使用 ``async with controller:``，離開時依例外類型與延遲調整上限。
+    """
+
+    def __init__(
+        self,
+        initial_limit: Optional[int] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_wait: Optional[float] = None,
+        latency_target: Optional[float] = None,
+        is_rate_limit_error: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        pool_size = int(os.getenv("SPEECH_THREAD_POOL_SIZE", "20"))
+        self.max_limit = min(
+            max_limit or int(os.getenv("AZURE_SPEECH_MAX_CONCURRENCY", "18")),
+            pool_size,
+        )
+        self.min_limit = min(
+            min_limit or int(os.getenv("AZURE_SPEECH_MIN_CONCURRENCY", "2")),
+            self.max_limit,
+        )
+        initial = initial_limit or int(
+            os.getenv("AZURE_SPEECH_INITIAL_CONCURRENCY", str(self.max_limit))
+        )
+        self._limit = float(max(self.min_limit, min(initial, self.max_limit)))
+
+        self.max_queue = max_queue or int(os.getenv("AZURE_SPEECH_MAX_QUEUE", "100"))
+        self.max_wait = max_wait or float(
+            os.getenv("AZURE_SPEECH_MAX_QUEUE_WAIT", "8.0")
+        )
+        # 與原本「Azure 回應超過 5 秒」的慢回應警告門檻一致
+        self.latency_target = latency_target or float(
+            os.getenv("AZURE_SPEECH_LATENCY_TARGET", "5.0")
+        )
+        self._is_rate_limit_error = is_rate_limit_error or (lambda e: False)
+
+        self._in_flight = 0
+        self._waiters: "collections.deque[asyncio.Future]" = collections.deque()
+        self._started_at: Dict[int, float] = {}
+
+        # 統計
+        self._avg_latency = 0.0
+        self._last_decrease = 0.0
+        self._admitted = 0
+        self._rejected = 0
+        self._rate_limited = 0
+        self._slow = 0
+
+    # ------------------------------------------------------------------
+    # 狀態
+    # ------------------------------------------------------------------
+
+    @property
+    def limit(self) -> int:
+        """目前的並發上限（整數）"""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def available(self) -> int:
+        """目前可立即取得的名額"""
+        return max(0, self.limit - self._in_flight)
+
+    @property
+    def queue_length(self) -> int:
+        return sum(1 for w in self._waiters if not w.done())
+
+    def retry_after_hint(self) -> int:
+        """估計排隊清空所需秒數（Retry-After）"""
+        avg_latency = self._avg_latency or 1.0
+        rounds = (self.queue_length + 1) / max(self.limit, 1)
+        return max(1, min(30, math.ceil(avg_latency * rounds)))
+
+    def get_stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self._in_flight,
+            "queue_length": self.queue_length,
+            "max_queue": self.max_queue,
+            "avg_latency_seconds": round(self._avg_latency, 3),
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "rate_limited": self._rate_limited,
+            "slow_or_timeout": self._slow,
+        }
+
+    # ------------------------------------------------------------------
+    # 取得 / 釋放
+    # ------------------------------------------------------------------
+
+    async def acquire(self):
+        """取得一個名額；排隊已滿或等待超過 max_wait 時拋出 AdmissionRejectedError"""
+        if self._in_flight < self.limit and not self.queue_length:
+            self._in_flight += 1
+            self._admitted += 1
+            return
+
+        if self.queue_length >= self.max_queue:
+            self._rejected += 1
+            raise AdmissionRejectedError(
+                f"Azure Speech admission queue full ({self.max_queue})",
+                retry_after=self.retry_after_hint(),
+                queue_length=self.queue_length,
+            )
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # 名額剛好在逾時瞬間被分配，直接使用
+                self._admitted += 1
+                return
+            waiter.cancel()
+            self._rejected += 1
+            raise AdmissionRejectedError(
+                f"Azure Speech admission wait exceeded {self.max_wait}s",
+                retry_after=self.retry_after_hint(),
+                queue_length=self.queue_length,
+            )
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已分配到名額但呼叫端被取消，歸還名額
+                self._in_flight -= 1
+                self._wake_waiters()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+        self._admitted += 1
+
+    def release(
+        self, latency: float, rate_limited: bool = False, overloaded: bool = False
+    ):
+        """
+        歸還名額並依結果調整上限
+
+        Args:
+            latency: 本次呼叫耗時（秒）
+            rate_limited: Azure 回傳 429
+            overloaded: 逾時或其他過載訊號
+        """
+        self._in_flight = max(0, self._in_flight - 1)
+        self._record(latency, rate_limited, overloaded)
+        self._wake_waiters()
+
+    def _record(self, latency: float, rate_limited: bool, overloaded: bool):
+        # 指數移動平均（用於 Retry-After 估計）
+        if self._avg_latency:
+            self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+        else:
+            self._avg_latency = latency
+
+        old_limit = self.limit
+        # 同一批（一個平均延遲內）的多個失敗只減少一次，避免上限瞬間掉到底
+        now = time.monotonic()
+        can_decrease = now - self._last_decrease >= self._avg_latency
+        if rate_limited:
+            self._rate_limited += 1
+            if can_decrease:
+                self._limit = max(self.min_limit, self._limit * 0.7)
+                self._last_decrease = now
+        elif overloaded or latency > self.latency_target:
+            self._slow += 1
+            if can_decrease:
+                self._limit = max(self.min_limit, self._limit * 0.9)
+                self._last_decrease = now
+        else:
+            # 加法增加：每個完整窗口（limit 個成功）約 +1
+            self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+        if self.limit != old_limit:
+            logger.info(
+                f"🎚️ Azure Speech concurrency limit {old_limit} → {self.limit} "
+                f"(latency={latency:.2f}s, rate_limited={rate_limited})"
+            )
+
+    def _wake_waiters(self):
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(True)
+
+    # ------------------------------------------------------------------
+    # async context manager
+    # ------------------------------------------------------------------
+
+    async def __aenter__(self):
+        await self.acquire()
+        self._started_at[id(asyncio.current_task())] = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        started = self._started_at.pop(id(asyncio.current_task()), None)
+        latency = time.monotonic() - started if started else 0.0
+        rate_limited = exc is not None and self._is_rate_limit_error(exc)
+        overloaded = exc_type is not None and issubclass(exc_type, asyncio.TimeoutError)
+        self.release(latency, rate_limited=rate_limited, overloaded=overloaded)
+        return False
+
+
+# 每個 event loop 維護獨立的控制器（asyncio future 不能跨 loop）
+_controllers: Dict[int, AdaptiveAdmissionController] = {}
+_last_controller: Optional[AdaptiveAdmissionController] = None
+
+
+def get_azure_speech_admission_controller(
+    is_rate_limit_error: Optional[Callable[[BaseException], bool]] = None,
+) -> AdaptiveAdmissionController:
+    """取得目前 event loop 的 Azure Speech 並發控制器"""
+    global _last_controller
+
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+    loop_id = id(loop)
+    controller = _controllers.get(loop_id)
+    if controller is None:
+        controller = AdaptiveAdmissionController(
+            is_rate_limit_error=is_rate_limit_error
+        )
+        _controllers[loop_id] = controller
+        _last_controller = controller
+    return controller
+
+
+def get_azure_admission_stats() -> dict:
+    """取得並發控制器的即時狀態（用於監控）"""
+    if _last_controller is None:
+        return {"initialized": False}
+    return {"initialized": True, **_last_controller.get_stats()}
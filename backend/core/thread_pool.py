@@ -9,11 +9,26 @@ import concurrent.futures
 import os
 import logging
 
+from core.azure_admission import get_azure_admission_stats
+
 logger = logging.getLogger(__name__)
 
 # 全域線程池實例
 _speech_thread_pool: concurrent.futures.ThreadPoolExecutor = None
 _audio_thread_pool: concurrent.futures.ThreadPoolExecutor = None
+_tts_thread_pool: concurrent.futures.ThreadPoolExecutor = None
+_password_thread_pool: concurrent.futures.ThreadPoolExecutor = None
+
+
+def _default_password_pool_size() -> int:
+    # bcrypt 是純 CPU 工作（會釋放 GIL），線程數不超過 CPU 核心數
+    return min(4, os.cpu_count() or 1)
+
+
+# 密碼線程池大小（批次雜湊的同時送出數量也以此為上限）
+PASSWORD_THREAD_POOL_SIZE = int(
+    os.getenv("PASSWORD_THREAD_POOL_SIZE", str(_default_password_pool_size()))
+)
 
 
 def get_speech_thread_pool() -> concurrent.futures.ThreadPoolExecutor:
@@ -62,6 +77,52 @@ def get_audio_thread_pool() -> concurrent.futures.ThreadPoolExecutor:
     return _audio_thread_pool
 
 
+def get_tts_thread_pool() -> concurrent.futures.ThreadPoolExecutor:
+    """
+    取得 TTS 專用線程池（用於 Azure TTS 合成與 GCS 上傳）
+
+    與語音評分線程池分開，批次生成語音時不會佔滿評分用的線程；
+    線程數即為同時進行的 Azure TTS 呼叫上限
+
+    Returns:
+        ThreadPoolExecutor: TTS 線程池
+    """
+    global _tts_thread_pool
+
+    if _tts_thread_pool is None:
+        max_workers = int(os.getenv("TTS_THREAD_POOL_SIZE", "8"))
+
+        _tts_thread_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tts_worker"
+        )
+        logger.info(f"✅ TTS thread pool initialized with {max_workers} workers")
+
+    return _tts_thread_pool
+
+
+def get_password_thread_pool() -> concurrent.futures.ThreadPoolExecutor:
+    """
+    取得密碼雜湊專用線程池（用於 bcrypt hash / verify）
+
+    bcrypt 每次約 250ms CPU，在 event loop 上直接執行會卡住整個 instance；
+    bcrypt 會釋放 GIL，因此用線程池即可平行運算，不需要 process pool
+
+    Returns:
+        ThreadPoolExecutor: 密碼雜湊線程池
+    """
+    global _password_thread_pool
+
+    if _password_thread_pool is None:
+        max_workers = PASSWORD_THREAD_POOL_SIZE
+
+        _password_thread_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password_worker"
+        )
+        logger.info(f"✅ Password thread pool initialized with {max_workers} workers")
+
+    return _password_thread_pool
+
+
 def shutdown_thread_pools(wait: bool = True):
     """
     關閉所有線程池（應用程式關閉時呼叫）
@@ -69,7 +130,8 @@ def shutdown_thread_pools(wait: bool = True):
     Args:
         wait: 是否等待所有任務完成
     """
-    global _speech_thread_pool, _audio_thread_pool
+    global _speech_thread_pool, _audio_thread_pool, _tts_thread_pool
+    global _password_thread_pool
 
     if _speech_thread_pool is not None:
         logger.info("🔄 Shutting down speech thread pool...")
@@ -83,6 +145,18 @@ def shutdown_thread_pools(wait: bool = True):
         _audio_thread_pool = None
         logger.info("✅ Audio thread pool shutdown complete")
 
+    if _tts_thread_pool is not None:
+        logger.info("🔄 Shutting down TTS thread pool...")
+        _tts_thread_pool.shutdown(wait=wait)
+        _tts_thread_pool = None
+        logger.info("✅ TTS thread pool shutdown complete")
+
+    if _password_thread_pool is not None:
+        logger.info("🔄 Shutting down password thread pool...")
+        _password_thread_pool.shutdown(wait=wait)
+        _password_thread_pool = None
+        logger.info("✅ Password thread pool shutdown complete")
+
 
 def get_thread_pool_stats() -> dict:
     """
@@ -100,6 +174,16 @@ def get_thread_pool_stats() -> dict:
             "initialized": _audio_thread_pool is not None,
             "max_workers": int(os.getenv("AUDIO_THREAD_POOL_SIZE", "10")),
         },
+        "tts_pool": {
+            "initialized": _tts_thread_pool is not None,
+            "max_workers": int(os.getenv("TTS_THREAD_POOL_SIZE", "8")),
+        },
+        "password_pool": {
+            "initialized": _password_thread_pool is not None,
+            "max_workers": PASSWORD_THREAD_POOL_SIZE,
+        },
+        # Azure Speech 自適應並發上限與排隊長度
+        "azure_speech_admission": get_azure_admission_stats(),
     }
 
     return stats
@@ -13,11 +13,33 @@ from core.thread_pool import (
     shutdown_thread_pools,
     get_speech_thread_pool,
     get_audio_thread_pool,
+    get_tts_thread_pool,
+    get_password_thread_pool,
     get_thread_pool_stats,
 )
+from services.bigquery_sink import get_bigquery_sink_stats, shutdown_bigquery_sinks
+from services.job_queue import get_job_queue_stats, start_job_workers, stop_job_workers
+from services.email_outbox import (
+    get_email_outbox_stats,
+    start_email_outbox,
+    stop_email_outbox,
+)
+from services.casbin_sync import (
+    get_casbin_role_sync,
+    get_casbin_sync_stats,
+    start_casbin_role_sync,
+    stop_casbin_role_sync,
+)
+from services.word_selection_practice import get_word_practice_stats
+from services.teacher_dashboard import get_teacher_dashboard_stats
 
 # Import middleware
 # from middleware.rate_limiter import RateLimitMiddleware  # Temporarily disabled due to bug
+from middleware.global_rate_limiter import (
+    get_global_rate_limiter,
+    get_global_rate_limiter_stats,
+    global_rate_limit_middleware,
+)
 from utils.performance import performance_logging_middleware, setup_query_logging
 
 # Import routers
@@ -42,6 +64,7 @@ from routers import (
     payment,
     credit_packages,
     cron,
+    jobs,
     organizations,
     schools,
     classroom_schools,
@@ -65,6 +88,10 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# 🔐 Global Rate Limiting - 其他 API 的兜底保護（路由類別 + IP + 登入用戶）
+# 在 CORS 之前註冊，429 回應仍會帶 CORS headers
+app.middleware("http")(global_rate_limit_middleware)
+
 # CORS 設定
 environment = os.getenv("ENVIRONMENT", "development")
 
@@ -124,6 +151,8 @@ async def startup_event():
     # 初始化線程池
     get_speech_thread_pool()
     get_audio_thread_pool()
+    get_tts_thread_pool()
+    get_password_thread_pool()
 
     # Initialize HTTP client connection pool
     from utils.http_client import get_http_client
@@ -147,10 +176,7 @@ async def startup_event():
 
     for attempt in range(MAX_RETRIES):
         try:
-            from services.casbin_service import get_casbin_service
-
-            casbin_service = get_casbin_service()
-            casbin_service.sync_from_database()
+            get_casbin_role_sync().full_sync()
             logger.info("✅ Casbin roles synced from database")
             break
         except Exception as e:
@@ -170,9 +196,30 @@ async def startup_event():
                 time.sleep(RETRY_DELAY)
                 RETRY_DELAY *= 2  # Exponential backoff
 
+    # 預熱 TTS 快取索引（背景執行，不延遲啟動）
+    import asyncio
+    from services.tts import get_tts_service
+
+    asyncio.get_event_loop().run_in_executor(
+        None, get_tts_service().warm_up_cache_index
+    )
+
+    # 啟動背景工作 worker pool（批次批改、續訂、報告、課程複製）
+    start_job_workers()
+
+    # 啟動 email outbox sender（EMAIL_OUTBOX_ENABLED=true 時）
+    start_email_outbox()
+
+    # Casbin 角色增量同步（定期 + LISTEN/NOTIFY 跨 instance 通知）
+    start_casbin_role_sync()
+
+    # 定期清理 rate limiter 記憶體中過期的 key
+    get_global_rate_limiter().start_cleanup_task()
+
     print(
         "🚀 Application startup complete - "
-        "HTTP client pool, thread pools initialized, query logging enabled, Casbin synced"
+        "HTTP client pool, thread pools initialized, query logging enabled, Casbin synced, "
+        "TTS cache index warming up, background job workers started"
     )
 
 
@@ -184,9 +231,26 @@ async def shutdown_event():
 
     await close_http_client()
 
+    # 等待執行中的背景工作完成（逾時的工作由 lease 回收後重新執行）
+    await stop_job_workers()
+
+    # 寄完 outbox 目前這批郵件並關閉 SMTP 連線（未寄出的郵件留在 outbox）
+    await stop_email_outbox()
+
+    # 停止 Casbin 角色同步並關閉 LISTEN 連線
+    await stop_casbin_role_sync()
+
+    await get_global_rate_limiter().stop_cleanup_task()
+
+    # 送出 BigQuery sink 佇列中剩餘的日誌
+    shutdown_bigquery_sinks()
+
     # 關閉線程池
     shutdown_thread_pools(wait=True)
-    print("👋 Application shutdown complete - Thread pools and HTTP client closed")
+    print(
+        "👋 Application shutdown complete - "
+        "BigQuery sinks drained, thread pools and HTTP client closed"
+    )
 
 
 @app.get("/")
@@ -227,6 +291,13 @@ async def health_check():
             "info": settings.get_database_info(),
         },
         "thread_pools": get_thread_pool_stats(),
+        "bigquery_sinks": get_bigquery_sink_stats(),
+        "job_queue": get_job_queue_stats(),
+        "email_outbox": get_email_outbox_stats(),
+        "casbin_sync": get_casbin_sync_stats(),
+        "rate_limiter": get_global_rate_limiter_stats(),
+        "word_practice": get_word_practice_stats(),
+        "teacher_dashboard": get_teacher_dashboard_stats(),
     }
 
 
@@ -278,6 +349,7 @@ app.include_router(admin_monitoring.router)  # 監控路由（無需認證）
 app.include_router(admin_billing.router)  # Admin 帳單監控路由（Admin only）
 app.include_router(admin_audio_errors.router)  # Admin 錄音錯誤監控路由（Admin only）
 app.include_router(cron.router)  # Cron Job 路由
+app.include_router(jobs.router)  # 背景工作狀態查詢路由
 app.include_router(debug.router)  # Debug 路由
 
 
@@ -4,7 +4,7 @@
 
 策略：
 1. 登录 API: 已由 slowapi 保护（3次/分钟）
-2. 其他 API: 全局限制（500次/分钟，保守配置）
+2. 其他 API: 全局限制（默认 500次/分钟，按路由类别可调）
 3. 观察 1 周后调整为 200次/分钟
 
 为什么需要这个：
@@ -13,35 +13,191 @@
 - 需要全局兜底保护
 
 设计：
-- 非常宽松的限制（500/分钟）
-- 正常用户不会触发（5分钟最多50-100个请求）
-- 只阻止极端异常（如12/3那种）
+- 近似滑动窗口（sliding window counter）：每个 key 只存
+  (窗口编号, 本窗口计数, 上一窗口计数)，内存与 CPU 都是 O(1)
+  估计值 = 上一窗口计数 × (1 - 本窗口已过比例) + 本窗口计数
+- 复合 key：路由类别 + IP + 登录用户
+  同一个 NAT IP 后面的整班学生各自计算，不会互相影响；
+  未登录的请求仍按 IP 计算
+- 登录：/api/auth/ 未登录请求按 IP 只有较高的上限（整个学校共用一个 NAT IP），
+  登录接口另外按 提交的账号 + IP 限制（enforce_login_rate_limit）
+- 客户端 IP：X-Forwarded-For 取受信任代理追加的条目（从右数第 N 个），
+  最左边的条目可以由客户端伪造
+- 后端可插拔：有 REDIS_URL 时用 Redis（多 instance 共享），
+  Redis 出错时降级到内存（与 core/demo_quota.py 相同）；
+  Redis 调用在 executor 执行，不阻塞 event loop
+- 统计：按路由类别的 allowed/limited 次数，以及被限制最多的 key（/health）
+
+环境变量：
+- GLOBAL_RATE_LIMIT_ENABLED: 是否启用（默认 true）
+- GLOBAL_RATE_LIMIT_MAX / GLOBAL_RATE_LIMIT_WINDOW: 默认类别的限制（500 / 60 秒）
+- GLOBAL_RATE_LIMIT_AUTH_IP_MAX: /api/auth/ 每个 IP 的上限（默认 600 / 60 秒）
+- GLOBAL_RATE_LIMIT_LOGIN_MAX: 每个 账号 + IP 的登录次数上限（默认 30 / 60 秒）
+- GLOBAL_RATE_LIMIT_TRUSTED_HOPS: 会追加 X-Forwarded-For 的受信任代理层数
+  （默认 1，Cloud Run；0 表示不信任 X-Forwarded-For）
 """
 
-from fastapi import Request
-from datetime import datetime, timedelta
-from collections import defaultdict
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from typing import Dict, List, Optional, Tuple
 import asyncio
 import logging
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_REQUESTS = int(os.getenv("GLOBAL_RATE_LIMIT_MAX", "500"))
+DEFAULT_WINDOW_SECONDS = int(os.getenv("GLOBAL_RATE_LIMIT_WINDOW", "60"))
+AUTH_IP_MAX_REQUESTS = int(os.getenv("GLOBAL_RATE_LIMIT_AUTH_IP_MAX", "600"))
+LOGIN_MAX_ATTEMPTS = int(os.getenv("GLOBAL_RATE_LIMIT_LOGIN_MAX", "30"))
+LOGIN_WINDOW_SECONDS = 60
+TRUSTED_PROXY_HOPS = int(os.getenv("GLOBAL_RATE_LIMIT_TRUSTED_HOPS", "1"))
 
-class GlobalRateLimiter:
-    """全局速率限制器（内存版）"""
+# 路由类别：(路径前缀, 类别, 最大请求数, 窗口秒数)，按顺序匹配第一个
+ROUTE_CLASSES: List[Tuple[str, str, int, int]] = [
+    ("/api/auth/", "auth", AUTH_IP_MAX_REQUESTS, 60),
+    ("/api/speech", "speech", 240, 60),
+    ("/api/azure-speech", "speech", 240, 60),
+    ("/api/files", "upload", 120, 60),
+    ("/api/admin", "admin", 300, 60),
+]
+
+# 不限制的路径（健康检查、静态资源、文档）
+EXEMPT_PREFIXES = ("/health", "/static", "/docs", "/redoc", "/openapi.json")
+
+# 被限制次数统计最多保留的 key 数
+MAX_TRACKED_LIMITED_KEYS = 1000
+
+
+class MemoryRateLimitBackend:
+    """内存后端：{key: [窗口编号, 本窗口计数, 上一窗口计数, 窗口秒数]}"""
+
+    name = "memory"
 
     def __init__(self):
-        # {client_ip: [(timestamp, path), ...]}
-        self.requests = defaultdict(list)
+        self._windows: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def hit(
+        self, key: str, limit: int, window_seconds: int, now: float
+    ) -> Tuple[bool, float]:
+        """检查并计数；超限时不计数。返回 (是否允许, 估计请求数)"""
+        window = int(now // window_seconds)
+        elapsed = (now % window_seconds) / window_seconds
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None:
+                state = self._windows[key] = [window, 0, 0, window_seconds]
+            elif state[0] != window:
+                # 刚好进入下一个窗口时保留计数，跨多个窗口则归零
+                previous = state[1] if state[0] == window - 1 else 0
+                state[0], state[1], state[2] = window, 0, previous
+
+            estimated = state[2] * (1 - elapsed) + state[1]
+            if estimated >= limit:
+                return False, estimated
+            state[1] += 1
+            return True, estimated
+
+    def cleanup(self, now: float) -> int:
+        """删除两个窗口以上没有请求的 key"""
+        with self._lock:
+            expired = [
+                k for k, s in self._windows.items() if s[0] < int(now // s[3]) - 1
+            ]
+            for key in expired:
+                del self._windows[key]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._windows)
+
+
+class RedisRateLimitBackend:
+    """Redis 后端：每个窗口一个计数 key（INCR + EXPIRE），多 instance 共享"""
+
+    name = "redis"
+    REDIS_KEY_PREFIX = "ratelimit:global|"
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    def hit(
+        self, key: str, limit: int, window_seconds: int, now: float
+    ) -> Tuple[bool, float]:
+        window = int(now // window_seconds)
+        elapsed = (now % window_seconds) / window_seconds
+        current_key = f"{self.REDIS_KEY_PREFIX}{key}|{window}"
+        previous_key = f"{self.REDIS_KEY_PREFIX}{key}|{window - 1}"
+
+        pipe = self.redis_client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, window_seconds * 2)
+        pipe.get(previous_key)
+        current, _, previous = pipe.execute()
+
+        # INCR 已包含本次请求
+        estimated = int(previous or 0) * (1 - elapsed) + current - 1
+        if estimated >= limit:
+            # 超限的请求不计入，与内存后端一致
+            self.redis_client.decr(current_key)
+            return False, estimated
+        return True, estimated
+
+    def cleanup(self, now: float) -> int:
+        # key 由 EXPIRE 自动过期
+        return 0
+
+
+class GlobalRateLimiter:
+    """全局速率限制器（近似滑动窗口，内存或 Redis）"""
+
+    def __init__(
+        self,
+        redis_client=None,
+        enabled: Optional[bool] = None,
+        trusted_hops: int = TRUSTED_PROXY_HOPS,
+    ):
+        self.enabled = (
+            enabled
+            if enabled is not None
+            else os.getenv("GLOBAL_RATE_LIMIT_ENABLED", "true").lower() == "true"
+        )
+        self.trusted_hops = trusted_hops
+        self.memory_backend = MemoryRateLimitBackend()
+        self.backend = self.memory_backend
+        if redis_client:
+            try:
+                redis_client.ping()
+                self.backend = RedisRateLimitBackend(redis_client)
+                logger.info("✅ Redis connected for global rate limiting")
+            except Exception as e:
+                logger.warning(
+                    f"⚠️ Redis unavailable for rate limiting, using memory: {e}"
+                )
         self.cleanup_task = None
+        self._stats_lock = threading.Lock()
+        # {route_class: {"allowed": int, "limited": int}}
+        self._route_stats: Dict[str, Dict[str, int]] = {}
+        # {key: limited 次数}
+        self._limited_keys: Dict[str, int] = {}
+        self._backend_errors = 0
 
     def get_client_ip(self, request: Request) -> str:
-        """获取客户端 IP（处理代理）"""
-        # 优先使用 X-Forwarded-For（Cloud Run 会设置）
+        """
+        获取客户端 IP（处理代理）
+
+        X-Forwarded-For 的每一层代理都在右边追加一个 IP，只有最右边 trusted_hops
+        个条目是受信任代理写入的；取从右数第 trusted_hops 个（Cloud Run 为 1，
+        即最右边），左边的条目可由客户端任意伪造（与 routers/demo.py 相同）
+        """
         forwarded = request.headers.get("X-Forwarded-For")
-        if forwarded:
-            # 取第一个 IP（客户端真实 IP）
-            return forwarded.split(",")[0].strip()
+        if forwarded and self.trusted_hops > 0:
+            ips = [ip.strip() for ip in forwarded.split(",") if ip.strip()]
+            if ips:
+                return ips[-min(self.trusted_hops, len(ips))]
 
         # Fallback: 直接连接 IP
         if request.client:
@@ -49,85 +205,148 @@ class GlobalRateLimiter:
 
         return "unknown"
 
+    def get_user_identity(self, request: Request) -> Optional[str]:
+        """从 Bearer token 取得登录用户（teacher:1 / student:2），无效 token 视为未登录"""
+        authorization = request.headers.get("Authorization", "")
+        if not authorization.lower().startswith("bearer "):
+            return None
+        from auth import verify_token
+
+        payload = verify_token(authorization[7:].strip())
+        if not payload or not payload.get("sub"):
+            return None
+        return f"{payload.get('type', 'user')}:{payload['sub']}"
+
+    @staticmethod
+    def classify_route(path: str) -> Tuple[str, int, int]:
+        """路由类别与限制：(类别, 最大请求数, 窗口秒数)"""
+        for prefix, route_class, max_requests, window_seconds in ROUTE_CLASSES:
+            if path.startswith(prefix):
+                return route_class, max_requests, window_seconds
+        return "default", DEFAULT_MAX_REQUESTS, DEFAULT_WINDOW_SECONDS
+
+    def build_key(self, request: Request, route_class: str) -> str:
+        """复合 key：路由类别 + IP + 登录用户"""
+        user = self.get_user_identity(request) or "anonymous"
+        return f"{route_class}|{self.get_client_ip(request)}|{user}"
+
+    async def _hit(
+        self, key: str, max_requests: int, window_seconds: int
+    ) -> Tuple[bool, float]:
+        now = time.time()
+        if self.backend is not self.memory_backend:
+            try:
+                # Redis client 是同步的，在 executor 执行避免阻塞 event loop
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, self.backend.hit, key, max_requests, window_seconds, now
+                )
+            except Exception as e:
+                # Redis 出错时降级到内存
+                self._backend_errors += 1
+                logger.error(f"Redis error in global rate limiter: {e}")
+        return self.memory_backend.hit(key, max_requests, window_seconds, now)
+
+    def _record(self, route_class: str, key: str, allowed: bool):
+        with self._stats_lock:
+            stats = self._route_stats.setdefault(
+                route_class, {"allowed": 0, "limited": 0}
+            )
+            if allowed:
+                stats["allowed"] += 1
+                return
+            stats["limited"] += 1
+            if (
+                key in self._limited_keys
+                or len(self._limited_keys) < MAX_TRACKED_LIMITED_KEYS
+            ):
+                self._limited_keys[key] = self._limited_keys.get(key, 0) + 1
+
     async def check_rate_limit(
-        self, request: Request, max_requests: int = 500, window_seconds: int = 60
+        self,
+        request: Request,
+        max_requests: Optional[int] = None,
+        window_seconds: Optional[int] = None,
     ) -> tuple[bool, dict]:
         """
         检查是否超限
 
         Args:
             request: FastAPI request
-            max_requests: 时间窗口内最大请求数（默认500，很宽松）
-            window_seconds: 时间窗口秒数（默认60秒）
+            max_requests: 时间窗口内最大请求数（默认按路由类别）
+            window_seconds: 时间窗口秒数（默认按路由类别）
 
         Returns:
             (是否允许, 限制信息)
         """
-        client_ip = self.get_client_ip(request)
-        now = datetime.now()
-        window_start = now - timedelta(seconds=window_seconds)
+        route_class, class_max, class_window = self.classify_route(request.url.path)
+        return await self._check(
+            request,
+            route_class,
+            self.build_key(request, route_class),
+            max_requests or class_max,
+            window_seconds or class_window,
+        )
 
-        # 清理该 IP 的过期记录
-        self.requests[client_ip] = [
-            (ts, path) for ts, path in self.requests[client_ip] if ts > window_start
-        ]
+    async def check_login_attempt(
+        self, request: Request, account: str
+    ) -> tuple[bool, dict]:
+        """登录尝试：按 提交的账号 + IP 计算，同一个 NAT IP 的其他账号不受影响"""
+        key = f"login|{self.get_client_ip(request)}|{account}"
+        return await self._check(
+            request, "login", key, LOGIN_MAX_ATTEMPTS, LOGIN_WINDOW_SECONDS
+        )
 
-        # 计数
-        current_count = len(self.requests[client_ip])
+    async def _check(
+        self,
+        request: Request,
+        route_class: str,
+        key: str,
+        max_requests: int,
+        window_seconds: int,
+    ) -> tuple[bool, dict]:
+        allowed, estimated = await self._hit(key, max_requests, window_seconds)
+        self._record(route_class, key, allowed)
 
-        # 检查是否超限
-        if current_count >= max_requests:
+        if not allowed:
             # 记录被限制的请求（用于分析）
             logger.warning(
                 f"⚠️ Rate limit exceeded: "
-                f"IP={client_ip}, "
+                f"Key={key}, "
                 f"Path={request.url.path}, "
-                f"Count={current_count}/{max_requests} in {window_seconds}s"
+                f"Count={int(estimated)}/{max_requests} in {window_seconds}s"
             )
+            retry_after = window_seconds - int(time.time() % window_seconds)
 
             return False, {
                 "error": "Too many requests",
-                "message": f"您的请求过于频繁，请{window_seconds}秒后再试",
+                "message": f"您的请求过于频繁，请{retry_after}秒后再试",
                 "limit": max_requests,
                 "window_seconds": window_seconds,
-                "retry_after": window_seconds,
+                "retry_after": retry_after,
+                "route_class": route_class,
             }
 
-        # 记录本次请求
-        self.requests[client_ip].append((now, str(request.url.path)))
-
         return True, {
             "limit": max_requests,
-            "remaining": max_requests - current_count - 1,
+            "remaining": max(0, max_requests - int(estimated) - 1),
             "window_seconds": window_seconds,
+            "route_class": route_class,
         }
 
     async def cleanup_old_records(self):
         """
-        定期清理所有过期记录（防止内存泄漏）
-        每5分钟清理一次，删除2分钟前的记录
+        定期清理内存后端中过期的 key（防止内存泄漏）
+        每5分钟清理一次
         """
         while True:
             try:
                 await asyncio.sleep(300)  # 每5分钟
-                now = datetime.now()
-                cutoff = now - timedelta(seconds=120)  # 2分钟前
-
-                cleaned_ips = 0
-                for ip in list(self.requests.keys()):
-                    # 清理过期记录
-                    self.requests[ip] = [
-                        (ts, path) for ts, path in self.requests[ip] if ts > cutoff
-                    ]
-
-                    # 如果该 IP 没有记录了，删除 key
-                    if not self.requests[ip]:
-                        del self.requests[ip]
-                        cleaned_ips += 1
-
-                if cleaned_ips > 0:
-                    logger.info(f"🧹 Cleaned {cleaned_ips} expired IP records")
+                cleaned = self.memory_backend.cleanup(time.time())
+                if cleaned > 0:
+                    logger.info(f"🧹 Cleaned {cleaned} expired rate limit keys")
 
+            except asyncio.CancelledError:
+                break
             except Exception as e:
                 logger.error(f"❌ Cleanup task error: {e}")
 
@@ -137,6 +356,103 @@ class GlobalRateLimiter:
             self.cleanup_task = asyncio.create_task(self.cleanup_old_records())
             logger.info("✅ Rate limiter cleanup task started")
 
+    async def stop_cleanup_task(self):
+        """停止清理任务"""
+        if self.cleanup_task:
+            self.cleanup_task.cancel()
+            try:
+                await self.cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self.cleanup_task = None
+
+    def get_stats(self, top: int = 10) -> Dict:
+        """监控用统计（/health）"""
+        with self._stats_lock:
+            routes = {k: dict(v) for k, v in self._route_stats.items()}
+            top_limited = sorted(
+                self._limited_keys.items(), key=lambda item: item[1], reverse=True
+            )[:top]
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend.name,
+            "tracked_keys": len(self.memory_backend),
+            "backend_errors": self._backend_errors,
+            "routes": routes,
+            "top_limited_keys": [
+                {"key": key, "limited": count} for key, count in top_limited
+            ],
+        }
+
+
+async def global_rate_limit_middleware(request: Request, call_next):
+    """FastAPI HTTP middleware：超限返回 429"""
+    limiter = get_global_rate_limiter()
+    if not limiter.enabled or request.url.path.startswith(EXEMPT_PREFIXES):
+        return await call_next(request)
+
+    allowed, info = await limiter.check_rate_limit(request)
+    if not allowed:
+        return JSONResponse(
+            status_code=429,
+            content=info,
+            headers={
+                "Retry-After": str(info["retry_after"]),
+                "X-RateLimit-Limit": str(info["limit"]),
+                "X-RateLimit-Remaining": "0",
+            },
+        )
+
+    response = await call_next(request)
+    response.headers["X-RateLimit-Limit"] = str(info["limit"])
+    response.headers["X-RateLimit-Remaining"] = str(info["remaining"])
+    return response
+
+
+async def enforce_login_rate_limit(request: Request, account: str) -> None:
+    """
+    登录接口调用：按 提交的账号 + IP 限制，超限抛出 429
+
+    middleware 读不到 request body，所以账号级别的限制由登录接口在解析请求后调用
+    """
+    limiter = get_global_rate_limiter()
+    if not limiter.enabled:
+        return
+
+    allowed, info = await limiter.check_login_attempt(request, account)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=info,
+            headers={"Retry-After": str(info["retry_after"])},
+        )
+
+
+# 全局实例
+global_rate_limiter: Optional[GlobalRateLimiter] = None
+
+
+def get_global_rate_limiter() -> GlobalRateLimiter:
+    """取得全局限制器单例（有 REDIS_URL 时使用 Redis 后端）"""
+    global global_rate_limiter
+    if global_rate_limiter is None:
+        redis_client = None
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            try:
+                import redis
+
+                redis_client = redis.from_url(redis_url)
+            except Exception as e:
+                logger.warning(f"Failed to connect to Redis: {e}")
+
+        global_rate_limiter = GlobalRateLimiter(redis_client)
+
+    return global_rate_limiter
+
 
-# 创建全局实例
-global_rate_limiter = GlobalRateLimiter()
+def get_global_rate_limiter_stats() -> Dict:
+    """监控用统计（/health）"""
+    if global_rate_limiter is None:
+        return {"enabled": False}
+    return global_rate_limiter.get_stats()
@@ -65,6 +65,21 @@ from .progress import (
 # Demo models
 from .demo_config import DemoConfig
 
+# TTS cache models
+from .tts_cache import TTSCacheEntry
+
+# Translation cache models
+from .translation_cache import TranslationCacheEntry
+
+# Background job models
+from .job import BackgroundJob
+
+# Subscription renewal models
+from .renewal import RenewalAttempt
+
+# Email outbox models
+from .email_outbox import EmailOutboxMessage
+
 __all__ = [
     # Base
     "Base",
@@ -120,4 +135,14 @@ __all__ = [
     "OrganizationPointsLog",
     # Demo
     "DemoConfig",
+    # TTS cache
+    "TTSCacheEntry",
+    # Translation cache
+    "TranslationCacheEntry",
+    # Background jobs
+    "BackgroundJob",
+    # Subscription renewal
+    "RenewalAttempt",
+    # Email outbox
+    "EmailOutboxMessage",
 ]
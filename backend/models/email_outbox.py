@@ -0,0 +1,47 @@
+"""
+Email Outbox model - persisted queue of outgoing emails
+"""
+
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index
+from sqlalchemy.sql import func
+from database import Base
+
+
+class EmailOutboxMessage(Base):
+    """待寄送的郵件 - 驗證信、密碼重設、續訂通知、帳單摘要等
+
+    EmailService 只負責組好 MIME 郵件並寫入 outbox，
+    實際寄送由 services.email_outbox 的 sender 以常駐的 SMTP 連線批次處理。
+    """
+
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    from_email = Column(String(255), nullable=False, comment="Envelope sender")
+    to_email = Column(String(255), nullable=False, comment="Envelope recipient")
+    subject = Column(String(500), comment="Subject (for monitoring)")
+    raw_message = Column(Text, nullable=False, comment="Serialized MIME message")
+    status = Column(
+        String(16),
+        nullable=False,
+        default="queued",
+        comment="queued / sending / sent / failed",
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    last_error = Column(Text, comment="Last SMTP error")
+    next_attempt_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        comment="Not claimed before this time (retry backoff)",
+    )
+    locked_by = Column(String(64), comment="Sender that claimed the message")
+    locked_at = Column(DateTime(timezone=True), comment="Lease start")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<EmailOutboxMessage {self.id} -> {self.to_email} {self.status}>"
@@ -0,0 +1,54 @@
+"""
+Background Job model - Postgres-backed queue for long-running work
+"""
+
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index
+from sqlalchemy.sql import func
+from database import Base
+from .base import JSONType
+
+
+class BackgroundJob(Base):
+    """背景工作 - 批次批改、每月續訂、錄音錯誤報告、課程複製等長時間工作
+
+    HTTP handler 只負責建立 job（回傳 202 + job id），
+    實際工作由 services.job_queue 的 worker pool 領取執行。
+    """
+
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        Index("ix_background_jobs_status_run_after", "status", "run_after"),
+        Index("ix_background_jobs_created_by", "created_by"),
+    )
+
+    id = Column(String(36), primary_key=True, comment="UUID")
+    job_type = Column(String(64), nullable=False, comment="Registered job type")
+    status = Column(
+        String(16),
+        nullable=False,
+        default="queued",
+        comment="queued / running / succeeded / failed",
+    )
+    payload = Column(JSONType, comment="Handler arguments")
+    result = Column(JSONType, comment="Handler return value")
+    error = Column(Text, comment="Last error message")
+    progress = Column(Integer, nullable=False, default=0, comment="0-100")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    idempotency_key = Column(
+        String(255), unique=True, comment="Same key returns the existing job"
+    )
+    created_by = Column(String(64), comment="teacher:<id> / student:<id> / cron")
+    run_after = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        comment="Not claimed before this time (retry backoff)",
+    )
+    locked_by = Column(String(64), comment="Worker that claimed the job")
+    locked_at = Column(DateTime(timezone=True), comment="Lease start")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<BackgroundJob {self.job_type} {self.id} {self.status}>"
@@ -0,0 +1,68 @@
+"""
+Renewal Attempt model - per-teacher checkpoint for the monthly auto-renewal run
+"""
+
+from sqlalchemy import (
+    Column,
+    String,
+    Integer,
+    Text,
+    DateTime,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+)
+from sqlalchemy.sql import func
+from database import Base
+from .base import JSONType
+
+
+class RenewalAttempt(Base):
+    """每月自動續訂的扣款紀錄（每位教師每月一筆）
+
+    扣款前先寫入 status='charging'，扣款結果與新訂閱週期在同一個 transaction 中
+    更新為 succeeded / failed。續訂中斷後重新執行時，已完成的教師直接跳過，
+    停在 charging 的教師先以訂單編號向 TapPay 查詢是否已扣款，不會重複扣款。
+    """
+
+    __tablename__ = "renewal_attempts"
+    __table_args__ = (
+        UniqueConstraint(
+            "teacher_id", "renewal_month", name="uq_renewal_attempts_teacher_month"
+        ),
+        Index("ix_renewal_attempts_month_status", "renewal_month", "status"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    teacher_id = Column(
+        Integer,
+        ForeignKey("teachers.id", ondelete="CASCADE"),
+        nullable=False,
+        comment="Teacher being renewed",
+    )
+    renewal_month = Column(String(7), nullable=False, comment="YYYY-MM (Taipei)")
+    order_number = Column(String(64), nullable=False, comment="TapPay order number")
+    status = Column(
+        String(16),
+        nullable=False,
+        default="charging",
+        comment="charging / succeeded / failed",
+    )
+    plan_name = Column(String(64), comment="Plan charged")
+    amount = Column(Integer, comment="Amount charged (TWD)")
+    run_id = Column(String(36), comment="Renewal run that owns the attempt")
+    rec_trade_id = Column(String(64), comment="TapPay transaction id")
+    error = Column(Text, comment="Failure reason")
+    gateway_response = Column(JSONType, comment="Last TapPay response")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        comment="Last status change (stale charging attempts are reconciled)",
+    )
+
+    def __repr__(self):
+        return (
+            f"<RenewalAttempt teacher={self.teacher_id} "
+            f"{self.renewal_month} {self.status}>"
+        )
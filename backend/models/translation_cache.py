@@ -0,0 +1,44 @@
+"""
+Translation Cache Entry model - persistent dictionary of LLM word translations
+"""
+
+from sqlalchemy import Column, String, Integer, Text, DateTime, Index
+from sqlalchemy.sql import func
+from database import Base
+from .base import JSONType
+
+
+class TranslationCacheEntry(Base):
+    """翻譯快取 - 記錄 TranslationService 的 LLM 翻譯結果
+
+    老師反覆翻譯同一批 CEFR 單字，同一個 (文字, 目標語言, 模式, prompt 版本)
+    只需要呼叫一次 LLM；prompt 修改時調高版本號，舊項目自然失效。
+    """
+
+    __tablename__ = "translation_cache_entries"
+    __table_args__ = (
+        Index("ix_translation_cache_entries_prompt_version", "prompt_version"),
+    )
+
+    cache_key = Column(
+        String(32),
+        primary_key=True,
+        comment="MD5 of prompt_version|mode|target_lang|normalized text",
+    )
+    mode = Column(String(16), nullable=False, comment="text / batch / pos")
+    target_lang = Column(String(16), nullable=False, comment="Target language code")
+    prompt_version = Column(Integer, nullable=False, comment="Prompt version")
+    source_text = Column(Text, nullable=False, comment="Normalized source text")
+    result = Column(
+        JSONType, nullable=False, comment="Translation string or {translation, pos}"
+    )
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        comment="First time this translation was recorded",
+    )
+
+    def __repr__(self):
+        return (
+            f"<TranslationCacheEntry {self.mode}:{self.target_lang}:{self.source_text}>"
+        )
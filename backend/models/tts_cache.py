@@ -0,0 +1,31 @@
+"""
+TTS Cache Entry model - persistent manifest of generated TTS audio files
+"""
+
+from sqlalchemy import Column, String, DateTime, Index
+from sqlalchemy.sql import func
+from database import Base
+
+
+class TTSCacheEntry(Base):
+    """TTS 快取清單 - 記錄已上傳到 GCS 的 cached_{md5}.mp3
+
+    讓 TTSService 在重新啟動後不必逐一呼叫 GCS blob.exists()，
+    啟動時載入最近的項目到記憶體 LRU。
+    """
+
+    __tablename__ = "tts_cache_entries"
+    __table_args__ = (Index("ix_tts_cache_entries_created_at", "created_at"),)
+
+    cache_key = Column(
+        String(32), primary_key=True, comment="MD5 of text|voice|rate|volume"
+    )
+    url = Column(String(500), nullable=False, comment="Public audio URL")
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        comment="First time this key was recorded",
+    )
+
+    def __repr__(self):
+        return f"<TTSCacheEntry {self.cache_key}>"
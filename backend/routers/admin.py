@@ -1,8 +1,8 @@
 """Admin routes for seeding and managing the database + subscription management."""
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
+from sqlalchemy import func
 from typing import Dict, Any, Optional
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timezone
@@ -32,6 +32,7 @@ from models import (
 from routers.teachers import get_current_teacher
 from services.tappay_service import TapPayService
 from services.casbin_service import CasbinService
+from services.search_service import search_filter
 from schemas import RefundRequest
 from routers.schemas.admin_organization import (
     AdminOrganizationCreate,
@@ -313,9 +314,7 @@ async def list_teachers(
 
     # 搜尋條件
     if search:
-        query = query.filter(
-            or_(Teacher.email.ilike(f"%{search}%"), Teacher.name.ilike(f"%{search}%"))
-        )
+        query = query.filter(search_filter([Teacher.email, Teacher.name], search))
 
     # 總數
     total = query.count()
@@ -558,6 +557,7 @@ async def admin_refund(
     refund_request: RefundRequest,
     admin: Teacher = Depends(get_current_admin),
     db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
 ):
     """
     Admin 執行退款操作
@@ -565,6 +565,7 @@ async def admin_refund(
     - 全額退款：不提供 amount
     - 部分退款：提供 amount
     - 退款會立即調用 TapPay API
+    - 重送同一次退款請帶相同的 Idempotency-Key（不帶時每次都是新的退款）
     - 退款成功後會記錄在交易中
     - 實際的 period 和 webhook 更新由 TapPay webhook 自動處理
     """
@@ -594,9 +595,10 @@ async def admin_refund(
 
     # 3. 調用 TapPay 退款 API
     tappay_service = TapPayService()
-    refund_result = tappay_service.refund(
+    refund_result = await tappay_service.refund_async(
         rec_trade_id=refund_request.rec_trade_id,
         amount=refund_request.amount,  # None = 全額退款
+        request_id=idempotency_key,
     )
 
     # 4. 檢查 TapPay 退款結果
@@ -617,45 +619,60 @@ async def admin_refund(
     transaction.refund_initiated_at = datetime.now(timezone.utc)
 
     # 5.5 創建 REFUND transaction 記錄
-    # ⚠️ 用 try-except 保護，即使失敗也要 commit 原始 transaction 更新
-    try:
-        refund_transaction = TeacherSubscriptionTransaction(
-            teacher_id=transaction.teacher_id,
-            teacher_email=transaction.teacher_email,
+    refund_id = refund_result.get("refund_id")
+    already_recorded = (
+        refund_id is not None
+        and db.query(TeacherSubscriptionTransaction.id)
+        .filter_by(
             transaction_type=TransactionType.REFUND,
-            subscription_type=transaction.subscription_type,
-            amount=-abs(refund_request.amount or int(transaction.amount)),  # 負數表示退款
-            currency=transaction.currency or "TWD",
-            status=TransactionStatus.SUCCESS,
-            months=transaction.months or 0,  # 複製原交易的月數
-            period_start=transaction.period_start,  # 複製原交易的時間
-            period_end=transaction.period_end,
-            previous_end_date=transaction.previous_end_date,
-            new_end_date=transaction.new_end_date or datetime.now(timezone.utc),  # 必填欄位
-            payment_provider="tappay",
-            payment_method=transaction.payment_method,
-            external_transaction_id=refund_result.get(
-                "refund_id"
-            ),  # 退款交易編號（TapPay 返回 refund_id）
-            original_transaction_id=transaction.id,  # 關聯原始交易
-            refund_reason=refund_request.reason,
-            refund_notes=refund_request.notes,
-            refund_initiated_by=admin.id,
-            refund_initiated_at=datetime.now(timezone.utc),
-            processed_at=datetime.now(timezone.utc),
+            external_transaction_id=refund_id,
         )
-        db.add(refund_transaction)
-        db.flush()  # 先 flush 取得 ID
+        .first()
+        is not None
+    )
+    if already_recorded:
+        # 同一個 Idempotency-Key 的重送：TapPay 回傳同一筆退款，不重複記帳
+        logger.info(f"REFUND transaction for {refund_id} already recorded")
+    else:
+        # ⚠️ 用 try-except 保護，即使失敗也要 commit 原始 transaction 更新
+        try:
+            refund_transaction = TeacherSubscriptionTransaction(
+                teacher_id=transaction.teacher_id,
+                teacher_email=transaction.teacher_email,
+                transaction_type=TransactionType.REFUND,
+                subscription_type=transaction.subscription_type,
+                amount=-abs(refund_request.amount or int(transaction.amount)),  # 負數表示退款
+                currency=transaction.currency or "TWD",
+                status=TransactionStatus.SUCCESS,
+                months=transaction.months or 0,  # 複製原交易的月數
+                period_start=transaction.period_start,  # 複製原交易的時間
+                period_end=transaction.period_end,
+                previous_end_date=transaction.previous_end_date,
+                new_end_date=transaction.new_end_date or datetime.now(timezone.utc),  # 必填欄位
+                payment_provider="tappay",
+                payment_method=transaction.payment_method,
+                external_transaction_id=refund_result.get(
+                    "refund_id"
+                ),  # 退款交易編號（TapPay 返回 refund_id）
+                original_transaction_id=transaction.id,  # 關聯原始交易
+                refund_reason=refund_request.reason,
+                refund_notes=refund_request.notes,
+                refund_initiated_by=admin.id,
+                refund_initiated_at=datetime.now(timezone.utc),
+                processed_at=datetime.now(timezone.utc),
+            )
+            db.add(refund_transaction)
+            db.flush()  # 先 flush 取得 ID
 
-        logger.info(
-            f"✅ Created REFUND transaction {refund_transaction.id} for original transaction {transaction.id}"
-        )
-    except Exception as e:
-        logger.error(f"❌ Failed to create REFUND transaction for {transaction.id}: {e}")
-        logger.error(
-            "⚠️  TapPay refund succeeded but REFUND transaction creation failed! "
-            "Manual intervention may be required."
-        )
+            logger.info(
+                f"✅ Created REFUND transaction {refund_transaction.id} for original transaction {transaction.id}"
+            )
+        except Exception as e:
+            logger.error(f"❌ Failed to create REFUND transaction for {transaction.id}: {e}")
+            logger.error(
+                "⚠️  TapPay refund succeeded but REFUND transaction creation failed! "
+                "Manual intervention may be required."
+            )
 
     # 6. 同步更新對應的 SubscriptionPeriod（如果存在）
     period = (
@@ -981,10 +998,9 @@ async def list_organizations(
             )
             .outerjoin(Teacher, Teacher.id == TeacherOrganization.teacher_id)
             .filter(
-                or_(
-                    Organization.name.ilike(f"%{search}%"),
-                    Organization.display_name.ilike(f"%{search}%"),
-                    Teacher.email.ilike(f"%{search}%"),
+                search_filter(
+                    [Organization.name, Organization.display_name, Teacher.email],
+                    search,
                 )
             )
         )
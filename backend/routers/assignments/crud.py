@@ -31,6 +31,7 @@ from models import (
     StudentItemProgress,
     AssignmentStatus,
 )
+from services.assignment_progress_service import fan_out_student_assignments
 from utils.permissions import has_read_org_materials_permission
 from .validators import (
     CreateAssignmentRequest,
@@ -302,60 +303,10 @@ async def create_assignment(
             status_code=400, detail="No active students in this classroom"
         )
 
-    # Preload all ContentItems for all COPY content_ids (avoid N+1)
-    copy_content_ids = list(content_copy_map.values())
-    all_content_items = (
-        db.query(ContentItem)
-        .filter(ContentItem.content_id.in_(copy_content_ids))
-        .order_by(ContentItem.content_id, ContentItem.order_index)
-        .all()
+    # 以 set-based INSERT 一次建立所有學生的作業與進度記錄（語句數與班級人數無關）
+    fan_out_counts = fan_out_student_assignments(
+        assignment, [student.id for student in students], db, request.classroom_id
     )
-    # Build map: copy_content_id -> [copy_items]
-    content_items_map = {}
-    for item in all_content_items:
-        if item.content_id not in content_items_map:
-            content_items_map[item.content_id] = []
-        content_items_map[item.content_id].append(item)
-
-    # 為每個學生建立 StudentAssignment
-    for student in students:
-        student_assignment = StudentAssignment(
-            assignment_id=assignment.id,
-            student_id=student.id,
-            classroom_id=request.classroom_id,
-            # 暫時保留舊欄位以兼容
-            title=request.title,
-            instructions=request.description,
-            due_date=request.due_date,
-            status=AssignmentStatus.NOT_STARTED,
-            is_active=True,
-        )
-        db.add(student_assignment)
-        db.flush()
-
-        # 為每個內容建立進度記錄（使用副本 ID）
-        for idx, original_content_id in enumerate(request.content_ids, 1):
-            copy_content_id = content_copy_map[original_content_id]
-            progress = StudentContentProgress(
-                student_assignment_id=student_assignment.id,
-                content_id=copy_content_id,  # 指向副本
-                status=AssignmentStatus.NOT_STARTED,
-                order_index=idx,
-                is_locked=False if idx == 1 else True,  # 只解鎖第一個
-            )
-            db.add(progress)
-            db.flush()  # 取得 progress.id
-
-            # Get copy content items from preloaded map (no query)
-            content_items = content_items_map.get(copy_content_id, [])
-
-            for item in content_items:
-                item_progress = StudentItemProgress(
-                    student_assignment_id=student_assignment.id,
-                    content_item_id=item.id,  # 指向副本的 ContentItem
-                    status="NOT_STARTED",
-                )
-                db.add(item_progress)
 
     db.commit()
 
@@ -364,6 +315,7 @@ async def create_assignment(
         "assignment_id": assignment.id,
         "student_count": len(students),
         "content_count": len(request.content_ids),
+        "progress_count": fan_out_counts["item_progress"],
         "message": f"Successfully created assignment for {len(students)} students",
     }
 
@@ -648,78 +600,8 @@ async def patch_assignment(
                 StudentAssignment.id.in_(assignment_ids_to_delete)
             ).delete(synchronize_session=False)
 
-        # Preload existing student assignments (avoid N+1)
-        existing_student_assignments = (
-            db.query(StudentAssignment)
-            .filter(StudentAssignment.assignment_id == assignment_id)
-            .all()
-        )
-        existing_student_ids = {sa.student_id for sa in existing_student_assignments}
-
-        # Preload assignment contents (avoid N+1)
-        assignment_contents = (
-            db.query(AssignmentContent)
-            .filter(AssignmentContent.assignment_id == assignment_id)
-            .order_by(AssignmentContent.order_index)
-            .all()
-        )
-
-        # Preload all content items (avoid N+1)
-        content_ids = [ac.content_id for ac in assignment_contents]
-        all_content_items = (
-            db.query(ContentItem)
-            .filter(ContentItem.content_id.in_(content_ids))
-            .order_by(ContentItem.content_id, ContentItem.order_index)
-            .all()
-        )
-        content_items_map = {}
-        for item in all_content_items:
-            if item.content_id not in content_items_map:
-                content_items_map[item.content_id] = []
-            content_items_map[item.content_id].append(item)
-
-        # 為新的學生列表創建 StudentAssignment
-        for student_id in request.student_ids:
-            # Check from preloaded set (no query)
-            if student_id in existing_student_ids:
-                continue  # Already exists
-
-            student_assignment = StudentAssignment(
-                assignment_id=assignment_id,
-                student_id=student_id,
-                classroom_id=assignment.classroom_id,
-                title=assignment.title,
-                instructions=assignment.description,
-                due_date=assignment.due_date,
-                status=AssignmentStatus.NOT_STARTED,
-                assigned_at=datetime.now(timezone.utc),
-                is_active=True,
-            )
-            db.add(student_assignment)
-            db.flush()  # 取得 student_assignment.id
-
-            # Use preloaded assignment_contents (no query)
-            for ac in assignment_contents:
-                progress = StudentContentProgress(
-                    student_assignment_id=student_assignment.id,
-                    content_id=ac.content_id,
-                    status=AssignmentStatus.NOT_STARTED,
-                    order_index=ac.order_index,
-                    is_locked=False if ac.order_index == 1 else True,  # 只解鎖第一個
-                )
-                db.add(progress)
-                db.flush()  # 取得 progress.id
-
-                # Use preloaded content_items (no query)
-                content_items = content_items_map.get(ac.content_id, [])
-
-                for item in content_items:
-                    item_progress = StudentItemProgress(
-                        student_assignment_id=student_assignment.id,
-                        content_item_id=item.id,
-                        status="NOT_STARTED",
-                    )
-                    db.add(item_progress)
+        # 為新的學生列表建立 StudentAssignment 與進度（已存在的學生會略過）
+        fan_out_student_assignments(assignment, request.student_ids, db)
 
     db.commit()
 
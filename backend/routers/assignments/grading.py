@@ -4,9 +4,9 @@ Grading operations (AI and manual)
 
 import json
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import and_
 from sqlalchemy.orm.attributes import flag_modified
@@ -47,8 +47,10 @@ from .utils import (
     get_score_with_fallback,
     generate_item_comment,
     generate_assignment_feedback,
-    trigger_ai_assessment_for_item,
 )
+from services.grading_pipeline import get_grading_pipeline
+from services.job_queue import JobContext, enqueue_job, register_job
+from routers.jobs import job_accepted_response, job_owner, prefers_async
 
 logger = logging.getLogger(__name__)
 
@@ -936,17 +938,93 @@ async def manual_grade_assignment(
 # ============ Batch Grading Endpoints ============
 
 
+def _get_assignment_for_grading(
+    assignment_id: int, classroom_id: int, teacher_id: int, db: Session
+) -> Assignment:
+    """取得教師有權限批改的作業（找不到時拋出 404）"""
+    assignment = (
+        db.query(Assignment)
+        .join(Classroom)
+        .filter(
+            and_(
+                Assignment.id == assignment_id,
+                Classroom.id == classroom_id,
+                Classroom.teacher_id == teacher_id,
+            )
+        )
+        .first()
+    )
+
+    if not assignment:
+        raise HTTPException(
+            status_code=404,
+            detail="Assignment not found or you don't have permission",
+        )
+    return assignment
+
+
 @router.post("/{assignment_id}/batch-grade", response_model=BatchGradingResponse)
 @trace_function("Batch Grade Assignment")
 async def batch_grade_assignment(
     assignment_id: int,
     request: BatchGradingRequest,
+    prefer: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_teacher: Teacher = Depends(get_current_teacher),
 ):
     """
     AI 批次批改作業
 
+    帶有 Prefer: respond-async 時建立背景工作並回傳 202 + job id，
+    以 GET /api/jobs/{job_id} 查詢進度，完成後 result 即為 BatchGradingResponse。
+    """
+    if prefers_async(prefer):
+        _get_assignment_for_grading(
+            assignment_id, request.classroom_id, current_teacher.id, db
+        )
+        job = enqueue_job(
+            db,
+            "batch_grade",
+            payload={
+                "assignment_id": assignment_id,
+                "teacher_id": current_teacher.id,
+                "request": request.model_dump(),
+            },
+            idempotency_key=idempotency_key,
+            created_by=job_owner(current_teacher),
+        )
+        return job_accepted_response(job)
+
+    return await run_batch_grade(assignment_id, request, current_teacher.id, db)
+
+
+@register_job("batch_grade", concurrency_class="grading", max_attempts=2)
+async def batch_grade_job(ctx: JobContext) -> dict:
+    db = ctx.session()
+    try:
+        response = await run_batch_grade(
+            ctx.payload["assignment_id"],
+            BatchGradingRequest(**ctx.payload["request"]),
+            ctx.payload["teacher_id"],
+            db,
+            on_progress=ctx.set_progress,
+        )
+        return response.model_dump()
+    finally:
+        db.close()
+
+
+async def run_batch_grade(
+    assignment_id: int,
+    request: BatchGradingRequest,
+    teacher_id: int,
+    db: Session,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> BatchGradingResponse:
+    """
+    AI 批次批改作業
+
     批改流程：
     1. 查找需要批改的學生：
        - 批次模式（未指定 student_ids 或多個學生）：僅處理「已提交」或「已訂正」狀態
@@ -968,24 +1046,7 @@ async def batch_grade_assignment(
 
     # 1. 驗證教師權限
     with start_span("Verify Teacher Permission"):
-        assignment = (
-            db.query(Assignment)
-            .join(Classroom)
-            .filter(
-                and_(
-                    Assignment.id == assignment_id,
-                    Classroom.id == request.classroom_id,
-                    Classroom.teacher_id == current_teacher.id,
-                )
-            )
-            .first()
-        )
-
-        if not assignment:
-            raise HTTPException(
-                status_code=404,
-                detail="Assignment not found or you don't have permission",
-            )
+        _get_assignment_for_grading(assignment_id, request.classroom_id, teacher_id, db)
         perf.checkpoint("Permission Check")
 
     # 2. 查找需要批改的學生
@@ -1070,32 +1131,74 @@ async def batch_grade_assignment(
         content_items_by_id = {item.id: item for item in content_items}
         perf.checkpoint(f"Pre-loaded {len(content_items)} Content Items")
 
+    # 4.5. 並發補齊缺少 AI 評分的題目（下載 / 解碼 / Azure 評估），一次寫回
+    with start_span("Assess Missing Items"):
+        pending_items = [
+            item
+            for item in all_item_progress
+            if item.recording_url and not item.ai_assessed_at
+        ]
+        # 每位學生的評估進度：pending / assessed / failed
+        assessment_progress = {
+            sa_id: {"pending": 0, "assessed": 0, "failed": 0}
+            for sa_id in student_assignment_ids
+        }
+        for item in pending_items:
+            assessment_progress[item.student_assignment_id]["pending"] += 1
+
+        assessed_total = 0
+
+        def record_progress(item: StudentItemProgress, succeeded: bool):
+            nonlocal assessed_total
+            progress = assessment_progress[item.student_assignment_id]
+            progress["assessed" if succeeded else "failed"] += 1
+            done = progress["assessed"] + progress["failed"]
+            logger.info(
+                f"Batch grade {assignment_id}: student_assignment "
+                f"{item.student_assignment_id} assessed {done}/{progress['pending']}"
+            )
+            # AI 評估約占整體時間的 80%
+            assessed_total += 1
+            if on_progress:
+                on_progress(assessed_total * 80 / len(pending_items))
+
+        if pending_items:
+            # 評估可能要數十秒：先把預載的物件移出 session（保留已載入的值，
+            # 不被 commit expire），再結束讀取交易，評估期間不佔住 idle 的交易
+            preloaded = [
+                *content_items,
+                *all_item_progress,
+                *student_assignments,
+                *(sa.student for sa in student_assignments),
+            ]
+            for obj in preloaded:
+                if obj in db:
+                    db.expunge(obj)
+            db.commit()
+
+            pipeline = get_grading_pipeline()
+            assessments = await pipeline.assess_items(
+                pending_items, content_items_by_id, on_item_done=record_progress
+            )
+            # 評估完成後在新的短交易中寫回：物件重新加入 session（不重新查詢），
+            # 一次 bulk UPDATE 寫回評估結果，與批改結果在步驟 12 一起提交
+            db.add_all(student_assignments)
+            db.add_all(all_item_progress)
+            pipeline.apply_results(pending_items, assessments, db)
+        perf.checkpoint(f"Assessed {len(pending_items)} Missing Items")
+
     results = []
 
     # 5. 批改每個學生的作業
     with start_span("Process Each Student"):
-        for student_assignment in student_assignments:
+        for index, student_assignment in enumerate(student_assignments):
             student = student_assignment.student
+            if on_progress:
+                on_progress(80 + index * 20 / len(student_assignments))
 
             # 6. 從預載的資料中取得該學生所有題目的進度
             item_progress_list = progress_by_student.get(student_assignment.id, [])
 
-            # 6.5. Trigger AI assessment for items with recordings but no scores
-            with start_span("Trigger Missing AI Assessments"):
-                for item in item_progress_list:
-                    # Check if has recording but no AI assessment
-                    if item.recording_url and not item.ai_assessed_at:
-                        logger.info(
-                            f"Triggering AI assessment for item_progress {item.id}"
-                        )
-                        # Pass pre-loaded content_item to avoid N+1 query
-                        content_item = content_items_by_id.get(item.content_item_id)
-                        await trigger_ai_assessment_for_item(item, db, content_item)
-                        # Refresh to get updated scores
-                        db.refresh(item)
-
-                perf.checkpoint("AI Assessments Triggered")
-
             # 7. 計算分數
             item_scores = []
             pronunciation_scores = []
@@ -1290,6 +1393,12 @@ async def batch_grade_assignment(
                     avg_completeness=round(avg_completeness, 1),
                     feedback=student_assignment.feedback,
                     status=student_assignment.status.value,
+                    assessed_items=assessment_progress[student_assignment.id][
+                        "assessed"
+                    ],
+                    failed_assessments=assessment_progress[student_assignment.id][
+                        "failed"
+                    ],
                 )
             )
 
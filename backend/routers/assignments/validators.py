@@ -168,6 +168,8 @@ class StudentBatchGradingResult(BaseModel):
     avg_completeness: float
     feedback: Optional[str] = None  # Assignment feedback
     status: str
+    assessed_items: int = 0  # 本次批改新完成 AI 評估的題數
+    failed_assessments: int = 0  # 本次 AI 評估失敗的題數（以 0 分計）
 
 
 class BatchGradingResponse(BaseModel):
@@ -15,15 +15,17 @@ from models import (
     TeacherSchool,
 )
 from auth import (
-    verify_password,
+    verify_password_async,
     create_access_token,
-    get_password_hash,
+    get_password_hash,  # noqa: F401 - kept importable from routers.auth
+    get_password_hash_async,
     verify_token,
     validate_password_strength,
 )
 from services.email_service import email_service
 from datetime import datetime, timedelta
 from core.limiter import limiter
+from middleware.global_rate_limiter import enforce_login_rate_limit
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
@@ -71,6 +73,8 @@ async def teacher_login(
 
     logger = logging.getLogger(__name__)
 
+    await enforce_login_rate_limit(request, f"email:{login_req.email.lower()}")
+
     logger.info(f"🔍 Login attempt for email: {login_req.email}")
     teacher = db.query(Teacher).filter(Teacher.email == login_req.email).first()
 
@@ -85,7 +89,9 @@ async def teacher_login(
     logger.info(f"   - is_active: {teacher.is_active}")
     logger.info(f"   - email_verified: {teacher.email_verified}")
 
-    password_valid = verify_password(login_req.password, teacher.password_hash)
+    password_valid = await verify_password_async(
+        login_req.password, teacher.password_hash
+    )
     logger.info(f"🔑 Password verification result: {password_valid}")
 
     if not password_valid:
@@ -216,7 +222,7 @@ async def teacher_register(
     # Create new teacher (未啟用，需要 email 驗證)
     new_teacher = Teacher(
         email=register_req.email,
-        password_hash=get_password_hash(register_req.password),
+        password_hash=await get_password_hash_async(register_req.password),
         name=register_req.name,
         phone=register_req.phone,
         is_active=False,  # 🔴 未啟用，需要 email 驗證
@@ -341,6 +347,8 @@ async def student_login(
     request: Request, login_req: StudentLoginRequest, db: Session = Depends(get_db)
 ):
     """學生登入"""
+    await enforce_login_rate_limit(request, f"student:{login_req.id}")
+
     student = db.query(Student).filter(Student.id == login_req.id).first()
 
     # 🔐 Security: 統一錯誤訊息，不洩漏帳號是否存在
@@ -350,7 +358,7 @@ async def student_login(
         )
 
     # 驗證密碼
-    if not verify_password(login_req.password, student.password_hash):
+    if not await verify_password_async(login_req.password, student.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
@@ -553,7 +561,7 @@ async def reset_password(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_msg)
 
     # 更新密碼
-    teacher.password_hash = get_password_hash(new_password)
+    teacher.password_hash = await get_password_hash_async(new_password)
 
     # 清除 token
     teacher.password_reset_token = None
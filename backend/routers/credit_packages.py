@@ -202,7 +202,7 @@ async def purchase_credit_package(
     try:
         # Call TapPay
         tappay_service = TapPayService()
-        gateway_response = tappay_service.process_payment(
+        gateway_response = await tappay_service.process_payment_async(
             prime=purchase_request.prime,
             amount=amount,
             details={
@@ -448,7 +448,7 @@ async def org_purchase_credit_package(
     try:
         # Call TapPay
         tappay_service = TapPayService()
-        gateway_response = tappay_service.process_payment(
+        gateway_response = await tappay_service.process_payment_async(
             prime=purchase_request.prime,
             amount=amount,
             details={
@@ -616,7 +616,7 @@ async def org_renew_credit_package(
     try:
         # Call TapPay
         tappay_service = TapPayService()
-        gateway_response = tappay_service.process_payment(
+        gateway_response = await tappay_service.process_payment_async(
             prime=renew_request.prime,
             amount=amount,
             details={
@@ -8,8 +8,10 @@ from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy import create_engine
 from datetime import datetime, timedelta, timezone
+import asyncio
 import logging
 import os
+from typing import Callable, Optional
 
 from database import get_db
 from models import (
@@ -22,8 +24,18 @@ from models import (
     ClassroomStudent,
     StudentItemProgress,
 )
+from services.assignment_mastery import reconcile_assignment_mastery
 from services.email_service import email_service
+from services.subscription_renewal import RenewalEngine
 from services.tappay_service import TapPayService
+from services.job_queue import (
+    JobContext,
+    enqueue_job,
+    get_job,
+    job_to_dict,
+    register_job,
+)
+from routers.jobs import job_accepted_response, prefers_async
 from google.cloud import bigquery
 
 router = APIRouter(prefix="/api/cron", tags=["cron"])
@@ -35,7 +47,10 @@ CRON_SECRET = os.getenv("CRON_SECRET", "dev-secret-change-me")
 
 @router.post("/monthly-renewal")
 async def monthly_renewal_cron(
-    x_cron_secret: str = Header(None), db: Session = Depends(get_db)
+    x_cron_secret: str = Header(None),
+    prefer: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
 ):
     """
     每月 1 號執行的自動續訂任務
@@ -47,6 +62,10 @@ async def monthly_renewal_cron(
     2. 自動延長訂閱到下個月 1 號
     3. 發送續訂通知 Email
 
+    背景模式：
+    - 帶有 Prefer: respond-async 時建立背景工作並回傳 202 + job id
+    - 同一天（台北時間）重複觸發回傳同一個 job（可用 Idempotency-Key 覆寫）
+
     安全性：
     - 只允許帶有正確 X-Cron-Secret header 的請求
     - Cloud Scheduler 設定中需配置此 header
@@ -56,327 +75,43 @@ async def monthly_renewal_cron(
         logger.warning(f"Unauthorized cron request. Secret: {x_cron_secret[:10]}...")
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # 使用台北時區（因為 Cloud Scheduler 設定為 Asia/Taipei）
-    from zoneinfo import ZoneInfo
-
-    taipei_tz = ZoneInfo("Asia/Taipei")
-    now_taipei = datetime.now(taipei_tz)
-    today_taipei = now_taipei.date()
-
-    # 同時記錄 UTC 時間
-    now_utc = datetime.now(timezone.utc)
-
-    logger.info("🔄 Monthly renewal cron started")
-    logger.info(f"   Taipei time: {now_taipei}")
-    logger.info(f"   UTC time: {now_utc}")
+    if prefers_async(prefer):
+        from zoneinfo import ZoneInfo
 
-    # 檢查是否為每月 1 號（台北時間）
-    if today_taipei.day != 1:
-        logger.info(
-            f"Not the 1st of the month (Taipei: {today_taipei}), skipping renewal"
+        today_taipei = datetime.now(ZoneInfo("Asia/Taipei")).date()
+        job = enqueue_job(
+            db,
+            "monthly_renewal",
+            idempotency_key=idempotency_key
+            or f"monthly-renewal:{today_taipei.isoformat()}",
+            created_by="cron",
         )
-        return {
-            "status": "skipped",
-            "message": f"Not the 1st of the month. Today is {today_taipei}",
-            "date": today_taipei.isoformat(),
-        }
+        return job_accepted_response(job, f"/api/cron/jobs/{job.id}")
 
-    # ========================================
-    # Phase 1: 標記所有過期訂閱為 expired
-    # ========================================
-    logger.info("📋 Phase 1: Marking expired subscriptions")
+    return await run_monthly_renewal(sessionmaker(bind=db.get_bind()))
 
-    expired_periods = (
-        db.query(SubscriptionPeriod)
-        .filter(
-            SubscriptionPeriod.status == "active",
-            SubscriptionPeriod.end_date < today_taipei,
-        )
-        .all()
-    )
 
-    marked_expired = 0
-    for period in expired_periods:
-        period.status = "expired"
-        marked_expired += 1
-
-    if marked_expired > 0:
-        db.commit()
-        logger.info(f"✅ Marked {marked_expired} subscriptions as expired")
-    else:
-        logger.info("✅ No expired subscriptions to mark")
-
-    # ========================================
-    # Phase 2: 處理自動續訂
-    # ========================================
-    logger.info("💳 Phase 2: Processing auto-renewals")
-
-    # 找出所有 auto_renew 啟用的教師
-    teachers_with_auto_renew = (
-        db.query(Teacher)
-        .filter(
-            Teacher.subscription_auto_renew.is_(True),
-            Teacher.is_active.is_(True),
-        )
-        .all()
-    )
+@register_job("monthly_renewal", concurrency_class="billing")
+async def monthly_renewal_job(ctx: JobContext) -> dict:
+    return await run_monthly_renewal(ctx.session, ctx.set_progress)
 
-    logger.info(
-        f"Found {len(teachers_with_auto_renew)} teachers with auto_renew enabled"
-    )
 
-    results = {
-        "status": "completed",
-        "date": today_taipei.isoformat(),
-        "marked_expired": marked_expired,
-        "auto_renewed": 0,
-        "renewal_failed": 0,
-        "auto_renew_disabled": 0,
-        "skipped": 0,
-        "errors": [],
-    }
-
-    # 初始化 TapPay 服務
-    tappay_service = TapPayService()
-
-    # 計算上個月的日期範圍
-    from dateutil.relativedelta import relativedelta
-
-    last_month_start = today_taipei.replace(day=1) - relativedelta(months=1)
-    last_month_end = today_taipei.replace(day=1) - relativedelta(days=1)
-
-    # 當月日期範圍
-    from calendar import monthrange
-
-    current_month_start = today_taipei.replace(day=1)
-    current_month_end = today_taipei.replace(
-        day=monthrange(today_taipei.year, today_taipei.month)[1]
-    )
-
-    for teacher in teachers_with_auto_renew:
-        try:
-            # 💳 檢查是否有儲存的信用卡 Token
-            if not teacher.card_key or not teacher.card_token:
-                logger.info(
-                    f"Teacher {teacher.email} has auto_renew but no card, skipping"
-                )
-                results["skipped"] += 1
-                continue
-
-            # ========================================
-            # 檢查 1: 防重複扣款
-            # ========================================
-            # 查詢是否已有本月訂閱
-            existing_current_month = (
-                db.query(SubscriptionPeriod)
-                .filter(
-                    SubscriptionPeriod.teacher_id == teacher.id,
-                    SubscriptionPeriod.start_date >= current_month_start,
-                    SubscriptionPeriod.status == "active",
-                )
-                .first()
-            )
-
-            if existing_current_month:
-                logger.info(
-                    f"Teacher {teacher.email} already has current month subscription, skipping"
-                )
-                results["skipped"] += 1
-                continue
-
-            # ========================================
-            # 檢查 2: 防錯誤扣款 + 關閉 auto_renew
-            # ========================================
-            # 查詢是否有上個月訂閱
-            last_month_subscription = (
-                db.query(SubscriptionPeriod)
-                .filter(
-                    SubscriptionPeriod.teacher_id == teacher.id,
-                    SubscriptionPeriod.start_date == last_month_start,
-                    SubscriptionPeriod.end_date == last_month_end,
-                )
-                .first()
-            )
-
-            if not last_month_subscription:
-                # 沒有上個月訂閱 → 關閉 auto_renew
-                logger.warning(
-                    f"Teacher {teacher.email} has no last month subscription, "
-                    f"disabling auto_renew"
-                )
-                teacher.subscription_auto_renew = False
-                db.commit()
-                results["auto_renew_disabled"] += 1
-
-                # TODO: 發送通知信
-                # email_service.send_auto_renew_disabled_notification(teacher)
-
-                continue
-
-            # ========================================
-            # 取得上個月訂閱資訊用於續訂
-            # ========================================
-            from config.plans import PLAN_PRICES, PLAN_QUOTAS
-
-            plan_name = last_month_subscription.plan_name
-            amount = PLAN_PRICES.get(plan_name, 299)
-            quota_total = PLAN_QUOTAS.get(plan_name, 2000)
-
-            # 生成訂單編號
-            order_number = f"RENEWAL_{teacher.id}_{today_taipei.strftime('%Y%m%d')}"
-
-            # 💳 使用 TapPay Card Token 進行扣款
-            logger.info(
-                f"💳 Auto-charging {teacher.email}: TWD {amount} "
-                f"(Card: ****{teacher.card_last_four})"
-            )
-
-            gateway_response = tappay_service.pay_by_token(
-                card_key=teacher.card_key,
-                card_token=teacher.card_token,
-                amount=amount,
-                details=f"{plan_name} Monthly Renewal",  # 🔄 使用 Period.plan_name
-                cardholder={
-                    "name": teacher.name,
-                    "email": teacher.email,
-                    "phone": "+886912345678",  # TODO: 未來可加入電話欄位
-                },
-                order_number=order_number,
-            )
-
-            # 檢查扣款是否成功
-            if gateway_response.get("status") != 0:
-                # 扣款失敗
-                error_msg = TapPayService.parse_error_code(
-                    gateway_response.get("status"), gateway_response.get("msg")
-                )
-                logger.error(f"❌ Auto-charge failed for {teacher.email}: {error_msg}")
-
-                # 記錄失敗交易
-                failed_transaction = TeacherSubscriptionTransaction(
-                    teacher_id=teacher.id,
-                    teacher_email=teacher.email,
-                    transaction_type=TransactionType.RECHARGE,
-                    subscription_type=plan_name,
-                    amount=amount,
-                    currency="TWD",
-                    status="FAILED",
-                    months=1,
-                    period_start=current_month_start,
-                    period_end=current_month_end,
-                    previous_end_date=last_month_end,
-                    new_end_date=last_month_end,  # 失敗不延長
-                    processed_at=now_utc,
-                    payment_provider="tappay",
-                    payment_method="card_token",
-                    external_transaction_id=gateway_response.get("rec_trade_id"),
-                    failure_reason=error_msg,
-                    error_code=str(gateway_response.get("status")),
-                    gateway_response=gateway_response,
-                )
-                db.add(failed_transaction)
-                db.commit()
-
-                results["renewal_failed"] += 1
-                results["errors"].append(
-                    {
-                        "teacher": teacher.email,
-                        "error": error_msg,
-                        "status_code": gateway_response.get("status"),
-                    }
-                )
-
-                # 發送扣款失敗通知（TODO: 未來實作）
-                # email_service.send_renewal_failed(...)
-
-                continue
-
-            # ✅ 扣款成功 - 創建新的訂閱週期
-            rec_id = gateway_response.get("rec_trade_id")
-
-            # ✅ 創建新的訂閱週期記錄
-            new_period = SubscriptionPeriod(
-                teacher_id=teacher.id,
-                plan_name=plan_name,
-                amount_paid=amount,
-                quota_total=quota_total,
-                quota_used=0,
-                start_date=current_month_start,
-                end_date=current_month_end,
-                payment_method="auto_renew",  # 自動續訂
-                payment_id=rec_id,
-                payment_status="paid",
-                status="active",
-            )
-            db.add(new_period)
-
-            # ⚠️ 重要：更新 card_token（TapPay 每次交易會刷新 token）
-            if gateway_response.get("card_secret"):
-                new_card_token = gateway_response["card_secret"].get("card_token")
-                if new_card_token:
-                    teacher.card_token = new_card_token
-                    logger.info(f"Card token refreshed for {teacher.email}")
-
-            # 建立成功交易記錄
-            transaction = TeacherSubscriptionTransaction(
-                teacher_id=teacher.id,
-                teacher_email=teacher.email,
-                transaction_type=TransactionType.RECHARGE,
-                subscription_type=plan_name,
-                amount=amount,
-                currency="TWD",
-                status="SUCCESS",
-                months=1,
-                period_start=current_month_start,
-                period_end=current_month_end,
-                previous_end_date=last_month_end,
-                new_end_date=current_month_end,
-                processed_at=now_utc,
-                payment_provider="tappay",
-                payment_method="card_token",
-                external_transaction_id=gateway_response.get("rec_trade_id"),
-                gateway_response=gateway_response,
-            )
-            db.add(transaction)
-
-            # 提交變更
-            db.commit()
-
-            logger.info(
-                f"✅ Auto-renewal success: {teacher.email} - "
-                f"{plan_name} {current_month_start} to {current_month_end} "
-                f"(TWD {amount} charged)"
-            )
-
-            # 發送續訂成功通知
-            try:
-                email_service.send_renewal_success(
-                    teacher_email=teacher.email,
-                    teacher_name=teacher.name,
-                    new_end_date=current_month_end,
-                    plan_name=plan_name,
-                )
-            except Exception as e:
-                logger.error(f"Failed to send renewal email to {teacher.email}: {e}")
-
-            results["auto_renewed"] += 1
-
-        except Exception as e:
-            db.rollback()
-            logger.error(f"❌ Failed to renew {teacher.email}: {e}")
-            results["renewal_failed"] += 1
-            results["errors"].append({"teacher": teacher.email, "error": str(e)})
+async def run_monthly_renewal(
+    session_factory: Callable[[], Session],
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> dict:
+    """
+    執行每月續訂（HTTP handler 與背景工作共用）
 
-    logger.info(
-        f"🔄 Monthly renewal completed: "
-        f"Marked expired: {results['marked_expired']}, "
-        f"Auto-renewed: {results['auto_renewed']}, "
-        f"Failed: {results['renewal_failed']}, "
-        f"Auto-renew disabled: {results['auto_renew_disabled']}, "
-        f"Skipped: {results['skipped']}"
-    )
+    由 RenewalEngine 分批、限制並發處理；每位教師的扣款結果寫入 renewal_attempts，
+    重複執行或中斷後重新執行都不會重複扣款。
 
-    return results
+    Args:
+        session_factory: 建立 DB session 的函式
+        on_progress: 進度回呼（0-100）
+    """
+    engine = RenewalEngine(session_factory, TapPayService())
+    return await engine.run(on_progress)
 
 
 @router.post("/renewal-reminder")
@@ -593,7 +328,10 @@ async def test_cron_notification(
 
 @router.post("/recording-error-report")
 async def recording_error_report_cron(
-    x_cron_secret: str = Header(None), db: Session = Depends(get_db)
+    x_cron_secret: str = Header(None),
+    prefer: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
 ):
     """
     每小時檢查 BigQuery 錄音錯誤統計
@@ -605,6 +343,10 @@ async def recording_error_report_cron(
     2. 使用 OpenAI 生成錯誤摘要
     3. 發送統計報告到官網信箱 (myduotopia@gmail.com)
 
+    背景模式：
+    - 帶有 Prefer: respond-async 時建立背景工作並回傳 202 + job id
+    - 同一小時重複觸發回傳同一個 job（可用 Idempotency-Key 覆寫）
+
     安全性：只允許帶有正確 X-Cron-Secret header 的請求
     """
     # 驗證 Cron Secret
@@ -614,6 +356,26 @@ async def recording_error_report_cron(
         )
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+    if prefers_async(prefer):
+        hour = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H")
+        job = enqueue_job(
+            db,
+            "recording_error_report",
+            idempotency_key=idempotency_key or f"recording-error-report:{hour}",
+            created_by="cron",
+        )
+        return job_accepted_response(job, f"/api/cron/jobs/{job.id}")
+
+    return run_recording_error_report(db)
+
+
+@register_job("recording_error_report", concurrency_class="report")
+async def recording_error_report_job(ctx: JobContext) -> dict:
+    return await ctx.run_sync(run_recording_error_report)
+
+
+def run_recording_error_report(db: Session) -> dict:
+    """產生並寄送錄音錯誤報告（同步；HTTP handler 與背景工作共用）"""
     try:
         # 初始化 BigQuery client
         client = bigquery.Client(project=os.getenv("GCP_PROJECT_ID"))
@@ -1213,6 +975,64 @@ async def expire_credit_packages_cron(
         raise HTTPException(status_code=500, detail=f"Cron job failed: {str(e)}")
 
 
+@router.post("/reconcile-mastery")
+async def reconcile_mastery_cron(
+    x_cron_secret: str = Header(None),
+    prefer: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    修正單字選擇作業熟練度彙總（assignment_mastery）的漂移
+
+    執行時間：每日凌晨 4:00（由 Cloud Scheduler 觸發）
+
+    功能：
+    1. 重算被 trigger 標記為 stale 的彙總列
+    2. 重新核對超過一天未更新的彙總列，與全量計算不一致時覆寫
+
+    背景模式：
+    - 帶有 Prefer: respond-async 時建立背景工作並回傳 202 + job id
+    - 同一天重複觸發回傳同一個 job（可用 Idempotency-Key 覆寫）
+    """
+    if x_cron_secret != CRON_SECRET:
+        logger.warning(f"Unauthorized cron request. Secret: {x_cron_secret[:10]}...")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if prefers_async(prefer):
+        today = datetime.now(timezone.utc).date().isoformat()
+        job = enqueue_job(
+            db,
+            "mastery_reconcile",
+            idempotency_key=idempotency_key or f"mastery-reconcile:{today}",
+            created_by="cron",
+        )
+        return job_accepted_response(job, f"/api/cron/jobs/{job.id}")
+
+    return reconcile_assignment_mastery(db)
+
+
+@register_job("mastery_reconcile", concurrency_class="report")
+async def mastery_reconcile_job(ctx: JobContext) -> dict:
+    return await ctx.run_sync(
+        lambda db: reconcile_assignment_mastery(db, on_progress=ctx.set_progress)
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_cron_job_status(
+    job_id: str, x_cron_secret: str = Header(None), db: Session = Depends(get_db)
+):
+    """查詢 cron 背景工作狀態（status / progress / result / error）"""
+    if x_cron_secret != CRON_SECRET:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    job = get_job(db, job_id)
+    if not job or job.created_by != "cron":
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+
 @router.get("/health")
 async def cron_health_check():
     """
@@ -13,7 +13,7 @@ Includes:
 import logging
 import os
 import random
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 from fastapi import (
     APIRouter,
@@ -36,6 +36,15 @@ from core.demo_quota import (
     DEMO_TOKEN_DAILY_LIMIT,
 )
 from database import get_db
+from services.rearrangement_service import (
+    default_max_errors,
+    issue_answer_key,
+    read_answer_key,
+    score_selections,
+    split_sentence,
+    to_response,
+)
+from services.word_selection_practice import get_word_practice_engine
 from models import (
     DemoConfig,
     Teacher,
@@ -65,6 +74,13 @@ class RearrangementAnswerRequest(BaseModel):
     user_answer: str
 
 
+class RearrangementBatchAnswerRequest(BaseModel):
+    answer_token: str
+    selections: List[str]
+    start_position: int = 0
+    error_count: int = 0
+
+
 class RearrangementCompleteRequest(BaseModel):
     total_score: int = 0
     total_questions: int = 0
@@ -607,23 +623,16 @@ async def demo_word_selection_start(
             status_code=400, detail="This assignment is not in word_selection mode"
         )
 
-    # Get all content items
-    content_items = (
-        db.query(ContentItem)
-        .join(Content)
-        .join(AssignmentContent)
-        .filter(AssignmentContent.assignment_id == assignment.id)
-        .order_by(ContentItem.order_index)
-        .all()
-    )
+    # Word pool is cached per assignment and shared with the student API
+    pool = get_word_practice_engine().get_pool(db, assignment.id)
 
-    if not content_items:
+    if not pool.words:
         raise HTTPException(
             status_code=404, detail="No vocabulary items found for this assignment"
         )
 
     # Record total words before limiting
-    total_words_in_assignment = len(content_items)
+    total_words_in_assignment = pool.total_words
 
     # (#379) Exclude already-practiced words to avoid repetition per round
     # Per-token parsing: a single invalid value won't drop all exclusions
@@ -637,84 +646,18 @@ async def demo_word_selection_start(
                 except ValueError:
                     pass  # Skip individual invalid token
 
-    remaining_items = [item for item in content_items if item.id not in exclude_id_set]
-
-    # If remaining < 10, reset cycle (start over from all words)
-    if len(remaining_items) < 10:
-        remaining_items = list(content_items)
-
-    # Shuffle if needed
-    if assignment.shuffle_questions:
-        random.shuffle(remaining_items)
-
-    # Limit to 10 words (consistent with student API)
-    content_items = remaining_items[:10]
+    # 10 words per round (consistent with student API); restarts the cycle
+    # when fewer than 10 unpracticed words remain
+    round_words = pool.preview_round(
+        exclude_id_set, 10, shuffle=bool(assignment.shuffle_questions)
+    )
 
     # NOTE: AI distractor generation is temporarily disabled (#303).
-    # All distractors now come from other words in the assignment.
-    #
-    # --- AI distractor generation (disabled) ---
-    # items_needing_generation = [item for item in content_items if not item.distractors]
-    # if items_needing_generation:
-    #     words_for_distractors = [
-    #         {"word": item.text, "translation": item.translation or ""}
-    #         for item in items_needing_generation
-    #     ]
-    #     try:
-    #         generated = await translation_service.batch_generate_distractors(
-    #             words_for_distractors, count=2
-    #         )
-    #         for i, item in enumerate(items_needing_generation):
-    #             if i < len(generated):
-    #                 item._generated_distractors = generated[i]
-    #     except Exception as e:
-    #         logger.error(f"Failed to generate distractors for demo preview: {e}")
-    #         for item in items_needing_generation:
-    #             item._generated_distractors = ["選項A", "選項B", "選項C"]
-    # --- end AI distractor generation ---
-
-    # Build response data
-    words_with_options = []
-
-    # Collect all unique translations for picking distractors from the word set
-    all_translations = {
-        item.translation.lower().strip(): item.translation
-        for item in content_items
-        if item.translation
-    }
-
-    for item in content_items:
-        correct_answer = item.translation or ""
-
-        # Pick 3 random distractors from other words' translations (#303)
-        other_translations = [
-            t
-            for key, t in all_translations.items()
-            if key != correct_answer.lower().strip()
-        ]
-        random.shuffle(other_translations)
-        final_distractors = other_translations[:3]
-
-        # Fallback for small word sets
-        num_needed = 3 - len(final_distractors)
-        for i in range(num_needed):
-            final_distractors.append(f"選項{chr(65 + i)}")
-
-        # Build options array and shuffle
-        options = [correct_answer] + final_distractors
-        random.shuffle(options)
-
-        words_with_options.append(
-            {
-                "content_item_id": item.id,
-                "text": item.text,
-                "translation": correct_answer,
-                "audio_url": item.audio_url,
-                "image_url": item.image_url,
-                "memory_strength": 0,
-                "options": options,
-            }
-        )
+    # Pick 3 random distractors from other words' translations (#303)
+    words_with_options = [
+        {**word, "options": pool.build_options(word, use_stored_distractors=False)}
+        for word in round_words
+    ]
 
     return {
         "session_id": None,  # Preview mode doesn't create session
@@ -826,10 +769,11 @@ async def demo_rearrangement_questions(
         random.shuffle(content_items)
 
     # Build questions list
+    answer_scope = f"demo:{assignment.id}"
     questions = []
     for item in content_items:
         # Split sentence into words and shuffle
-        words = item.text.strip().split()
+        words = split_sentence(item.text)
         shuffled_words = words.copy()
         random.shuffle(shuffled_words)
 
@@ -837,7 +781,7 @@ async def demo_rearrangement_questions(
             "content_item_id": item.id,
             "shuffled_words": shuffled_words,
             "word_count": item.word_count or len(words),
-            "max_errors": item.max_errors or (3 if len(words) <= 10 else 5),
+            "max_errors": default_max_errors(len(words), item.max_errors),
             "time_limit": (
                 assignment.time_limit_per_question
                 if assignment.time_limit_per_question is not None
@@ -847,6 +791,13 @@ async def demo_rearrangement_questions(
             "audio_url": item.audio_url,
             "translation": item.translation,
             "original_text": item.text.strip(),
+            "answer_token": issue_answer_key(
+                answer_scope,
+                item.id,
+                item.text,
+                item.max_errors,
+                len(content_items),
+            ),
         }
         questions.append(question)
 
@@ -913,6 +864,41 @@ async def demo_rearrangement_answer(
     }
 
 
+@router.post("/assignments/{assignment_id}/preview/rearrangement-answers")
+@limiter.limit("60/minute")
+async def demo_rearrangement_answers(
+    request: Request,
+    assignment_id: int,
+    data: RearrangementBatchAnswerRequest,
+):
+    """
+    Demo mode: Submit a whole sentence (or micro-batch) of selections.
+
+    Rate limit: 60 requests per minute per IP.
+
+    The answer_token is only issued for demo assignments, so verifying it
+    replaces the demo-account lookup. Nothing is saved.
+
+    Returns:
+        Same format as the student batch answer API.
+    """
+    try:
+        key = read_answer_key(data.answer_token, f"demo:{assignment_id}")
+        result = score_selections(
+            key.words,
+            key.max_errors,
+            data.selections,
+            correct_word_count=data.start_position,
+            error_count=data.error_count,
+            total_items=key.total_items,
+        )
+    except ValueError as e:
+        # InvalidAnswerKey is a ValueError too
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {**to_response(key, result), "preview_mode": True, "demo_mode": True}
+
+
 @router.post("/assignments/{assignment_id}/preview/rearrangement-retry")
 @limiter.limit("60/minute")
 async def demo_rearrangement_retry(
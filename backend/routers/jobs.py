@@ -0,0 +1,59 @@
+"""
+Background Job API
+
+- GET /api/jobs/{job_id}: 查詢背景工作狀態與進度（只能查詢自己建立的工作）
+
+長時間的端點在請求帶有 `Prefer: respond-async` header 時改為建立背景工作，
+回傳 202 + job id（Location header 指向狀態查詢端點）。
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import BackgroundJob, Teacher
+from routers.auth import get_current_user
+from services.job_queue import get_job, job_to_dict
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+def prefers_async(prefer: Optional[str]) -> bool:
+    """請求是否帶有 Prefer: respond-async（RFC 7240）"""
+    if not prefer:
+        return False
+    return any(token.strip().lower() == "respond-async" for token in prefer.split(","))
+
+
+def job_owner(user) -> str:
+    """BackgroundJob.created_by 的值"""
+    kind = "teacher" if isinstance(user, Teacher) else "student"
+    return f"{kind}:{user.id}"
+
+
+def job_accepted_response(
+    job: BackgroundJob, status_path: Optional[str] = None
+) -> JSONResponse:
+    """202 Accepted + job 狀態"""
+    status_path = status_path or f"/api/jobs/{job.id}"
+    body = job_to_dict(job)
+    body["status_url"] = status_path
+    return JSONResponse(
+        status_code=202, content=body, headers={"Location": status_path}
+    )
+
+
+@router.get("/{job_id}")
+async def get_job_status(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """查詢背景工作狀態（status / progress / result / error）"""
+    job = get_job(db, job_id)
+    if not job or job.created_by != job_owner(current_user):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
@@ -16,7 +16,7 @@ import uuid
 
 from database import get_db
 from models import Teacher, Organization, TeacherOrganization, TeacherSchool, School
-from auth import verify_token, get_password_hash
+from auth import verify_token, get_password_hash_async
 from services.casbin_service import get_casbin_service
 from services.email_service import email_service
 import secrets
@@ -850,7 +850,7 @@ async def invite_teacher_to_organization(
 
         new_teacher = Teacher(
             email=request.email,
-            password_hash=get_password_hash(random_password),
+            password_hash=await get_password_hash_async(random_password),
             name=request.name,
             is_active=True,  # Active immediately for org invites
             is_demo=False,
@@ -197,7 +197,7 @@ async def process_payment(
         logger.info(f"Processing payment for order: {order_number}")
         tappay_service = TapPayService()
 
-        gateway_response = tappay_service.process_payment(
+        gateway_response = await tappay_service.process_payment_async(
             prime=payment_request.prime,
             amount=payment_request.amount,
             details=payment_request.details or {"item_name": payment_request.plan_name},
@@ -1192,7 +1192,7 @@ async def update_saved_card(
         # 🔐 進行 1 元授權測試（暫不請款）
         logger.info(f"Testing new card for {current_teacher.email}")
 
-        gateway_response = tappay_service.process_payment(
+        gateway_response = await tappay_service.process_payment_async(
             prime=request.prime,
             amount=1,  # 1 元授權測試
             details={"item_name": "Card Verification"},
@@ -1244,7 +1244,9 @@ async def update_saved_card(
             if rec_trade_id:
                 try:
                     # 使用 refund API 取消授權
-                    refund_response = tappay_service.refund(rec_trade_id, amount=1)
+                    refund_response = await tappay_service.refund_async(
+                        rec_trade_id, amount=1
+                    )
                     if refund_response.get("status") == 0:
                         logger.info(f"1 元授權已取消: {rec_trade_id}")
                     else:
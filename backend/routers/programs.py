@@ -7,7 +7,8 @@ from typing import List, Literal, Optional  # noqa: F401
 from copy import deepcopy
 import uuid
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.exc import SQLAlchemyError
@@ -43,6 +44,8 @@ from utils.permissions import (
     has_manage_materials_permission,
     has_school_materials_permission,
 )
+from services.job_queue import JobContext, enqueue_job, register_job
+from routers.jobs import job_accepted_response, job_owner, prefers_async
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/teacher/login")
 
@@ -388,9 +391,26 @@ def _deep_copy_content_with_items(
 @router.post("/copy-from-template", response_model=ProgramResponse)
 async def copy_from_template(
     data: ProgramCopyFromTemplate,
+    prefer: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_teacher: Teacher = Depends(get_current_teacher),
 ):
+    """從公版模板複製課程到班級（Prefer: respond-async 時改為背景工作）"""
+    if prefers_async(prefer):
+        return _enqueue_copy_job(
+            db,
+            "copy_from_template",
+            {"data": data.model_dump(mode="json")},
+            current_teacher,
+            idempotency_key,
+        )
+    return _copy_from_template(data, current_teacher, db)
+
+
+def _copy_from_template(
+    data: ProgramCopyFromTemplate, current_teacher: Teacher, db: Session
+) -> Program:
     """從公版模板複製課程到班級"""
     # 驗證模板存在 (with eager loading to prevent N+1 queries)
     template = (
@@ -484,9 +504,26 @@ async def copy_from_template(
 @router.post("/copy-from-classroom", response_model=ProgramResponse)
 async def copy_from_classroom(
     data: ProgramCopyFromClassroom,
+    prefer: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_teacher: Teacher = Depends(get_current_teacher),
 ):
+    """從其他班級複製課程（Prefer: respond-async 時改為背景工作）"""
+    if prefers_async(prefer):
+        return _enqueue_copy_job(
+            db,
+            "copy_from_classroom",
+            {"data": data.model_dump(mode="json")},
+            current_teacher,
+            idempotency_key,
+        )
+    return _copy_from_classroom(data, current_teacher, db)
+
+
+def _copy_from_classroom(
+    data: ProgramCopyFromClassroom, current_teacher: Teacher, db: Session
+) -> Program:
     """從其他班級複製課程"""
     # 驗證來源課程存在且屬於當前教師 (with eager loading to prevent N+1 queries)
     source_program = (
@@ -624,6 +661,60 @@ async def create_custom_program(
     return new_program
 
 
+# ============ 背景複製工作 ============
+
+
+def _enqueue_copy_job(
+    db: Session,
+    job_type: str,
+    payload: dict,
+    current_teacher: Teacher,
+    idempotency_key: Optional[str],
+):
+    job = enqueue_job(
+        db,
+        job_type,
+        payload={"teacher_id": current_teacher.id, **payload},
+        idempotency_key=idempotency_key,
+        created_by=job_owner(current_teacher),
+    )
+    return job_accepted_response(job)
+
+
+def _run_copy_job(db: Session, job_payload: dict, copy_func, request_model) -> dict:
+    """在背景工作中執行課程複製，result 為 ProgramResponse 的 JSON"""
+    teacher = db.query(Teacher).filter(Teacher.id == job_payload["teacher_id"]).first()
+    if not teacher:
+        raise HTTPException(status_code=404, detail="Teacher not found")
+
+    args = [job_payload["program_id"]] if "program_id" in job_payload else []
+    program = copy_func(*args, request_model(**job_payload["data"]), teacher, db)
+    return jsonable_encoder(
+        ProgramResponse.model_validate(program, from_attributes=True)
+    )
+
+
+@register_job("copy_from_template", concurrency_class="copy", max_attempts=2)
+async def copy_from_template_job(ctx: JobContext) -> dict:
+    return await ctx.run_sync(
+        _run_copy_job, ctx.payload, _copy_from_template, ProgramCopyFromTemplate
+    )
+
+
+@register_job("copy_from_classroom", concurrency_class="copy", max_attempts=2)
+async def copy_from_classroom_job(ctx: JobContext) -> dict:
+    return await ctx.run_sync(
+        _run_copy_job, ctx.payload, _copy_from_classroom, ProgramCopyFromClassroom
+    )
+
+
+@register_job("copy_program", concurrency_class="copy", max_attempts=2)
+async def copy_program_job(ctx: JobContext) -> dict:
+    return await ctx.run_sync(
+        _run_copy_job, ctx.payload, _copy_program, ProgramCopyRequest
+    )
+
+
 # ============ 輔助功能 ============
 
 
@@ -965,10 +1056,30 @@ def _has_school_manage_permission(
 async def copy_program(
     program_id: int,
     payload: ProgramCopyRequest,
+    prefer: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_teacher: Teacher = Depends(get_current_teacher),
 ):
-    """Unified program copy API (supports classroom target for now)."""
+    """Unified program copy API (supports classroom target for now).
+
+    With `Prefer: respond-async` the copy runs as a background job (202 + job id).
+    """
+    if prefers_async(prefer):
+        return _enqueue_copy_job(
+            db,
+            "copy_program",
+            {"program_id": program_id, "data": payload.model_dump(mode="json")},
+            current_teacher,
+            idempotency_key,
+        )
+    return _copy_program(program_id, payload, current_teacher, db)
+
+
+def _copy_program(
+    program_id: int, payload: ProgramCopyRequest, current_teacher: Teacher, db: Session
+) -> ProgramResponse:
+    """Copy a program tree to a classroom, teacher templates or a school."""
     if payload.target_scope not in ["classroom", "teacher", "school"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
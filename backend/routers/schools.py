@@ -26,6 +26,7 @@ from models import (
 )
 from auth import verify_token
 from services.casbin_service import get_casbin_service
+from services.student_directory import count_students_by_school
 
 
 router = APIRouter(prefix="/api/schools", tags=["schools"])
@@ -357,23 +358,7 @@ async def list_schools(
     )
 
     # Batch query for student counts (via classrooms)
-    student_counts_raw = (
-        db.query(
-            ClassroomSchool.school_id,
-            func.count(func.distinct(ClassroomStudent.student_id)),
-        )
-        .join(
-            ClassroomStudent,
-            ClassroomSchool.classroom_id == ClassroomStudent.classroom_id,
-        )
-        .filter(
-            ClassroomSchool.school_id.in_(school_ids),
-            ClassroomSchool.is_active.is_(True),
-        )
-        .group_by(ClassroomSchool.school_id)
-        .all()
-    )
-    student_counts = dict(student_counts_raw)
+    student_counts = count_students_by_school(db, school_ids)
 
     # Build response with admin info and counts
     result = []
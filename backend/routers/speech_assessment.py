@@ -7,9 +7,10 @@ import os
 import logging
 import asyncio
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 from datetime import datetime
 from io import BytesIO
+import struct
 import tempfile
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
@@ -20,6 +21,11 @@ from database import get_db
 from auth import get_current_user
 from performance_monitoring import trace_function, start_span, PerformanceSnapshot
 from core.thread_pool import get_speech_thread_pool, get_audio_thread_pool
+from core.azure_admission import (
+    AdaptiveAdmissionController,
+    AdmissionRejectedError,
+    get_azure_speech_admission_controller,
+)
 from models import (
     Student,
     StudentContentProgress,
@@ -63,35 +69,6 @@ def get_organization_id_from_classroom(classroom) -> Optional[str]:
     return None
 
 
-# 全局 Semaphore - 限制並發 Azure Speech API 呼叫
-# Azure S0 標準層限制：20 TPS（每秒事務數）
-# 保守設定：18 並發（保留 2 個緩衝，避免觸發 429 錯誤）
-# 使用字典儲存每個 event loop 的 semaphore，避免跨 loop 問題
-_azure_speech_semaphores = {}
-
-
-def _get_azure_speech_semaphore():
-    """
-    獲取當前 event loop 的 Azure Speech API Semaphore
-    每個 event loop 維護獨立的 semaphore 實例
-    """
-    try:
-        loop = asyncio.get_event_loop()
-        loop_id = id(loop)
-
-        if loop_id not in _azure_speech_semaphores:
-            _azure_speech_semaphores[loop_id] = asyncio.Semaphore(18)
-
-        return _azure_speech_semaphores[loop_id]
-    except RuntimeError:
-        # No event loop running, create one
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop_id = id(loop)
-        _azure_speech_semaphores[loop_id] = asyncio.Semaphore(18)
-        return _azure_speech_semaphores[loop_id]
-
-
 # 自定義異常 - Azure API 429 錯誤
 class AzureRateLimitError(Exception):
     """Azure API 429 Too Many Requests 錯誤"""
@@ -99,6 +76,20 @@ class AzureRateLimitError(Exception):
     pass
 
 
+# Azure Speech API 並發控制
+# 原本固定 Semaphore(18)（Azure S0 標準層 20 TPS，保留 2 個緩衝）
+# 改為依 Azure 延遲與 429 動態調整的 AIMD 控制器，上限預設仍為 18
+# 每個 event loop 維護獨立的控制器實例
+def _get_azure_speech_semaphore() -> AdaptiveAdmissionController:
+    """
+    獲取當前 event loop 的 Azure Speech API 並發控制器
+    （保留舊名稱，用法與原本的 semaphore 相同：async with ...）
+    """
+    return get_azure_speech_admission_controller(
+        is_rate_limit_error=lambda e: isinstance(e, AzureRateLimitError)
+    )
+
+
 # 🕐 Azure Speech API Timeout 設定（秒）
 AZURE_SPEECH_TIMEOUT = 20  # Azure Speech API timeout in seconds
 
@@ -161,32 +152,85 @@ class AssessmentResponse(BaseModel):
 #     reference_text: str
 
 
-def convert_audio_to_wav(audio_data: bytes, content_type: str) -> bytes:
+# Azure Speech SDK 需要的 PCM 格式：16000Hz, 16bit, mono
+ASSESSMENT_SAMPLE_RATE = 16000
+ASSESSMENT_SAMPLE_WIDTH = 2  # 16bit = 2 bytes
+ASSESSMENT_CHANNELS = 1
+
+
+class DecodedAudio:
     """
-    將音檔轉換為 WAV 格式（16000Hz, 16bit, mono）
-    Azure Speech SDK 需要特定格式的 WAV
+    已解碼的音檔（16000Hz, 16bit, mono PCM）
+
+    每個上傳只解碼一次（在音訊線程池中），之後配額檢查、點數扣除、
+    Azure push stream 都共用這個物件，避免重複呼叫 ffmpeg。
+    """
+
+    def __init__(self, pcm_data: bytes, source_size_bytes: int = 0):
+        self.pcm_data = pcm_data
+        self.source_size_bytes = source_size_bytes
+        self.sample_rate = ASSESSMENT_SAMPLE_RATE
+        self.sample_width = ASSESSMENT_SAMPLE_WIDTH
+        self.channels = ASSESSMENT_CHANNELS
+
+    @property
+    def duration_seconds(self) -> float:
+        """錄音時長（秒），直接由 PCM 長度計算，不需重新解碼"""
+        bytes_per_second = self.sample_rate * self.sample_width * self.channels
+        return len(self.pcm_data) / bytes_per_second
+
+    @property
+    def wav_header(self) -> bytes:
+        """標準 44 bytes RIFF/WAVE header"""
+        data_size = len(self.pcm_data)
+        byte_rate = self.sample_rate * self.sample_width * self.channels
+        block_align = self.sample_width * self.channels
+        return struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF",
+            36 + data_size,
+            b"WAVE",
+            b"fmt ",
+            16,  # PCM fmt chunk size
+            1,  # PCM format
+            self.channels,
+            self.sample_rate,
+            byte_rate,
+            block_align,
+            self.sample_width * 8,
+            b"data",
+            data_size,
+        )
+
+    @property
+    def wav_data(self) -> bytes:
+        """完整 WAV 檔（header + PCM）"""
+        return self.wav_header + self.pcm_data
+
+
+def decode_audio(audio_data: bytes, content_type: str) -> DecodedAudio:
     """
-    logger.debug(f"Converting audio from {content_type} to WAV")
+    將上傳音檔解碼為 Azure Speech SDK 需要的 PCM（16000Hz, 16bit, mono）
 
+    ⚡ 這是唯一呼叫 ffmpeg 的地方，應該在音訊線程池中執行。
+    """
+    logger.debug(f"Decoding audio from {content_type}")
+
+    temp_in_path = None
     try:
         # 根據 content type 選擇格式
         if "webm" in content_type:
-            # WebM 格式（瀏覽器錄音）
-            with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as temp_in:
-                temp_in.write(audio_data)
-                temp_in_path = temp_in.name
-
-            # 使用 pydub 轉換（需要 ffmpeg）
-            audio = AudioSegment.from_file(temp_in_path, format="webm")
+            # WebM 格式（瀏覽器錄音）- 直接透過 pipe 傳給 ffmpeg，不落地
+            audio = AudioSegment.from_file(BytesIO(audio_data), format="webm")
         elif "mp3" in content_type or "mpeg" in content_type:
             # MP3 格式
             audio = AudioSegment.from_mp3(BytesIO(audio_data))
         elif "mp4" in content_type:
             # MP4 格式（macOS Safari）
+            # moov atom 可能在檔尾，ffmpeg 需要可 seek 的輸入，只能使用暫存檔
             with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_in:
                 temp_in.write(audio_data)
                 temp_in_path = temp_in.name
-            # 使用 pydub 轉換（需要 ffmpeg）
             audio = AudioSegment.from_file(temp_in_path, format="mp4")
         elif "wav" in content_type:
             # 已經是 WAV，但可能需要轉換採樣率
@@ -196,41 +240,49 @@ def convert_audio_to_wav(audio_data: bytes, content_type: str) -> bytes:
             audio = AudioSegment.from_file(BytesIO(audio_data))
 
         # 轉換為 Azure Speech SDK 需要的格式
-        # 16000Hz 採樣率, 單聲道, 16bit
-        audio = audio.set_frame_rate(16000)
-        audio = audio.set_channels(1)
-        audio = audio.set_sample_width(2)  # 16bit = 2 bytes
+        audio = audio.set_frame_rate(ASSESSMENT_SAMPLE_RATE)
+        audio = audio.set_channels(ASSESSMENT_CHANNELS)
+        audio = audio.set_sample_width(ASSESSMENT_SAMPLE_WIDTH)
 
-        # 輸出為 WAV
-        wav_buffer = BytesIO()
-        audio.export(wav_buffer, format="wav")
-        wav_data = wav_buffer.getvalue()
+        decoded = DecodedAudio(audio.raw_data, source_size_bytes=len(audio_data))
 
         logger.debug(
-            f"Converted audio: {len(audio_data)} bytes -> {len(wav_data)} bytes WAV"
+            f"Decoded audio: {len(audio_data)} bytes -> {len(decoded.pcm_data)} bytes PCM"
         )
-        logger.debug(f"Audio duration: {len(audio) / 1000.0} seconds")
+        logger.debug(f"Audio duration: {decoded.duration_seconds} seconds")
 
-        # 清理暫存檔
-        if "temp_in_path" in locals():
-            os.unlink(temp_in_path)
-
-        return wav_data
+        return decoded
 
     except Exception as e:
         logger.error(f"Audio conversion failed: {e}")
         raise HTTPException(
             status_code=400, detail=f"Audio format conversion failed: {str(e)}"
         )
+    finally:
+        # 清理暫存檔
+        if temp_in_path and os.path.exists(temp_in_path):
+            os.unlink(temp_in_path)
+
+
+def convert_audio_to_wav(audio_data: bytes, content_type: str) -> bytes:
+    """
+    將音檔轉換為 WAV 格式（16000Hz, 16bit, mono）
+    Azure Speech SDK 需要特定格式的 WAV
+
+    需要時長等資訊的呼叫端請改用 decode_audio()，避免重複解碼
+    """
+    return decode_audio(audio_data, content_type).wav_data
 
 
 @trace_function("Azure Speech Assessment")
-def assess_pronunciation(audio_data: bytes, reference_text: str) -> Dict[str, Any]:
+def assess_pronunciation(
+    audio_data: Union[bytes, DecodedAudio], reference_text: str
+) -> Dict[str, Any]:
     """
     呼叫 Azure Speech API 進行發音評估
 
     Args:
-        audio_data: 音檔二進位資料
+        audio_data: WAV 音檔二進位資料，或 decode_audio() 產生的 DecodedAudio
         reference_text: 參考文本
 
     Returns:
@@ -245,7 +297,13 @@ def assess_pronunciation(audio_data: bytes, reference_text: str) -> Dict[str, An
 
     logger.debug(f"Azure Speech Key configured: {bool(speech_key)}")
     logger.debug(f"Azure Speech Region: {speech_region}")
-    logger.debug(f"Processing audio: {len(audio_data)} bytes")
+    if isinstance(audio_data, DecodedAudio):
+        # PushAudioInputStream 預設格式即為 16kHz/16bit/mono PCM，直接推送 PCM
+        stream_data = audio_data.pcm_data
+    else:
+        stream_data = audio_data
+
+    logger.debug(f"Processing audio: {len(stream_data)} bytes")
     logger.debug(f"Reference text: {reference_text}")
 
     if not speech_key:
@@ -293,7 +351,7 @@ def assess_pronunciation(audio_data: bytes, reference_text: str) -> Dict[str, An
         pronunciation_config.apply_to(speech_recognizer)
 
         # 推送音訊資料
-        audio_stream.write(audio_data)
+        audio_stream.write(stream_data)
         audio_stream.close()
 
         # 🕐 記錄 Azure API 呼叫開始時間
@@ -657,16 +715,17 @@ async def assess_pronunciation_endpoint(
             )
         perf.checkpoint("Audio File Read")
 
-    # 轉換音檔格式為 WAV（Azure Speech SDK 需要）
+    # 解碼音檔為 PCM（Azure Speech SDK 需要）
     # ⚡ 音檔轉換也可能耗時，使用自訂線程池避免阻塞
+    # ⚡ 每個上傳只解碼一次：配額檢查、扣點、Azure 評估都共用 decoded_audio
     with start_span("Convert Audio to WAV"):
         import time
 
         conversion_start = time.time()
         loop = asyncio.get_event_loop()
         audio_pool = get_audio_thread_pool()
-        wav_audio_data = await loop.run_in_executor(
-            audio_pool, convert_audio_to_wav, audio_data, audio_file.content_type
+        decoded_audio = await loop.run_in_executor(
+            audio_pool, decode_audio, audio_data, audio_file.content_type
         )
         conversion_time = time.time() - conversion_start
         logger.info(f"⏱️ Audio conversion time: {conversion_time:.2f}s")
@@ -732,10 +791,9 @@ async def assess_pronunciation_endpoint(
 
     # 📊 配額/點數檢查（僅記錄狀態，不阻擋學生學習）
     if teacher and assignment:
-        # 計算錄音時長
+        # 計算錄音時長（使用已解碼的 PCM，不再重新解碼）
         try:
-            audio = AudioSegment.from_file(BytesIO(audio_data))
-            duration_seconds = len(audio) / 1000.0  # 毫秒轉秒
+            duration_seconds = decoded_audio.duration_seconds
             required_points = OrganizationPointsService.convert_unit_to_points(
                 duration_seconds, "秒"
             )
@@ -782,7 +840,7 @@ async def assess_pronunciation_endpoint(
     # 進行發音評估（Azure Speech SDK）
     # ⚡ 使用自訂語音線程池避免阻塞 event loop
     # 🕐 加入 timeout 保護避免長時間阻塞
-    # 🔒 使用全局 Semaphore 限制並發（18 並發，避免 429 錯誤）
+    # 🔒 使用自適應並發控制器限制並發（依延遲與 429 調整，避免 429 錯誤）
     with start_span(
         "Azure Speech API Call", {"reference_text_length": len(reference_text)}
     ):
@@ -793,7 +851,8 @@ async def assess_pronunciation_endpoint(
         queue_start = time.time()
 
         try:
-            # 🔒 全局限流：最多 18 個並發 Azure API 呼叫
+            # 🔒 全局限流：並發上限由控制器動態決定（預設最多 18）
+            #    排隊已滿或等待過久會直接拒絕，不會等到 AZURE_SPEECH_TIMEOUT
             async with _get_azure_speech_semaphore():
                 queue_wait = time.time() - queue_start
 
@@ -825,13 +884,48 @@ async def assess_pronunciation_endpoint(
                     loop.run_in_executor(
                         speech_pool,
                         assess_pronunciation,
-                        wav_audio_data,
+                        decoded_audio,
                         reference_text,
                     ),
                     timeout=AZURE_SPEECH_TIMEOUT,
                 )
             perf.checkpoint("Azure Speech Assessment Complete")
 
+        except AdmissionRejectedError as e:
+            # 🚦 排隊已滿或等待過久 - 快速拒絕並建議重試時間
+            queue_wait = time.time() - queue_start
+            logger.warning(
+                f"🚦 Azure Speech admission rejected for student {current_student.id}: "
+                f"{e} (retry_after={e.retry_after}s)"
+            )
+
+            # 📊 記錄到 BigQuery
+            bigquery_logger = get_bigquery_logger()
+            await bigquery_logger.log_audio_error(
+                {
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "error_type": "admission_rejected",
+                    "error_message": str(e),
+                    "student_id": current_student.id,
+                    "assignment_id": assignment_id,
+                    "audio_size_bytes": len(audio_data),
+                    "reference_text": reference_text,
+                    "queue_wait_time": round(queue_wait, 2),
+                    "environment": os.getenv("ENVIRONMENT", "unknown"),
+                }
+            )
+
+            raise HTTPException(
+                status_code=503,
+                detail={
+                    "error": "AZURE_BUSY",
+                    "message": "語音評估服務繁忙，請稍後再試",
+                    "retry_after_seconds": e.retry_after,
+                    "queue_length": e.queue_length,
+                },
+                headers={"Retry-After": str(e.retry_after)},
+            )
+
         except asyncio.TimeoutError:
             # 🕐 Azure API timeout - 記錄到 BigQuery
             timeout_duration = AZURE_SPEECH_TIMEOUT
@@ -972,8 +1066,7 @@ async def assess_pronunciation_endpoint(
     # 📊 評分成功後扣除配額/點數
     if teacher and assignment:
         try:
-            audio = AudioSegment.from_file(BytesIO(audio_data))
-            duration_seconds = len(audio) / 1000.0
+            duration_seconds = decoded_audio.duration_seconds
 
             # 根據班級類型決定扣點對象
             classroom = assignment.classroom
@@ -6,7 +6,7 @@ Supports many-to-many relationships: students can belong to multiple schools
 and multiple classrooms.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func, or_
@@ -25,13 +25,21 @@ from models import (
     ClassroomSchool,
     ClassroomStudent,
 )
-from auth import verify_token, get_password_hash
+from auth import verify_token, get_password_hash_async, get_default_password_hashes
 from utils.permissions import (
     check_school_student_permission,
     check_student_in_school,
     check_classroom_in_school,
     validate_student_classroom_school,
 )
+from services.student_directory import (
+    StudentDirectoryFilters,
+    build_student_responses,
+    invalidate_school_student_count,
+    list_classroom_students,
+    list_school_students,
+)
+from services.search_service import SEARCH_TYPES, search_school
 from routers.schemas.student import (
     SchoolStudentCreate,
     SchoolStudentUpdate,
@@ -84,64 +92,7 @@ async def get_current_teacher(
 
 def build_student_response(student: Student, db: Session) -> dict:
     """Build student response with schools and classrooms"""
-    # Get all schools the student belongs to
-    student_schools = (
-        db.query(StudentSchool)
-        .filter(
-            StudentSchool.student_id == student.id, StudentSchool.is_active.is_(True)
-        )
-        .all()
-    )
-
-    schools = []
-    for ss in student_schools:
-        school = db.query(School).filter(School.id == ss.school_id).first()
-        if school:
-            schools.append({"id": str(school.id), "name": school.name})
-
-    # Get all classrooms the student belongs to
-    classroom_enrollments = (
-        db.query(ClassroomStudent)
-        .filter(
-            ClassroomStudent.student_id == student.id,
-            ClassroomStudent.is_active.is_(True),
-        )
-        .all()
-    )
-
-    classrooms = []
-    for cs in classroom_enrollments:
-        classroom = db.query(Classroom).filter(Classroom.id == cs.classroom_id).first()
-        if classroom:
-            # Get school for this classroom
-            classroom_school = (
-                db.query(ClassroomSchool)
-                .filter(
-                    ClassroomSchool.classroom_id == classroom.id,
-                    ClassroomSchool.is_active.is_(True),
-                )
-                .first()
-            )
-            if classroom_school:
-                classrooms.append(
-                    {
-                        "id": classroom.id,
-                        "name": classroom.name,
-                        "school_id": str(classroom_school.school_id),
-                    }
-                )
-
-    return {
-        "id": student.id,
-        "name": student.name,
-        "email": student.email,
-        "student_number": student.student_number,
-        "birthdate": student.birthdate.isoformat() if student.birthdate else None,
-        "is_active": student.is_active,
-        "last_login": student.last_login.isoformat() if student.last_login else None,
-        "schools": schools,
-        "classrooms": classrooms,
-    }
+    return build_student_responses(db, [student])[0]
 
 
 # ============ GET Endpoints ============
@@ -150,10 +101,14 @@ def build_student_response(student: Student, db: Session) -> dict:
 @router.get("/api/schools/{school_id}/students", response_model=List[dict])
 async def get_school_students(
     school_id: uuid.UUID,
+    response: Response,
     teacher: Teacher = Depends(get_current_teacher),
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[int] = Query(
+        None, description="Last student id of the previous page (X-Next-Cursor)"
+    ),
     search: Optional[str] = None,
     status_filter: Optional[str] = Query(None, alias="status"),
     classroom_id: Optional[int] = None,
@@ -162,6 +117,10 @@ async def get_school_students(
     """
     Get all students in a school.
 
+    Pagination: pass the X-Next-Cursor response header back as ?cursor= for the
+    next page (keyset). ?page= still works but gets slower for deep pages.
+    X-Total-Count is cached for a short time.
+
     Permissions: school_admin, org_admin, org_owner
     """
     # Check permission
@@ -178,52 +137,24 @@ async def get_school_students(
             status_code=status.HTTP_404_NOT_FOUND, detail="School not found"
         )
 
-    # Base query: students in this school
-    query = (
-        db.query(Student)
-        .join(StudentSchool, Student.id == StudentSchool.student_id)
-        .filter(StudentSchool.school_id == school_id, StudentSchool.is_active.is_(True))
+    result = list_school_students(
+        db,
+        school_id,
+        StudentDirectoryFilters(
+            search=search,
+            status=status_filter,
+            classroom_id=classroom_id,
+            unassigned=unassigned,
+        ),
+        limit=limit,
+        cursor=cursor,
+        page=page,
     )
 
-    # Apply filters
-    if status_filter == "active":
-        query = query.filter(Student.is_active.is_(True))
-    elif status_filter == "inactive":
-        query = query.filter(Student.is_active.is_(False))
-
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            or_(
-                Student.name.ilike(search_term),
-                Student.student_number.ilike(search_term),
-                Student.email.ilike(search_term),
-            )
-        )
-
-    # Filter by classroom if specified
-    if classroom_id is not None:
-        query = query.join(
-            ClassroomStudent, Student.id == ClassroomStudent.student_id
-        ).filter(
-            ClassroomStudent.classroom_id == classroom_id,
-            ClassroomStudent.is_active.is_(True),
-        )
-
-    # Filter unassigned students
-    if unassigned:
-        query = query.outerjoin(
-            ClassroomStudent, Student.id == ClassroomStudent.student_id
-        ).filter(ClassroomStudent.id.is_(None))
-
-    # Apply pagination
-    total = query.count()
-    students = query.offset((page - 1) * limit).limit(limit).all()
-
-    # Build response
-    result = [build_student_response(student, db) for student in students]
-
-    return result
+    response.headers["X-Total-Count"] = str(result.total)
+    if result.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(result.next_cursor)
+    return result.students
 
 
 @router.get(
@@ -254,19 +185,51 @@ async def get_classroom_students(
             detail="Classroom not found in this school",
         )
 
-    # Get students in classroom
-    classroom_students = (
-        db.query(Student)
-        .join(ClassroomStudent, Student.id == ClassroomStudent.student_id)
-        .filter(
-            ClassroomStudent.classroom_id == classroom_id,
-            ClassroomStudent.is_active.is_(True),
-            Student.is_active.is_(True),
+    return list_classroom_students(db, classroom_id)
+
+
+@router.get("/api/schools/{school_id}/search", response_model=dict)
+async def search_school_members(
+    school_id: uuid.UUID,
+    q: str = Query(..., min_length=1, max_length=100),
+    types: str = Query(
+        ",".join(SEARCH_TYPES), description="Comma-separated: " + ",".join(SEARCH_TYPES)
+    ),
+    limit: int = Query(20, ge=1, le=100),
+    teacher: Teacher = Depends(get_current_teacher),
+    db: Session = Depends(get_db),
+):
+    """
+    Ranked search for students, teachers and classrooms in a school.
+
+    Exact matches rank first, then prefix matches (e.g. a Chinese surname),
+    then substring matches.
+
+    Permissions: school_admin, org_admin, org_owner
+    """
+    if not check_school_student_permission(teacher.id, school_id, db):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions"
+        )
+
+    requested = [t.strip() for t in types.split(",") if t.strip()]
+    invalid = [t for t in requested if t not in SEARCH_TYPES]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid search types: {', '.join(invalid)}",
         )
-        .all()
-    )
 
-    return [build_student_response(student, db) for student in classroom_students]
+    results = search_school(db, school_id, q, types=requested, limit=limit)
+    return {
+        "students": build_student_responses(db, results.students),
+        "teachers": [
+            {"id": t.id, "name": t.name, "email": t.email} for t in results.teachers
+        ],
+        "classrooms": [
+            {"id": c.id, "name": c.name, "grade": c.grade} for c in results.classrooms
+        ],
+    }
 
 
 # ============ POST Endpoints ============
@@ -338,7 +301,7 @@ async def create_school_student(
         email=student_data.email,
         student_number=student_data.student_number,
         birthdate=birthdate,
-        password_hash=get_password_hash(default_password),
+        password_hash=await get_password_hash_async(default_password),
         password_changed=False,
         is_active=True,
     )
@@ -354,6 +317,7 @@ async def create_school_student(
         db.add(student_school)
         db.commit()
         db.refresh(student)
+        invalidate_school_student_count(school_id)
 
     except Exception as e:
         db.rollback()
@@ -396,6 +360,35 @@ async def batch_import_students(
             status_code=status.HTTP_404_NOT_FOUND, detail="School not found"
         )
 
+    # 預設密碼（生日 YYYYMMDD）的 bcrypt 雜湊先在線程池平行計算：
+    # 只算會建立學生的列（跳過 / 更新既有學生、生日格式錯誤的列不需要）
+    existing_numbers = set()
+    student_numbers = {
+        item.student_number for item in import_data.students if item.student_number
+    }
+    if student_numbers and import_data.duplicate_action in ("skip", "update"):
+        existing_numbers = {
+            number
+            for (number,) in db.query(Student.student_number)
+            .join(StudentSchool, Student.id == StudentSchool.student_id)
+            .filter(
+                StudentSchool.school_id == school_id,
+                StudentSchool.is_active.is_(True),
+                Student.student_number.in_(student_numbers),
+            )
+        }
+    new_rows = []
+    for idx, student_item in enumerate(import_data.students):
+        if student_item.student_number in existing_numbers:
+            continue
+        try:
+            new_rows.append((idx, date.fromisoformat(student_item.birthdate)))
+        except ValueError:
+            continue
+    hashes = await get_default_password_hashes(birthdate for _, birthdate in new_rows)
+    # 列索引 → 該列學生的密碼雜湊
+    password_hashes = dict(zip((idx for idx, _ in new_rows), hashes))
+
     created_count = 0
     updated_count = 0
     skipped_count = 0
@@ -410,8 +403,6 @@ async def batch_import_students(
                 errors.append(f"Row {idx + 1}: Invalid birthdate format")
                 continue
 
-            default_password = birthdate.strftime("%Y%m%d")
-
             # Check for duplicates based on duplicate_action
             existing = None
             if student_item.student_number:
@@ -483,7 +474,8 @@ async def batch_import_students(
                 email=student_item.email,
                 student_number=student_item.student_number,
                 birthdate=birthdate,
-                password_hash=get_password_hash(default_password),
+                password_hash=password_hashes.get(idx)
+                or await get_password_hash_async(birthdate.strftime("%Y%m%d")),
                 password_changed=False,
                 is_active=True,
             )
@@ -513,6 +505,7 @@ async def batch_import_students(
             db.rollback()
             errors.append(f"Row {idx + 1}: {str(e)}")
 
+    invalidate_school_student_count(school_id)
     return {
         "message": "Batch import completed",
         "created": created_count,
@@ -575,6 +568,7 @@ async def add_student_to_school(
             # Reactivate
             existing.is_active = True
             db.commit()
+            invalidate_school_student_count(school_id)
             return build_student_response(student, db)
 
     # Create new relationship
@@ -583,6 +577,7 @@ async def add_student_to_school(
     )
     db.add(student_school)
     db.commit()
+    invalidate_school_student_count(school_id)
 
     return build_student_response(student, db)
 
@@ -822,7 +817,9 @@ async def update_school_student(
             # If password not changed and birthdate changed, update password
             if not student.password_changed and new_birthdate != student.birthdate:
                 new_default_password = new_birthdate.strftime("%Y%m%d")
-                student.password_hash = get_password_hash(new_default_password)
+                student.password_hash = await get_password_hash_async(
+                    new_default_password
+                )
             student.birthdate = new_birthdate
         except ValueError:
             raise HTTPException(
@@ -846,6 +843,7 @@ async def update_school_student(
             detail=f"Failed to update student: {str(e)}",
         )
 
+    invalidate_school_student_count(school_id)
     return build_student_response(student, db)
 
 
@@ -995,5 +993,6 @@ async def remove_student_from_school(
             enrollment.is_active = False
 
     db.commit()
+    invalidate_school_student_count(school_id)
 
     return {"message": "Student removed from school and all classrooms"}
@@ -7,7 +7,7 @@ from datetime import datetime, timedelta
 
 from database import get_db
 from models import Student, Classroom, ClassroomStudent
-from auth import get_current_user, create_access_token, verify_password
+from auth import get_current_user, create_access_token, verify_password_async
 from .validators import SwitchAccountRequest
 
 router = APIRouter()
@@ -148,7 +148,7 @@ async def switch_account(
         raise HTTPException(status_code=403, detail="Target account is not linked")
 
     # 驗證目標帳號的密碼
-    if not verify_password(request.password, target_student.password_hash):
+    if not await verify_password_async(request.password, target_student.password_hash):
         raise HTTPException(
             status_code=401, detail="Invalid password for target account"
         )
@@ -24,7 +24,20 @@ from models import (
     AssignmentStatus,
     PracticeSession,
 )
+from services.assignment_mastery import get_assignment_mastery
+from services.assignment_progress_service import materialize_student_progress
 from services.quota_service import QuotaService
+from services.word_selection_practice import get_word_practice_engine
+from services.rearrangement_service import (
+    InvalidAnswerKey,
+    default_max_errors,
+    issue_answer_key,
+    points_per_word as rearrangement_points_per_word,
+    read_answer_key,
+    score_selections,
+    split_sentence,
+    to_response,
+)
 from .dependencies import get_current_student
 from .validators import (
     PracticeWord,
@@ -32,6 +45,8 @@ from .validators import (
     RearrangementQuestionResponse,
     RearrangementAnswerRequest,
     RearrangementAnswerResponse,
+    RearrangementBatchAnswerRequest,
+    RearrangementBatchAnswerResponse,
     RearrangementRetryRequest,
     RearrangementCompleteRequest,
 )
@@ -177,6 +192,10 @@ async def get_assignment_activities(
     activities = []
 
     if student_assignment.assignment_id:
+        # 第一次打開時補齊缺少的進度記錄（set-based，重複呼叫不會產生重複記錄）
+        if any(materialize_student_progress(student_assignment, db).values()):
+            db.commit()
+
         # 直接查詢這個學生作業的所有進度記錄（這才是正確的數據源）
         progress_records = (
             db.query(StudentContentProgress)
@@ -187,59 +206,6 @@ async def get_assignment_activities(
             .all()
         )
 
-        # 如果沒有 progress_records，自動創建
-        if not progress_records:
-            # 獲取作業的所有 assignment_contents
-            assignment_contents = (
-                db.query(AssignmentContent)
-                .filter(
-                    AssignmentContent.assignment_id == student_assignment.assignment_id
-                )
-                .order_by(AssignmentContent.order_index)
-                .all()
-            )
-
-            # 為每個 assignment_content 創建 StudentContentProgress
-            for idx, ac in enumerate(assignment_contents):
-                progress = StudentContentProgress(
-                    student_assignment_id=student_assignment.id,
-                    content_id=ac.content_id,
-                    status=AssignmentStatus.NOT_STARTED,
-                    order_index=idx,
-                )
-                db.add(progress)
-                progress_records.append(progress)
-
-                # 同時創建 StudentItemProgress
-                content_items = (
-                    db.query(ContentItem)
-                    .filter(ContentItem.content_id == ac.content_id)
-                    .order_by(ContentItem.order_index)
-                    .all()
-                )
-
-                for item in content_items:
-                    item_progress = StudentItemProgress(
-                        student_assignment_id=student_assignment.id,
-                        content_item_id=item.id,
-                        status="NOT_STARTED",
-                    )
-                    db.add(item_progress)
-
-            # 提交到資料庫
-            db.commit()
-
-            # 重新查詢以獲取 ID
-            progress_records = (
-                db.query(StudentContentProgress)
-                .filter(
-                    StudentContentProgress.student_assignment_id
-                    == student_assignment.id
-                )
-                .order_by(StudentContentProgress.order_index)
-                .all()
-            )
-
         # 優化：批次查詢所有 content，避免 N+1 問題
         content_ids = [progress.content_id for progress in progress_records]
         contents = db.query(Content).filter(Content.id.in_(content_ids)).all()
@@ -661,11 +627,8 @@ async def submit_assignment(
             else:
                 student_assignment.score = 0
         elif practice_mode == "word_selection":
-            # 單字選擇：使用 calculate_assignment_mastery 函數計算
-            result = db.execute(
-                text("SELECT * FROM calculate_assignment_mastery(:sa_id)"),
-                {"sa_id": student_assignment.id},
-            ).fetchone()
+            # 單字選擇：讀取作業熟練度彙總
+            result = get_assignment_mastery(db, student_assignment.id)
             if result:
                 current_mastery = float(result.current_mastery) * 100
                 student_assignment.score = min(100, int(current_mastery))
@@ -840,6 +803,10 @@ async def get_vocabulary_activities(
     items = []
 
     if student_assignment.assignment_id:
+        # 第一次打開時補齊缺少的進度記錄，讓每個單字都有 progress_id
+        if any(materialize_student_progress(student_assignment, db).values()):
+            db.commit()
+
         # Get assignment contents
         assignment_contents = (
             db.query(AssignmentContent)
@@ -1119,11 +1086,42 @@ async def start_word_selection_practice(
     Returns 10 words selected by the intelligent get_words_for_practice function,
     each with 3 distractors from the word set plus the correct answer.
     """
+    return _word_selection_round(assignment_id, current_student, db)
+
+
+@router.get("/assignments/{assignment_id}/vocabulary/selection/next-round")
+async def next_word_selection_round(
+    assignment_id: int,
+    session_id: Optional[int] = Query(
+        None, description="Practice session to continue (from the previous round)"
+    ),
+    current_student: Dict[str, Any] = Depends(get_current_student),
+    db: Session = Depends(get_db),
+):
+    """
+    Get the next round of a word selection practice.
+
+    The round is usually prefetched while the student answers the previous
+    one, so this is normally a cache hit. Passing the previous session_id
+    continues that PracticeSession instead of creating a new one.
+    Same response format as /vocabulary/selection/start.
+    """
+    return _word_selection_round(assignment_id, current_student, db, session_id)
+
+
+def _word_selection_round(
+    assignment_id: int,
+    current_student: Dict[str, Any],
+    db: Session,
+    session_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """單字選擇的一回合（start 與 next-round 共用）"""
     student_id = int(current_student.get("sub"))
 
     # Verify student has this assignment
     student_assignment = (
         db.query(StudentAssignment)
+        .options(joinedload(StudentAssignment.assignment))
         .filter(
             StudentAssignment.id == assignment_id,
             StudentAssignment.student_id == student_id,
@@ -1138,14 +1136,7 @@ async def start_word_selection_practice(
             detail="Assignment not found or not assigned to you",
         )
 
-    # Get the Assignment to check practice_mode
-    assignment = None
-    if student_assignment.assignment_id:
-        assignment = (
-            db.query(Assignment)
-            .filter(Assignment.id == student_assignment.assignment_id)
-            .first()
-        )
+    assignment = student_assignment.assignment
 
     # Verify this is a word_selection assignment
     if assignment and assignment.practice_mode != "word_selection":
@@ -1163,168 +1154,66 @@ async def start_word_selection_practice(
     # Get target proficiency from assignment (default 80%)
     target_proficiency = assignment.target_proficiency if assignment else 80
 
-    # Get total words in assignment
-    total_words_result = db.execute(
-        text(
-            """
-            SELECT COUNT(DISTINCT ci.id) as total_count
-            FROM student_content_progress scp
-            JOIN content_items ci ON ci.content_id = scp.content_id
-            WHERE scp.student_assignment_id = :sa_id
-        """
-        ),
-        {"sa_id": assignment_id},
-    ).fetchone()
-    total_words_in_assignment = (
-        total_words_result.total_count if total_words_result else 0
-    )
-
-    # Fallback if no progress records yet
-    if total_words_in_assignment == 0:
-        fallback_count = db.execute(
-            text(
-                """
-                SELECT COUNT(DISTINCT ci.id) as total_count
-                FROM assignment_contents ac
-                JOIN content_items ci ON ci.content_id = ac.content_id
-                WHERE ac.assignment_id = :assignment_id
-            """
-            ),
-            {"assignment_id": student_assignment.assignment_id},
-        ).fetchone()
-        total_words_in_assignment = fallback_count.total_count if fallback_count else 0
-
-    # Call get_words_for_practice PostgreSQL function
-    words_result = db.execute(
-        text("SELECT * FROM get_words_for_practice(:sa_id, :limit_count)"),
-        {"sa_id": assignment_id, "limit_count": 10},
-    ).fetchall()
-
-    if not words_result:
-        # No words found - get all content items directly
-        assignment_contents = (
-            db.query(AssignmentContent)
-            .filter(AssignmentContent.assignment_id == student_assignment.assignment_id)
-            .all()
-        )
-        content_ids = [ac.content_id for ac in assignment_contents]
+    # Word pool, total word count and the round come from the practice engine
+    # (cached per assignment / student assignment, next round prefetched)
+    engine = get_word_practice_engine()
+    total_words_in_assignment = engine.total_words(db, student_assignment)
+    practice_round = engine.next_round(db, student_assignment)
 
-        content_items = (
-            db.query(ContentItem)
-            .filter(ContentItem.content_id.in_(content_ids))
-            .limit(10)
-            .all()
+    if not practice_round.words:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No vocabulary items found for this assignment",
         )
 
-        if not content_items:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="No vocabulary items found for this assignment",
-            )
-
-        # Build words list from content items
-        words_data = []
-        for ci in content_items:
-            words_data.append(
-                {
-                    "content_item_id": ci.id,
-                    "text": ci.text,
-                    "translation": ci.translation or "",
-                    "audio_url": ci.audio_url,
-                    "image_url": ci.image_url,
-                    "memory_strength": 0,
-                }
-            )
-    else:
-        # Build words list from function result
-        words_data = []
-        for row in words_result:
-            words_data.append(
-                {
-                    "content_item_id": row.content_item_id,
-                    "text": row.text,
-                    "translation": row.translation or "",
-                    "audio_url": row.audio_url,
-                    "image_url": getattr(row, "image_url", None),
-                    "memory_strength": float(row.memory_strength)
-                    if row.memory_strength
-                    else 0,
-                }
+    # Continue the previous round's session, or create a new one
+    practice_session = None
+    if session_id is not None:
+        practice_session = (
+            db.query(PracticeSession)
+            .filter(
+                PracticeSession.id == session_id,
+                PracticeSession.student_id == student_id,
+                PracticeSession.student_assignment_id == assignment_id,
             )
-
-    # Create practice session
-    practice_session = PracticeSession(
-        student_id=student_id,
-        student_assignment_id=assignment_id,
-        practice_mode="word_selection",
-        words_practiced=0,
-        correct_count=0,
-        started_at=datetime.now(timezone.utc),
-    )
-    db.add(practice_session)
-    db.commit()
-    db.refresh(practice_session)
+            .first()
+        )
+    if practice_session is None:
+        practice_session = PracticeSession(
+            student_id=student_id,
+            student_assignment_id=assignment_id,
+            practice_mode="word_selection",
+            words_practiced=0,
+            correct_count=0,
+            started_at=datetime.now(timezone.utc),
+        )
+        db.add(practice_session)
+        db.commit()
+        db.refresh(practice_session)
 
     # Build response with words and their options
+    pool = engine.get_pool(db, student_assignment.assignment_id)
     words_with_options = []
-
-    # Collect all unique translations for picking distractors from the word set
-    all_translations = {
-        w["translation"].lower().strip(): w["translation"]
-        for w in words_data
-        if w["translation"]
-    }
-
-    # Query stored AI distractors from DB
-    content_item_ids = [w["content_item_id"] for w in words_data]
-    items_with_distractors = (
-        db.query(ContentItem).filter(ContentItem.id.in_(content_item_ids)).all()
-    )
-    distractors_map = {item.id: item.distractors for item in items_with_distractors}
-
-    for i, word in enumerate(words_data):
-        correct_answer = word["translation"]
-        stored_distractors = distractors_map.get(word["content_item_id"])
-
-        if isinstance(stored_distractors, list) and len(stored_distractors) >= 3:
-            # 使用已儲存的干擾項（來自同作業其他單字翻譯）
-            final_distractors = list(stored_distractors[:3])
-        else:
-            # Fallback: 從其他單字翻譯取
-            other_translations = [
-                t
-                for key, t in all_translations.items()
-                if key != correct_answer.lower().strip()
-            ]
-            random.shuffle(other_translations)
-            final_distractors = other_translations[:3]
-
-        # Fallback for small word sets
-        num_needed = 3 - len(final_distractors)
-        for j in range(num_needed):
-            final_distractors.append(f"選項{chr(65 + j)}")
-
-        # Create options array with correct answer and 3 distractors = 4 total
-        options = [correct_answer] + final_distractors
-        random.shuffle(options)
-
+    for word in practice_round.words:
         words_with_options.append(
             {
                 "content_item_id": word["content_item_id"],
                 "text": word["text"],
-                "translation": correct_answer,
+                "translation": word["translation"],
                 "audio_url": word.get("audio_url"),
                 "image_url": word.get("image_url"),
                 "memory_strength": word.get("memory_strength", 0),
-                "options": options,
+                "options": pool.build_options(word),
             }
         )
 
+    # Compute the following round while the student answers this one
+    engine.schedule_prefetch(
+        assignment_id, student_assignment.assignment_id, practice_round.served_ids
+    )
+
     # Get current proficiency
-    mastery_result = db.execute(
-        text("SELECT * FROM calculate_assignment_mastery(:sa_id)"),
-        {"sa_id": assignment_id},
-    ).fetchone()
+    mastery_result = get_assignment_mastery(db, assignment_id)
 
     current_proficiency = (
         float(mastery_result.current_mastery) * 100 if mastery_result else 0
@@ -1424,10 +1313,8 @@ async def submit_word_selection_answer(
     new_memory_strength = float(result.memory_strength) if result else 0
 
     # Sync assignment status after each answer
-    mastery_result = db.execute(
-        text("SELECT * FROM calculate_assignment_mastery(:sa_id)"),
-        {"sa_id": assignment_id},
-    ).fetchone()
+    # (O(1): update_memory_strength already applied the delta to the aggregate)
+    mastery_result = get_assignment_mastery(db, assignment_id)
 
     if mastery_result:
         current_mastery = float(mastery_result.current_mastery)
@@ -1499,11 +1386,8 @@ async def get_word_selection_proficiency(
 
     target_proficiency = assignment.target_proficiency if assignment else 80
 
-    # Call calculate_assignment_mastery PostgreSQL function
-    result = db.execute(
-        text("SELECT * FROM calculate_assignment_mastery(:sa_id)"),
-        {"sa_id": assignment_id},
-    ).fetchone()
+    # Read the incrementally maintained mastery aggregate
+    result = get_assignment_mastery(db, assignment_id)
 
     if not result:
         return {
@@ -1557,10 +1441,7 @@ async def complete_word_selection_assignment(
         )
 
     # Get current proficiency to verify achievement
-    result = db.execute(
-        text("SELECT * FROM calculate_assignment_mastery(:sa_id)"),
-        {"sa_id": assignment_id},
-    ).fetchone()
+    result = get_assignment_mastery(db, assignment_id)
 
     # Get target proficiency
     assignment = None
@@ -1638,6 +1519,10 @@ async def get_rearrangement_questions(
             status_code=400, detail="This assignment is not in rearrangement mode"
         )
 
+    # 第一次打開時補齊缺少的進度記錄，作答時不必再逐題建立
+    if any(materialize_student_progress(student_assignment, db).values()):
+        db.commit()
+
     # 取得所有內容項目
     content_items = (
         db.query(ContentItem)
@@ -1652,10 +1537,11 @@ async def get_rearrangement_questions(
     if assignment.shuffle_questions:
         random.shuffle(content_items)
 
+    answer_scope = f"student:{assignment_id}"
     questions = []
     for item in content_items:
         # 打亂單字順序
-        words = item.text.strip().split()
+        words = split_sentence(item.text)
         shuffled_words = words.copy()
         random.shuffle(shuffled_words)
 
@@ -1664,7 +1550,7 @@ async def get_rearrangement_questions(
                 content_item_id=item.id,
                 shuffled_words=shuffled_words,
                 word_count=item.word_count or len(words),
-                max_errors=item.max_errors or (3 if len(words) <= 10 else 5),
+                max_errors=default_max_errors(len(words), item.max_errors),
                 time_limit=(
                     assignment.time_limit_per_question
                     if assignment.time_limit_per_question is not None
@@ -1674,6 +1560,13 @@ async def get_rearrangement_questions(
                 audio_url=item.audio_url,
                 translation=item.translation,
                 original_text=item.text.strip(),  # 正確答案
+                answer_token=issue_answer_key(
+                    answer_scope,
+                    item.id,
+                    item.text,
+                    item.max_errors,
+                    len(content_items),
+                ),
             )
         )
 
@@ -1742,10 +1635,10 @@ async def submit_rearrangement_answer(
         db.flush()
 
     # 解析正確答案
-    correct_words = content_item.text.strip().split()
+    correct_words = split_sentence(content_item.text)
     word_count = len(correct_words)
-    max_errors = content_item.max_errors or (3 if word_count <= 10 else 5)
-    points_per_word = math.floor(100 / word_count)
+    max_errors = default_max_errors(word_count, content_item.max_errors)
+    points_per_word = rearrangement_points_per_word(word_count)
 
     # 檢查答案是否正確
     current_position = request.current_position
@@ -1826,6 +1719,107 @@ async def submit_rearrangement_answer(
     )
 
 
+@router.post("/assignments/{assignment_id}/rearrangement-answers")
+async def submit_rearrangement_answers(
+    assignment_id: int,
+    request: RearrangementBatchAnswerRequest,
+    current_student: Dict[str, Any] = Depends(get_current_student),
+    db: Session = Depends(get_db),
+):
+    """
+    批次提交例句重組答案
+
+    用題目附帶的 answer_token 驗證整句（或一段 micro-batch）的點選，
+    計分規則與逐字 API 相同，一次讀取、一次寫入。
+    applied_count 必須等於目前已計分的點選數（答對 + 答錯）、start_position 必須等於
+    目前已答對的字數，重送的批次（包括只有答錯點選的批次）會回 409 而不會重複計分；
+    進度列以 SELECT ... FOR UPDATE 讀取，同一批並發送出兩次時只會套用一次。
+    """
+    student_id = int(current_student.get("sub"))
+
+    try:
+        key = read_answer_key(request.answer_token, f"student:{assignment_id}")
+    except InvalidAnswerKey as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 進度記錄與作業擁有者一次查詢（鎖住進度列直到 commit）
+    progress = (
+        db.query(StudentItemProgress)
+        .join(
+            StudentAssignment,
+            StudentItemProgress.student_assignment_id == StudentAssignment.id,
+        )
+        .filter(
+            StudentItemProgress.student_assignment_id == assignment_id,
+            StudentItemProgress.content_item_id == key.content_item_id,
+            StudentAssignment.student_id == student_id,
+        )
+        .with_for_update(of=StudentItemProgress)
+        .first()
+    )
+
+    if not progress:
+        # 進度通常在取題時已補齊，這裡只是防禦性建立
+        owned = (
+            db.query(StudentAssignment.id)
+            .filter(
+                StudentAssignment.id == assignment_id,
+                StudentAssignment.student_id == student_id,
+            )
+            .first()
+        )
+        if not owned:
+            raise HTTPException(status_code=404, detail="Student assignment not found")
+        progress = StudentItemProgress(
+            student_assignment_id=assignment_id,
+            content_item_id=key.content_item_id,
+            status="IN_PROGRESS",
+            error_count=0,
+            correct_word_count=0,
+            expected_score=100.0,
+            rearrangement_data={"selections": []},
+        )
+        db.add(progress)
+
+    correct_word_count = progress.correct_word_count or 0
+    error_count = progress.error_count or 0
+    # 只比對 start_position 不夠：只有答錯點選的批次不會改變已答對的字數
+    if (
+        request.start_position != correct_word_count
+        or request.applied_count != correct_word_count + error_count
+    ):
+        raise HTTPException(
+            status_code=409,
+            detail="start_position / applied_count does not match saved progress",
+        )
+
+    try:
+        result = score_selections(
+            key.words,
+            key.max_errors,
+            request.selections,
+            correct_word_count=correct_word_count,
+            error_count=error_count,
+            total_items=key.total_items,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    progress.correct_word_count = result.correct_word_count
+    progress.error_count = result.error_count
+    progress.expected_score = result.expected_score
+    if result.completed:
+        progress.status = "COMPLETED"
+
+    data = dict(progress.rearrangement_data or {})
+    data["selections"] = list(data.get("selections") or []) + result.selections
+    progress.rearrangement_data = data
+
+    db.commit()
+
+    return RearrangementBatchAnswerResponse(**to_response(key, result))
+
+
 @router.post("/assignments/{student_assignment_id}/rearrangement-retry")
 async def retry_rearrangement(
     student_assignment_id: int,
@@ -7,7 +7,7 @@ from datetime import timedelta
 from database import get_db
 from models import Student, Classroom, ClassroomStudent
 from models.organization import ClassroomSchool, School, Organization
-from auth import create_access_token, verify_password
+from auth import create_access_token, verify_password_async
 from .validators import StudentValidateRequest, StudentLoginResponse
 
 router = APIRouter()
@@ -27,7 +27,7 @@ async def validate_student(
         )
 
     # 驗證密碼 - 未改密碼時是生日，改密碼後是新密碼
-    if not verify_password(request.password, student.password_hash):
+    if not await verify_password_async(request.password, student.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid password"
         )
@@ -13,7 +13,11 @@ from models import (
     StudentAssignment,
     AssignmentStatus,
 )
-from auth import verify_password, get_password_hash, validate_password_strength
+from auth import (
+    verify_password_async,
+    get_password_hash_async,
+    validate_password_strength,
+)
 from .dependencies import get_current_student, get_student_id
 from .validators import UpdateStudentProfileRequest, UpdatePasswordRequest
 
@@ -181,14 +185,14 @@ async def update_student_password(
         )
 
     # Verify current password
-    if not verify_password(request.current_password, student.password_hash):
+    if not await verify_password_async(request.current_password, student.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect",
         )
 
     # Check if new password is same as current password
-    if verify_password(request.new_password, student.password_hash):
+    if await verify_password_async(request.new_password, student.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="New password must be different from current password",
@@ -200,7 +204,7 @@ async def update_student_password(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_msg)
 
     # Update password
-    student.password_hash = get_password_hash(request.new_password)
+    student.password_hash = await get_password_hash_async(request.new_password)
     student.password_changed = True  # Mark that password has been changed
     db.commit()
 
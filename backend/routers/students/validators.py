@@ -94,6 +94,7 @@ class RearrangementQuestionResponse(BaseModel):
     audio_url: Optional[str] = None
     translation: Optional[str] = None
     original_text: Optional[str] = None  # 正確答案（用於顯示答案功能）
+    answer_token: Optional[str] = None  # 批次作答用的 answer key
 
 
 class RearrangementAnswerRequest(BaseModel):
@@ -118,6 +119,39 @@ class RearrangementAnswerResponse(BaseModel):
     completed: bool  # 是否完成此題
 
 
+class RearrangementBatchAnswerRequest(BaseModel):
+    """例句重組批次作答請求（整句或一段 micro-batch）"""
+
+    answer_token: str  # 題目附帶的 answer key
+    selections: List[str]  # 依點選順序排列的單字
+    start_position: int = 0  # 這段點選開始前已正確選擇的字數
+    # 這段點選開始前已計分的點選數（答對 + 答錯，即回應的 correct_word_count + error_count）
+    applied_count: int = 0
+
+
+class RearrangementSelectionResult(BaseModel):
+    """批次作答中單次點選的結果"""
+
+    position: int
+    selected: str
+    is_correct: bool
+    correct_word: Optional[str] = None  # 如果錯誤，顯示正確答案
+
+
+class RearrangementBatchAnswerResponse(BaseModel):
+    """例句重組批次作答回應"""
+
+    content_item_id: int
+    results: List[RearrangementSelectionResult]
+    error_count: int
+    max_errors: int
+    expected_score: float
+    correct_word_count: int
+    total_word_count: int
+    challenge_failed: bool
+    completed: bool
+
+
 class RearrangementRetryRequest(BaseModel):
     """重新挑戰請求"""
 
@@ -28,6 +28,15 @@ from models import (
     Organization,
     School,
 )
+from services.rearrangement_service import (
+    default_max_errors,
+    issue_answer_key,
+    read_answer_key,
+    score_selections,
+    split_sentence,
+    to_response,
+)
+from services.word_selection_practice import get_word_practice_engine
 from .dependencies import get_current_teacher
 from .validators import *
 from .utils import TEST_SUBSCRIPTION_WHITELIST, parse_birthdate
@@ -332,23 +341,16 @@ async def preview_word_selection_start(
             status_code=400, detail="This assignment is not in word_selection mode"
         )
 
-    # Get all content items
-    content_items = (
-        db.query(ContentItem)
-        .join(Content)
-        .join(AssignmentContent)
-        .filter(AssignmentContent.assignment_id == assignment.id)
-        .order_by(ContentItem.order_index)
-        .all()
-    )
+    # Word pool is cached per assignment and shared with the student API
+    pool = get_word_practice_engine().get_pool(db, assignment.id)
 
-    if not content_items:
+    if not pool.words:
         raise HTTPException(
             status_code=404, detail="No vocabulary items found for this assignment"
         )
 
     # Record total word count (before limiting)
-    total_words_in_assignment = len(content_items)
+    total_words_in_assignment = pool.total_words
 
     # (#379) Exclude already-practiced words to avoid repetition per round
     # Per-token parsing: a single invalid value won't drop all exclusions
@@ -362,89 +364,17 @@ async def preview_word_selection_start(
                 except ValueError:
                     pass  # Skip individual invalid token
 
-    remaining_items = [item for item in content_items if item.id not in exclude_id_set]
-
-    # If remaining < 10, reset cycle (start over from all words)
-    if len(remaining_items) < 10:
-        remaining_items = list(content_items)
-
-    # Shuffle if needed
-    if assignment.shuffle_questions:
-        random.shuffle(remaining_items)
-
-    # Limit to 10 words (consistent with student API)
-    content_items = remaining_items[:10]
+    # 10 words per round (consistent with student API); restarts the cycle
+    # when fewer than 10 unpracticed words remain
+    round_words = pool.preview_round(
+        exclude_id_set, 10, shuffle=bool(assignment.shuffle_questions)
+    )
 
     # NOTE: AI distractor generation is temporarily disabled (#303).
-    # All distractors now come from other words in the assignment.
-    #
-    # --- AI distractor generation (disabled) ---
-    # items_needing_generation = [item for item in content_items if not item.distractors]
-    # if items_needing_generation:
-    #     words_for_distractors = [
-    #         {"word": item.text, "translation": item.translation or ""}
-    #         for item in items_needing_generation
-    #     ]
-    #     try:
-    #         generated = await translation_service.batch_generate_distractors(
-    #             words_for_distractors, count=2
-    #         )
-    #         for i, item in enumerate(items_needing_generation):
-    #             if i < len(generated):
-    #                 item._generated_distractors = generated[i]
-    #     except Exception as e:
-    #         logger.error(f"Failed to generate distractors for preview: {e}")
-    #         for item in items_needing_generation:
-    #             item._generated_distractors = ["選項A", "選項B", "選項C"]
-    # --- end AI distractor generation ---
-
-    # Build response data
-    words_with_options = []
-
-    # Collect all unique translations for picking distractors from the word set
-    all_translations = {
-        item.translation.lower().strip(): item.translation
-        for item in content_items
-        if item.translation
-    }
-
-    for item in content_items:
-        correct_answer = item.translation or ""
-        stored_distractors = item.distractors
-
-        if isinstance(stored_distractors, list) and len(stored_distractors) >= 3:
-            # 使用已儲存的干擾項（來自同作業其他單字翻譯，需至少 3 個）
-            final_distractors = list(stored_distractors[:3])
-        else:
-            # Fallback: 儲存的干擾項不足 3 個，從其他單字翻譯取
-            other_translations = [
-                t
-                for key, t in all_translations.items()
-                if key != correct_answer.lower().strip()
-            ]
-            random.shuffle(other_translations)
-            final_distractors = other_translations[:3]
-
-        # Fallback for small word sets
-        num_needed = 3 - len(final_distractors)
-        for j in range(num_needed):
-            final_distractors.append(f"選項{chr(65 + j)}")
-
-        # Build options array and shuffle
-        options = [correct_answer] + final_distractors
-        random.shuffle(options)
-
-        words_with_options.append(
-            {
-                "content_item_id": item.id,
-                "text": item.text,
-                "translation": correct_answer,
-                "audio_url": item.audio_url,
-                "image_url": item.image_url,
-                "memory_strength": 0,
-                "options": options,
-            }
-        )
+    # Distractors are the stored ones, or other words in the assignment.
+    words_with_options = [
+        {**word, "options": pool.build_options(word)} for word in round_words
+    ]
 
     return {
         "session_id": None,  # Preview mode doesn't create session
@@ -563,10 +493,11 @@ async def preview_rearrangement_questions(
     if assignment.shuffle_questions:
         random.shuffle(content_items)
 
+    answer_scope = f"preview:{current_teacher.id}:{assignment_id}"
     questions = []
     for item in content_items:
         # Shuffle words
-        words = item.text.strip().split()
+        words = split_sentence(item.text)
         shuffled_words = words.copy()
         random.shuffle(shuffled_words)
 
@@ -575,7 +506,7 @@ async def preview_rearrangement_questions(
                 "content_item_id": item.id,
                 "shuffled_words": shuffled_words,
                 "word_count": item.word_count or len(words),
-                "max_errors": item.max_errors or (3 if len(words) <= 10 else 5),
+                "max_errors": default_max_errors(len(words), item.max_errors),
                 "time_limit": (
                     assignment.time_limit_per_question
                     if assignment.time_limit_per_question is not None
@@ -585,6 +516,13 @@ async def preview_rearrangement_questions(
                 "audio_url": item.audio_url,
                 "translation": item.translation,
                 "original_text": item.text.strip(),  # Correct answer
+                "answer_token": issue_answer_key(
+                    answer_scope,
+                    item.id,
+                    item.text,
+                    item.max_errors,
+                    len(content_items),
+                ),
             }
         )
 
@@ -664,6 +602,40 @@ async def preview_rearrangement_answer(
     }
 
 
+@router.post("/assignments/{assignment_id}/preview/rearrangement-answers")
+async def preview_rearrangement_answers(
+    assignment_id: int,
+    request: dict,
+    current_teacher: Teacher = Depends(get_current_teacher),
+):
+    """
+    Preview mode: Submit a whole sentence (or micro-batch) of selections.
+
+    - Verifies the answer_token issued by preview/rearrangement-questions
+      (scoped to this teacher and assignment), so no database access is needed
+    - Scores with the same rules as the student API; nothing is saved
+    - start_position / error_count carry the client-side state between batches
+    """
+    try:
+        key = read_answer_key(
+            request.get("answer_token", ""),
+            f"preview:{current_teacher.id}:{assignment_id}",
+        )
+        result = score_selections(
+            key.words,
+            key.max_errors,
+            request.get("selections", []),
+            correct_word_count=request.get("start_position", 0),
+            error_count=request.get("error_count", 0),
+            total_items=key.total_items,
+        )
+    except ValueError as e:
+        # InvalidAnswerKey is a ValueError too
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return to_response(key, result)
+
+
 @router.post("/assignments/{assignment_id}/preview/rearrangement-retry")
 async def preview_rearrangement_retry(
     assignment_id: int,
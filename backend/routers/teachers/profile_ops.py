@@ -20,7 +20,11 @@ from models import (
 from .dependencies import get_current_teacher
 from .validators import *
 from .utils import TEST_SUBSCRIPTION_WHITELIST, parse_birthdate
-from auth import verify_password, get_password_hash, validate_password_strength
+from auth import (
+    verify_password_async,
+    get_password_hash_async,
+    validate_password_strength,
+)
 
 router = APIRouter()
 
@@ -138,14 +142,16 @@ async def update_teacher_password(
 ):
     """更新教師密碼"""
     # Verify current password
-    if not verify_password(request.current_password, current_teacher.password_hash):
+    if not await verify_password_async(
+        request.current_password, current_teacher.password_hash
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect",
         )
 
     # Check if new password is same as current password
-    if verify_password(request.new_password, current_teacher.password_hash):
+    if await verify_password_async(request.new_password, current_teacher.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="New password must be different from current password",
@@ -157,7 +163,7 @@ async def update_teacher_password(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_msg)
 
     # Update password
-    current_teacher.password_hash = get_password_hash(request.new_password)
+    current_teacher.password_hash = await get_password_hash_async(request.new_password)
     db.commit()
 
     return {"message": "Password updated successfully"}
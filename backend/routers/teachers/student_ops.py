@@ -22,7 +22,7 @@ from models import (
 from .dependencies import get_current_teacher
 from .validators import *
 from .utils import TEST_SUBSCRIPTION_WHITELIST  # parse_birthdate is defined locally
-from auth import get_password_hash
+from auth import get_password_hash_async, get_default_password_hashes
 
 router = APIRouter()
 
@@ -292,7 +292,7 @@ async def create_student(
         name=student_data.name,
         email=email,
         birthdate=birthdate,
-        password_hash=get_password_hash(default_password),
+        password_hash=await get_password_hash_async(default_password),
         password_changed=False,
         student_number=student_data.student_number,
         target_wpm=80,
@@ -446,7 +446,7 @@ async def update_student(
 
         # Update password to new birthdate (YYYYMMDD format)
         new_default_password = new_birthdate.strftime("%Y%m%d")
-        student.password_hash = get_password_hash(new_default_password)
+        student.password_hash = await get_password_hash_async(new_default_password)
 
     # Update other fields
     if update_data.name is not None:
@@ -602,7 +602,7 @@ async def reset_student_password(
     # Reset password to birthdate (YYYYMMDD format)
 
     default_password = student.birthdate.strftime("%Y%m%d")
-    student.password_hash = get_password_hash(default_password)
+    student.password_hash = await get_password_hash_async(default_password)
     student.password_changed = False
 
     db.commit()
@@ -680,16 +680,19 @@ async def batch_create_students(
     if not classroom:
         raise HTTPException(status_code=404, detail="Classroom not found")
 
-    created_students = []
-    for student_data in batch_data.students:
-        birthdate = date.fromisoformat(student_data["birthdate"])
-        default_password = birthdate.strftime("%Y%m%d")
+    # 預設密碼（生日 YYYYMMDD）的 bcrypt 雜湊在線程池平行計算，每位學生各自的 salt
+    birthdates = [date.fromisoformat(s["birthdate"]) for s in batch_data.students]
+    password_hashes = await get_default_password_hashes(birthdates)
 
+    created_students = []
+    for student_data, birthdate, password_hash in zip(
+        batch_data.students, birthdates, password_hashes
+    ):
         student = Student(
             name=student_data["name"],
             email=student_data["email"],
             birthdate=birthdate,
-            password_hash=get_password_hash(default_password),
+            password_hash=password_hash,
             password_changed=False,
             student_id=student_data.get("student_id"),
             target_wpm=80,
@@ -834,6 +837,48 @@ async def batch_import_students(
         if cs.student
     }
 
+    # 🔥 Hash default passwords (birthdate YYYYMMDD) in parallel up front,
+    # instead of one blocking bcrypt call per row inside the loop.
+    # Only rows that will create a student (or reset an unchanged password on
+    # update) need a hash; every row gets its own hash and salt.
+    duplicate_action = import_data.duplicate_action or "skip"
+    today = datetime.now().date()
+    new_password_rows = []
+    for idx, student_data in enumerate(import_data.students):
+        if not (
+            student_data.name
+            and student_data.name.strip()
+            and student_data.classroom_name
+            and student_data.birthdate
+        ):
+            continue
+        try:
+            birthdate = parse_birthdate(student_data.birthdate)
+        except Exception:
+            continue
+        classroom = classroom_map.get(student_data.classroom_name.strip())
+        if not birthdate or birthdate > today or not classroom:
+            continue
+        existing = enrollment_map.get((student_data.name.strip(), classroom.id))
+        if existing and (
+            duplicate_action == "skip"
+            or (
+                duplicate_action == "update"
+                and (not existing.student or existing.student.password_changed)
+            )
+        ):
+            continue
+        new_password_rows.append((idx, birthdate))
+    hashes = await get_default_password_hashes(b for _, b in new_password_rows)
+    # row index -> that row's precomputed hash
+    password_hashes = dict(zip((idx for idx, _ in new_password_rows), hashes))
+
+    async def default_password_hash(idx: int, birthdate: date) -> str:
+        # Rows the pre-pass did not predict are hashed on demand
+        return password_hashes.pop(idx, None) or await get_password_hash_async(
+            birthdate.strftime("%Y%m%d")
+        )
+
     success_count = 0
     error_count = 0
     errors = []
@@ -930,8 +975,8 @@ async def batch_import_students(
                         existing_student.birthdate = birthdate
                         # Update password if it hasn't been changed
                         if not existing_student.password_changed:
-                            existing_student.password_hash = get_password_hash(
-                                birthdate.strftime("%Y%m%d")
+                            existing_student.password_hash = (
+                                await default_password_hash(idx, birthdate)
                             )
                         db.flush()
 
@@ -971,7 +1016,7 @@ async def batch_import_students(
                 name=student_name,
                 email=None,  # Let students bind email themselves
                 birthdate=birthdate,
-                password_hash=get_password_hash(default_password),
+                password_hash=await default_password_hash(idx, birthdate),
                 password_changed=False,
                 target_wpm=80,
                 target_accuracy=0.8,
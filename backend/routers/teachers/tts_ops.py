@@ -58,15 +58,17 @@ async def batch_generate_tts(
 
         tts_service = get_tts_service()
 
-        # 直接使用 await，因為 FastAPI 已經在異步環境中
-        audio_urls = await tts_service.batch_generate_tts(
+        # 回傳部分結果：失敗的項目 audio_url 為 null，並列在 failed_indices
+        audio_urls, errors = await tts_service.batch_generate_tts_detailed(
             texts=request.texts,
             voice=request.voice,
             rate=request.rate,
             volume=request.volume,
         )
+        if request.texts and len(errors) == len(request.texts):
+            raise Exception(f"All {len(errors)} items failed: {errors[0]}")
 
-        return {"audio_urls": audio_urls}
+        return {"audio_urls": audio_urls, "failed_indices": sorted(errors)}
     except Exception as e:
         print(f"Batch TTS error: {e}")
         raise HTTPException(status_code=500, detail="Batch TTS generation failed")
@@ -0,0 +1,123 @@
+"""
+單字選擇作業的熟練度彙總（assignment_mastery）
+
+每個 StudentAssignment 一列：strength 總和、已練習字數、已精熟字數、總字數。
+update_memory_strength() 作答時以差值更新彙總列，
+read_assignment_mastery() 只讀這一列，不再隨作業字數掃描 user_word_progress。
+
+- get_assignment_mastery：取得目前熟練度（欄位同 calculate_assignment_mastery）
+- reconcile_assignment_mastery：定期以全量重算修正彙總列的漂移
+  （stale 的列、以及超過 max_age 未更新的列），回傳修正統計
+
+彙總表與函式只存在於 PostgreSQL（見 migration 20260421_1000）。
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# 每批重算的作業數
+RECONCILE_BATCH_SIZE = 500
+
+# 彙總列超過這個時間未更新就重新核對
+RECONCILE_MAX_AGE = timedelta(days=1)
+
+# strength_sum 比對容許誤差（memory_strength 為 NUMERIC(5, 4)）
+_STRENGTH_EPSILON = 1e-6
+
+
+def get_assignment_mastery(db: Session, student_assignment_id: int):
+    """
+    取得 StudentAssignment 的熟練度
+
+    Returns:
+        含 current_mastery / target_mastery / achieved / words_mastered / total_words
+        的資料列；作業不存在時 target_mastery 為 None
+    """
+    return db.execute(
+        text("SELECT * FROM read_assignment_mastery(:sa_id)"),
+        {"sa_id": student_assignment_id},
+    ).fetchone()
+
+
+def _drifted(before, after) -> bool:
+    """重算前後的彙總是否不同（stale 的列一律視為需要修正）"""
+    if before.stale:
+        return True
+    return (
+        abs(float(before.strength_sum) - float(after.strength_sum)) > _STRENGTH_EPSILON
+        or before.practiced_words != after.practiced_words
+        or before.words_mastered != after.words_mastered
+        or before.total_words != after.total_words
+    )
+
+
+def reconcile_assignment_mastery(
+    db: Session,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    max_age: timedelta = RECONCILE_MAX_AGE,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> Dict[str, Any]:
+    """
+    重算 stale 或過久未更新的彙總列
+
+    依 student_assignment_id 分批（keyset），每批 commit 一次，
+    中斷後重新執行只會重算尚未處理的列（已處理的 updated_at 已更新）。
+
+    Args:
+        db: DB session
+        batch_size: 每批處理的作業數
+        max_age: 超過這個時間未更新的列也會重新核對
+        on_progress: 進度回呼（0-100）
+    """
+    cutoff = datetime.now(timezone.utc) - max_age
+    scope = "WHERE (stale OR updated_at < :cutoff)"
+
+    total = db.execute(
+        text(f"SELECT COUNT(*) FROM assignment_mastery {scope}"),
+        {"cutoff": cutoff},
+    ).scalar()
+
+    checked = 0
+    repaired = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            text(
+                f"""
+                SELECT student_assignment_id, strength_sum, practiced_words,
+                       words_mastered, total_words, stale
+                FROM assignment_mastery
+                {scope} AND student_assignment_id > :last_id
+                ORDER BY student_assignment_id
+                LIMIT :limit
+                """
+            ),
+            {"cutoff": cutoff, "last_id": last_id, "limit": batch_size},
+        ).fetchall()
+        if not rows:
+            break
+
+        for before in rows:
+            after = db.execute(
+                text("SELECT * FROM refresh_assignment_mastery(:sa_id)"),
+                {"sa_id": before.student_assignment_id},
+            ).fetchone()
+            if _drifted(before, after):
+                repaired += 1
+        db.commit()
+
+        checked += len(rows)
+        last_id = rows[-1].student_assignment_id
+        if on_progress and total:
+            on_progress(min(100.0, checked * 100.0 / total))
+
+    if repaired:
+        logger.info(f"Assignment mastery reconciled: {repaired}/{checked} repaired")
+
+    return {"checked": checked, "repaired": repaired}
@@ -0,0 +1,246 @@
+"""
+Assignment Progress Service
+
+Set-based fan-out of StudentAssignment / StudentContentProgress /
+StudentItemProgress rows.
+
+Instead of adding one ORM object per student × content × item, each level is
+materialized with a single statement:
+- StudentAssignment: one executemany INSERT
+- StudentContentProgress: INSERT ... SELECT (student_assignments × assignment_contents)
+- StudentItemProgress: INSERT ... SELECT (student_assignments × assignment_contents × content_items)
+
+The number of statements stays constant regardless of class size.
+
+The same statements, scoped to a single StudentAssignment, back the lazy
+materialization used when a student first opens an assignment.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, exists, func, insert, literal, select, or_
+from sqlalchemy.orm import Session
+
+from models import (
+    Assignment,
+    AssignmentContent,
+    AssignmentStatus,
+    ContentItem,
+    StudentAssignment,
+    StudentContentProgress,
+    StudentItemProgress,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _progress_cursor(assignment_id: int, db: Session) -> int:
+    """
+    作業的進度游標：目前已展開進度的 StudentAssignment 最大 id
+
+    新插入的 StudentAssignment id 一定大於游標，
+    後續的 INSERT ... SELECT 只需處理游標之後的學生。
+    """
+    return (
+        db.query(func.max(StudentAssignment.id))
+        .filter(StudentAssignment.assignment_id == assignment_id)
+        .scalar()
+        or 0
+    )
+
+
+def _content_progress_source(scope: List):
+    """缺少的 StudentContentProgress（scope 為 StudentAssignment 的篩選條件）"""
+    return select(
+        StudentAssignment.id,
+        AssignmentContent.content_id,
+        literal(AssignmentStatus.NOT_STARTED, StudentContentProgress.status.type),
+        AssignmentContent.order_index,
+        AssignmentContent.order_index != 1,
+    ).where(
+        AssignmentContent.assignment_id == StudentAssignment.assignment_id,
+        *scope,
+        ~exists().where(
+            and_(
+                StudentContentProgress.student_assignment_id == StudentAssignment.id,
+                StudentContentProgress.content_id == AssignmentContent.content_id,
+            )
+        ),
+    )
+
+
+def _item_progress_source(scope: List):
+    """缺少的 StudentItemProgress（scope 為 StudentAssignment 的篩選條件）"""
+    # INSERT ... SELECT 不會套用 ORM 的 Python 端預設值，這裡明確帶入
+    return select(
+        StudentAssignment.id,
+        ContentItem.id,
+        literal("NOT_STARTED"),
+        literal("PENDING"),
+        literal(0),
+        literal(0),
+        literal(0),
+        literal(0),
+        literal(0),
+        literal(False),
+    ).where(
+        AssignmentContent.assignment_id == StudentAssignment.assignment_id,
+        ContentItem.content_id == AssignmentContent.content_id,
+        *scope,
+        ~exists().where(
+            and_(
+                StudentItemProgress.student_assignment_id == StudentAssignment.id,
+                StudentItemProgress.content_item_id == ContentItem.id,
+            )
+        ),
+    )
+
+
+def _insert_content_progress(scope: List, db: Session) -> int:
+    """建立缺少的 StudentContentProgress（只解鎖第一個）"""
+    result = db.execute(
+        insert(StudentContentProgress).from_select(
+            [
+                StudentContentProgress.student_assignment_id,
+                StudentContentProgress.content_id,
+                StudentContentProgress.status,
+                StudentContentProgress.order_index,
+                StudentContentProgress.is_locked,
+            ],
+            _content_progress_source(scope),
+        )
+    )
+    return max(result.rowcount or 0, 0)
+
+
+def _insert_item_progress(scope: List, db: Session) -> int:
+    """建立缺少的 StudentItemProgress（每個 ContentItem 一筆）"""
+    result = db.execute(
+        insert(StudentItemProgress).from_select(
+            [
+                StudentItemProgress.student_assignment_id,
+                StudentItemProgress.content_item_id,
+                StudentItemProgress.status,
+                StudentItemProgress.review_status,
+                StudentItemProgress.attempts,
+                StudentItemProgress.error_count,
+                StudentItemProgress.correct_word_count,
+                StudentItemProgress.retry_count,
+                StudentItemProgress.expected_score,
+                StudentItemProgress.timeout_ended,
+            ],
+            _item_progress_source(scope),
+        )
+    )
+    return max(result.rowcount or 0, 0)
+
+
+def fan_out_student_assignments(
+    assignment: Assignment,
+    student_ids: Iterable[int],
+    db: Session,
+    classroom_id: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    為多位學生建立作業及所有進度記錄（不 commit，由呼叫端決定交易邊界）
+
+    已經有這份作業的學生會被略過。
+
+    Args:
+        assignment: 已 flush（有 id）且已建立 AssignmentContent 的作業
+        student_ids: 要指派的學生 ID
+        db: Database session
+        classroom_id: 班級 ID（預設使用 assignment.classroom_id）
+
+    Returns:
+        各層新增的筆數：student_assignments / content_progress / item_progress
+    """
+    # 確保 assignment 與 AssignmentContent 已寫入，INSERT ... SELECT 才讀得到
+    db.flush()
+
+    existing_student_ids = {
+        row.student_id
+        for row in db.query(StudentAssignment.student_id).filter(
+            StudentAssignment.assignment_id == assignment.id
+        )
+    }
+    new_student_ids = list(
+        dict.fromkeys(sid for sid in student_ids if sid not in existing_student_ids)
+    )
+    if not new_student_ids:
+        return {"student_assignments": 0, "content_progress": 0, "item_progress": 0}
+
+    cursor = _progress_cursor(assignment.id, db)
+
+    db.execute(
+        insert(StudentAssignment),
+        [
+            {
+                "assignment_id": assignment.id,
+                "student_id": student_id,
+                "classroom_id": classroom_id or assignment.classroom_id,
+                # 暫時保留舊欄位以兼容
+                "title": assignment.title,
+                "instructions": assignment.description,
+                "due_date": assignment.due_date,
+                "status": AssignmentStatus.NOT_STARTED,
+                "is_active": True,
+            }
+            for student_id in new_student_ids
+        ],
+    )
+
+    scope = [
+        StudentAssignment.assignment_id == assignment.id,
+        StudentAssignment.id > cursor,
+    ]
+    counts = {
+        "student_assignments": len(new_student_ids),
+        "content_progress": _insert_content_progress(scope, db),
+        "item_progress": _insert_item_progress(scope, db),
+    }
+    logger.info(f"Assignment {assignment.id} fan-out: {counts}")
+    return counts
+
+
+def materialize_student_progress(
+    student_assignment: StudentAssignment, db: Session
+) -> Dict[str, int]:
+    """
+    補齊單一學生作業缺少的進度記錄（不 commit，由呼叫端決定交易邊界）
+
+    學生第一次打開作業時呼叫。已完整時只需一個 EXISTS 查詢；
+    缺少時先鎖定該 StudentAssignment 列，讓同一位學生同時送出的多個請求
+    （重複分頁、前端重送）依序執行，再以 INSERT ... SELECT 一次補齊，
+    NOT EXISTS 條件確保重複呼叫不會產生重複記錄。
+
+    Returns:
+        新增的筆數：content_progress / item_progress
+    """
+    counts = {"content_progress": 0, "item_progress": 0}
+    if not student_assignment.assignment_id:
+        return counts
+
+    scope = [StudentAssignment.id == student_assignment.id]
+    missing = db.query(
+        or_(
+            _content_progress_source(scope).exists(),
+            _item_progress_source(scope).exists(),
+        )
+    ).scalar()
+    if not missing:
+        return counts
+
+    # 鎖定後重新檢查（NOT EXISTS 在鎖定後的新語句中看得到其他交易已提交的資料）
+    db.query(StudentAssignment.id).filter(
+        StudentAssignment.id == student_assignment.id
+    ).with_for_update().one()
+
+    counts["content_progress"] = _insert_content_progress(scope, db)
+    counts["item_progress"] = _insert_item_progress(scope, db)
+    logger.info(
+        f"Materialized progress for student assignment {student_assignment.id}: "
+        f"{counts}"
+    )
+    return counts
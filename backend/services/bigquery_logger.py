@@ -4,20 +4,23 @@ from datetime import datetime
 from google.cloud import bigquery
 from typing import Dict, Any
 
+from services.bigquery_sink import BigQuerySink, get_bigquery_sink
+
 
 class BigQueryLogger:
     def __init__(self):
         self.client = None
         self._initialized = False
+        self._sink = None
 
         # 從環境變數讀取專案 ID，預設使用 duotopia-472708
         project_id = os.getenv("GCP_PROJECT_ID", "duotopia-472708")
         self.table_id = f"{project_id}.duotopia_logs.audio_playback_errors"
 
-    def _ensure_client(self):
-        """延遲初始化 BigQuery client（只在第一次使用時初始化）"""
+    def _create_client(self):
+        """延遲初始化 BigQuery client（由背景 sink thread 在第一次寫入時呼叫）"""
         if self._initialized:
-            return
+            return self.client
 
         try:
             # 使用跟 audio_upload.py 一樣的認證方式
@@ -35,28 +38,33 @@ class BigQueryLogger:
                 print("✅ BigQuery client initialized with default credentials")
 
             print(f"📊 BigQuery table: {self.table_id}")
-            self._initialized = True
         except Exception as e:
             print(f"⚠️ BigQuery client initialization failed: {e}")
             print("⚠️ Audio error logging will be disabled, but app will continue")
-            self._initialized = True  # 標記為已嘗試初始化，避免重複嘗試
+        self._initialized = True  # 標記為已嘗試初始化，避免重複嘗試
+        return self.client
+
+    def _get_sink(self) -> BigQuerySink:
+        if self._sink is None:
+            self._sink = get_bigquery_sink(self.table_id, self._create_client)
+        return self._sink
 
     async def log_audio_error(self, error_data: Dict[str, Any]) -> bool:
         """
         記錄音檔錯誤到 BigQuery
 
+        ⚡ 只放入背景 sink 的佇列，不在 event loop 上做 HTTPS 寫入；
+        實際的 insert_rows_json 由 sink 批次執行。
+
         Args:
             error_data: 錯誤資料字典
 
         Returns:
-            bool: 是否成功記錄
+            bool: 是否成功排入佇列
         """
         try:
-            # 延遲初始化 client
-            self._ensure_client()
-
-            # 如果 client 初始化失敗，靜默返回 False
-            if self.client is None:
+            # 如果 client 初始化已失敗，靜默返回 False
+            if self._initialized and self.client is None:
                 print("⚠️ BigQuery client not available, skipping log")
                 return False
 
@@ -64,17 +72,10 @@ class BigQueryLogger:
             if "timestamp" not in error_data:
                 error_data["timestamp"] = datetime.utcnow().isoformat()
 
-            print(f"📝 Logging to BigQuery: {error_data.get('error_type')}")
-
-            # 插入資料（Streaming Insert）
-            errors = self.client.insert_rows_json(self.table_id, [error_data])
-
-            if errors:
-                print(f"❌ BigQuery insert failed: {errors}")
-                return False
-
-            print(f"✅ BigQuery logged: {error_data.get('error_type')}")
-            return True
+            queued = self._get_sink().enqueue(error_data)
+            if not queued:
+                print(f"⚠️ BigQuery sink full, dropped: {error_data.get('error_type')}")
+            return queued
 
         except Exception as e:
             print(f"❌ BigQuery error: {e}")
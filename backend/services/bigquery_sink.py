@@ -0,0 +1,305 @@
+"""
+BigQuery 背景批次寫入（Error Sink）
+
+取代每個事件一次的同步 Streaming Insert：
+- 呼叫端只把資料放入有上限的記憶體佇列（不阻塞 event loop）
+- 背景 thread 依筆數或時間間隔批次呼叫 insert_rows_json
+- 佇列滿時溢寫到磁碟（有設定 spill 目錄時）或丟棄，並記錄數量
+- 應用程式關閉時把佇列清空再結束
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 佇列結束標記
+_STOP = object()
+
+
+class BigQuerySink:
+    """單一 BigQuery table 的背景批次寫入器"""
+
+    def __init__(
+        self,
+        table_id: str,
+        client_factory: Callable[[], Any],
+        max_queue_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        spill_dir: Optional[str] = None,
+    ):
+        """
+        Args:
+            table_id: BigQuery table（project.dataset.table）
+            client_factory: 建立 BigQuery client 的函式（在背景 thread 中呼叫）
+            max_queue_size: 記憶體佇列上限
+            batch_size: 每批最多筆數（達到就立即送出）
+            flush_interval: 最長等待秒數（未滿一批也會送出）
+            spill_dir: 佇列滿或寫入失敗時的溢寫目錄（None 表示直接丟棄）
+        """
+        self.table_id = table_id
+        self._client_factory = client_factory
+        self._client = None
+        self._client_initialized = False
+
+        self.max_queue_size = max_queue_size or int(
+            os.getenv("BIGQUERY_SINK_MAX_QUEUE", "1000")
+        )
+        self.batch_size = batch_size or int(os.getenv("BIGQUERY_SINK_BATCH_SIZE", "50"))
+        self.flush_interval = flush_interval or float(
+            os.getenv("BIGQUERY_SINK_FLUSH_INTERVAL", "2.0")
+        )
+        spill_dir = spill_dir or os.getenv("BIGQUERY_SINK_SPILL_DIR")
+        self.spill_path = (
+            os.path.join(spill_dir, f"{table_id.replace('.', '_')}.jsonl")
+            if spill_dir
+            else None
+        )
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.max_queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+
+        # 統計
+        self._enqueued = 0
+        self._flushed_rows = 0
+        self._flushed_batches = 0
+        self._failed_rows = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._replayed = 0
+
+    # ------------------------------------------------------------------
+    # 呼叫端 API
+    # ------------------------------------------------------------------
+
+    def enqueue(self, row: Dict[str, Any]) -> bool:
+        """
+        放入一筆資料（非阻塞）
+
+        Returns:
+            bool: True 表示已進入佇列或已溢寫到磁碟，False 表示被丟棄
+        """
+        self._ensure_worker()
+
+        try:
+            self._queue.put_nowait(row)
+            self._enqueued += 1
+            return True
+        except queue.Full:
+            # 背壓：佇列滿了，溢寫或丟棄
+            if self._spill([row]):
+                return True
+            self._dropped += 1
+            logger.warning(
+                f"⚠️ BigQuery sink queue full ({self.max_queue_size}), "
+                f"dropped row for {self.table_id}"
+            )
+            return False
+
+    def shutdown(self, timeout: float = 10.0):
+        """停止背景 thread，並把佇列中剩餘資料送出"""
+        with self._lock:
+            worker = self._worker
+            if worker is None:
+                return
+            self._worker = None
+
+        # 結束標記一定要放得進去，否則 worker 永遠不會停
+        self._queue.put(_STOP)
+        worker.join(timeout=timeout)
+        if worker.is_alive():
+            logger.warning(
+                f"⚠️ BigQuery sink for {self.table_id} did not drain within {timeout}s"
+            )
+        else:
+            logger.info(f"✅ BigQuery sink drained: {self.table_id}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得佇列深度與寫入/丟棄統計（用於監控）"""
+        return {
+            "table_id": self.table_id,
+            "running": self._worker is not None and self._worker.is_alive(),
+            "queue_depth": self._queue.qsize(),
+            "max_queue_size": self.max_queue_size,
+            "enqueued": self._enqueued,
+            "flushed_rows": self._flushed_rows,
+            "flushed_batches": self._flushed_batches,
+            "failed_rows": self._failed_rows,
+            "dropped": self._dropped,
+            "spilled": self._spilled,
+            "replayed": self._replayed,
+        }
+
+    # ------------------------------------------------------------------
+    # 背景 thread
+    # ------------------------------------------------------------------
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name=f"bigquery_sink_{self.table_id}",
+                    daemon=True,
+                )
+                self._worker.start()
+
+    def _get_client(self):
+        """延遲初始化 client（在背景 thread 中，不影響請求）"""
+        if not self._client_initialized:
+            self._client_initialized = True
+            try:
+                self._client = self._client_factory()
+            except Exception as e:
+                logger.error(f"BigQuery sink client initialization failed: {e}")
+                self._client = None
+        return self._client
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            deadline = time.monotonic() + self.flush_interval
+
+            # 收集一批：滿 batch_size 或超過 flush_interval 就送出
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if stopping:
+                # 關閉時把剩餘資料全部取出
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+
+            healthy = None
+            for start in range(0, len(batch), self.batch_size):
+                healthy = self._flush(batch[start : start + self.batch_size])
+
+            # 只有在 BigQuery 剛寫入成功、且佇列已空時才重送溢寫資料，
+            # 避免 BigQuery 故障期間反覆讀寫磁碟
+            if healthy and self._queue.empty():
+                self._replay_spill()
+
+    def _flush(self, rows: List[Dict[str, Any]], spill_on_failure: bool = True) -> bool:
+        if not rows:
+            return True
+
+        client = self._get_client()
+        if client is None:
+            self._failed_rows += len(rows)
+            return False
+
+        try:
+            errors = client.insert_rows_json(self.table_id, rows)
+        except Exception as e:
+            logger.error(f"❌ BigQuery sink insert failed ({len(rows)} rows): {e}")
+            # 重送溢寫資料時由呼叫端自行寫回磁碟
+            if spill_on_failure and not self._spill(rows):
+                self._failed_rows += len(rows)
+            return False
+
+        if errors:
+            logger.error(f"❌ BigQuery sink insert returned errors: {errors}")
+            self._failed_rows += len(errors)
+
+        self._flushed_rows += len(rows) - len(errors or [])
+        self._flushed_batches += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # 磁碟溢寫
+    # ------------------------------------------------------------------
+
+    def _spill(self, rows: List[Dict[str, Any]], count: bool = True) -> bool:
+        if not self.spill_path:
+            return False
+
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(json.dumps(row, default=str) + "\n")
+            if count:
+                self._spilled += len(rows)
+            return True
+        except Exception as e:
+            logger.error(f"❌ BigQuery sink spill failed: {e}")
+            return False
+
+    def _replay_spill(self):
+        """佇列空閒時，把溢寫到磁碟的資料重新送出"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+
+        with self._spill_lock:
+            replay_path = f"{self.spill_path}.replay"
+            try:
+                os.replace(self.spill_path, replay_path)
+            except OSError:
+                return
+
+        with open(replay_path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        os.unlink(replay_path)
+
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start : start + self.batch_size]
+            if not self._flush(chunk, spill_on_failure=False):
+                # 又失敗了：剩下的資料寫回磁碟，等下次成功寫入後再重送
+                self._spill(rows[start:], count=False)
+                return
+            self._replayed += len(chunk)
+
+
+# 所有 sink 的註冊表（用於統計與關閉）
+_sinks: Dict[str, BigQuerySink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_bigquery_sink(table_id: str, client_factory: Callable[[], Any]) -> BigQuerySink:
+    """取得（或建立）指定 table 的 sink"""
+    with _sinks_lock:
+        sink = _sinks.get(table_id)
+        if sink is None:
+            sink = BigQuerySink(table_id, client_factory)
+            _sinks[table_id] = sink
+        return sink
+
+
+def shutdown_bigquery_sinks(timeout: float = 10.0):
+    """關閉所有 sink（應用程式關閉時呼叫）"""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.shutdown(timeout=timeout)
+
+
+def get_bigquery_sink_stats() -> Dict[str, Dict[str, Any]]:
+    """取得所有 sink 的統計資訊（用於監控）"""
+    with _sinks_lock:
+        return {table_id: sink.get_stats() for table_id, sink in _sinks.items()}
@@ -7,8 +7,9 @@ Casbin Permission Service
 import casbin
 import logging
 import os
+import threading
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -19,11 +20,50 @@ MODEL_PATH = str(CONFIG_DIR / "casbin_model.conf")
 POLICY_PATH = str(CONFIG_DIR / "casbin_policy.csv")
 
 
+# g rule: (teacher_id, role, domain)
+GroupingRule = Tuple[str, str, str]
+
+
+class _DecisionCacheWatcher:
+    """
+    本機 watcher：enforcer 的 policy 變更時清除 check_permission 的決策快取
+
+    角色分配（g rules）只清除該教師的決策，其他變更清除全部
+    """
+
+    def __init__(self, service: "CasbinService"):
+        self._service = service
+
+    def update(self):
+        self._service.clear_decision_cache()
+
+    def _changed(self, ptype: str, rules: Iterable[List[str]]):
+        if ptype.startswith("g"):
+            self._service.clear_decision_cache({rule[0] for rule in rules})
+        else:
+            self._service.clear_decision_cache()
+
+    def update_for_add_policy(self, sec, ptype, rule):
+        self._changed(ptype, [rule])
+
+    def update_for_remove_policy(self, sec, ptype, rule):
+        self._changed(ptype, [rule])
+
+    def update_for_add_policies(self, sec, ptype, rules):
+        self._changed(ptype, rules)
+
+    def update_for_remove_policies(self, sec, ptype, rules):
+        self._changed(ptype, rules)
+
+
 class CasbinService:
     """
     Casbin 權限管理服務
 
     使用 RBAC with Domains 模型支援多租戶權限控制
+
+    check_permission 的結果依 (teacher, domain) 快取，enforcer 的 policy 有任何
+    變更時由 _DecisionCacheWatcher 清除
     """
 
     _instance: Optional["CasbinService"] = None
@@ -55,7 +95,15 @@ class CasbinService:
         # 載入政策
         self._enforcer.load_policy()
 
-        print(f"[Casbin] Initialized with {self._enforcer.get_policy()} policies")
+        # (teacher_id, domain) → {(resource, action): allowed}
+        self._decisions: Dict[Tuple[str, str], Dict[Tuple[str, str], bool]] = {}
+        self._decisions_lock = threading.Lock()
+        self._decision_generation = 0
+        self._enforcer.set_watcher(_DecisionCacheWatcher(self))
+
+        logger.info(
+            f"[Casbin] Initialized with {len(self._enforcer.get_policy())} policies"
+        )
 
     @property
     def enforcer(self) -> casbin.Enforcer:
@@ -89,15 +137,37 @@ class CasbinService:
             >>> service.check_permission(123, 'school-uuid-def', 'manage_teachers', 'write')
             False
         """
+        subject_key = (str(teacher_id), domain)
+        with self._decisions_lock:
+            cached = self._decisions.get(subject_key, {}).get((resource, action))
+            generation = self._decision_generation
+        if cached is not None:
+            return cached
+
         result = self.enforcer.enforce(str(teacher_id), domain, resource, action)
 
-        print(
+        logger.debug(
             f"[Casbin] Check: teacher={teacher_id}, domain={domain}, "
             f"resource={resource}, action={action} => {result}"
         )
 
+        with self._decisions_lock:
+            # 計算期間 policy 有變更則不快取
+            if generation == self._decision_generation:
+                self._decisions.setdefault(subject_key, {})[(resource, action)] = result
         return result
 
+    def clear_decision_cache(self, teacher_ids: Optional[Iterable[str]] = None):
+        """清除決策快取；指定 teacher_ids 時只清除這些教師"""
+        with self._decisions_lock:
+            self._decision_generation += 1
+            if teacher_ids is None:
+                self._decisions.clear()
+                return
+            subjects = {str(t) for t in teacher_ids}
+            for key in [k for k in self._decisions if k[0] in subjects]:
+                del self._decisions[key]
+
     def has_role(self, teacher_id: int, role: str, domain: str) -> bool:
         """
         檢查使用者在特定 domain 是否有特定角色
@@ -233,6 +303,69 @@ class CasbinService:
     # 資料庫同步
     # ============================================
 
+    def load_roles_from_database(
+        self, db, teacher_ids: Optional[Iterable[int]] = None
+    ) -> Set[GroupingRule]:
+        """
+        從 teacher_organizations / teacher_schools 取得應有的 g rules
+
+        Args:
+            teacher_ids: 只取這些教師（None = 全部）
+        """
+        from models.organization import TeacherOrganization, TeacherSchool
+
+        org_query = db.query(
+            TeacherOrganization.teacher_id,
+            TeacherOrganization.role,
+            TeacherOrganization.organization_id,
+        ).filter(TeacherOrganization.is_active.is_(True))
+        school_query = db.query(
+            TeacherSchool.teacher_id, TeacherSchool.roles, TeacherSchool.school_id
+        ).filter(TeacherSchool.is_active.is_(True))
+        if teacher_ids is not None:
+            teacher_ids = list(teacher_ids)
+            org_query = org_query.filter(
+                TeacherOrganization.teacher_id.in_(teacher_ids)
+            )
+            school_query = school_query.filter(
+                TeacherSchool.teacher_id.in_(teacher_ids)
+            )
+
+        rules: Set[GroupingRule] = {
+            (str(teacher_id), role, f"org-{org_id}")
+            for teacher_id, role, org_id in org_query.all()
+        }
+        for teacher_id, roles, school_id in school_query.all():
+            # TeacherSchool.roles 是列表
+            for role in roles or []:
+                rules.add((str(teacher_id), role, f"school-{school_id}"))
+        return rules
+
+    def apply_grouping_rules(
+        self, desired: Set[GroupingRule], subjects: Optional[Set[str]] = None
+    ) -> Tuple[int, int]:
+        """
+        把記憶體中的 g rules 調整成 desired（只增刪差異，批次操作）
+
+        Args:
+            subjects: 只調整這些使用者的 g rules（None = 全部）
+
+        Returns:
+            (新增數, 移除數)
+        """
+        current = {
+            tuple(rule[:3])
+            for rule in self.enforcer.get_grouping_policy()
+            if subjects is None or rule[0] in subjects
+        }
+        stale = current - desired
+        added = desired - current
+        if stale:
+            self.enforcer.remove_grouping_policies([list(rule) for rule in stale])
+        if added:
+            self.enforcer.add_grouping_policies([list(rule) for rule in added])
+        return len(added), len(stale)
+
     def sync_from_database(self, db=None):
         """
         從資料庫同步角色到 Casbin (with improved session management)
@@ -241,10 +374,12 @@ class CasbinService:
             db: Optional database session (for testing). If None, creates a new session.
 
         這個方法應該在應用啟動時呼叫，
-        將 teacher_organizations 和 teacher_schools 表的資料同步到 Casbin
+        將 teacher_organizations 和 teacher_schools 表的資料同步到 Casbin。
+        兩張表各一個查詢，與記憶體中的 g rules 比對後以
+        add_grouping_policies / remove_grouping_policies 批次增刪差異
+        （之後的增量同步見 services.casbin_sync）
         """
         from database import get_session_local
-        from models.organization import TeacherOrganization, TeacherSchool
 
         # Use provided session or create a new one
         session_provided = db is not None
@@ -256,50 +391,13 @@ class CasbinService:
             session_to_close = db
 
         try:
-            # 1. 只清空角色分配（g rules），保留權限政策（p rules）
-            # clear_policy() 會清除所有規則，包括從 CSV 載入的 p 規則
-            all_grouping = self.enforcer.get_grouping_policy()
-            for g in all_grouping:
-                self.enforcer.remove_grouping_policy(*g)
+            # 只調整角色分配（g rules），保留權限政策（p rules）
+            # 不需要保存到檔案（會覆蓋 casbin_policy.csv 中的 p 規則）
+            desired = self.load_roles_from_database(db)
+            added, removed = self.apply_grouping_rules(desired)
             logger.info(
-                f"[Casbin] Cleared {len(all_grouping)} existing role assignments"
-            )
-
-            # 2. 同步組織角色
-            org_roles = (
-                db.query(TeacherOrganization)
-                .filter(TeacherOrganization.is_active.is_(True))
-                .all()
-            )
-
-            for tr in org_roles:
-                self.add_role_for_user(
-                    tr.teacher_id, tr.role, f"org-{tr.organization_id}"
-                )
-
-            logger.info(f"[Casbin] Synced {len(org_roles)} organization roles")
-
-            # 3. 同步學校角色
-            school_roles = (
-                db.query(TeacherSchool).filter(TeacherSchool.is_active.is_(True)).all()
-            )
-
-            for ts in school_roles:
-                # TeacherSchool.roles 是列表，需要逐個添加
-                if ts.roles:
-                    for role in ts.roles:
-                        self.add_role_for_user(
-                            ts.teacher_id, role, f"school-{ts.school_id}"
-                        )
-
-            logger.info(f"[Casbin] Synced {len(school_roles)} school roles")
-
-            # 4. 不需要保存到檔案（會覆蓋 casbin_policy.csv 中的 p 規則）
-            # 角色分配只存在記憶體中，每次啟動時從資料庫同步
-            # self.enforcer.save_policy()  # REMOVED
-            logger.info(
-                f"[Casbin] Database sync complete: "
-                f"{len(org_roles)} org roles + {len(school_roles)} school roles"
+                f"[Casbin] Database sync complete: {len(desired)} role assignments "
+                f"(+{added} / -{removed})"
             )
 
         except Exception as e:
@@ -335,16 +433,26 @@ class CasbinService:
                         exc_info=True,
                     )
 
+    def sync_teachers(self, teacher_ids: Iterable[int], db) -> Tuple[int, int]:
+        """重算多位教師的角色（一次查詢），只增刪差異"""
+        teacher_ids = list(teacher_ids)
+        if not teacher_ids:
+            return 0, 0
+        desired = self.load_roles_from_database(db, teacher_ids)
+        return self.apply_grouping_rules(desired, {str(t) for t in teacher_ids})
+
     def sync_teacher_roles(self, teacher_id: int, db=None):
         """
         同步特定老師的角色 (with improved session management)
 
+        同步後通知其他 instance（PostgreSQL NOTIFY，見 services.casbin_sync）
+
         Args:
             teacher_id: 老師 ID
             db: Optional database session (for testing). If None, creates a new session.
         """
         from database import get_session_local
-        from models.organization import TeacherOrganization, TeacherSchool
+        from services.casbin_sync import publish_role_change
 
         # Use provided session or create a new one
         session_provided = db is not None
@@ -356,65 +464,12 @@ class CasbinService:
             session_to_close = db
 
         try:
-            # 1. 刪除該教師的所有舊角色
-            user = str(teacher_id)
-
-            # Get all grouping policies for this user (format: [user, role, domain])
-            all_grouping_policies = self.enforcer.get_grouping_policy()
-            removed_count = 0
-
-            for policy in all_grouping_policies:
-                if len(policy) >= 3 and policy[0] == user:
-                    # policy = [user, role, domain]
-                    role = policy[1]
-                    domain = policy[2]
-                    if self.delete_role_for_user(teacher_id, role, domain):
-                        removed_count += 1
-
-            logger.info(
-                f"[Casbin] Removed {removed_count} old roles for teacher {teacher_id}"
-            )
-
-            # 2. 查詢並添加組織角色
-            org_roles = (
-                db.query(TeacherOrganization)
-                .filter(
-                    TeacherOrganization.teacher_id == teacher_id,
-                    TeacherOrganization.is_active.is_(True),
-                )
-                .all()
-            )
-
-            for tr in org_roles:
-                self.add_role_for_user(teacher_id, tr.role, f"org-{tr.organization_id}")
-
-            logger.info(
-                f"[Casbin] Added {len(org_roles)} organization roles for teacher {teacher_id}"
-            )
-
-            # 3. 查詢並添加學校角色
-            school_roles = (
-                db.query(TeacherSchool)
-                .filter(
-                    TeacherSchool.teacher_id == teacher_id,
-                    TeacherSchool.is_active.is_(True),
-                )
-                .all()
-            )
-
-            school_role_count = 0
-            for ts in school_roles:
-                if ts.roles:
-                    for role in ts.roles:
-                        self.add_role_for_user(
-                            teacher_id, role, f"school-{ts.school_id}"
-                        )
-                        school_role_count += 1
-
+            added, removed = self.sync_teachers([teacher_id], db)
             logger.info(
-                f"[Casbin] Added {school_role_count} school roles for teacher {teacher_id}"
+                f"[Casbin] Sync complete for teacher {teacher_id} "
+                f"(+{added} / -{removed})"
             )
-            logger.info(f"[Casbin] Sync complete for teacher {teacher_id}")
+            publish_role_change(db, [teacher_id])
 
         except Exception as e:
             logger.error(
@@ -453,7 +508,8 @@ class CasbinService:
     def reload_policy(self):
         """重新載入政策檔案"""
         self.enforcer.load_policy()
-        print("[Casbin] Policy reloaded")
+        self.clear_decision_cache()
+        logger.info("[Casbin] Policy reloaded")
 
 
 # ============================================
@@ -484,5 +540,5 @@ def init_casbin_service():
     # 從資料庫同步角色（如果需要）
     # casbin_service.sync_from_database()
 
-    print("[Casbin] Service initialized")
+    logger.info("[Casbin] Service initialized")
     return casbin_service
@@ -0,0 +1,361 @@
+"""
+Casbin Role Sync
+
+讓每個 instance 記憶體中的 Casbin 角色（g rules）跟上 teacher_organizations /
+teacher_schools：
+- 啟動：CasbinService.sync_from_database() 全量載入（兩個查詢 + 批次增刪差異）
+- 增量：每 CASBIN_SYNC_INTERVAL 秒查詢 coalesce(updated_at, created_at) 晚於
+  watermark 的關聯，只重算這些教師的角色；watermark 往回重疊
+  CASBIN_SYNC_OVERLAP_SECONDS 秒，避免漏掉較晚 commit 的交易（重算是冪等的）
+- 直接刪除的資料列查不到時間戳，每 CASBIN_FULL_SYNC_INTERVAL 秒做一次全量比對
+- 跨 instance：sync_teacher_roles() 之後 NOTIFY casbin_role_changes，
+  其他 instance LISTEN 收到後立即重算該教師（PostgreSQL only；
+  其他資料庫只靠定期增量同步）
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from models.organization import TeacherOrganization, TeacherSchool
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "casbin_role_changes"
+
+# 本 instance 的識別（NOTIFY payload 用來略過自己發出的通知）
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# 兩張表都沒有資料時的 watermark
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _get_session_factory():
+    from database import get_session_local
+
+    return get_session_local()
+
+
+def publish_role_change(db: Session, teacher_ids: Iterable[int]):
+    """
+    通知其他 instance 重算這些教師的角色（PostgreSQL NOTIFY）
+
+    使用獨立的連線立即送出，不依賴呼叫端 session 的交易
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    teacher_ids = [str(t) for t in teacher_ids]
+    if not teacher_ids:
+        return
+    try:
+        with bind.connect() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {
+                    "channel": NOTIFY_CHANNEL,
+                    "payload": f"{INSTANCE_ID}|{','.join(teacher_ids)}",
+                },
+            )
+            conn.commit()
+    except Exception as e:
+        # 通知失敗時其他 instance 仍會在下一次增量同步取得變更
+        logger.warning(f"[Casbin] Failed to publish role change: {e}")
+
+
+def parse_notification(payload: str) -> List[int]:
+    """解析 NOTIFY payload；本 instance 發出的通知回傳空列表"""
+    sender, _, ids = payload.partition("|")
+    if sender == INSTANCE_ID:
+        return []
+    return [int(t) for t in ids.split(",") if t.strip().isdigit()]
+
+
+class CasbinRoleSync:
+    """Casbin 角色的增量同步（背景定期執行 + LISTEN 即時通知）"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        casbin_service=None,
+        interval: Optional[float] = None,
+        full_sync_interval: Optional[float] = None,
+        overlap_seconds: Optional[float] = None,
+    ):
+        self._session_factory = session_factory
+        self._casbin_service = casbin_service
+        self.interval = (
+            interval
+            if interval is not None
+            else float(os.getenv("CASBIN_SYNC_INTERVAL", "30"))
+        )
+        self.full_sync_interval = (
+            full_sync_interval
+            if full_sync_interval is not None
+            else float(os.getenv("CASBIN_FULL_SYNC_INTERVAL", "3600"))
+        )
+        self.overlap = timedelta(
+            seconds=(
+                overlap_seconds
+                if overlap_seconds is not None
+                else float(os.getenv("CASBIN_SYNC_OVERLAP_SECONDS", "60"))
+            )
+        )
+        self.watermark: Optional[datetime] = None
+        self._last_full_sync: Optional[float] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._listen_conn = None
+        self._full_syncs = 0
+        self._incremental_syncs = 0
+        self._teachers_synced = 0
+        self._notifications = 0
+
+    @property
+    def casbin_service(self):
+        if self._casbin_service is None:
+            from services.casbin_service import get_casbin_service
+
+            self._casbin_service = get_casbin_service()
+        return self._casbin_service
+
+    def _session(self) -> Session:
+        factory = self._session_factory or _get_session_factory()
+        return factory()
+
+    # ------------------------------------------------------------------
+    # 同步
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _max_changed_at(db: Session) -> datetime:
+        values = [
+            db.query(
+                func.max(func.coalesce(model.updated_at, model.created_at))
+            ).scalar()
+            for model in (TeacherOrganization, TeacherSchool)
+        ]
+        # SQLite 回傳 naive datetime / 字串，統一成 UTC aware
+        values = [_as_utc(v) for v in values if v is not None]
+        return max(values) if values else _EPOCH
+
+    @staticmethod
+    def _changed_teacher_ids(db: Session, since: datetime) -> Set[int]:
+        teacher_ids: Set[int] = set()
+        for model in (TeacherOrganization, TeacherSchool):
+            rows = (
+                db.query(model.teacher_id)
+                .filter(func.coalesce(model.updated_at, model.created_at) >= since)
+                .distinct()
+                .all()
+            )
+            teacher_ids.update(teacher_id for (teacher_id,) in rows)
+        return teacher_ids
+
+    def full_sync(self) -> None:
+        """全量比對（啟動時與每 full_sync_interval 秒）"""
+        db = self._session()
+        try:
+            # 先取 watermark 再載入，載入期間的變更會在下一次增量同步重算
+            try:
+                watermark = self._max_changed_at(db)
+            except SQLAlchemyError as e:
+                # 資料表不存在（preview 環境）：只載入 policy，不做增量同步
+                logger.warning(f"[Casbin] Role tables unavailable: {e}")
+                db.rollback()
+                watermark = None
+            self.casbin_service.sync_from_database(db=db)
+            self.watermark = watermark
+            self._last_full_sync = time.monotonic()
+            self._full_syncs += 1
+        finally:
+            db.close()
+
+    def sync_changes(self) -> int:
+        """增量同步 watermark 之後有變更的教師；回傳重算的教師數"""
+        if self.watermark is None:
+            return 0
+        db = self._session()
+        try:
+            watermark = self._max_changed_at(db)
+            teacher_ids = self._changed_teacher_ids(db, self.watermark - self.overlap)
+            self.casbin_service.sync_teachers(teacher_ids, db)
+            self.watermark = max(self.watermark, watermark)
+            self._incremental_syncs += 1
+            self._teachers_synced += len(teacher_ids)
+            return len(teacher_ids)
+        finally:
+            db.close()
+
+    def sync_teachers(self, teacher_ids: Iterable[int]) -> None:
+        """收到其他 instance 的通知後重算這些教師"""
+        teacher_ids = list(teacher_ids)
+        db = self._session()
+        try:
+            self.casbin_service.sync_teachers(teacher_ids, db)
+            self._teachers_synced += len(teacher_ids)
+        finally:
+            db.close()
+
+    def run_once(self) -> int:
+        """定期同步：到期時做全量比對，否則增量同步"""
+        if (
+            self._last_full_sync is None
+            or time.monotonic() - self._last_full_sync >= self.full_sync_interval
+        ):
+            self.full_sync()
+            return 0
+        return self.sync_changes()
+
+    # ------------------------------------------------------------------
+    # LISTEN / NOTIFY
+    # ------------------------------------------------------------------
+
+    def _start_listening(self, loop: asyncio.AbstractEventLoop):
+        from database import get_engine
+
+        engine = get_engine()
+        if engine.dialect.name != "postgresql":
+            return
+        try:
+            conn = engine.raw_connection()
+            driver_conn = conn.driver_connection
+            driver_conn.autocommit = True
+            with driver_conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            loop.add_reader(driver_conn.fileno(), self._on_notify, loop)
+            self._listen_conn = conn
+            logger.info(f"[Casbin] Listening on {NOTIFY_CHANNEL}")
+        except Exception as e:
+            logger.warning(f"[Casbin] LISTEN unavailable, polling only: {e}")
+
+    def _stop_listening(self, loop: asyncio.AbstractEventLoop):
+        if self._listen_conn is None:
+            return
+        conn, self._listen_conn = self._listen_conn, None
+        try:
+            loop.remove_reader(conn.driver_connection.fileno())
+        except Exception:
+            pass
+        # LISTEN / autocommit 改過的連線不放回 pool
+        conn.invalidate()
+
+    def _on_notify(self, loop: asyncio.AbstractEventLoop):
+        driver_conn = self._listen_conn.driver_connection
+        try:
+            driver_conn.poll()
+        except Exception as e:
+            logger.warning(f"[Casbin] LISTEN connection lost: {e}")
+            self._stop_listening(loop)
+            return
+        teacher_ids: Set[int] = set()
+        while driver_conn.notifies:
+            notification = driver_conn.notifies.pop(0)
+            teacher_ids.update(parse_notification(notification.payload))
+        if teacher_ids:
+            self._notifications += 1
+            loop.run_in_executor(None, self.sync_teachers, teacher_ids)
+
+    # ------------------------------------------------------------------
+    # 生命週期
+    # ------------------------------------------------------------------
+
+    async def _run_forever(self):
+        loop = asyncio.get_event_loop()
+        while not self._stopping:
+            try:
+                await asyncio.sleep(self.interval)
+                if self._stopping:
+                    break
+                if self._listen_conn is None:
+                    # 連線中斷後重新 LISTEN
+                    self._start_listening(loop)
+                await loop.run_in_executor(None, self.run_once)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"[Casbin] Role sync error: {e}")
+
+    def start(self):
+        """啟動背景同步（需先完成啟動時的全量同步）"""
+        if self._loop_task is not None:
+            return
+        self._stopping = False
+        if self._last_full_sync is None:
+            self._last_full_sync = time.monotonic()
+        loop = asyncio.get_event_loop()
+        self._start_listening(loop)
+        self._loop_task = asyncio.create_task(self._run_forever())
+        logger.info(
+            f"✅ Casbin role sync started (interval={self.interval}s, "
+            f"full={self.full_sync_interval}s)"
+        )
+
+    async def stop(self):
+        self._stopping = True
+        self._stop_listening(asyncio.get_event_loop())
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "listening": self._listen_conn is not None,
+            "full_syncs": self._full_syncs,
+            "incremental_syncs": self._incremental_syncs,
+            "teachers_synced": self._teachers_synced,
+            "notifications": self._notifications,
+        }
+
+
+def _as_utc(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+_role_sync: Optional[CasbinRoleSync] = None
+
+
+def get_casbin_role_sync() -> CasbinRoleSync:
+    """取得 CasbinRoleSync 單例"""
+    global _role_sync
+    if _role_sync is None:
+        _role_sync = CasbinRoleSync()
+    return _role_sync
+
+
+def start_casbin_role_sync():
+    """應用程式啟動時呼叫（CASBIN_SYNC_ENABLED=false 時不啟動）"""
+    if os.getenv("CASBIN_SYNC_ENABLED", "true").lower() != "true":
+        logger.info("Casbin role sync disabled (CASBIN_SYNC_ENABLED=false)")
+        return
+    get_casbin_role_sync().start()
+
+
+async def stop_casbin_role_sync():
+    """應用程式關閉時呼叫"""
+    if _role_sync is not None:
+        await _role_sync.stop()
+
+
+def get_casbin_sync_stats() -> Dict[str, Any]:
+    """監控用統計（/health）"""
+    if _role_sync is None:
+        return {"enabled": False}
+    return {"enabled": _role_sync._loop_task is not None, **_role_sync.get_stats()}
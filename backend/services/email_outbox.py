@@ -0,0 +1,662 @@
+"""
+Email Outbox
+
+寄信不再佔用 request：EmailService 把組好的 MIME 郵件寫入 email_outbox 資料表，
+背景 sender 批次領取後以常駐的 SMTP 連線寄出。
+
+- SMTPConnectionPool 保留已完成 STARTTLS + login 的連線（EMAIL_SMTP_POOL_SIZE），
+  連線閒置超過 EMAIL_SMTP_IDLE_SECONDS 或已寄出 EMAIL_SMTP_MAX_MESSAGES 封後重新連線
+- 同一批郵件分配到各連線上連續寄送，不再每封重新握手
+- 暫時性錯誤（連線中斷、4xx）依指數退避重試，永久錯誤（5xx）或超過 max_attempts 標記為 failed
+- 每個 SMTP provider（host）以 token bucket 限制寄送速率（EMAIL_RATE_LIMIT_PER_SECOND）
+- 以條件式 UPDATE 領取（status='queued' → 'sending'），多個 instance 不會重複寄送；
+  sending 超過 lease 仍未完成的郵件重新排入佇列
+
+EMAIL_OUTBOX_ENABLED=true 時 EmailService 改為寫入 outbox，否則維持直接寄送。
+"""
+
+import asyncio
+import logging
+import os
+import smtplib
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.message import Message
+from email.utils import getaddresses
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models import EmailOutboxMessage
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_QUEUED = "queued"
+OUTBOX_SENDING = "sending"
+OUTBOX_SENT = "sent"
+OUTBOX_FAILED = "failed"
+
+
+def _get_session_factory():
+    from database import get_session_local
+
+    return get_session_local()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def outbox_enabled() -> bool:
+    return os.getenv("EMAIL_OUTBOX_ENABLED", "false").lower() == "true"
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """連線中斷、逾時、4xx 回應與登入失敗（設定問題）稍後重試；其餘 5xx 不重試"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(400 <= code < 500 for code in codes)
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    # socket 層錯誤（連線被拒、逾時）
+    return isinstance(error, OSError)
+
+
+# ----------------------------------------------------------------------
+# Rate limit（每個 SMTP provider 一個 token bucket）
+# ----------------------------------------------------------------------
+
+
+class TokenBucket:
+    """跨線程共用的 token bucket，acquire() 在額度不足時阻塞等待"""
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        burst: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate_per_second
+        self.capacity = burst or max(int(rate_per_second), 1)
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                self.waited_seconds += wait
+            self._sleep(wait)
+
+
+_rate_limiters: Dict[str, TokenBucket] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> TokenBucket:
+    """取得 SMTP provider 的 token bucket（同一 host 的連線池共用額度）"""
+    with _rate_limiters_lock:
+        bucket = _rate_limiters.get(provider)
+        if bucket is None:
+            bucket = TokenBucket(
+                float(os.getenv("EMAIL_RATE_LIMIT_PER_SECOND", "5")),
+                int(os.getenv("EMAIL_RATE_LIMIT_BURST", "0")) or None,
+            )
+            _rate_limiters[provider] = bucket
+        return bucket
+
+
+# ----------------------------------------------------------------------
+# SMTP 連線池
+# ----------------------------------------------------------------------
+
+
+class _PooledConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.last_used = time.monotonic()
+        self.closed = False
+
+
+class SMTPConnectionPool:
+    """保留已登入的 SMTP 連線，寄信時不必每封重新 STARTTLS + login"""
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        size: Optional[int] = None,
+        idle_seconds: Optional[float] = None,
+        max_messages: Optional[int] = None,
+        timeout: Optional[float] = None,
+        use_tls: Optional[bool] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+    ):
+        self.host = host or os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.port = port or int(os.getenv("SMTP_PORT", "587"))
+        self.user = user if user is not None else os.getenv("SMTP_USER", "")
+        self.password = (
+            password if password is not None else os.getenv("SMTP_PASSWORD", "")
+        )
+        self.size = size or int(os.getenv("EMAIL_SMTP_POOL_SIZE", "2"))
+        self.idle_seconds = idle_seconds or float(
+            os.getenv("EMAIL_SMTP_IDLE_SECONDS", "60")
+        )
+        self.max_messages = max_messages or int(
+            os.getenv("EMAIL_SMTP_MAX_MESSAGES", "100")
+        )
+        self.timeout = timeout or float(os.getenv("EMAIL_SMTP_TIMEOUT", "30"))
+        self.use_tls = (
+            use_tls
+            if use_tls is not None
+            else os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+        )
+        self.rate_limiter = rate_limiter or get_rate_limiter(self.host)
+
+        self._idle: List[_PooledConnection] = []
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+
+        # 統計
+        self.connections_opened = 0
+        self.messages_sent = 0
+
+    def _open(self) -> _PooledConnection:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except BaseException:
+            server.close()
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return _PooledConnection(server)
+
+    @staticmethod
+    def _close(conn: _PooledConnection):
+        if conn.closed:
+            return
+        conn.closed = True
+        try:
+            conn.server.quit()
+        except Exception:
+            conn.server.close()
+
+    def _checkout(self) -> _PooledConnection:
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._open()
+                idle_for = time.monotonic() - conn.last_used
+                if idle_for < self.idle_seconds and conn.sent < self.max_messages:
+                    return conn
+                self._close(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn: _PooledConnection):
+        if not conn.closed:
+            conn.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(conn)
+        self._slots.release()
+
+    def send(self, from_addr: str, to_addrs: List[str], message: str):
+        """以池中的連線寄出一封郵件（連線在閒置時被 server 關閉則重新連線再送一次）"""
+        self.rate_limiter.acquire()
+        conn = self._checkout()
+        try:
+            try:
+                conn.server.sendmail(from_addr, to_addrs, message)
+            except smtplib.SMTPServerDisconnected:
+                self._close(conn)
+                conn = self._open()
+                conn.server.sendmail(from_addr, to_addrs, message)
+            conn.sent += 1
+        except smtplib.SMTPServerDisconnected:
+            self._close(conn)
+            raise
+        except smtplib.SMTPResponseException as e:
+            # 421 表示 server 即將關閉連線
+            if e.smtp_code == 421:
+                self._close(conn)
+            raise
+        except smtplib.SMTPException:
+            # 例如收件者全被拒絕：連線仍可繼續使用
+            raise
+        except OSError:
+            # SMTPException 也是 OSError，這裡只剩 socket 層錯誤
+            self._close(conn)
+            raise
+        finally:
+            self._checkin(conn)
+        with self._lock:
+            self.messages_sent += 1
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "size": self.size,
+            "idle_connections": len(self._idle),
+            "connections_opened": self.connections_opened,
+            "messages_sent": self.messages_sent,
+            "rate_limit_wait_seconds": round(self.rate_limiter.waited_seconds, 3),
+        }
+
+
+# ----------------------------------------------------------------------
+# Outbox
+# ----------------------------------------------------------------------
+
+
+def enqueue_email(
+    message: Message,
+    db: Optional[Session] = None,
+    from_email: Optional[str] = None,
+) -> EmailOutboxMessage:
+    """
+    把 MIME 郵件寫入 outbox（立即 commit），由背景 sender 寄出
+
+    Args:
+        message: 已組好的郵件（To / From / Subject header）
+        db: 呼叫端的 session；None 時使用新的 session
+        from_email: 信封寄件者（預設取 From header 的地址）
+    """
+    to_addrs = [addr for _, addr in getaddresses(message.get_all("To", [])) if addr]
+    if from_email is None:
+        from_email = getaddresses([message["From"] or ""])[0][1]
+    entry = EmailOutboxMessage(
+        from_email=from_email,
+        to_email=", ".join(to_addrs),
+        subject=str(message["Subject"] or "")[:500],
+        raw_message=message.as_string(),
+        status=OUTBOX_QUEUED,
+        max_attempts=int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5")),
+        next_attempt_at=_utcnow(),
+    )
+
+    own_session = db is None
+    if own_session:
+        db = _get_session_factory()()
+    try:
+        db.add(entry)
+        db.commit()
+        if own_session:
+            db.expunge(entry)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+    if _sender is not None:
+        _sender.notify()
+    return entry
+
+
+@dataclass
+class _OutboxItem:
+    """sender 線程之間傳遞的郵件（不含 ORM 物件）"""
+
+    id: int
+    from_email: str
+    to_addrs: List[str]
+    raw_message: str
+    attempts: int
+    max_attempts: int
+
+
+class EmailOutboxSender:
+    """在應用程式內批次寄送 email_outbox 的背景 sender"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        smtp_pool: Optional[SMTPConnectionPool] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        lease_seconds: Optional[int] = None,
+        retry_base_seconds: Optional[float] = None,
+    ):
+        """
+        Args:
+            session_factory: 建立 DB session 的函式（None 表示使用預設 SessionLocal）
+            smtp_pool: SMTP 連線池（預設依 SMTP_* 環境變數建立）
+            batch_size: 每次領取的郵件數
+            poll_interval: 沒有郵件時的輪詢間隔（秒）
+            lease_seconds: sending 超過多久未完成視為 sender 已消失
+            retry_base_seconds: 重試退避的基準秒數（第 n 次重試等待 base * 2^(n-1)）
+        """
+        self._session_factory = session_factory
+        self.smtp_pool = smtp_pool or SMTPConnectionPool()
+        self.batch_size = batch_size or int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+        self.poll_interval = poll_interval or float(
+            os.getenv("EMAIL_OUTBOX_POLL_INTERVAL", "2.0")
+        )
+        self.lease_seconds = lease_seconds or int(
+            os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "300")
+        )
+        self.retry_base_seconds = (
+            retry_base_seconds
+            if retry_base_seconds is not None
+            else float(os.getenv("EMAIL_OUTBOX_RETRY_BASE_SECONDS", "30"))
+        )
+
+        self.sender_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+
+        # 統計
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+        self._recovered = 0
+
+    def _session(self) -> Session:
+        if self._session_factory is None:
+            self._session_factory = _get_session_factory()
+        return self._session_factory()
+
+    # ------------------------------------------------------------------
+    # 領取 / 回收
+    # ------------------------------------------------------------------
+
+    def _recover_stale(self, db: Session) -> int:
+        """把 lease 過期的 sending 郵件重新排入佇列"""
+        cutoff = _utcnow() - timedelta(seconds=self.lease_seconds)
+        result = db.execute(
+            update(EmailOutboxMessage)
+            .where(
+                EmailOutboxMessage.status == OUTBOX_SENDING,
+                EmailOutboxMessage.locked_at < cutoff,
+            )
+            .values(status=OUTBOX_QUEUED, locked_by=None, next_attempt_at=_utcnow())
+        )
+        db.commit()
+        recovered = max(result.rowcount or 0, 0)
+        if recovered:
+            self._recovered += recovered
+            logger.warning(f"♻️ Re-queued {recovered} emails with expired lease")
+        return recovered
+
+    def _claim(self) -> List[_OutboxItem]:
+        db = self._session()
+        try:
+            self._recover_stale(db)
+            now = _utcnow()
+            candidate_ids = [
+                message_id
+                for (message_id,) in db.query(EmailOutboxMessage.id)
+                .filter(
+                    EmailOutboxMessage.status == OUTBOX_QUEUED,
+                    EmailOutboxMessage.next_attempt_at <= now,
+                )
+                .order_by(EmailOutboxMessage.id)
+                .limit(self.batch_size)
+            ]
+            if not candidate_ids:
+                return []
+            # 條件式 UPDATE：其他 sender 先領走的郵件不會被更新
+            db.execute(
+                update(EmailOutboxMessage)
+                .where(
+                    EmailOutboxMessage.id.in_(candidate_ids),
+                    EmailOutboxMessage.status == OUTBOX_QUEUED,
+                )
+                .values(
+                    status=OUTBOX_SENDING,
+                    locked_by=self.sender_id,
+                    locked_at=now,
+                    attempts=EmailOutboxMessage.attempts + 1,
+                )
+            )
+            db.commit()
+            rows = (
+                db.query(EmailOutboxMessage)
+                .filter(
+                    EmailOutboxMessage.id.in_(candidate_ids),
+                    EmailOutboxMessage.status == OUTBOX_SENDING,
+                    EmailOutboxMessage.locked_by == self.sender_id,
+                )
+                .order_by(EmailOutboxMessage.id)
+                .all()
+            )
+            return [
+                _OutboxItem(
+                    id=row.id,
+                    from_email=row.from_email,
+                    to_addrs=[a.strip() for a in row.to_email.split(",") if a.strip()],
+                    raw_message=row.raw_message,
+                    attempts=row.attempts,
+                    max_attempts=row.max_attempts,
+                )
+                for row in rows
+            ]
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to claim outbox emails: {e}")
+            return []
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    # 寄送
+    # ------------------------------------------------------------------
+
+    def _send_chunk(
+        self, items: List[_OutboxItem]
+    ) -> List[Tuple[_OutboxItem, Optional[BaseException]]]:
+        """在 executor 中依序寄出（同一線程連續使用同一條池中連線）"""
+        outcomes = []
+        for item in items:
+            try:
+                self.smtp_pool.send(item.from_email, item.to_addrs, item.raw_message)
+                outcomes.append((item, None))
+            except Exception as e:
+                outcomes.append((item, e))
+        return outcomes
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.retry_base_seconds * (2 ** max(attempts - 1, 0)), 3600)
+
+    def _record(self, outcomes: List[Tuple[_OutboxItem, Optional[BaseException]]]):
+        db = self._session()
+        try:
+            now = _utcnow()
+            sent_ids = [item.id for item, error in outcomes if error is None]
+            if sent_ids:
+                db.execute(
+                    update(EmailOutboxMessage)
+                    .where(EmailOutboxMessage.id.in_(sent_ids))
+                    .values(
+                        status=OUTBOX_SENT,
+                        sent_at=now,
+                        last_error=None,
+                        locked_by=None,
+                    )
+                )
+                self._sent += len(sent_ids)
+            for item, error in outcomes:
+                if error is None:
+                    continue
+                message = f"{type(error).__name__}: {error}"
+                if is_transient_error(error) and item.attempts < item.max_attempts:
+                    delay = self._retry_delay(item.attempts)
+                    values = {
+                        "status": OUTBOX_QUEUED,
+                        "next_attempt_at": now + timedelta(seconds=delay),
+                    }
+                    self._retried += 1
+                    logger.warning(
+                        f"🔁 Email {item.id} attempt {item.attempts}/"
+                        f"{item.max_attempts} failed, retry in {delay:.0f}s: {message}"
+                    )
+                else:
+                    values = {"status": OUTBOX_FAILED}
+                    self._failed += 1
+                    logger.error(
+                        f"❌ Email {item.id} to {', '.join(item.to_addrs)} failed "
+                        f"after {item.attempts} attempts: {message}"
+                    )
+                db.execute(
+                    update(EmailOutboxMessage)
+                    .where(EmailOutboxMessage.id == item.id)
+                    .values(last_error=message, locked_by=None, **values)
+                )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to record outbox results: {e}")
+        finally:
+            db.close()
+
+    async def run_once(self) -> int:
+        """領取並寄出目前到期的郵件（測試與手動排空佇列用），回傳處理的郵件數"""
+        loop = asyncio.get_event_loop()
+        items = await loop.run_in_executor(None, self._claim)
+        if not items:
+            return 0
+        # 平均分配到各連線：每個 chunk 在一個線程中連續寄送
+        chunk_count = min(self.smtp_pool.size, len(items))
+        chunks = [items[i::chunk_count] for i in range(chunk_count)]
+        results = await asyncio.gather(
+            *(loop.run_in_executor(None, self._send_chunk, c) for c in chunks)
+        )
+        outcomes = [outcome for chunk in results for outcome in chunk]
+        await loop.run_in_executor(None, self._record, outcomes)
+        return len(items)
+
+    async def _run_forever(self):
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Email outbox loop error: {e}")
+                processed = 0
+            if processed >= self.batch_size:
+                # 還有積壓的郵件，直接處理下一批
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    # ------------------------------------------------------------------
+    # 生命週期
+    # ------------------------------------------------------------------
+
+    def notify(self):
+        """有新郵件時喚醒輪詢（跨線程安全）"""
+        if self._wake is None or self._loop_task is None:
+            return
+        try:
+            self._loop_task.get_loop().call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass
+
+    def start(self):
+        if self._loop_task is not None:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._run_forever())
+        logger.info(
+            f"✅ Email outbox sender started ({self.sender_id}, "
+            f"smtp={self.smtp_pool.host}, pool={self.smtp_pool.size})"
+        )
+
+    async def stop(self):
+        """寄完目前這批後停止，關閉池中的 SMTP 連線"""
+        self._stopping = True
+        if self._wake is not None:
+            self._wake.set()
+        if self._loop_task is not None:
+            await self._loop_task
+            self._loop_task = None
+        self.smtp_pool.close_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "sender_id": self.sender_id,
+            "sent": self._sent,
+            "failed": self._failed,
+            "retried": self._retried,
+            "recovered": self._recovered,
+            "smtp": self.smtp_pool.get_stats(),
+        }
+
+
+_sender: Optional[EmailOutboxSender] = None
+
+
+def get_email_outbox_sender() -> EmailOutboxSender:
+    """取得 EmailOutboxSender 單例"""
+    global _sender
+    if _sender is None:
+        _sender = EmailOutboxSender()
+    return _sender
+
+
+def start_email_outbox():
+    """應用程式啟動時呼叫（EMAIL_OUTBOX_ENABLED=true 才啟動）"""
+    if not outbox_enabled():
+        logger.info("Email outbox disabled, emails are sent inline")
+        return
+    get_email_outbox_sender().start()
+
+
+async def stop_email_outbox():
+    """應用程式關閉時呼叫"""
+    if _sender is not None:
+        await _sender.stop()
+
+
+def get_email_outbox_stats() -> Dict[str, Any]:
+    """監控用統計（/health）"""
+    if _sender is None:
+        return {"enabled": False}
+    return {"enabled": _sender._loop_task is not None, **_sender.get_stats()}
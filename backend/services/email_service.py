@@ -12,6 +12,7 @@ import smtplib
 from sqlalchemy.orm import Session
 
 from models import Student, Teacher
+from services.email_outbox import enqueue_email, outbox_enabled
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +30,26 @@ class EmailService:
         self.from_name = os.getenv("FROM_NAME", "Duotopia")
         self.frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
+    def _deliver(self, msg: MIMEMultipart, db: Optional[Session] = None):
+        """
+        寄出組好的郵件
+
+        EMAIL_OUTBOX_ENABLED=true 時寫入 email_outbox 由背景 sender 以常駐連線寄送
+        （不佔用 request）；否則直接連線 SMTP 寄送。
+
+        Args:
+            msg: 郵件（含 Subject / From / To header）
+            db: 呼叫端的 session（寫入 outbox 用，None 時使用新的 session）
+        """
+        if outbox_enabled():
+            enqueue_email(msg, db=db, from_email=self.from_email)
+            return
+
+        with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
+            server.starttls()
+            server.login(self.smtp_user, self.smtp_password)
+            server.send_message(msg)
+
     def send_email(self, to_email: str, subject: str, html_content: str) -> bool:
         """
         發送通用 HTML 郵件
@@ -57,10 +78,7 @@ class EmailService:
                 print(f"📝 主旨: {subject}")
                 return True
 
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            self._deliver(msg)
 
             logger.info(f"Email sent successfully to {to_email}")
             return True
@@ -176,10 +194,7 @@ class EmailService:
 
             msg.attach(MIMEText(html_content, "html"))
 
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            self._deliver(msg, db)
 
             logger.info(f"驗證 email 已發送到 {target_email}")
             return True
@@ -385,10 +400,7 @@ class EmailService:
                 return True
 
             # 發送實際 email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            self._deliver(msg, db)
 
             logger.info(f"教師驗證 email 已發送到 {teacher.email}")
             return True
@@ -648,10 +660,7 @@ class EmailService:
                 return True
 
             # 發送 email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            self._deliver(msg, db)
 
             logger.info(f"密碼設定郵件已發送到: {teacher.email} (機構: {organization_name})")
             return True
@@ -782,10 +791,7 @@ class EmailService:
                 return True
 
             # 發送 email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            self._deliver(msg, db)
 
             logger.info(f"密碼重設郵件已發送到: {teacher.email}")
             return True
@@ -907,10 +913,7 @@ class EmailService:
             msg.attach(html_part)
 
             # 發送郵件
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            self._deliver(msg)
 
             logger.info(f"✅ Refund notification email sent to: {teacher_email}")
             return True
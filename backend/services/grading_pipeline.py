@@ -0,0 +1,225 @@
+"""
+AI Grading Pipeline
+
+批次批改時補齊缺少 AI 評分的題目：下載錄音 → 解碼 → Azure 發音評估，
+所有題目並發處理，結果以一次 bulk UPDATE 寫回資料庫。
+
+- 下載：共用 utils.http_client 連線池（不再每題建立新的 httpx.AsyncClient）
+- 解碼：音訊線程池，每段錄音只解碼一次
+- 評估：語音線程池，經過全域 Azure Speech 並發控制器（與學生即時評分共用上限）
+- 同時處理的題目數由 GRADING_PIPELINE_CONCURRENCY 限制，
+  避免一次批改佔滿控制器的排隊名額、擠掉學生的即時請求
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from core.azure_admission import AdmissionRejectedError
+from core.thread_pool import get_audio_thread_pool, get_speech_thread_pool
+from models import StudentItemProgress
+from utils.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# 錄音副檔名 → content type（與 services/audio_upload.py 的 ext_map 對應）
+_RECORDING_CONTENT_TYPES = {
+    "webm": "audio/webm",
+    "mp4": "audio/mp4",
+    "m4a": "audio/mp4",
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+}
+
+_SCORE_FIELDS = (
+    "accuracy_score",
+    "fluency_score",
+    "pronunciation_score",
+    "completeness_score",
+)
+
+
+def _recording_content_type(recording_url: str) -> str:
+    """依錄音檔副檔名判斷格式（無法判斷時視為瀏覽器錄音的 webm）"""
+    extension = recording_url.split("?")[0].rsplit(".", 1)[-1].lower()
+    return _RECORDING_CONTENT_TYPES.get(extension, "audio/webm")
+
+
+class GradingPipeline:
+    """並發補齊 StudentItemProgress 的 AI 評分"""
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        admission_retries: Optional[int] = None,
+    ):
+        """
+        Args:
+            concurrency: 同時處理（下載 / 解碼 / 評估）的題目數
+            admission_retries: Azure 並發控制器拒絕時的重試次數
+        """
+        self.concurrency = concurrency or int(
+            os.getenv("GRADING_PIPELINE_CONCURRENCY", "10")
+        )
+        self.admission_retries = (
+            admission_retries
+            if admission_retries is not None
+            else int(os.getenv("GRADING_ADMISSION_RETRIES", "3"))
+        )
+
+    async def _download(self, recording_url: str) -> bytes:
+        response = await get_http_client().get(recording_url)
+        response.raise_for_status()
+        return response.content
+
+    async def _assess(self, decoded_audio, reference_text: str) -> Dict[str, Any]:
+        """經過 Azure 並發控制器呼叫發音評估；被拒絕時依 Retry-After 等待後重試"""
+        # 延遲 import：routers.speech_assessment 會 import 大量 router 依賴
+        from routers import speech_assessment
+
+        loop = asyncio.get_event_loop()
+        speech_pool = get_speech_thread_pool()
+
+        for attempt in range(self.admission_retries + 1):
+            try:
+                async with speech_assessment._get_azure_speech_semaphore():
+                    return await asyncio.wait_for(
+                        loop.run_in_executor(
+                            speech_pool,
+                            speech_assessment.assess_pronunciation,
+                            decoded_audio,
+                            reference_text,
+                        ),
+                        timeout=speech_assessment.AZURE_SPEECH_TIMEOUT,
+                    )
+            except AdmissionRejectedError as e:
+                if attempt >= self.admission_retries:
+                    raise
+                logger.info(
+                    f"Azure Speech busy during batch grading, retry in "
+                    f"{e.retry_after}s ({attempt + 1}/{self.admission_retries})"
+                )
+                await asyncio.sleep(e.retry_after)
+
+    async def _process_item(
+        self, item: StudentItemProgress, reference_text: str
+    ) -> Dict[str, Any]:
+        from routers import speech_assessment
+
+        audio_data = await self._download(item.recording_url)
+
+        loop = asyncio.get_event_loop()
+        decoded_audio = await loop.run_in_executor(
+            get_audio_thread_pool(),
+            speech_assessment.decode_audio,
+            audio_data,
+            _recording_content_type(item.recording_url),
+        )
+        return await self._assess(decoded_audio, reference_text)
+
+    async def assess_items(
+        self,
+        items: Iterable[StudentItemProgress],
+        content_items_by_id: Dict[int, Any],
+        on_item_done: Optional[Callable[[StudentItemProgress, bool], None]] = None,
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        並發評估所有題目（不寫入資料庫）
+
+        Args:
+            items: 有錄音但沒有 AI 評分的 StudentItemProgress
+            content_items_by_id: 預載的 ContentItem（content_item_id → ContentItem）
+            on_item_done: 每題完成時的回呼 (item, succeeded)，用於回報進度
+
+        Returns:
+            item_progress.id → Azure 評估結果；失敗的題目不會出現在結果中
+        """
+        items = list(items)
+        if not items:
+            return {}
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results: Dict[int, Dict[str, Any]] = {}
+
+        async def run(item: StudentItemProgress):
+            succeeded = False
+            try:
+                content_item = content_items_by_id.get(item.content_item_id)
+                if content_item is None:
+                    logger.error(f"ContentItem not found for item_progress {item.id}")
+                    return
+                async with semaphore:
+                    results[item.id] = await self._process_item(item, content_item.text)
+                succeeded = True
+            except Exception as e:
+                logger.error(f"Failed to assess item_progress {item.id}: {e}")
+            finally:
+                if on_item_done:
+                    on_item_done(item, succeeded)
+
+        start = time.time()
+        await asyncio.gather(*(run(item) for item in items))
+        logger.info(
+            f"Grading pipeline assessed {len(results)}/{len(items)} items "
+            f"in {time.time() - start:.2f}s (concurrency={self.concurrency})"
+        )
+        return results
+
+    @staticmethod
+    def apply_results(
+        items: Iterable[StudentItemProgress],
+        results: Dict[int, Dict[str, Any]],
+        db: Session,
+    ) -> int:
+        """
+        以一次 bulk UPDATE（by primary key）寫回評估結果（不 commit）
+
+        寫入後同步更新 session 中的物件，呼叫端不需要再 db.refresh()。
+
+        Returns:
+            更新的筆數
+        """
+        assessed_at = datetime.now(timezone.utc)
+        rows: List[Dict[str, Any]] = []
+        targets = []
+        for item in items:
+            result = results.get(item.id)
+            if result is None:
+                continue
+            values = {
+                field: Decimal(str(result.get(field, 0))) for field in _SCORE_FIELDS
+            }
+            values["transcription"] = result.get("recognized_text", "")
+            values["ai_feedback"] = json.dumps(result)
+            values["ai_assessed_at"] = assessed_at
+            rows.append({"id": item.id, **values})
+            targets.append((item, values))
+
+        if not rows:
+            return 0
+
+        db.execute(update(StudentItemProgress), rows)
+        for item, values in targets:
+            for key, value in values.items():
+                set_committed_value(item, key, value)
+        return len(rows)
+
+
+_grading_pipeline: Optional[GradingPipeline] = None
+
+
+def get_grading_pipeline() -> GradingPipeline:
+    """取得 GradingPipeline 單例"""
+    global _grading_pipeline
+    if _grading_pipeline is None:
+        _grading_pipeline = GradingPipeline()
+    return _grading_pipeline
@@ -0,0 +1,666 @@
+"""
+Background Job Queue
+
+以 background_jobs 資料表為佇列、在應用程式內執行的 worker pool，
+處理不適合放在 HTTP request 裡的長時間工作（批次批改、每月續訂、報告、課程複製）。
+
+- HTTP handler 呼叫 enqueue_job() 後立即回傳 202 + job id，不再占用連線池
+- worker 以條件式 UPDATE 領取工作（status='queued' → 'running'），多個 instance 不會重複執行
+- 每種 job type 屬於一個並發類別（concurrency class），各類別有獨立的並發上限
+- 失敗時依指數退避重試，超過 max_attempts（或 4xx HTTPException）後標記為 failed
+- 執行中的工作定期更新 locked_at（lease），instance 被關閉時由其他 worker 重新排入佇列
+- 同一個建立者、同一種 job type、相同 idempotency_key 的請求回傳同一個 job
+  （已失敗的 job 不算，會建立新的 job 重試）
+
+使用方式：
+
+    @register_job("monthly_renewal", concurrency_class="billing")
+    async def monthly_renewal_job(ctx: JobContext) -> dict:
+        return await ctx.run_sync(run_monthly_renewal)
+
+    job = enqueue_job(db, "monthly_renewal", idempotency_key="monthly-renewal:2026-03")
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# 各並發類別的預設上限（可用 JOB_CONCURRENCY_<CLASS> 環境變數覆寫）
+DEFAULT_CONCURRENCY = {
+    "default": 4,
+    "grading": 2,  # 每個批改工作內部已並發呼叫 Azure
+    "billing": 1,  # 扣款類工作一次只跑一個
+    "report": 1,
+    "copy": 2,
+}
+
+
+class JobSpec:
+    """已註冊的 job type"""
+
+    def __init__(
+        self,
+        job_type: str,
+        handler: Callable[["JobContext"], Awaitable[Any]],
+        concurrency_class: str,
+        max_attempts: int,
+    ):
+        self.job_type = job_type
+        self.handler = handler
+        self.concurrency_class = concurrency_class
+        self.max_attempts = max_attempts
+
+
+_registry: Dict[str, JobSpec] = {}
+
+
+def register_job(
+    job_type: str, concurrency_class: str = "default", max_attempts: int = 3
+):
+    """註冊 job handler（decorator）；handler 為 async def handler(ctx) -> 可 JSON 序列化的結果"""
+
+    def decorator(handler):
+        _registry[job_type] = JobSpec(
+            job_type, handler, concurrency_class, max_attempts
+        )
+        return handler
+
+    return decorator
+
+
+def get_job_spec(job_type: str) -> Optional[JobSpec]:
+    return _registry.get(job_type)
+
+
+def _get_session_factory():
+    from database import get_session_local
+
+    return get_session_local()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobContext:
+    """傳給 handler 的執行環境：payload、短生命週期 DB session、進度回報"""
+
+    # 進度最多每秒寫入一次
+    PROGRESS_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        job_id: str,
+        payload: Optional[Dict[str, Any]],
+        attempt: int,
+        session_factory: Callable[[], Session],
+    ):
+        self.job_id = job_id
+        self.payload = payload or {}
+        self.attempt = attempt
+        self._session_factory = session_factory
+        self._progress = 0
+        self._progress_written_at = 0.0
+
+    def session(self) -> Session:
+        """建立新的 DB session（呼叫端負責 close）"""
+        return self._session_factory()
+
+    def set_progress(self, percent: float):
+        """
+        回報進度（0-100），同時更新 lease
+
+        可在 event loop 或 run_sync 的線程中呼叫。
+        """
+        percent = max(0, min(100, int(percent)))
+        now = time.monotonic()
+        if percent <= self._progress or (
+            percent < 100 and now - self._progress_written_at < self.PROGRESS_INTERVAL
+        ):
+            return
+        self._progress = percent
+        self._progress_written_at = now
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            # 在 event loop 上呼叫：寫入交給 executor，不阻塞 loop
+            loop.run_in_executor(None, self._write_progress, percent)
+        else:
+            self._write_progress(percent)
+
+    def _write_progress(self, percent: int):
+        db = self.session()
+        try:
+            db.execute(
+                update(BackgroundJob)
+                .where(
+                    BackgroundJob.id == self.job_id,
+                    # executor 中的寫入可能晚於 _finish：不覆寫已完成的 job
+                    BackgroundJob.status == JOB_RUNNING,
+                    BackgroundJob.progress < percent,
+                )
+                .values(progress=percent, locked_at=_utcnow())
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Failed to update progress for job {self.job_id}: {e}")
+        finally:
+            db.close()
+
+    async def run_sync(self, func: Callable[..., Any], *args) -> Any:
+        """
+        在 executor 中以新的 session 執行同步函式 func(db, *args)
+
+        同步的長時間工作（大量 DB 操作、第三方 SDK）不會阻塞 event loop。
+        """
+
+        def call():
+            db = self.session()
+            try:
+                return func(db, *args)
+            finally:
+                db.close()
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, call)
+
+
+def job_to_dict(job: BackgroundJob) -> Dict[str, Any]:
+    """API 回應格式"""
+    return {
+        "job_id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "progress": job.progress or 0,
+        "attempts": job.attempts or 0,
+        "max_attempts": job.max_attempts,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _scoped_idempotency_key(
+    job_type: str, created_by: Optional[str], idempotency_key: str
+) -> str:
+    """
+    儲存用的 idempotency key：依 job type 與建立者區隔
+
+    Idempotency-Key 由 client 提供，不同使用者（或不同 job type）使用相同的 key
+    不應取得彼此的 job。
+    """
+    raw = f"{job_type}\x00{created_by or ''}\x00{idempotency_key}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _find_by_idempotency_key(db: Session, key: str) -> Optional[BackgroundJob]:
+    return db.query(BackgroundJob).filter(BackgroundJob.idempotency_key == key).first()
+
+
+def enqueue_job(
+    db: Session,
+    job_type: str,
+    payload: Optional[Dict[str, Any]] = None,
+    idempotency_key: Optional[str] = None,
+    created_by: Optional[str] = None,
+) -> BackgroundJob:
+    """
+    建立背景工作並 commit
+
+    同一個建立者、同一種 job type 以相同 idempotency_key 建立的工作為
+    queued / running / succeeded 時直接回傳既有的 job；
+    既有的 job 已失敗時釋放它的 key 並建立新的 job（例如排程當天重試）。
+
+    Raises:
+        ValueError: job_type 未註冊
+    """
+    spec = get_job_spec(job_type)
+    if spec is None:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    scoped_key = None
+    if idempotency_key:
+        scoped_key = _scoped_idempotency_key(job_type, created_by, idempotency_key)
+        existing = _find_by_idempotency_key(db, scoped_key)
+        if existing is not None:
+            if existing.status != JOB_FAILED:
+                return existing
+            existing.idempotency_key = None
+
+    job = BackgroundJob(
+        id=str(uuid.uuid4()),
+        job_type=job_type,
+        status=JOB_QUEUED,
+        payload=payload or {},
+        progress=0,
+        attempts=0,
+        max_attempts=spec.max_attempts,
+        idempotency_key=scoped_key,
+        created_by=created_by,
+        run_after=_utcnow(),
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # 同一個 idempotency_key 被同時建立
+        db.rollback()
+        existing = _find_by_idempotency_key(db, scoped_key) if scoped_key else None
+        if existing is None:
+            raise
+        return existing
+
+    logger.info(f"📥 Enqueued job {job.id} ({job_type})")
+    if _worker_pool is not None:
+        _worker_pool.notify()
+    return job
+
+
+def get_job(db: Session, job_id: str) -> Optional[BackgroundJob]:
+    return db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+
+
+class JobWorkerPool:
+    """在應用程式內執行 background_jobs 的 worker pool"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        poll_interval: Optional[float] = None,
+        lease_seconds: Optional[int] = None,
+        retry_base_seconds: Optional[float] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Args:
+            session_factory: 建立 DB session 的函式（None 表示使用預設 SessionLocal）
+            poll_interval: 沒有工作時的輪詢間隔（秒）
+            lease_seconds: 執行中工作超過多久沒更新 locked_at 視為 worker 已消失
+            retry_base_seconds: 重試退避的基準秒數（第 n 次重試等待 base * 2^(n-1)）
+            concurrency: 各並發類別的上限（預設 DEFAULT_CONCURRENCY + 環境變數）
+        """
+        self._session_factory = session_factory
+        self.poll_interval = poll_interval or float(
+            os.getenv("JOB_POLL_INTERVAL", "2.0")
+        )
+        self.lease_seconds = lease_seconds or int(os.getenv("JOB_LEASE_SECONDS", "300"))
+        self.retry_base_seconds = (
+            retry_base_seconds
+            if retry_base_seconds is not None
+            else float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+        )
+        self.concurrency = dict(DEFAULT_CONCURRENCY)
+        for name in self.concurrency:
+            env_value = os.getenv(f"JOB_CONCURRENCY_{name.upper()}")
+            if env_value:
+                self.concurrency[name] = int(env_value)
+        if concurrency:
+            self.concurrency.update(concurrency)
+
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._running: Dict[str, Set[asyncio.Task]] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+
+        # 統計
+        self._succeeded = 0
+        self._failed = 0
+        self._retried = 0
+        self._recovered = 0
+
+    def _session(self) -> Session:
+        if self._session_factory is None:
+            self._session_factory = _get_session_factory()
+        return self._session_factory()
+
+    def _class_limit(self, concurrency_class: str) -> int:
+        return self.concurrency.get(concurrency_class, self.concurrency["default"])
+
+    def _free_slots(self) -> Dict[str, int]:
+        slots = {}
+        for spec in _registry.values():
+            name = spec.concurrency_class
+            running = len(self._running.get(name, ()))
+            slots[name] = max(0, self._class_limit(name) - running)
+        return slots
+
+    # ------------------------------------------------------------------
+    # 領取 / 回收
+    # ------------------------------------------------------------------
+
+    def _recover_stale(self, db: Session) -> int:
+        """
+        把 lease 過期的 running 工作重新排入佇列
+
+        已用完 max_attempts 的工作（例如每次都讓 instance 當掉）標記為 failed，
+        不再重新排入。
+        """
+        cutoff = _utcnow() - timedelta(seconds=self.lease_seconds)
+        exhausted = db.execute(
+            update(BackgroundJob)
+            .where(
+                BackgroundJob.status == JOB_RUNNING,
+                BackgroundJob.locked_at < cutoff,
+                BackgroundJob.attempts >= BackgroundJob.max_attempts,
+            )
+            .values(
+                status=JOB_FAILED,
+                error="Worker lease expired after the final attempt",
+                finished_at=_utcnow(),
+                locked_by=None,
+            )
+        )
+        if exhausted.rowcount:
+            self._failed += exhausted.rowcount
+            logger.error(
+                f"❌ {exhausted.rowcount} jobs with expired lease exhausted "
+                f"max_attempts, marked as failed"
+            )
+        result = db.execute(
+            update(BackgroundJob)
+            .where(
+                BackgroundJob.status == JOB_RUNNING,
+                BackgroundJob.locked_at < cutoff,
+            )
+            .values(status=JOB_QUEUED, locked_by=None, run_after=_utcnow())
+        )
+        db.commit()
+        recovered = max(result.rowcount or 0, 0)
+        if recovered:
+            self._recovered += recovered
+            logger.warning(f"♻️ Re-queued {recovered} jobs with expired lease")
+        return recovered
+
+    def _claim(self) -> List[BackgroundJob]:
+        """依各並發類別的剩餘名額領取工作"""
+        claimed: List[BackgroundJob] = []
+        db = self._session()
+        try:
+            self._recover_stale(db)
+            now = _utcnow()
+            for class_name, free in self._free_slots().items():
+                if free <= 0:
+                    continue
+                job_types = [
+                    spec.job_type
+                    for spec in _registry.values()
+                    if spec.concurrency_class == class_name
+                ]
+                candidates = (
+                    db.query(BackgroundJob.id)
+                    .filter(
+                        BackgroundJob.status == JOB_QUEUED,
+                        BackgroundJob.job_type.in_(job_types),
+                        BackgroundJob.run_after <= now,
+                    )
+                    .order_by(BackgroundJob.created_at)
+                    .limit(free)
+                    .all()
+                )
+                for (job_id,) in candidates:
+                    # 條件式 UPDATE：其他 worker 先領走時 rowcount 為 0
+                    result = db.execute(
+                        update(BackgroundJob)
+                        .where(
+                            BackgroundJob.id == job_id,
+                            BackgroundJob.status == JOB_QUEUED,
+                        )
+                        .values(
+                            status=JOB_RUNNING,
+                            locked_by=self.worker_id,
+                            locked_at=now,
+                            started_at=now,
+                            attempts=BackgroundJob.attempts + 1,
+                        )
+                    )
+                    db.commit()
+                    if result.rowcount == 1:
+                        claimed.append(get_job(db, job_id))
+            for job in claimed:
+                db.expunge(job)
+            return claimed
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to claim background jobs: {e}")
+            return claimed
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    # 執行
+    # ------------------------------------------------------------------
+
+    def _finish(self, job_id: str, values: Dict[str, Any]):
+        db = self._session()
+        try:
+            db.execute(
+                update(BackgroundJob)
+                .where(
+                    BackgroundJob.id == job_id,
+                    BackgroundJob.locked_by == self.worker_id,
+                )
+                .values(**values)
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to record result for job {job_id}: {e}")
+        finally:
+            db.close()
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.retry_base_seconds * (2 ** max(attempts - 1, 0)), 3600)
+
+    async def _heartbeat(self, job_id: str):
+        """定期更新 lease，避免長時間工作被其他 worker 回收"""
+        interval = max(self.lease_seconds / 3, 1)
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(
+                None, self._finish, job_id, {"locked_at": _utcnow()}
+            )
+
+    async def _execute(self, job: BackgroundJob):
+        spec = get_job_spec(job.job_type)
+        ctx = JobContext(job.id, job.payload, job.attempts, self._session)
+        loop = asyncio.get_event_loop()
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        start = time.time()
+        try:
+            result = await spec.handler(ctx)
+            values = {
+                "status": JOB_SUCCEEDED,
+                "result": result,
+                "error": None,
+                "progress": 100,
+                "finished_at": _utcnow(),
+                "locked_by": None,
+            }
+            self._succeeded += 1
+            logger.info(
+                f"✅ Job {job.id} ({job.job_type}) succeeded in "
+                f"{time.time() - start:.1f}s"
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {getattr(e, 'detail', None) or e}"
+            # 4xx（找不到資料、沒有權限等）重試也不會成功
+            retryable = getattr(e, "status_code", 500) >= 500
+            if retryable and job.attempts < job.max_attempts:
+                delay = self._retry_delay(job.attempts)
+                values = {
+                    "status": JOB_QUEUED,
+                    "error": error,
+                    "run_after": _utcnow() + timedelta(seconds=delay),
+                    "locked_by": None,
+                }
+                self._retried += 1
+                logger.warning(
+                    f"🔁 Job {job.id} ({job.job_type}) attempt {job.attempts}/"
+                    f"{job.max_attempts} failed, retry in {delay:.0f}s: {error}"
+                )
+            else:
+                values = {
+                    "status": JOB_FAILED,
+                    "error": error,
+                    "finished_at": _utcnow(),
+                    "locked_by": None,
+                }
+                self._failed += 1
+                logger.error(
+                    f"❌ Job {job.id} ({job.job_type}) failed after "
+                    f"{job.attempts} attempts: {error}"
+                )
+        finally:
+            heartbeat.cancel()
+        await loop.run_in_executor(None, self._finish, job.id, values)
+
+    def _spawn(self, job: BackgroundJob) -> asyncio.Task:
+        class_name = get_job_spec(job.job_type).concurrency_class
+        task = asyncio.create_task(self._execute(job))
+        running = self._running.setdefault(class_name, set())
+        running.add(task)
+
+        def done(t: asyncio.Task):
+            running.discard(t)
+            if self._wake is not None:
+                self._wake.set()
+
+        task.add_done_callback(done)
+        return task
+
+    async def run_once(self) -> int:
+        """領取並執行目前可執行的工作，等待它們完成（測試與手動排空佇列用）"""
+        loop = asyncio.get_event_loop()
+        jobs = await loop.run_in_executor(None, self._claim)
+        tasks = [self._spawn(job) for job in jobs]
+        if tasks:
+            await asyncio.gather(*tasks)
+        return len(tasks)
+
+    async def _run_forever(self):
+        loop = asyncio.get_event_loop()
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                jobs = await loop.run_in_executor(None, self._claim)
+                for job in jobs:
+                    self._spawn(job)
+            except Exception as e:
+                logger.error(f"Job worker loop error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    # ------------------------------------------------------------------
+    # 生命週期
+    # ------------------------------------------------------------------
+
+    def notify(self):
+        """有新工作時喚醒輪詢（跨線程安全）"""
+        if self._wake is None or self._loop_task is None:
+            return
+        try:
+            self._loop_task.get_loop().call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass
+
+    def start(self):
+        if self._loop_task is not None:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._run_forever())
+        logger.info(
+            f"✅ Background job workers started ({self.worker_id}, "
+            f"concurrency={self.concurrency})"
+        )
+
+    async def stop(self, timeout: float = 20.0):
+        """停止領取新工作，等待執行中的工作完成（逾時則交由 lease 回收）"""
+        self._stopping = True
+        if self._wake is not None:
+            self._wake.set()
+        if self._loop_task is not None:
+            await self._loop_task
+            self._loop_task = None
+        tasks = [t for running in self._running.values() for t in running]
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+            if pending:
+                logger.warning(
+                    f"{len(pending)} background jobs still running at shutdown, "
+                    f"they will be re-queued after lease expiry"
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "running": {
+                name: len(tasks) for name, tasks in self._running.items() if tasks
+            },
+            "concurrency": self.concurrency,
+            "succeeded": self._succeeded,
+            "failed": self._failed,
+            "retried": self._retried,
+            "recovered": self._recovered,
+        }
+
+
+_worker_pool: Optional[JobWorkerPool] = None
+
+
+def get_job_worker_pool() -> JobWorkerPool:
+    """取得 JobWorkerPool 單例"""
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = JobWorkerPool()
+    return _worker_pool
+
+
+def start_job_workers():
+    """應用程式啟動時呼叫（JOB_WORKERS_ENABLED=false 時不啟動，只負責建立工作）"""
+    if os.getenv("JOB_WORKERS_ENABLED", "true").lower() != "true":
+        logger.info("Background job workers disabled (JOB_WORKERS_ENABLED=false)")
+        return
+    get_job_worker_pool().start()
+
+
+async def stop_job_workers():
+    """應用程式關閉時呼叫"""
+    if _worker_pool is not None:
+        await _worker_pool.stop()
+
+
+def get_job_queue_stats() -> Dict[str, Any]:
+    """監控用統計（/health）"""
+    if _worker_pool is None:
+        return {"enabled": False}
+    return {"enabled": _worker_pool._loop_task is not None, **_worker_pool.get_stats()}
@@ -0,0 +1,285 @@
+"""
+LLM 完成結果快取（與供應商無關）
+
+以 (model, prompt hash, 生成參數) 為 key 快取 LLM 回傳的文字：
+- 記憶體 LRU，項目超過 TTL 即失效，超過上限時淘汰最久未使用的項目
+- 相同 key 的並發請求合併為一次呼叫（in-flight coalescing），其他請求等待同一結果
+- 高溫度（創意型）呼叫預設不快取，也可以用 cache=False / cache=True 明確指定
+- 每次實際呼叫記錄延遲與 token 數，get_stats() 提供累計統計
+
+只快取原始文字而不是解析後的物件，呼叫端各自解析，避免共用的 dict / list 被修改。
+失敗的呼叫不會寫入快取，合併等待中的請求會收到同一個例外。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Completion:
+    """一次 LLM 呼叫的結果（文字與 token 數）"""
+
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class CompletionCache:
+    """TTL + LRU 的 LLM 完成結果快取，含並發請求合併"""
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_temperature: Optional[float] = None,
+        enabled: Optional[bool] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_size: 最多保留的項目數（LLM_CACHE_SIZE）
+            ttl_seconds: 項目有效秒數（LLM_CACHE_TTL_SECONDS）
+            max_temperature: 溫度高於此值的呼叫預設不快取（LLM_CACHE_MAX_TEMPERATURE）
+            enabled: 是否啟用快取（LLM_CACHE_ENABLED），停用時仍記錄延遲與 token 數
+            clock: 取得目前時間的函式（測試用）
+        """
+        self.max_size = max_size or int(os.getenv("LLM_CACHE_SIZE", "1000"))
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+        )
+        self.max_temperature = (
+            max_temperature
+            if max_temperature is not None
+            else float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.5"))
+        )
+        self.enabled = (
+            enabled
+            if enabled is not None
+            else os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        )
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Completion]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+        # 統計
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._bypassed = 0
+        self._expired = 0
+        self._evictions = 0
+        self._calls = 0
+        self._errors = 0
+        self._latency_ms_total = 0.0
+        self._latency_ms_max = 0.0
+        self._prompt_tokens = 0
+        self._completion_tokens = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str, config: Dict[str, Any]) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        raw = json.dumps(
+            {"model": model, "prompt": prompt_hash, "config": config},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def is_cacheable(
+        self, config: Dict[str, Any], cache: Optional[bool] = None
+    ) -> bool:
+        """cache 有指定時依指定；否則溫度不高於 max_temperature 才快取"""
+        if not self.enabled:
+            return False
+        if cache is not None:
+            return cache
+        temperature = config.get("temperature")
+        return temperature is None or temperature <= self.max_temperature
+
+    # ------------------------------------------------------------------
+    # 記憶體 LRU
+    # ------------------------------------------------------------------
+
+    def _get_local(self, cache_key: str) -> Optional[Completion]:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            stored_at, completion = entry
+            if self._clock() - stored_at > self.ttl_seconds:
+                del self._entries[cache_key]
+                self._expired += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            return completion
+
+    def _put_local(self, cache_key: str, completion: Completion):
+        with self._lock:
+            self._entries[cache_key] = (self._clock(), completion)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 呼叫
+    # ------------------------------------------------------------------
+
+    async def _call(
+        self, model: str, producer: Callable[[], Awaitable[Completion]]
+    ) -> Completion:
+        """實際呼叫 LLM，記錄延遲與 token 數"""
+        started = time.perf_counter()
+        try:
+            completion = await producer()
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self._calls += 1
+            self._latency_ms_total += latency_ms
+            self._latency_ms_max = max(self._latency_ms_max, latency_ms)
+
+        self._prompt_tokens += completion.prompt_tokens
+        self._completion_tokens += completion.completion_tokens
+        logger.info(
+            f"LLM call: model={model}, latency_ms={latency_ms:.0f}, "
+            f"prompt_tokens={completion.prompt_tokens}, "
+            f"completion_tokens={completion.completion_tokens}"
+        )
+        return completion
+
+    async def complete(
+        self,
+        model: str,
+        prompt: str,
+        config: Dict[str, Any],
+        producer: Callable[[], Awaitable[Completion]],
+        cache: Optional[bool] = None,
+    ) -> Completion:
+        """
+        取得完成結果：快取命中直接回傳；相同 key 正在呼叫時等待同一結果；否則呼叫 producer
+
+        Args:
+            model: 模型名稱（key 的一部分）
+            prompt: 完整 prompt（含系統指令）
+            config: 影響輸出的生成參數（溫度、max tokens、輸出格式等）
+            producer: 實際呼叫 LLM 的 coroutine function
+            cache: None 依溫度判斷；False 強制不快取；True 強制快取
+        """
+        if not self.is_cacheable(config, cache):
+            self._bypassed += 1
+            return await self._call(model, producer)
+
+        cache_key = self.make_key(model, prompt, config)
+        cached = self._get_local(cache_key)
+        if cached is not None:
+            self._hits += 1
+            return cached
+
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            self._coalesced += 1
+        else:
+            self._misses += 1
+            task = asyncio.ensure_future(self._produce(cache_key, model, producer))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda done: self._inflight_done(cache_key, done))
+        # 呼叫在共用的 task 中進行，所有呼叫端（包括發起者）都透過 shield 等待：
+        # 任何一個呼叫端被取消都不影響其他等待者取得結果或例外
+        return await asyncio.shield(task)
+
+    async def _produce(
+        self, cache_key: str, model: str, producer: Callable[[], Awaitable[Completion]]
+    ) -> Completion:
+        completion = await self._call(model, producer)
+        self._put_local(cache_key, completion)
+        return completion
+
+    def _inflight_done(self, cache_key: str, task: asyncio.Task):
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+        if not task.cancelled():
+            # 呼叫端都已取消時避免 "exception was never retrieved" 警告
+            task.exception()
+
+    def clear(self):
+        """清空快取與統計"""
+        with self._lock:
+            self._entries.clear()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._bypassed = 0
+        self._expired = 0
+        self._evictions = 0
+        self._calls = 0
+        self._errors = 0
+        self._latency_ms_total = 0.0
+        self._latency_ms_max = 0.0
+        self._prompt_tokens = 0
+        self._completion_tokens = 0
+
+    # ------------------------------------------------------------------
+    # 監控
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self._hits + self._coalesced + self._misses
+        return {
+            "cache_enabled": self.enabled,
+            "cache_size": size,
+            "cache_maxsize": self.max_size,
+            "cache_ttl_seconds": self.ttl_seconds,
+            "cache_hits": self._hits,
+            "cache_misses": self._misses,
+            "cache_coalesced": self._coalesced,
+            "cache_bypassed": self._bypassed,
+            "cache_expired": self._expired,
+            "cache_evictions": self._evictions,
+            "hit_rate_percent": (
+                round((self._hits + self._coalesced) / lookups * 100, 2)
+                if lookups
+                else 0
+            ),
+            "llm_calls": self._calls,
+            "llm_errors": self._errors,
+            "avg_latency_ms": (
+                round(self._latency_ms_total / self._calls, 1) if self._calls else 0
+            ),
+            "max_latency_ms": round(self._latency_ms_max, 1),
+            "prompt_tokens": self._prompt_tokens,
+            "completion_tokens": self._completion_tokens,
+        }
+
+
+# 全局實例（lazy initialization）
+_llm_cache: Optional[CompletionCache] = None
+
+
+def get_llm_cache() -> CompletionCache:
+    """取得共用的 LLM 完成結果快取"""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = CompletionCache()
+    return _llm_cache
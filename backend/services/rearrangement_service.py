@@ -0,0 +1,226 @@
+"""
+例句重組（Rearrangement）答題核心
+
+逐字點選的舊流程每點一個字就要一次 request：重新查詢 StudentAssignment、
+ContentItem、StudentItemProgress，重新切字，再 commit 一次 JSONB。
+這裡提供批次作答需要的共用元件：
+
+- issue_answer_key / read_answer_key：出題時為每個句子簽發 answer key（JWT），
+  內含正確單字序列、錯誤上限、作業總題數與使用範圍（scope），
+  作答時驗簽即可評分，不必再查 ContentItem
+- score_selections：依序評分一整串點選（或其中一段 micro-batch），
+  計分規則與逐字 API 相同（max_errors、points_per_word、完成保底分）
+
+學生、老師預覽與 demo 三種入口共用同一套評分；
+差別只在 scope 與是否寫回 StudentItemProgress。
+"""
+
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from jose import JWTError, jwt
+
+from auth import ALGORITHM, SECRET_KEY
+
+# answer key 有效時間：涵蓋一次練習（含重新挑戰）
+ANSWER_KEY_TTL = timedelta(hours=6)
+
+_AUDIENCE = "rearrangement"
+
+
+class InvalidAnswerKey(ValueError):
+    """answer key 簽章錯誤、過期，或不屬於目前的作業 / 使用者"""
+
+
+def split_sentence(text: str) -> List[str]:
+    """把句子切成正確的單字序列"""
+    return (text or "").strip().split()
+
+
+def default_max_errors(word_count: int, max_errors: Optional[int] = None) -> int:
+    """錯誤上限：題目有設定就用設定值，否則 10 字以下 3 次、以上 5 次"""
+    return max_errors or (3 if word_count <= 10 else 5)
+
+
+def points_per_word(word_count: int) -> int:
+    """每個錯誤扣的分數"""
+    return math.floor(100 / word_count) if word_count > 0 else 100
+
+
+def completion_floor(total_items: int) -> int:
+    """完成作答的保底分：100 / 總題數"""
+    return math.floor(100 / total_items) if total_items > 0 else 1
+
+
+def issue_answer_key(
+    scope: str,
+    content_item_id: int,
+    text: str,
+    max_errors: Optional[int],
+    total_items: int,
+    ttl: timedelta = ANSWER_KEY_TTL,
+) -> str:
+    """
+    簽發單一句子的 answer key
+
+    Args:
+        scope: 使用範圍，例如 "student:{student_assignment_id}"、
+            "preview:{teacher_id}:{assignment_id}"、"demo:{assignment_id}"
+        content_item_id: 題目 ContentItem id
+        text: 題目原句
+        max_errors: 題目設定的錯誤上限（None 時用預設規則）
+        total_items: 作業總題數（計算完成保底分）
+    """
+    words = split_sentence(text)
+    payload = {
+        "aud": _AUDIENCE,
+        "scope": scope,
+        "ci": content_item_id,
+        "w": words,
+        "me": default_max_errors(len(words), max_errors),
+        "n": total_items,
+        "exp": datetime.now(timezone.utc) + ttl,
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    """驗簽後的 answer key 內容"""
+
+    scope: str
+    content_item_id: int
+    words: List[str]
+    max_errors: int
+    total_items: int
+
+
+def read_answer_key(token: str, scope: str) -> AnswerKey:
+    """驗證 answer key 並確認 scope 相符，失敗時拋出 InvalidAnswerKey"""
+    try:
+        payload = jwt.decode(
+            token, SECRET_KEY, algorithms=[ALGORITHM], audience=_AUDIENCE
+        )
+    except (JWTError, AttributeError) as e:
+        raise InvalidAnswerKey("Invalid or expired answer key") from e
+
+    if payload.get("scope") != scope:
+        raise InvalidAnswerKey("Answer key does not belong to this assignment")
+
+    words = payload.get("w") or []
+    if not words:
+        raise InvalidAnswerKey("Answer key has no words")
+
+    return AnswerKey(
+        scope=scope,
+        content_item_id=int(payload["ci"]),
+        words=list(words),
+        max_errors=int(payload["me"]),
+        total_items=int(payload.get("n") or 0),
+    )
+
+
+@dataclass
+class RearrangementResult:
+    """一段點選評分後的狀態"""
+
+    correct_word_count: int
+    error_count: int
+    max_errors: int
+    total_word_count: int
+    expected_score: float
+    challenge_failed: bool
+    completed: bool
+    selections: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def score_selections(
+    words: Sequence[str],
+    max_errors: int,
+    selected: Sequence[str],
+    correct_word_count: int = 0,
+    error_count: int = 0,
+    total_items: int = 0,
+) -> RearrangementResult:
+    """
+    依序評分一串點選
+
+    每次點選對照目前位置的正確單字：答對前進一格，答錯錯誤次數 +1。
+    達到錯誤上限或完成整句後，後面的點選不再計算（不會出現在 selections）。
+
+    Args:
+        words: 正確單字序列
+        max_errors: 錯誤上限
+        selected: 依點選順序排列的單字
+        correct_word_count: 這段點選開始前已答對的字數（micro-batch 接續用）
+        error_count: 這段點選開始前的錯誤次數
+        total_items: 作業總題數；完成時 expected_score 不低於 100 / 總題數
+    """
+    word_count = len(words)
+    if not 0 <= correct_word_count <= word_count:
+        raise ValueError("Invalid position")
+
+    position = correct_word_count
+    errors = error_count
+    now = datetime.now(timezone.utc).isoformat()
+    records: List[Dict[str, Any]] = []
+
+    for word in selected:
+        if position >= word_count or errors >= max_errors:
+            break
+        correct_word = words[position]
+        is_correct = word.strip() == correct_word.strip()
+        records.append(
+            {
+                "position": position,
+                "selected": word,
+                "correct": correct_word,
+                "is_correct": is_correct,
+                "timestamp": now,
+            }
+        )
+        if is_correct:
+            position += 1
+        else:
+            errors += 1
+
+    completed = position >= word_count
+    expected_score = float(max(0, 100 - errors * points_per_word(word_count)))
+    if completed:
+        expected_score = float(max(expected_score, completion_floor(total_items)))
+
+    return RearrangementResult(
+        correct_word_count=position,
+        error_count=errors,
+        max_errors=max_errors,
+        total_word_count=word_count,
+        expected_score=expected_score,
+        challenge_failed=errors >= max_errors,
+        completed=completed,
+        selections=records,
+    )
+
+
+def to_response(key: AnswerKey, result: RearrangementResult) -> Dict[str, Any]:
+    """批次作答回應（學生、老師預覽、demo 共用格式）"""
+    return {
+        "content_item_id": key.content_item_id,
+        "results": [
+            {
+                "position": s["position"],
+                "selected": s["selected"],
+                "is_correct": s["is_correct"],
+                "correct_word": None if s["is_correct"] else s["correct"],
+            }
+            for s in result.selections
+        ],
+        "error_count": result.error_count,
+        "max_errors": result.max_errors,
+        "expected_score": result.expected_score,
+        "correct_word_count": result.correct_word_count,
+        "total_word_count": result.total_word_count,
+        "challenge_failed": result.challenge_failed,
+        "completed": result.completed,
+    }
@@ -0,0 +1,173 @@
+"""
+Search Service
+
+學生 / 教師 / 班級的排序搜尋：
+- 篩選：各欄位 ILIKE '%term%'（跳脫 LIKE 萬用字元），PostgreSQL 上由 pg_trgm GIN index
+  （alembic 20260414_1000）支援，不再全表掃描
+- 排序：完全相符 > 前綴相符 > 包含；PostgreSQL 再加上 similarity() 分數，
+  SQLite（測試）沒有 pg_trgm，只用前三級排序
+- 中文姓名：「王」「王小」等前綴也會命中並排在前面；
+  trigram 至少需要 3 個字元，1–2 字的查詢在 PostgreSQL 上會退回掃描，但結果相同
+"""
+
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import Query, Session
+
+from models import (
+    Classroom,
+    ClassroomSchool,
+    Student,
+    StudentSchool,
+    Teacher,
+    TeacherSchool,
+)
+
+MAX_SEARCH_TERM_LENGTH = 100
+SEARCH_TYPES = ("students", "teachers", "classrooms")
+
+
+def normalize_search_term(term: Optional[str]) -> str:
+    """去除前後空白、合併連續空白，並限制長度"""
+    if not term:
+        return ""
+    return " ".join(term.split())[:MAX_SEARCH_TERM_LENGTH]
+
+
+def escape_like(term: str) -> str:
+    """跳脫 LIKE 萬用字元，讓使用者輸入的 % _ 以字面比對"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_filter(columns: Sequence, term: str):
+    """任一欄位包含 term（不分大小寫）"""
+    pattern = f"%{escape_like(term)}%"
+    return or_(*[column.ilike(pattern, escape="\\") for column in columns])
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def search_rank(db: Session, columns: Sequence, term: str):
+    """
+    相關度分數（越大越相關）
+
+    每個欄位：完全相符 3、前綴 2、包含 1，PostgreSQL 再加 similarity()（0–1）；
+    取所有欄位中最高的分數
+    """
+    lowered = term.lower()
+    escaped = escape_like(lowered)
+    postgres = _is_postgres(db)
+
+    scores = []
+    for column in columns:
+        value = func.lower(column)
+        score = case(
+            (value == lowered, 3),
+            (value.like(f"{escaped}%", escape="\\"), 2),
+            (value.like(f"%{escaped}%", escape="\\"), 1),
+            else_=0,
+        )
+        if postgres:
+            score = score + func.coalesce(func.similarity(column, term), 0)
+        scores.append(score)
+
+    if len(scores) == 1:
+        return scores[0]
+    # SQLite 的多參數 max() 即為 scalar greatest
+    return func.greatest(*scores) if postgres else func.max(*scores)
+
+
+def ranked_search(
+    db: Session, query: Query, columns: Sequence, term: str, id_column, limit: int
+) -> List:
+    """在 query 上套用搜尋條件，依相關度排序（同分依 id）"""
+    term = normalize_search_term(term)
+    if not term:
+        return []
+    rank = search_rank(db, columns, term).label("search_rank")
+    rows = (
+        query.filter(search_filter(columns, term))
+        .add_columns(rank)
+        .order_by(rank.desc(), id_column)
+        .limit(limit)
+        .all()
+    )
+    return [row[0] for row in rows]
+
+
+# ============ 學校範圍搜尋 ============
+
+
+def search_students(
+    db: Session, school_id: uuid.UUID, term: str, limit: int = 20
+) -> List[Student]:
+    """學校中的學生（姓名 / 學號 / email）"""
+    query = (
+        db.query(Student)
+        .join(StudentSchool, Student.id == StudentSchool.student_id)
+        .filter(StudentSchool.school_id == school_id, StudentSchool.is_active.is_(True))
+    )
+    columns = [Student.name, Student.student_number, Student.email]
+    return ranked_search(db, query, columns, term, Student.id, limit)
+
+
+def search_teachers(
+    db: Session, school_id: uuid.UUID, term: str, limit: int = 20
+) -> List[Teacher]:
+    """學校中的教師（姓名 / email）"""
+    query = (
+        db.query(Teacher)
+        .join(TeacherSchool, Teacher.id == TeacherSchool.teacher_id)
+        .filter(TeacherSchool.school_id == school_id, TeacherSchool.is_active.is_(True))
+    )
+    columns = [Teacher.name, Teacher.email]
+    return ranked_search(db, query, columns, term, Teacher.id, limit)
+
+
+def search_classrooms(
+    db: Session, school_id: uuid.UUID, term: str, limit: int = 20
+) -> List[Classroom]:
+    """學校中啟用的班級（班級名稱）"""
+    query = (
+        db.query(Classroom)
+        .join(ClassroomSchool, Classroom.id == ClassroomSchool.classroom_id)
+        .filter(
+            ClassroomSchool.school_id == school_id,
+            ClassroomSchool.is_active.is_(True),
+            Classroom.is_active.is_(True),
+        )
+    )
+    return ranked_search(db, query, [Classroom.name], term, Classroom.id, limit)
+
+
+@dataclass
+class SchoolSearchResults:
+    students: List[Student]
+    teachers: List[Teacher]
+    classrooms: List[Classroom]
+
+
+def search_school(
+    db: Session,
+    school_id: uuid.UUID,
+    term: str,
+    types: Sequence[str] = SEARCH_TYPES,
+    limit: int = 20,
+) -> SchoolSearchResults:
+    """依 types 搜尋學校中的學生 / 教師 / 班級（每種最多 limit 筆）"""
+    return SchoolSearchResults(
+        students=search_students(db, school_id, term, limit)
+        if "students" in types
+        else [],
+        teachers=search_teachers(db, school_id, term, limit)
+        if "teachers" in types
+        else [],
+        classrooms=search_classrooms(db, school_id, term, limit)
+        if "classrooms" in types
+        else [],
+    )
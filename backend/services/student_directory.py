@@ -0,0 +1,312 @@
+"""
+Student Directory
+
+學校 / 班級學生名單的批次查詢，取代逐筆 build_student_response 的 N+1：
+- 學生本身一個查詢，依 Student.id 做 keyset 分頁（cursor = 上一頁最後一個 student id）
+- 所屬學校、所屬班級（含班級所屬學校）各一個 IN 查詢，在 Python 端組合
+  → 不論頁面大小，一頁固定 3 個查詢
+- 學校學生總數以 (school, 篩選條件) 為 key 快取 STUDENT_DIRECTORY_COUNT_TTL 秒，
+  學生加入 / 移出學校時清除
+"""
+
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Query, Session
+
+from models import (
+    Classroom,
+    ClassroomSchool,
+    ClassroomStudent,
+    School,
+    Student,
+    StudentSchool,
+)
+from services.search_service import search_filter
+
+
+@dataclass
+class StudentDirectoryFilters:
+    """學校學生名單的篩選條件"""
+
+    search: Optional[str] = None
+    status: Optional[str] = None  # active / inactive
+    classroom_id: Optional[int] = None
+    unassigned: Optional[bool] = None
+
+    def cache_key(self) -> Tuple:
+        return (self.search, self.status, self.classroom_id, bool(self.unassigned))
+
+
+@dataclass
+class StudentDirectoryPage:
+    students: List[dict]
+    total: int
+    next_cursor: Optional[int]
+
+
+class _CountCache:
+    """學校學生總數的 TTL 快取（跨 request 共用）"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.getenv("STUDENT_DIRECTORY_COUNT_TTL", "60"))
+        )
+        self._entries: Dict[Hashable, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: int):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def invalidate(self, school_id: uuid.UUID):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == str(school_id)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_count_cache = _CountCache()
+
+
+def invalidate_school_student_count(school_id: uuid.UUID):
+    """學生加入 / 移出學校後呼叫，讓下一次列表重新計算總數"""
+    _count_cache.invalidate(school_id)
+
+
+# ============ 學生名單 ============
+
+
+def school_students_query(
+    db: Session, school_id: uuid.UUID, filters: StudentDirectoryFilters
+) -> Query:
+    """學校中（StudentSchool 有效）的學生，套用篩選條件"""
+    query = (
+        db.query(Student)
+        .join(StudentSchool, Student.id == StudentSchool.student_id)
+        .filter(StudentSchool.school_id == school_id, StudentSchool.is_active.is_(True))
+    )
+
+    if filters.status == "active":
+        query = query.filter(Student.is_active.is_(True))
+    elif filters.status == "inactive":
+        query = query.filter(Student.is_active.is_(False))
+
+    if filters.search:
+        query = query.filter(
+            search_filter(
+                [Student.name, Student.student_number, Student.email], filters.search
+            )
+        )
+
+    if filters.classroom_id is not None:
+        query = query.join(
+            ClassroomStudent, Student.id == ClassroomStudent.student_id
+        ).filter(
+            ClassroomStudent.classroom_id == filters.classroom_id,
+            ClassroomStudent.is_active.is_(True),
+        )
+
+    if filters.unassigned:
+        query = query.outerjoin(
+            ClassroomStudent, Student.id == ClassroomStudent.student_id
+        ).filter(ClassroomStudent.id.is_(None))
+
+    return query
+
+
+def count_school_students(
+    db: Session, school_id: uuid.UUID, filters: StudentDirectoryFilters
+) -> int:
+    """學校學生總數（快取）"""
+    key = (str(school_id),) + filters.cache_key()
+    total = _count_cache.get(key)
+    if total is None:
+        total = (
+            school_students_query(db, school_id, filters)
+            .with_entities(func.count(Student.id))
+            .scalar()
+        )
+        _count_cache.set(key, total)
+    return total
+
+
+def list_school_students(
+    db: Session,
+    school_id: uuid.UUID,
+    filters: Optional[StudentDirectoryFilters] = None,
+    limit: int = 100,
+    cursor: Optional[int] = None,
+    page: Optional[int] = None,
+) -> StudentDirectoryPage:
+    """
+    學校學生名單（一頁）
+
+    Args:
+        cursor: 上一頁回傳的 next_cursor（keyset 分頁，優先使用）
+        page: 沒有 cursor 時以頁碼分頁（相容舊的 ?page=，大頁碼時較慢）
+    """
+    filters = filters or StudentDirectoryFilters()
+    query = school_students_query(db, school_id, filters).order_by(Student.id)
+    if cursor is not None:
+        query = query.filter(Student.id > cursor)
+    elif page and page > 1:
+        query = query.offset((page - 1) * limit)
+
+    # 多取一筆判斷是否還有下一頁
+    students = query.limit(limit + 1).all()
+    has_more = len(students) > limit
+    students = students[:limit]
+
+    return StudentDirectoryPage(
+        students=build_student_responses(db, students),
+        total=count_school_students(db, school_id, filters),
+        next_cursor=students[-1].id if has_more else None,
+    )
+
+
+def list_classroom_students(db: Session, classroom_id: int) -> List[dict]:
+    """班級中有效的學生（含所屬學校與班級）"""
+    students = (
+        db.query(Student)
+        .join(ClassroomStudent, Student.id == ClassroomStudent.student_id)
+        .filter(
+            ClassroomStudent.classroom_id == classroom_id,
+            ClassroomStudent.is_active.is_(True),
+            Student.is_active.is_(True),
+        )
+        .order_by(Student.id)
+        .all()
+    )
+    return build_student_responses(db, students)
+
+
+# ============ 學校 / 班級關聯 ============
+
+
+def load_memberships(
+    db: Session, student_ids: Sequence[int]
+) -> Tuple[Dict[int, List[dict]], Dict[int, List[dict]]]:
+    """
+    一次載入多位學生的所屬學校與班級
+
+    Returns:
+        (student_id → schools, student_id → classrooms)；
+        班級只包含有有效 ClassroomSchool 的班級，school_id 取第一個有效的學校
+    """
+    schools: Dict[int, List[dict]] = {student_id: [] for student_id in student_ids}
+    classrooms: Dict[int, List[dict]] = {student_id: [] for student_id in student_ids}
+    if not student_ids:
+        return schools, classrooms
+
+    school_rows = (
+        db.query(StudentSchool.student_id, School.id, School.name)
+        .join(School, School.id == StudentSchool.school_id)
+        .filter(
+            StudentSchool.student_id.in_(student_ids),
+            StudentSchool.is_active.is_(True),
+        )
+        .order_by(StudentSchool.id)
+        .all()
+    )
+    for student_id, school_id, school_name in school_rows:
+        schools[student_id].append({"id": str(school_id), "name": school_name})
+
+    classroom_rows = (
+        db.query(
+            ClassroomStudent.student_id,
+            Classroom.id,
+            Classroom.name,
+            ClassroomSchool.school_id,
+        )
+        .join(Classroom, Classroom.id == ClassroomStudent.classroom_id)
+        .join(
+            ClassroomSchool,
+            (ClassroomSchool.classroom_id == Classroom.id)
+            & ClassroomSchool.is_active.is_(True),
+        )
+        .filter(
+            ClassroomStudent.student_id.in_(student_ids),
+            ClassroomStudent.is_active.is_(True),
+        )
+        .order_by(ClassroomStudent.id, ClassroomSchool.id)
+        .all()
+    )
+    seen = set()
+    for student_id, classroom_id, classroom_name, school_id in classroom_rows:
+        if (student_id, classroom_id) in seen:
+            continue
+        seen.add((student_id, classroom_id))
+        classrooms[student_id].append(
+            {"id": classroom_id, "name": classroom_name, "school_id": str(school_id)}
+        )
+
+    return schools, classrooms
+
+
+def build_student_responses(db: Session, students: Sequence[Student]) -> List[dict]:
+    """學生名單回應（所屬學校與班級以 2 個查詢批次載入）"""
+    schools, classrooms = load_memberships(db, [s.id for s in students])
+    return [
+        {
+            "id": student.id,
+            "name": student.name,
+            "email": student.email,
+            "student_number": student.student_number,
+            "birthdate": student.birthdate.isoformat() if student.birthdate else None,
+            "is_active": student.is_active,
+            "last_login": (
+                student.last_login.isoformat() if student.last_login else None
+            ),
+            "schools": schools[student.id],
+            "classrooms": classrooms[student.id],
+        }
+        for student in students
+    ]
+
+
+def count_students_by_school(
+    db: Session, school_ids: Sequence[uuid.UUID]
+) -> Dict[uuid.UUID, int]:
+    """各學校的學生數（經由學校的班級計算，不重複計算同一位學生）"""
+    if not school_ids:
+        return {}
+    return dict(
+        db.query(
+            ClassroomSchool.school_id,
+            func.count(func.distinct(ClassroomStudent.student_id)),
+        )
+        .join(
+            ClassroomStudent,
+            ClassroomSchool.classroom_id == ClassroomStudent.classroom_id,
+        )
+        .filter(
+            ClassroomSchool.school_id.in_(school_ids),
+            ClassroomSchool.is_active.is_(True),
+        )
+        .group_by(ClassroomSchool.school_id)
+        .all()
+    )
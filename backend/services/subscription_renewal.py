@@ -0,0 +1,642 @@
+"""
+Monthly Auto-Renewal Engine
+
+每月 1 號（台北時間）的自動續訂：
+- Phase 1：一個 set-based UPDATE 把所有過期的 active 訂閱標記為 expired
+- Phase 2：依 teacher id 分批（RENEWAL_BATCH_SIZE）載入開啟自動續訂的教師，
+  每批的訂閱 / 扣款紀錄一次查詢，扣款以 RENEWAL_CONCURRENCY 限制並發
+- 每位教師扣款前先寫入 renewal_attempts（status='charging'），扣款結果、新訂閱週期
+  與交易紀錄在同一個 transaction 中提交；中斷後重新執行時已完成的教師直接跳過
+- 停在 charging 超過 RENEWAL_CHARGE_STALE_SECONDS 的紀錄（程序中斷、扣款逾時）
+  先以訂單編號向 TapPay 查詢，已扣款則補完訂閱，確定未扣款才重新扣款
+- 續訂成功通知在提交後以背景方式寄送，不拖慢扣款
+
+DB 操作在 executor 中以各自的 session 執行，TapPay 扣款走非同步 client。
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from calendar import monthrange
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import (
+    RenewalAttempt,
+    SubscriptionPeriod,
+    Teacher,
+    TeacherSubscriptionTransaction,
+    TransactionType,
+)
+from services.tappay_service import TapPayService
+
+logger = logging.getLogger(__name__)
+
+ATTEMPT_CHARGING = "charging"
+ATTEMPT_SUCCEEDED = "succeeded"
+ATTEMPT_FAILED = "failed"
+
+# TapPay Record API record_status：0 = 已授權、1 = 已請款
+_PAID_RECORD_STATUSES = {0, 1}
+# -1 = 交易錯誤、5 = 已取消
+_UNPAID_RECORD_STATUSES = {-1, 5}
+
+
+def _midnight(day: date) -> datetime:
+    """日期欄位為 DateTime：以當天 00:00 比較（與寫入 date 時的儲存值一致）"""
+    return datetime.combine(day, time.min)
+
+
+@dataclass
+class RenewalCharge:
+    """一位教師本次要扣款的內容（在 executor 與 event loop 之間傳遞，不含 ORM 物件）"""
+
+    teacher_id: int
+    email: str
+    name: str
+    card_key: str
+    card_token: str
+    card_last_four: Optional[str]
+    plan_name: str
+    amount: int
+    quota_total: int
+    order_number: str
+    reconcile: bool = False
+
+
+@dataclass
+class RenewalBatch:
+    last_teacher_id: int
+    size: int
+    charges: List[RenewalCharge] = field(default_factory=list)
+
+
+class RenewalEngine:
+    """分批、限制並發、可中斷後續跑的每月自動續訂"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        tappay_service: TapPayService,
+        email_sender: Optional[Callable[..., Any]] = None,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        stale_seconds: Optional[int] = None,
+        now: Optional[datetime] = None,
+    ):
+        """
+        Args:
+            session_factory: 建立 DB session 的函式（每個 executor 呼叫各自建立）
+            tappay_service: TapPay 服務（使用 *_async 方法）
+            email_sender: 續訂成功通知（預設 email_service.send_renewal_success）
+            concurrency: 同時扣款的教師數（RENEWAL_CONCURRENCY）
+            batch_size: 每批載入的教師數（RENEWAL_BATCH_SIZE）
+            stale_seconds: charging 狀態超過此秒數視為中斷（RENEWAL_CHARGE_STALE_SECONDS）
+            now: 執行時間（測試用，預設為目前時間）
+        """
+        self._session_factory = session_factory
+        self.tappay_service = tappay_service
+        if email_sender is None:
+            from services.email_service import email_service
+
+            email_sender = email_service.send_renewal_success
+        self._email_sender = email_sender
+        self.concurrency = concurrency or int(os.getenv("RENEWAL_CONCURRENCY", "5"))
+        self.batch_size = batch_size or int(os.getenv("RENEWAL_BATCH_SIZE", "100"))
+        self.stale_seconds = (
+            stale_seconds
+            if stale_seconds is not None
+            else int(os.getenv("RENEWAL_CHARGE_STALE_SECONDS", "900"))
+        )
+        self.run_id = str(uuid.uuid4())
+
+        # 使用台北時區（因為 Cloud Scheduler 設定為 Asia/Taipei）
+        now_utc = now.astimezone(timezone.utc) if now else datetime.now(timezone.utc)
+        self.now_utc = now_utc
+        self.today = now_utc.astimezone(ZoneInfo("Asia/Taipei")).date()
+        self.renewal_month = self.today.strftime("%Y-%m")
+
+        # 上個月與當月的日期範圍
+        self.last_month_start = self.today.replace(day=1) - relativedelta(months=1)
+        self.last_month_end = self.today.replace(day=1) - relativedelta(days=1)
+        self.current_month_start = self.today.replace(day=1)
+        self.current_month_end = self.today.replace(
+            day=monthrange(self.today.year, self.today.month)[1]
+        )
+
+        self._email_tasks: List[asyncio.Future] = []
+
+    def order_number(self, teacher_id: int) -> str:
+        return f"RENEWAL_{teacher_id}_{self.today.strftime('%Y%m%d')}"
+
+    async def _in_executor(self, func: Callable[..., Any], *args) -> Any:
+        """在 executor 中以新的 session 執行 func(db, *args)"""
+
+        def call():
+            db = self._session_factory()
+            try:
+                return func(db, *args)
+            finally:
+                db.close()
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, call)
+
+    # ------------------------------------------------------------------
+    # 執行
+    # ------------------------------------------------------------------
+
+    async def run(self, on_progress: Optional[Callable[[float], None]] = None) -> dict:
+        """執行每月續訂，回傳統計結果"""
+        logger.info(
+            f"🔄 Monthly renewal started (Taipei date: {self.today}, run: {self.run_id})"
+        )
+
+        # 檢查是否為每月 1 號（台北時間）
+        if self.today.day != 1:
+            logger.info(
+                f"Not the 1st of the month (Taipei: {self.today}), skipping renewal"
+            )
+            return {
+                "status": "skipped",
+                "message": f"Not the 1st of the month. Today is {self.today}",
+                "date": self.today.isoformat(),
+            }
+
+        # Phase 1: 標記所有過期訂閱為 expired
+        marked_expired = await self._in_executor(self._mark_expired)
+        logger.info(f"✅ Marked {marked_expired} subscriptions as expired")
+
+        # Phase 2: 處理自動續訂
+        results = {
+            "status": "completed",
+            "date": self.today.isoformat(),
+            "marked_expired": marked_expired,
+            "auto_renewed": 0,
+            "renewal_failed": 0,
+            "auto_renew_disabled": 0,
+            "skipped": 0,
+            "already_processed": 0,
+            "reconciled": 0,
+            "errors": [],
+        }
+        total = await self._in_executor(self._count_candidates)
+        logger.info(f"💳 Found {total} teachers with auto_renew enabled")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        last_teacher_id = 0
+        processed = 0
+        while True:
+            batch = await self._in_executor(
+                self._prepare_batch, last_teacher_id, results
+            )
+            if batch is None:
+                break
+            await asyncio.gather(
+                *(self._renew(charge, semaphore, results) for charge in batch.charges)
+            )
+            last_teacher_id = batch.last_teacher_id
+            processed += batch.size
+            if on_progress and total:
+                on_progress(min(processed * 100 / total, 99))
+
+        # 等待背景寄送的通知信（失敗只記錄 log）
+        if self._email_tasks:
+            await asyncio.gather(*self._email_tasks, return_exceptions=True)
+
+        logger.info(
+            f"🔄 Monthly renewal completed: "
+            f"Marked expired: {results['marked_expired']}, "
+            f"Auto-renewed: {results['auto_renewed']}, "
+            f"Failed: {results['renewal_failed']}, "
+            f"Auto-renew disabled: {results['auto_renew_disabled']}, "
+            f"Skipped: {results['skipped']}, "
+            f"Already processed: {results['already_processed']}"
+        )
+        return results
+
+    # ------------------------------------------------------------------
+    # DB（在 executor 中執行）
+    # ------------------------------------------------------------------
+
+    def _mark_expired(self, db: Session) -> int:
+        marked = (
+            db.query(SubscriptionPeriod)
+            .filter(
+                SubscriptionPeriod.status == "active",
+                SubscriptionPeriod.end_date < _midnight(self.today),
+            )
+            .update({SubscriptionPeriod.status: "expired"}, synchronize_session=False)
+        )
+        db.commit()
+        return marked
+
+    @staticmethod
+    def _candidates(db: Session):
+        return db.query(Teacher).filter(
+            Teacher.subscription_auto_renew.is_(True),
+            Teacher.is_active.is_(True),
+        )
+
+    def _count_candidates(self, db: Session) -> int:
+        return self._candidates(db).count()
+
+    def _prepare_batch(
+        self, db: Session, after_teacher_id: int, results: dict
+    ) -> Optional[RenewalBatch]:
+        """
+        載入下一批教師並決定每位的處理方式
+
+        跳過 / 關閉自動續訂直接記入 results；需要扣款的教師寫入 charging 紀錄後回傳。
+        """
+        from config.plans import PLAN_PRICES, PLAN_QUOTAS
+
+        teachers = (
+            self._candidates(db)
+            .filter(Teacher.id > after_teacher_id)
+            .order_by(Teacher.id)
+            .limit(self.batch_size)
+            .all()
+        )
+        if not teachers:
+            return None
+
+        teacher_ids = [teacher.id for teacher in teachers]
+        batch = RenewalBatch(last_teacher_id=teacher_ids[-1], size=len(teachers))
+
+        attempts = {
+            attempt.teacher_id: attempt
+            for attempt in db.query(RenewalAttempt).filter(
+                RenewalAttempt.teacher_id.in_(teacher_ids),
+                RenewalAttempt.renewal_month == self.renewal_month,
+            )
+        }
+        # 檢查 1: 防重複扣款（已有本月訂閱）
+        renewed_ids = {
+            teacher_id
+            for (teacher_id,) in db.query(SubscriptionPeriod.teacher_id).filter(
+                SubscriptionPeriod.teacher_id.in_(teacher_ids),
+                SubscriptionPeriod.start_date >= _midnight(self.current_month_start),
+                SubscriptionPeriod.status == "active",
+            )
+        }
+        # 檢查 2: 防錯誤扣款（需有上個月訂閱）
+        last_month_plans: Dict[int, str] = {}
+        for teacher_id, plan_name in db.query(
+            SubscriptionPeriod.teacher_id, SubscriptionPeriod.plan_name
+        ).filter(
+            SubscriptionPeriod.teacher_id.in_(teacher_ids),
+            SubscriptionPeriod.start_date == _midnight(self.last_month_start),
+            SubscriptionPeriod.end_date == _midnight(self.last_month_end),
+        ):
+            last_month_plans.setdefault(teacher_id, plan_name)
+
+        stale_before = self.now_utc - timedelta(seconds=self.stale_seconds)
+        disable_ids = []
+        for teacher in teachers:
+            # 💳 檢查是否有儲存的信用卡 Token
+            if not teacher.card_key or not teacher.card_token:
+                logger.info(
+                    f"Teacher {teacher.email} has auto_renew but no card, skipping"
+                )
+                results["skipped"] += 1
+                continue
+
+            attempt = attempts.get(teacher.id)
+            reconcile = False
+            if attempt is not None and attempt.status == ATTEMPT_CHARGING:
+                updated_at = attempt.updated_at
+                if updated_at is not None and updated_at.tzinfo is None:
+                    updated_at = updated_at.replace(tzinfo=timezone.utc)
+                if updated_at is not None and updated_at > stale_before:
+                    # 另一個執行中的續訂正在處理
+                    logger.info(f"Renewal for {teacher.email} in progress, skipping")
+                    results["skipped"] += 1
+                    continue
+                if not self._claim_stale_attempt(db, attempt):
+                    results["skipped"] += 1
+                    continue
+                reconcile = True
+            elif teacher.id in renewed_ids:
+                logger.info(
+                    f"Teacher {teacher.email} already has current month subscription, skipping"
+                )
+                results["skipped"] += 1
+                continue
+            elif attempt is not None:
+                # 本月已扣款失敗（或成功後訂閱被手動移除）：不自動重試
+                results["already_processed"] += 1
+                continue
+
+            if not reconcile and teacher.id not in last_month_plans:
+                # 沒有上個月訂閱 → 關閉 auto_renew
+                logger.warning(
+                    f"Teacher {teacher.email} has no last month subscription, "
+                    f"disabling auto_renew"
+                )
+                disable_ids.append(teacher.id)
+                continue
+
+            plan_name = attempt.plan_name if reconcile else last_month_plans[teacher.id]
+            charge = RenewalCharge(
+                teacher_id=teacher.id,
+                email=teacher.email,
+                name=teacher.name,
+                card_key=teacher.card_key,
+                card_token=teacher.card_token,
+                card_last_four=teacher.card_last_four,
+                plan_name=plan_name,
+                amount=attempt.amount if reconcile else PLAN_PRICES.get(plan_name, 299),
+                quota_total=PLAN_QUOTAS.get(plan_name, 2000),
+                order_number=self.order_number(teacher.id),
+                reconcile=reconcile,
+            )
+            if reconcile or self._claim_new_attempt(db, charge):
+                batch.charges.append(charge)
+            else:
+                # 另一個執行中的續訂剛建立了紀錄
+                results["skipped"] += 1
+
+        if disable_ids:
+            db.query(Teacher).filter(Teacher.id.in_(disable_ids)).update(
+                {Teacher.subscription_auto_renew: False}, synchronize_session=False
+            )
+            db.commit()
+            results["auto_renew_disabled"] += len(disable_ids)
+
+        return batch
+
+    def _claim_new_attempt(self, db: Session, charge: RenewalCharge) -> bool:
+        """扣款前寫入 charging 紀錄；(teacher, month) 已存在時回傳 False"""
+        db.add(
+            RenewalAttempt(
+                teacher_id=charge.teacher_id,
+                renewal_month=self.renewal_month,
+                order_number=charge.order_number,
+                status=ATTEMPT_CHARGING,
+                plan_name=charge.plan_name,
+                amount=charge.amount,
+                run_id=self.run_id,
+                updated_at=self.now_utc,
+            )
+        )
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+
+    def _claim_stale_attempt(self, db: Session, attempt: RenewalAttempt) -> bool:
+        """以條件式 UPDATE 接手中斷的 charging 紀錄（多個續訂同時執行時只有一個成功）"""
+        claimed = (
+            db.query(RenewalAttempt)
+            .filter(
+                RenewalAttempt.id == attempt.id,
+                RenewalAttempt.status == ATTEMPT_CHARGING,
+                RenewalAttempt.run_id == attempt.run_id,
+            )
+            .update(
+                {
+                    RenewalAttempt.run_id: self.run_id,
+                    RenewalAttempt.updated_at: self.now_utc,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return claimed == 1
+
+    def _record_success(
+        self, db: Session, charge: RenewalCharge, gateway_response: Dict
+    ):
+        """扣款成功：新訂閱週期、交易紀錄、card_token 與 checkpoint 一起提交"""
+        rec_id = gateway_response.get("rec_trade_id")
+        db.add(
+            SubscriptionPeriod(
+                teacher_id=charge.teacher_id,
+                plan_name=charge.plan_name,
+                amount_paid=charge.amount,
+                quota_total=charge.quota_total,
+                quota_used=0,
+                start_date=self.current_month_start,
+                end_date=self.current_month_end,
+                payment_method="auto_renew",  # 自動續訂
+                payment_id=rec_id,
+                payment_status="paid",
+                status="active",
+            )
+        )
+
+        # ⚠️ 重要：更新 card_token（TapPay 每次交易會刷新 token）
+        new_card_token = (gateway_response.get("card_secret") or {}).get("card_token")
+        if new_card_token:
+            db.query(Teacher).filter(Teacher.id == charge.teacher_id).update(
+                {Teacher.card_token: new_card_token}, synchronize_session=False
+            )
+            logger.info(f"Card token refreshed for {charge.email}")
+
+        db.add(
+            self._transaction(charge, gateway_response, "SUCCESS", new_end_date=None)
+        )
+        self._finish_attempt(db, charge, ATTEMPT_SUCCEEDED, gateway_response)
+        db.commit()
+
+    def _record_failure(
+        self, db: Session, charge: RenewalCharge, gateway_response: Dict, error: str
+    ):
+        """扣款失敗：記錄失敗交易（不延長訂閱）與 checkpoint"""
+        db.add(
+            self._transaction(
+                charge,
+                gateway_response,
+                "FAILED",
+                new_end_date=self.last_month_end,  # 失敗不延長
+                failure_reason=error,
+                error_code=str(gateway_response.get("status")),
+            )
+        )
+        self._finish_attempt(db, charge, ATTEMPT_FAILED, gateway_response, error)
+        db.commit()
+
+    def _transaction(
+        self,
+        charge: RenewalCharge,
+        gateway_response: Dict,
+        status: str,
+        new_end_date: Optional[date],
+        **extra,
+    ) -> TeacherSubscriptionTransaction:
+        return TeacherSubscriptionTransaction(
+            teacher_id=charge.teacher_id,
+            teacher_email=charge.email,
+            transaction_type=TransactionType.RECHARGE,
+            subscription_type=charge.plan_name,
+            amount=charge.amount,
+            currency="TWD",
+            status=status,
+            months=1,
+            period_start=self.current_month_start,
+            period_end=self.current_month_end,
+            previous_end_date=self.last_month_end,
+            new_end_date=new_end_date or self.current_month_end,
+            processed_at=self.now_utc,
+            payment_provider="tappay",
+            payment_method="card_token",
+            external_transaction_id=gateway_response.get("rec_trade_id"),
+            gateway_response=gateway_response,
+            **extra,
+        )
+
+    def _finish_attempt(
+        self,
+        db: Session,
+        charge: RenewalCharge,
+        status: str,
+        gateway_response: Dict,
+        error: Optional[str] = None,
+    ):
+        db.query(RenewalAttempt).filter(
+            RenewalAttempt.teacher_id == charge.teacher_id,
+            RenewalAttempt.renewal_month == self.renewal_month,
+        ).update(
+            {
+                RenewalAttempt.status: status,
+                RenewalAttempt.rec_trade_id: gateway_response.get("rec_trade_id"),
+                RenewalAttempt.error: error,
+                RenewalAttempt.gateway_response: gateway_response,
+                RenewalAttempt.updated_at: datetime.now(timezone.utc),
+            },
+            synchronize_session=False,
+        )
+
+    # ------------------------------------------------------------------
+    # 扣款（event loop）
+    # ------------------------------------------------------------------
+
+    async def _find_paid_record(self, charge: RenewalCharge) -> Optional[Dict]:
+        """
+        以訂單編號查詢是否已扣款
+
+        Returns:
+            已扣款時回傳交易紀錄、確定未扣款時回傳 {}；無法確認時拋出 RuntimeError
+        """
+        response = await self.tappay_service.find_transaction_by_order_number_async(
+            charge.order_number
+        )
+        if response.get("status") != 0:
+            raise RuntimeError(
+                f"Unable to verify order {charge.order_number}: {response.get('msg')}"
+            )
+        records = [
+            record
+            for record in response.get("trade_records") or []
+            if record.get("order_number") == charge.order_number
+        ]
+        for record in records:
+            if record.get("record_status") in _PAID_RECORD_STATUSES:
+                return record
+        if all(r.get("record_status") in _UNPAID_RECORD_STATUSES for r in records):
+            return {}
+        raise RuntimeError(
+            f"Order {charge.order_number} has a pending TapPay record, needs review"
+        )
+
+    async def _renew(
+        self, charge: RenewalCharge, semaphore: asyncio.Semaphore, results: dict
+    ):
+        try:
+            async with semaphore:
+                gateway_response = None
+                if charge.reconcile:
+                    # 上次中斷在扣款途中：先確認是否已扣款
+                    record = await self._find_paid_record(charge)
+                    if record:
+                        logger.info(
+                            f"Order {charge.order_number} was already charged, "
+                            f"completing renewal"
+                        )
+                        gateway_response = {"status": 0, **record}
+                        results["reconciled"] += 1
+
+                if gateway_response is None:
+                    # 💳 使用 TapPay Card Token 進行扣款
+                    logger.info(
+                        f"💳 Auto-charging {charge.email}: TWD {charge.amount} "
+                        f"(Card: ****{charge.card_last_four})"
+                    )
+                    gateway_response = await self.tappay_service.pay_by_token_async(
+                        card_key=charge.card_key,
+                        card_token=charge.card_token,
+                        amount=charge.amount,
+                        details=f"{charge.plan_name} Monthly Renewal",
+                        cardholder={
+                            "name": charge.name,
+                            "email": charge.email,
+                            "phone": "+886912345678",  # TODO: 未來可加入電話欄位
+                        },
+                        order_number=charge.order_number,
+                    )
+
+                    if gateway_response.get("error") == "API_REQUEST_FAILED":
+                        # 逾時 / 連線中斷：不確定是否已扣款，查詢後再決定
+                        record = await self._find_paid_record(charge)
+                        if record:
+                            gateway_response = {"status": 0, **record}
+
+            if gateway_response.get("status") != 0:
+                error_msg = TapPayService.parse_error_code(
+                    gateway_response.get("status"), gateway_response.get("msg")
+                )
+                logger.error(f"❌ Auto-charge failed for {charge.email}: {error_msg}")
+                await self._in_executor(
+                    self._record_failure, charge, gateway_response, error_msg
+                )
+                results["renewal_failed"] += 1
+                results["errors"].append(
+                    {
+                        "teacher": charge.email,
+                        "error": error_msg,
+                        "status_code": gateway_response.get("status"),
+                    }
+                )
+                return
+
+            await self._in_executor(self._record_success, charge, gateway_response)
+            logger.info(
+                f"✅ Auto-renewal success: {charge.email} - "
+                f"{charge.plan_name} {self.current_month_start} to "
+                f"{self.current_month_end} (TWD {charge.amount} charged)"
+            )
+            results["auto_renewed"] += 1
+            self._send_success_email(charge)
+
+        except Exception as e:
+            # checkpoint 保持 charging，下次執行時先查詢 TapPay 再決定是否扣款
+            logger.error(f"❌ Failed to renew {charge.email}: {e}")
+            results["renewal_failed"] += 1
+            results["errors"].append({"teacher": charge.email, "error": str(e)})
+
+    def _send_success_email(self, charge: RenewalCharge):
+        """提交後在背景寄送續訂成功通知"""
+
+        def send():
+            try:
+                self._email_sender(
+                    teacher_email=charge.email,
+                    teacher_name=charge.name,
+                    new_end_date=self.current_month_end,
+                    plan_name=charge.plan_name,
+                )
+            except Exception as e:
+                logger.error(f"Failed to send renewal email to {charge.email}: {e}")
+
+        loop = asyncio.get_event_loop()
+        self._email_tasks.append(loop.run_in_executor(None, send))
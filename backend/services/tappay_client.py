@@ -0,0 +1,342 @@
+"""
+TapPay 非同步 HTTP client
+
+TapPayService / TapPayEInvoiceService 的非同步版本共用此 client：
+- 使用 utils.http_client.get_http_client() 的共用連線池，不阻塞 event loop
+- 同時進行的 TapPay 請求數受 TAPPAY_MAX_CONCURRENCY 限制
+- 冪等 key（訂單編號 + payload）：相同請求在 TTL 內重複送出時直接回傳第一次的結果，
+  並發的相同請求合併為一次呼叫，避免重複扣款
+- 重試：連線建立前失敗（請求未送出）一律重試；逾時 / 5xx 只在 retry_unsafe=True
+  （查詢等不會產生副作用的 API）時重試
+- 每個 endpoint 記錄呼叫次數、錯誤、重試與延遲（get_stats()）
+
+請求與回應格式與原本的 requests 版本相同，TAPPAY_API_BASE_URL 可指向本地 stub server。
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 請求一定沒有送出，重試不會造成重複扣款
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def get_tappay_base_url(environment: str) -> str:
+    """TapPay API 主機（TAPPAY_API_BASE_URL 可覆寫，例如本地 stub server）"""
+    override = os.getenv("TAPPAY_API_BASE_URL")
+    if override:
+        return override.rstrip("/")
+    if environment == "production":
+        return "https://prod.tappaysdk.com"
+    return "https://sandbox.tappaysdk.com"
+
+
+class TapPayClient:
+    """共用連線池的 TapPay 非同步 client"""
+
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        timeout: Optional[float] = None,
+        retry_base_seconds: Optional[float] = None,
+        idempotency_ttl_seconds: Optional[float] = None,
+    ):
+        """
+        Args:
+            http_client: 指定的 httpx.AsyncClient（None 表示使用共用連線池）
+            max_concurrency: 同時進行的請求上限（TAPPAY_MAX_CONCURRENCY）
+            max_retries: 失敗後最多重試次數（TAPPAY_MAX_RETRIES）
+            timeout: 單次請求逾時秒數（TAPPAY_TIMEOUT_SECONDS）
+            retry_base_seconds: 重試等待的基準秒數，依次數指數成長
+            idempotency_ttl_seconds: 冪等結果保留秒數（TAPPAY_IDEMPOTENCY_TTL_SECONDS）
+        """
+        self._http_client = http_client
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("TAPPAY_MAX_CONCURRENCY", "10")
+        )
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else int(os.getenv("TAPPAY_MAX_RETRIES", "2"))
+        )
+        self.timeout = timeout or float(os.getenv("TAPPAY_TIMEOUT_SECONDS", "30"))
+        self.retry_base_seconds = (
+            retry_base_seconds if retry_base_seconds is not None else 0.5
+        )
+        self.idempotency_ttl_seconds = (
+            idempotency_ttl_seconds
+            if idempotency_ttl_seconds is not None
+            else float(os.getenv("TAPPAY_IDEMPOTENCY_TTL_SECONDS", "600"))
+        )
+        self.idempotency_max_size = 1000
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self._results: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http_client is not None:
+            return self._http_client
+        from utils.http_client import get_http_client
+
+        return get_http_client()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """同時進行的 TapPay 請求上限（依 event loop 建立）"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    # ------------------------------------------------------------------
+    # 冪等結果
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def make_idempotency_key(
+        endpoint: str, order_number: str, payload: Dict[str, Any]
+    ) -> str:
+        """endpoint + 訂單編號 + payload 內容，只有完全相同的請求才會共用結果"""
+        raw = json.dumps(
+            {"endpoint": endpoint, "order": order_number, "payload": payload},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _get_result(self, key: str) -> Optional[Dict]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at > self.idempotency_ttl_seconds:
+            del self._results[key]
+            return None
+        return copy.deepcopy(result)
+
+    def _put_result(self, key: str, result: Dict):
+        self._results[key] = (time.monotonic(), copy.deepcopy(result))
+        self._results.move_to_end(key)
+        while len(self._results) > self.idempotency_max_size:
+            self._results.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # 請求
+    # ------------------------------------------------------------------
+
+    def _metric(self, endpoint: str) -> Dict[str, Any]:
+        return self._metrics.setdefault(
+            endpoint,
+            {
+                "calls": 0,
+                "errors": 0,
+                "retries": 0,
+                "idempotent_hits": 0,
+                "latency_ms_total": 0.0,
+                "latency_ms_max": 0.0,
+            },
+        )
+
+    def _record(self, endpoint: str, latency_ms: float, error: bool, retries: int):
+        metric = self._metric(endpoint)
+        metric["calls"] += 1
+        metric["errors"] += int(error)
+        metric["retries"] += retries
+        metric["latency_ms_total"] += latency_ms
+        metric["latency_ms_max"] = max(metric["latency_ms_max"], latency_ms)
+
+    def _should_retry(self, error: Exception, retry_unsafe: bool) -> bool:
+        if isinstance(error, _NOT_SENT_ERRORS):
+            return True
+        if not retry_unsafe:
+            return False
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+    async def _send(
+        self,
+        endpoint: str,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        method: str,
+        retry_unsafe: bool,
+    ) -> Dict:
+        client = self._get_http_client()
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            async with self._get_semaphore():
+                while True:
+                    try:
+                        if method == "GET":
+                            response = await client.get(
+                                url,
+                                params=payload,
+                                headers=headers,
+                                timeout=self.timeout,
+                            )
+                        else:
+                            response = await client.post(
+                                url, json=payload, headers=headers, timeout=self.timeout
+                            )
+                        response.raise_for_status()
+                        result = response.json()
+                        break
+                    except httpx.HTTPError as e:
+                        if attempt >= self.max_retries or not self._should_retry(
+                            e, retry_unsafe
+                        ):
+                            raise
+                        attempt += 1
+                        delay = self.retry_base_seconds * (2 ** (attempt - 1))
+                        logger.warning(
+                            f"TapPay {endpoint} failed ({e!r}), "
+                            f"retry {attempt}/{self.max_retries} in {delay}s"
+                        )
+                        await asyncio.sleep(delay)
+        except Exception:
+            self._record(
+                endpoint, (time.perf_counter() - started) * 1000, True, attempt
+            )
+            raise
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        self._record(endpoint, latency_ms, False, attempt)
+        logger.info(f"TapPay {endpoint}: latency_ms={latency_ms:.0f}")
+        return result
+
+    async def request(
+        self,
+        endpoint: str,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        method: str = "POST",
+        idempotency_key: Optional[str] = None,
+        retry_unsafe: bool = False,
+    ) -> Dict:
+        """
+        送出 TapPay 請求並回傳解析後的 JSON
+
+        Args:
+            endpoint: 統計用的 endpoint 名稱（例如 "pay-by-prime"）
+            url: 完整 URL
+            payload: 請求內容（POST 為 JSON body，GET 為 query string）
+            headers: HTTP headers
+            method: "POST" 或 "GET"
+            idempotency_key: 冪等 key（make_idempotency_key），相同 key 共用同一結果
+            retry_unsafe: 逾時 / 5xx 是否重試（只用於沒有副作用的 API）
+
+        Raises:
+            httpx.HTTPError: 重試後仍失敗（呼叫端轉成原本的錯誤回應格式）
+        """
+        headers = headers or {}
+        if idempotency_key is None:
+            return await self._send(
+                endpoint, url, payload, headers, method, retry_unsafe
+            )
+
+        cached = self._get_result(idempotency_key)
+        if cached is not None:
+            self._metric(endpoint)["idempotent_hits"] += 1
+            logger.info(f"TapPay {endpoint}: returning stored result for retry")
+            return cached
+
+        task = self._inflight.get(idempotency_key)
+        if task is not None:
+            logger.info(f"TapPay {endpoint}: waiting for identical in-flight request")
+        else:
+            task = asyncio.ensure_future(
+                self._send_and_remember(
+                    idempotency_key,
+                    endpoint,
+                    url,
+                    payload,
+                    headers,
+                    method,
+                    retry_unsafe,
+                )
+            )
+            self._inflight[idempotency_key] = task
+            task.add_done_callback(
+                lambda done: self._inflight_done(idempotency_key, done)
+            )
+        # 請求在共用的 task 中送出，所有呼叫端（包括發起者）都透過 shield 等待：
+        # 任何一個呼叫端被取消都不會中斷已送出的付款，也不影響其他等待者
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def _send_and_remember(
+        self,
+        idempotency_key: str,
+        endpoint: str,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        method: str,
+        retry_unsafe: bool,
+    ) -> Dict:
+        # 傳輸失敗不記錄結果，呼叫端可以用相同訂單編號重試
+        result = await self._send(endpoint, url, payload, headers, method, retry_unsafe)
+        self._put_result(idempotency_key, result)
+        return result
+
+    def _inflight_done(self, idempotency_key: str, task: asyncio.Task):
+        if self._inflight.get(idempotency_key) is task:
+            del self._inflight[idempotency_key]
+        if not task.cancelled():
+            # 呼叫端都已取消時避免 "exception was never retrieved" 警告
+            task.exception()
+
+    # ------------------------------------------------------------------
+    # 監控
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, metric in self._metrics.items():
+            calls = metric["calls"]
+            endpoints[endpoint] = {
+                "calls": calls,
+                "errors": metric["errors"],
+                "retries": metric["retries"],
+                "idempotent_hits": metric["idempotent_hits"],
+                "avg_latency_ms": (
+                    round(metric["latency_ms_total"] / calls, 1) if calls else 0
+                ),
+                "max_latency_ms": round(metric["latency_ms_max"], 1),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_retries": self.max_retries,
+            "stored_results": len(self._results),
+            "endpoints": endpoints,
+        }
+
+
+# 全局實例（lazy initialization）
+_tappay_client: Optional[TapPayClient] = None
+
+
+def get_tappay_client() -> TapPayClient:
+    """取得共用的 TapPay 非同步 client"""
+    global _tappay_client
+    if _tappay_client is None:
+        _tappay_client = TapPayClient()
+    return _tappay_client
@@ -3,15 +3,19 @@ TapPay E-Invoice Service
 處理 TapPay 電子發票串接（基於 Open API 規格 V1.4）
 
 API 文件: docs/payment/電子發票Open_API規格_商戶_V1.4.pdf
+
+async 路由請使用 *_async 方法（共用連線池、不阻塞 event loop，見 services.tappay_client）。
 """
 
 import os
 import requests
+import httpx
 import logging
 from typing import Dict, Optional
 from datetime import datetime
 from sqlalchemy.orm import Session
 from models import TeacherSubscriptionTransaction, InvoiceStatusHistory
+from services.tappay_client import TapPayClient, get_tappay_base_url, get_tappay_client
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +23,7 @@ logger = logging.getLogger(__name__)
 class TapPayEInvoiceService:
     """TapPay 電子發票服務"""
 
-    def __init__(self):
+    def __init__(self, client: Optional[TapPayClient] = None):
         self.partner_key = os.getenv("TAPPAY_PARTNER_KEY")
         if not self.partner_key:
             raise ValueError("TAPPAY_PARTNER_KEY environment variable is required")
@@ -28,15 +32,35 @@ class TapPayEInvoiceService:
         if not self.merchant_id:
             raise ValueError("TAPPAY_MERCHANT_ID environment variable is required")
 
-        # 根據環境選擇 API URL
+        # 根據環境選擇 API URL（TAPPAY_API_BASE_URL 可指向本地 stub server）
         self.environment = os.getenv("TAPPAY_ENV", "sandbox")
-        if self.environment == "production":
-            self.base_url = "https://prod.tappaysdk.com/tpc/einvoice"
-        else:
-            self.base_url = "https://sandbox.tappaysdk.com/tpc/einvoice"
+        self.base_url = f"{get_tappay_base_url(self.environment)}/tpc/einvoice"
+
+        # 非同步 client（共用連線池）
+        self.client = client if client is not None else get_tappay_client()
 
         logger.info(f"TapPay E-Invoice Service initialized in {self.environment} mode")
 
+    def _prepare_request(self, endpoint: str, payload: Dict):
+        """組出 URL 與 headers，並自動加入 partner_key"""
+        url = f"{self.base_url}/{endpoint}"
+        headers = {
+            "Content-Type": "application/json",
+            "x-api-key": self.partner_key,
+        }
+
+        if "partner_key" not in payload:
+            payload["partner_key"] = self.partner_key
+
+        return url, headers
+
+    @staticmethod
+    def _log_result(result: Dict):
+        logger.info(
+            f"E-Invoice API response: status={result.get('status')}, "
+            f"rec_invoice_id={result.get('rec_invoice_id')}"
+        )
+
     def _make_request(self, endpoint: str, payload: Dict, method: str = "POST") -> Dict:
         """
         發送 API 請求的通用方法
@@ -49,15 +73,7 @@ class TapPayEInvoiceService:
         Returns:
             API 回應
         """
-        url = f"{self.base_url}/{endpoint}"
-        headers = {
-            "Content-Type": "application/json",
-            "x-api-key": self.partner_key,
-        }
-
-        # 自動加入 partner_key
-        if "partner_key" not in payload:
-            payload["partner_key"] = self.partner_key
+        url, headers = self._prepare_request(endpoint, payload)
 
         try:
             logger.info(f"TapPay E-Invoice API: {method} {url}")
@@ -71,15 +87,58 @@ class TapPayEInvoiceService:
 
             response.raise_for_status()
             result = response.json()
+            self._log_result(result)
+            return result
 
-            logger.info(
-                f"E-Invoice API response: status={result.get('status')}, "
-                f"rec_invoice_id={result.get('rec_invoice_id')}"
+        except requests.exceptions.RequestException as e:
+            logger.error(f"TapPay E-Invoice API error: {str(e)}")
+            return {"status": -1, "msg": str(e), "error": "API_REQUEST_FAILED"}
+        except Exception as e:
+            logger.error(f"Unexpected error in E-Invoice service: {str(e)}")
+            return {
+                "status": -1,
+                "msg": "E-Invoice API failed",
+                "error": "INTERNAL_ERROR",
+            }
+
+    async def _make_request_async(
+        self,
+        endpoint: str,
+        payload: Dict,
+        method: str = "POST",
+        order_number: Optional[str] = None,
+    ) -> Dict:
+        """
+        _make_request 的非同步版本
+
+        Args:
+            order_number: 冪等 key 的訂單參考（交易 / 發票編號）；None 表示不做冪等處理，
+                GET 查詢沒有副作用，逾時 / 5xx 會重試
+        """
+        url, headers = self._prepare_request(endpoint, payload)
+        idempotency_key = (
+            self.client.make_idempotency_key(
+                f"einvoice-{endpoint}", order_number, payload
             )
+            if order_number
+            else None
+        )
 
+        try:
+            logger.info(f"TapPay E-Invoice API: {method} {url}")
+            result = await self.client.request(
+                f"einvoice-{endpoint}",
+                url,
+                payload,
+                headers=headers,
+                method=method,
+                idempotency_key=idempotency_key,
+                retry_unsafe=method == "GET",
+            )
+            self._log_result(result)
             return result
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"TapPay E-Invoice API error: {str(e)}")
             return {"status": -1, "msg": str(e), "error": "API_REQUEST_FAILED"}
         except Exception as e:
@@ -90,6 +149,105 @@ class TapPayEInvoiceService:
                 "error": "INTERNAL_ERROR",
             }
 
+    # ------------------------------------------------------------------
+    # 開立發票
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _build_issue_payload(
+        transaction: TeacherSubscriptionTransaction,
+        buyer_email: str,
+        buyer_tax_id: Optional[str],
+        buyer_name: Optional[str],
+        carrier_type: Optional[str],
+        carrier_id: Optional[str],
+    ) -> Dict:
+        payload = {
+            "rec_trade_id": transaction.external_transaction_id,  # TapPay 交易編號
+            "buyer_email": buyer_email,  # 必填
+            "issue_notify_email": "AUTO",  # 自動發送發票 email
+        }
+
+        # B2B 發票
+        if buyer_tax_id:
+            payload["buyer_tax_id"] = buyer_tax_id
+            payload["buyer_name"] = buyer_name or "公司名稱"
+            payload["invoice_type"] = "B2B"
+        else:
+            payload["invoice_type"] = "B2C"
+
+        # 載具資訊
+        if carrier_type and carrier_id:
+            payload["carrier_type"] = carrier_type
+            payload["carrier_id"] = carrier_id
+
+        return payload
+
+    @staticmethod
+    def _apply_issue_result(
+        db: Session,
+        transaction: TeacherSubscriptionTransaction,
+        payload: Dict,
+        result: Dict,
+        buyer_email: str,
+        buyer_tax_id: Optional[str],
+        buyer_name: Optional[str],
+        carrier_type: Optional[str],
+        carrier_id: Optional[str],
+    ):
+        """依 Issue API 回應更新交易與狀態歷史"""
+        if result.get("status") == 0:
+            # 成功開立
+            transaction.rec_invoice_id = result.get("rec_invoice_id")
+            transaction.invoice_number = result.get("invoice_number")
+            transaction.invoice_status = "ISSUED"
+            transaction.invoice_issued_at = datetime.now()
+            transaction.buyer_email = buyer_email
+            transaction.buyer_tax_id = buyer_tax_id
+            transaction.buyer_name = buyer_name
+            transaction.carrier_type = carrier_type
+            transaction.carrier_id = carrier_id
+            transaction.invoice_response = result
+
+            # 記錄狀態變更歷史
+            history = InvoiceStatusHistory(
+                transaction_id=transaction.id,
+                from_status="PENDING",
+                to_status="ISSUED",
+                action_type="ISSUE",
+                reason="開立發票",
+                request_payload=payload,
+                response_payload=result,
+            )
+            db.add(history)
+            db.commit()
+
+            logger.info(
+                f"Invoice issued successfully: rec_invoice_id={result.get('rec_invoice_id')}, "
+                f"invoice_number={result.get('invoice_number')}"
+            )
+        else:
+            # 開立失敗
+            transaction.invoice_status = "ERROR"
+            transaction.invoice_response = result
+
+            history = InvoiceStatusHistory(
+                transaction_id=transaction.id,
+                from_status="PENDING",
+                to_status="ERROR",
+                action_type="ISSUE",
+                reason=f"開立失敗: {result.get('msg')}",
+                request_payload=payload,
+                response_payload=result,
+            )
+            db.add(history)
+            db.commit()
+
+            logger.error(
+                f"Invoice issue failed: status={result.get('status')}, "
+                f"msg={result.get('msg')}"
+            )
+
     def issue_invoice(
         self,
         db: Session,
@@ -115,89 +273,78 @@ class TapPayEInvoiceService:
         Returns:
             TapPay API 回應
         """
-        # 構建 API payload
-        payload = {
-            "rec_trade_id": transaction.external_transaction_id,  # TapPay 交易編號
-            "buyer_email": buyer_email,  # 必填
-            "issue_notify_email": "AUTO",  # 自動發送發票 email
-        }
-
-        # B2B 發票
-        if buyer_tax_id:
-            payload["buyer_tax_id"] = buyer_tax_id
-            payload["buyer_name"] = buyer_name or "公司名稱"
-            payload["invoice_type"] = "B2B"
-        else:
-            payload["invoice_type"] = "B2C"
-
-        # 載具資訊
-        if carrier_type and carrier_id:
-            payload["carrier_type"] = carrier_type
-            payload["carrier_id"] = carrier_id
+        buyer = (buyer_email, buyer_tax_id, buyer_name, carrier_type, carrier_id)
+        payload = self._build_issue_payload(transaction, *buyer)
 
         try:
             # 呼叫 TapPay Issue API
             result = self._make_request("issue", payload)
+            self._apply_issue_result(db, transaction, payload, result, *buyer)
+            return result
 
-            # 更新資料庫
-            if result.get("status") == 0:
-                # 成功開立
-                transaction.rec_invoice_id = result.get("rec_invoice_id")
-                transaction.invoice_number = result.get("invoice_number")
-                transaction.invoice_status = "ISSUED"
-                transaction.invoice_issued_at = datetime.now()
-                transaction.buyer_email = buyer_email
-                transaction.buyer_tax_id = buyer_tax_id
-                transaction.buyer_name = buyer_name
-                transaction.carrier_type = carrier_type
-                transaction.carrier_id = carrier_id
-                transaction.invoice_response = result
-
-                # 記錄狀態變更歷史
-                history = InvoiceStatusHistory(
-                    transaction_id=transaction.id,
-                    from_status="PENDING",
-                    to_status="ISSUED",
-                    action_type="ISSUE",
-                    reason="開立發票",
-                    request_payload=payload,
-                    response_payload=result,
-                )
-                db.add(history)
-                db.commit()
-
-                logger.info(
-                    f"Invoice issued successfully: rec_invoice_id={result.get('rec_invoice_id')}, "
-                    f"invoice_number={result.get('invoice_number')}"
-                )
-            else:
-                # 開立失敗
-                transaction.invoice_status = "ERROR"
-                transaction.invoice_response = result
-
-                history = InvoiceStatusHistory(
-                    transaction_id=transaction.id,
-                    from_status="PENDING",
-                    to_status="ERROR",
-                    action_type="ISSUE",
-                    reason=f"開立失敗: {result.get('msg')}",
-                    request_payload=payload,
-                    response_payload=result,
-                )
-                db.add(history)
-                db.commit()
+        except Exception as e:
+            logger.error(f"Issue invoice error: {str(e)}")
+            return {"status": -1, "msg": str(e), "error": "ISSUE_FAILED"}
 
-                logger.error(
-                    f"Invoice issue failed: status={result.get('status')}, "
-                    f"msg={result.get('msg')}"
-                )
+    async def issue_invoice_async(
+        self,
+        db: Session,
+        transaction: TeacherSubscriptionTransaction,
+        buyer_email: str,
+        buyer_tax_id: Optional[str] = None,
+        buyer_name: Optional[str] = None,
+        carrier_type: Optional[str] = None,
+        carrier_id: Optional[str] = None,
+    ) -> Dict:
+        """issue_invoice 的非同步版本（以 TapPay 交易編號作為冪等 key）"""
+        buyer = (buyer_email, buyer_tax_id, buyer_name, carrier_type, carrier_id)
+        payload = self._build_issue_payload(transaction, *buyer)
 
+        try:
+            result = await self._make_request_async(
+                "issue", payload, order_number=transaction.external_transaction_id
+            )
+            self._apply_issue_result(db, transaction, payload, result, *buyer)
             return result
 
         except Exception as e:
             logger.error(f"Issue invoice error: {str(e)}")
             return {"status": -1, "msg": str(e), "error": "ISSUE_FAILED"}
 
+    # ------------------------------------------------------------------
+    # 作廢 / 折讓
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _apply_status_change(
+        db: Session,
+        transaction: TeacherSubscriptionTransaction,
+        payload: Dict,
+        result: Dict,
+        to_status: str,
+        action_type: str,
+        reason: str,
+    ):
+        """成功時更新發票狀態並記錄狀態變更歷史"""
+        if result.get("status") != 0:
+            return
+
+        old_status = transaction.invoice_status
+        transaction.invoice_status = to_status
+        transaction.invoice_response = result
+
+        history = InvoiceStatusHistory(
+            transaction_id=transaction.id,
+            from_status=old_status,
+            to_status=to_status,
+            action_type=action_type,
+            reason=reason,
+            request_payload=payload,
+            response_payload=result,
+        )
+        db.add(history)
+        db.commit()
+
     def void_invoice(
         self,
         db: Session,
@@ -225,28 +372,45 @@ class TapPayEInvoiceService:
 
         try:
             result = self._make_request("void", payload)
-
+            self._apply_status_change(
+                db, transaction, payload, result, "VOIDED", "VOID", reason
+            )
             if result.get("status") == 0:
-                old_status = transaction.invoice_status
-                transaction.invoice_status = "VOIDED"
-                transaction.invoice_response = result
-
-                history = InvoiceStatusHistory(
-                    transaction_id=transaction.id,
-                    from_status=old_status,
-                    to_status="VOIDED",
-                    action_type="VOID",
-                    reason=reason,
-                    request_payload=payload,
-                    response_payload=result,
+                logger.info(
+                    f"Invoice voided: rec_invoice_id={transaction.rec_invoice_id}"
                 )
-                db.add(history)
-                db.commit()
+            return result
 
+        except Exception as e:
+            logger.error(f"Void invoice error: {str(e)}")
+            return {"status": -1, "msg": str(e), "error": "VOID_FAILED"}
+
+    async def void_invoice_async(
+        self,
+        db: Session,
+        transaction: TeacherSubscriptionTransaction,
+        reason: str = "用戶申請退款",
+    ) -> Dict:
+        """void_invoice 的非同步版本（以發票編號作為冪等 key）"""
+        if not transaction.rec_invoice_id:
+            return {"status": -1, "msg": "No invoice to void", "error": "NO_INVOICE"}
+
+        payload = {
+            "rec_invoice_id": transaction.rec_invoice_id,
+            "void_reason": reason,
+        }
+
+        try:
+            result = await self._make_request_async(
+                "void", payload, order_number=transaction.rec_invoice_id
+            )
+            self._apply_status_change(
+                db, transaction, payload, result, "VOIDED", "VOID", reason
+            )
+            if result.get("status") == 0:
                 logger.info(
                     f"Invoice voided: rec_invoice_id={transaction.rec_invoice_id}"
                 )
-
             return result
 
         except Exception as e:
@@ -287,35 +451,75 @@ class TapPayEInvoiceService:
 
         try:
             result = self._make_request("allowance", payload)
-
+            self._apply_status_change(
+                db,
+                transaction,
+                payload,
+                result,
+                "ALLOWANCED",
+                "ALLOWANCE",
+                f"{reason} (金額: {allowance_amount})",
+            )
             if result.get("status") == 0:
-                old_status = transaction.invoice_status
-                transaction.invoice_status = "ALLOWANCED"
-                transaction.invoice_response = result
-
-                history = InvoiceStatusHistory(
-                    transaction_id=transaction.id,
-                    from_status=old_status,
-                    to_status="ALLOWANCED",
-                    action_type="ALLOWANCE",
-                    reason=f"{reason} (金額: {allowance_amount})",
-                    request_payload=payload,
-                    response_payload=result,
+                logger.info(
+                    f"Allowance issued: rec_invoice_id={transaction.rec_invoice_id}, "
+                    f"amount={allowance_amount}"
                 )
-                db.add(history)
-                db.commit()
+            return result
+
+        except Exception as e:
+            logger.error(f"Issue allowance error: {str(e)}")
+            return {"status": -1, "msg": str(e), "error": "ALLOWANCE_FAILED"}
+
+    async def issue_allowance_async(
+        self,
+        db: Session,
+        transaction: TeacherSubscriptionTransaction,
+        allowance_amount: int,
+        reason: str = "用戶申請退款",
+    ) -> Dict:
+        """issue_allowance 的非同步版本（以發票編號 + 金額作為冪等 key）"""
+        if not transaction.rec_invoice_id:
+            return {
+                "status": -1,
+                "msg": "No invoice for allowance",
+                "error": "NO_INVOICE",
+            }
 
+        payload = {
+            "rec_invoice_id": transaction.rec_invoice_id,
+            "allowance_amount": allowance_amount,
+            "allowance_reason": reason,
+        }
+
+        try:
+            result = await self._make_request_async(
+                "allowance", payload, order_number=transaction.rec_invoice_id
+            )
+            self._apply_status_change(
+                db,
+                transaction,
+                payload,
+                result,
+                "ALLOWANCED",
+                "ALLOWANCE",
+                f"{reason} (金額: {allowance_amount})",
+            )
+            if result.get("status") == 0:
                 logger.info(
                     f"Allowance issued: rec_invoice_id={transaction.rec_invoice_id}, "
                     f"amount={allowance_amount}"
                 )
-
             return result
 
         except Exception as e:
             logger.error(f"Issue allowance error: {str(e)}")
             return {"status": -1, "msg": str(e), "error": "ALLOWANCE_FAILED"}
 
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+
     def query_invoice(self, rec_invoice_id: str) -> Dict:
         """
         查詢發票狀態 (Query API)
@@ -336,6 +540,17 @@ class TapPayEInvoiceService:
             logger.error(f"Query invoice error: {str(e)}")
             return {"status": -1, "msg": str(e), "error": "QUERY_FAILED"}
 
+    async def query_invoice_async(self, rec_invoice_id: str) -> Dict:
+        """query_invoice 的非同步版本"""
+        payload = {"rec_invoice_id": rec_invoice_id}
+
+        try:
+            return await self._make_request_async("query", payload, method="GET")
+
+        except Exception as e:
+            logger.error(f"Query invoice error: {str(e)}")
+            return {"status": -1, "msg": str(e), "error": "QUERY_FAILED"}
+
     def handle_notify(self, db: Session, notify_data: Dict) -> Dict:
         """
         處理 TapPay Notify Webhook (當發票上傳到財政部失敗時觸發)
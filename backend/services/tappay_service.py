@@ -1,16 +1,21 @@
 """
 TapPay Payment Service
 處理 TapPay 金流串接
+
+async 路由請使用 *_async 方法（共用連線池、不阻塞 event loop，見 services.tappay_client）；
+同步方法保留給非 async 的呼叫端。
 """
 
 import os
 import requests
+import httpx
 import logging
 import hmac
 import hashlib
-from typing import Dict
+from typing import Any, Dict, Optional
 from datetime import datetime
 from core.config import settings
+from services.tappay_client import TapPayClient, get_tappay_base_url, get_tappay_client
 
 logger = logging.getLogger(__name__)
 
@@ -18,58 +23,46 @@ logger = logging.getLogger(__name__)
 class TapPayService:
     """TapPay 金流服務"""
 
-    def __init__(self):
+    def __init__(self, client: Optional[TapPayClient] = None):
         # 使用 settings 自動選擇正確的環境參數
         self.environment = settings.TAPPAY_ENV
         self.partner_key = settings.tappay_partner_key
         self.merchant_id = settings.tappay_merchant_id
 
-        # 根據環境選擇 API URL
-        if self.environment == "production":
-            self.pay_by_prime_url = (
-                "https://prod.tappaysdk.com/tpc/payment/pay-by-prime"
-            )
-            self.pay_by_token_url = (
-                "https://prod.tappaysdk.com/tpc/payment/pay-by-token"
-            )
-        else:
-            self.pay_by_prime_url = (
-                "https://sandbox.tappaysdk.com/tpc/payment/pay-by-prime"
-            )
-            self.pay_by_token_url = (
-                "https://sandbox.tappaysdk.com/tpc/payment/pay-by-token"
-            )
+        # 根據環境選擇 API URL（TAPPAY_API_BASE_URL 可指向本地 stub server）
+        base_url = get_tappay_base_url(self.environment)
+        self.pay_by_prime_url = f"{base_url}/tpc/payment/pay-by-prime"
+        self.pay_by_token_url = f"{base_url}/tpc/payment/pay-by-token"
+        # 正確的 query / refund / capture URL 不含 /payment/ 路徑
+        self.query_url = f"{base_url}/tpc/transaction/query"
+        self.refund_url = f"{base_url}/tpc/transaction/refund"
+        self.capture_url = f"{base_url}/tpc/transaction/capture"
 
         # 保持向後相容
         self.api_url = self.pay_by_prime_url
 
+        # 非同步 client（共用連線池）
+        self.client = client if client is not None else get_tappay_client()
+
         logger.info(f"TapPay Service initialized in {self.environment} mode")
         logger.info(f"Using merchant_id: {self.merchant_id}")
 
-    def process_payment(
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "x-api-key": self.partner_key,
+        }
+
+    def _build_prime_payload(
         self,
         prime: str,
         amount: int,
         details: Dict,
         cardholder: Dict,
-        order_number: str = None,
-        remember: bool = False,
+        order_number: Optional[str],
+        remember: bool,
     ) -> Dict:
-        """
-        處理信用卡付款
-
-        Args:
-            prime: TapPay prime token (from frontend)
-            amount: 金額 (TWD)
-            details: 商品詳情
-            cardholder: 持卡人資訊
-            order_number: 訂單編號
-            remember: 是否記住卡片 (for recurring)
-
-        Returns:
-            TapPay API response
-        """
-
+        """pay-by-prime 的請求內容（同步 / 非同步共用）"""
         if not order_number:
             order_number = f"DUO_{datetime.now().strftime('%Y%m%d%H%M%S')}"
 
@@ -100,6 +93,73 @@ class TapPayService:
                 "backend_notify_url": f"{os.getenv('BACKEND_URL')}/api/payment/webhook",
             }
 
+        return payload
+
+    def _build_token_payload(
+        self,
+        card_key: str,
+        card_token: str,
+        amount: int,
+        details,
+        cardholder: Dict,
+        order_number: Optional[str],
+    ) -> Dict:
+        """pay-by-token 的請求內容（同步 / 非同步共用）"""
+        if not order_number:
+            order_number = f"AUTO_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+        payload = {
+            "partner_key": self.partner_key,
+            "merchant_id": self.merchant_id,
+            "card_key": card_key,
+            "card_token": card_token,
+            "amount": amount,
+            "currency": "TWD",
+            "details": details
+            if isinstance(details, str)
+            else details.get("item_name", "Duotopia Auto-Renewal"),
+            "order_number": order_number,
+            "cardholder": {
+                "phone_number": cardholder.get("phone", "+886912345678"),
+                "name": cardholder.get("name", ""),
+                "email": cardholder.get("email", ""),
+                "zip_code": cardholder.get("zip_code", ""),
+                "address": cardholder.get("address", ""),
+                "national_id": cardholder.get("national_id", ""),
+            },
+        }
+
+        return payload
+
+    def process_payment(
+        self,
+        prime: str,
+        amount: int,
+        details: Dict,
+        cardholder: Dict,
+        order_number: str = None,
+        remember: bool = False,
+    ) -> Dict:
+        """
+        處理信用卡付款
+
+        Args:
+            prime: TapPay prime token (from frontend)
+            amount: 金額 (TWD)
+            details: 商品詳情
+            cardholder: 持卡人資訊
+            order_number: 訂單編號
+            remember: 是否記住卡片 (for recurring)
+
+        Returns:
+            TapPay API response
+        """
+
+        payload = self._build_prime_payload(
+            prime, amount, details, cardholder, order_number, remember
+        )
+        order_number = payload["order_number"]
+
         try:
             print("🔥 TapPay Service Config:")
             print(f"  - Environment: {self.environment}")
@@ -172,29 +232,10 @@ class TapPayService:
             TapPay API response（包含更新的 card_token）
         """
 
-        if not order_number:
-            order_number = f"AUTO_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-        payload = {
-            "partner_key": self.partner_key,
-            "merchant_id": self.merchant_id,
-            "card_key": card_key,
-            "card_token": card_token,
-            "amount": amount,
-            "currency": "TWD",
-            "details": details
-            if isinstance(details, str)
-            else details.get("item_name", "Duotopia Auto-Renewal"),
-            "order_number": order_number,
-            "cardholder": {
-                "phone_number": cardholder.get("phone", "+886912345678"),
-                "name": cardholder.get("name", ""),
-                "email": cardholder.get("email", ""),
-                "zip_code": cardholder.get("zip_code", ""),
-                "address": cardholder.get("address", ""),
-                "national_id": cardholder.get("national_id", ""),
-            },
-        }
+        payload = self._build_token_payload(
+            card_key, card_token, amount, details, cardholder, order_number
+        )
+        order_number = payload["order_number"]
 
         try:
             logger.info(f"Processing auto-renewal payment for order: {order_number}")
@@ -245,12 +286,7 @@ class TapPayService:
         Returns:
             Transaction details
         """
-        # 正確的 query URL 不含 /payment/ 路徑
-        if self.environment == "production":
-            query_url = "https://prod.tappaysdk.com/tpc/transaction/query"
-        else:
-            query_url = "https://sandbox.tappaysdk.com/tpc/transaction/query"
-
+        query_url = self.query_url
         payload = {"partner_key": self.partner_key, "rec_trade_id": rec_trade_id}
 
         try:
@@ -282,12 +318,7 @@ class TapPayService:
         Returns:
             Refund result
         """
-        # 正確的 refund URL 不含 /payment/ 路徑
-        if self.environment == "production":
-            refund_url = "https://prod.tappaysdk.com/tpc/transaction/refund"
-        else:
-            refund_url = "https://sandbox.tappaysdk.com/tpc/transaction/refund"
-
+        refund_url = self.refund_url
         payload = {"partner_key": self.partner_key, "rec_trade_id": rec_trade_id}
 
         if amount is not None:
@@ -341,12 +372,7 @@ class TapPayService:
         Returns:
             Capture result
         """
-        # 正確的 capture URL 不含 /payment/ 路徑
-        if self.environment == "production":
-            capture_url = "https://prod.tappaysdk.com/tpc/transaction/capture"
-        else:
-            capture_url = "https://sandbox.tappaysdk.com/tpc/transaction/capture"
-
+        capture_url = self.capture_url
         payload = {"partner_key": self.partner_key, "rec_trade_id": rec_trade_id}
 
         if amount is not None:
@@ -367,6 +393,227 @@ class TapPayService:
             logger.error(f"Capture error: {str(e)}")
             return {"status": -1, "msg": str(e)}
 
+    # ------------------------------------------------------------------
+    # 非同步版本（async 路由使用，經由共用連線池的 TapPayClient）
+    # ------------------------------------------------------------------
+
+    async def process_payment_async(
+        self,
+        prime: str,
+        amount: int,
+        details: Dict,
+        cardholder: Dict,
+        order_number: str = None,
+        remember: bool = False,
+    ) -> Dict:
+        """process_payment 的非同步版本（相同訂單與內容重複送出時回傳第一次的結果）"""
+        payload = self._build_prime_payload(
+            prime, amount, details, cardholder, order_number, remember
+        )
+        order_number = payload["order_number"]
+
+        try:
+            logger.info(f"Processing payment for order: {order_number}")
+            result = await self.client.request(
+                "pay-by-prime",
+                self.pay_by_prime_url,
+                payload,
+                headers=self._headers(),
+                idempotency_key=self.client.make_idempotency_key(
+                    "pay-by-prime", order_number, payload
+                ),
+            )
+            logger.info(
+                f"TapPay response status: {result.get('status')}, "
+                f"rec_trade_id: {result.get('rec_trade_id')}"
+            )
+            return result
+
+        except httpx.HTTPError as e:
+            logger.error(f"TapPay API error: {str(e)}")
+            return {"status": -1, "msg": str(e), "error": "API_REQUEST_FAILED"}
+        except Exception as e:
+            logger.error(f"Unexpected error in TapPay service: {str(e)}")
+            return {
+                "status": -1,
+                "msg": "Payment processing failed",
+                "error": "INTERNAL_ERROR",
+            }
+
+    async def pay_by_token_async(
+        self,
+        card_key: str,
+        card_token: str,
+        amount: int,
+        details: str,
+        cardholder: Dict,
+        order_number: str = None,
+    ) -> Dict:
+        """pay_by_token 的非同步版本（相同訂單與內容重複送出時回傳第一次的結果）"""
+        payload = self._build_token_payload(
+            card_key, card_token, amount, details, cardholder, order_number
+        )
+        order_number = payload["order_number"]
+
+        try:
+            logger.info(f"Processing auto-renewal payment for order: {order_number}")
+            result = await self.client.request(
+                "pay-by-token",
+                self.pay_by_token_url,
+                payload,
+                headers=self._headers(),
+                idempotency_key=self.client.make_idempotency_key(
+                    "pay-by-token", order_number, payload
+                ),
+            )
+            logger.info(
+                f"TapPay pay-by-token response: status={result.get('status')}, "
+                f"rec_trade_id={result.get('rec_trade_id')}"
+            )
+
+            # ⚠️ 重要：成功交易會返回新的 card_token，需要更新
+            if result.get("status") == 0 and result.get("card_secret"):
+                logger.info("New card_token received, caller should update DB")
+
+            return result
+
+        except httpx.HTTPError as e:
+            logger.error(f"TapPay pay-by-token API error: {str(e)}")
+            return {"status": -1, "msg": str(e), "error": "API_REQUEST_FAILED"}
+        except Exception as e:
+            logger.error(f"Unexpected error in pay-by-token: {str(e)}")
+            return {
+                "status": -1,
+                "msg": "Auto-renewal payment processing failed",
+                "error": "INTERNAL_ERROR",
+            }
+
+    async def query_transaction_async(self, rec_trade_id: str) -> Dict:
+        """query_transaction 的非同步版本（查詢沒有副作用，逾時 / 5xx 會重試）"""
+        payload = {"partner_key": self.partner_key, "rec_trade_id": rec_trade_id}
+
+        try:
+            return await self.client.request(
+                "query",
+                self.query_url,
+                payload,
+                headers=self._headers(),
+                retry_unsafe=True,
+            )
+        except Exception as e:
+            logger.error(f"Query transaction error: {str(e)}")
+            return {"status": -1, "msg": str(e)}
+
+    async def find_transaction_by_order_number_async(
+        self, order_number: str
+    ) -> Dict:
+        """
+        以訂單編號查詢交易紀錄（Record API filters.order_number）
+
+        用於扣款結果不明（逾時、程序中斷）時確認是否已扣款。
+
+        Returns:
+            TapPay 回應（trade_records 為符合的交易，查詢失敗時 status 為 -1）
+        """
+        payload = {
+            "partner_key": self.partner_key,
+            "records_per_page": 10,
+            "page": 0,
+            "filters": {"order_number": order_number},
+        }
+
+        try:
+            return await self.client.request(
+                "query",
+                self.query_url,
+                payload,
+                headers=self._headers(),
+                retry_unsafe=True,
+            )
+        except Exception as e:
+            logger.error(f"Query transaction by order number error: {str(e)}")
+            return {"status": -1, "msg": str(e)}
+
+    def _request_idempotency_key(
+        self,
+        endpoint: str,
+        rec_trade_id: str,
+        payload: Dict[str, Any],
+        request_id: Optional[str],
+    ) -> Optional[str]:
+        """退款 / 請款的冪等 key：必須由呼叫端提供 request_id，否則不去重"""
+        if not request_id:
+            return None
+        return self.client.make_idempotency_key(
+            endpoint, rec_trade_id, {**payload, "request_id": request_id}
+        )
+
+    async def refund_async(
+        self, rec_trade_id: str, amount: int = None, request_id: Optional[str] = None
+    ) -> Dict:
+        """
+        refund 的非同步版本
+
+        退款會移動金額，不能以內容去重（同一筆交易、相同金額的第二次部分退款是合法的）：
+        只有呼叫端提供 request_id（同一次退款操作的重送）時才回傳第一次的結果；
+        未提供時每次都送出，只重試確定未送達的錯誤。
+        """
+        payload = {"partner_key": self.partner_key, "rec_trade_id": rec_trade_id}
+
+        if amount is not None:
+            payload["amount"] = amount  # 部分退款
+
+        logger.info(
+            f"🔄 Sending refund request: rec_trade_id={rec_trade_id}, "
+            f"amount={amount or 'Full refund'}"
+        )
+
+        try:
+            result = await self.client.request(
+                "refund",
+                self.refund_url,
+                payload,
+                headers=self._headers(),
+                idempotency_key=self._request_idempotency_key(
+                    "refund", rec_trade_id, payload, request_id
+                ),
+            )
+            logger.info(
+                f"✅ Refund processed for {rec_trade_id}: status={result.get('status')}"
+            )
+            return result
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"❌ HTTP Error: {e}")
+            logger.error(f"❌ Response: {e.response.text}")
+            return {"status": -1, "msg": str(e)}
+        except Exception as e:
+            logger.error(f"❌ Refund error: {str(e)}")
+            return {"status": -1, "msg": str(e)}
+
+    async def capture_async(
+        self, rec_trade_id: str, amount: int = None, request_id: Optional[str] = None
+    ) -> Dict:
+        """capture 的非同步版本（與 refund_async 相同，只有提供 request_id 時才去重）"""
+        payload = {"partner_key": self.partner_key, "rec_trade_id": rec_trade_id}
+
+        if amount is not None:
+            payload["amount"] = amount
+
+        try:
+            return await self.client.request(
+                "capture",
+                self.capture_url,
+                payload,
+                headers={"Content-Type": "application/json"},
+                idempotency_key=self._request_idempotency_key(
+                    "capture", rec_trade_id, payload, request_id
+                ),
+            )
+        except Exception as e:
+            logger.error(f"Capture error: {str(e)}")
+            return {"status": -1, "msg": str(e)}
+
     def validate_webhook(self, request_body: bytes, signature: str) -> bool:
         """
         驗證 TapPay Webhook 簽名
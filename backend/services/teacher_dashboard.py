@@ -0,0 +1,598 @@
+"""
+教師儀表板摘要（teacher dashboard summary）
+
+儀表板是每位教師登入後的首頁，原本每次都 selectin 載入所有班級的
+ClassroomStudent → Student 與 ClassroomSchool → School → Organization，
+成本隨班級人數成長。
+
+- TeacherDashboardSummary：每位教師一份摘要（所屬機構 / 學校 / 角色、
+  每個班級的學生數、學校、機構、前 3 位學生），mode 篩選直接在摘要上進行
+- 快取未命中時以彙總查詢重建：學生數與前 3 位學生用 window function 一次取得，
+  不載入整個班級的學生
+- TTL + LRU 快取（TEACHER_DASHBOARD_TTL_SECONDS / TEACHER_DASHBOARD_MAX_ENTRIES）
+- 班級、選課、班級學校、學校、機構、教師成員資格經 ORM 變更並 commit 後，
+  受影響教師的摘要立即失效；繞過 ORM 的變更由 TTL 兜底
+
+program 數、訂閱與 AI 額度不在摘要中，仍由 endpoint 即時查詢。
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from models import (
+    Classroom,
+    ClassroomSchool,
+    ClassroomStudent,
+    Organization,
+    School,
+    Student,
+    Teacher,
+    TeacherOrganization,
+    TeacherSchool,
+)
+
+# 每個班級列入 recent_students 的學生數
+RECENT_STUDENTS_PER_CLASSROOM = 3
+
+# 會影響摘要的 Student 欄位（登入時間等更新不需失效）
+_STUDENT_FIELDS = ("name", "email", "is_active")
+
+_PENDING_INVALIDATIONS_KEY = "teacher_dashboard_invalidations"
+
+
+def _as_uuid(value) -> Optional[uuid.UUID]:
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class RecentStudent:
+    id: int
+    name: str
+    email: Optional[str]
+
+
+@dataclass(frozen=True)
+class ClassroomEntry:
+    """一個有效班級的摘要"""
+
+    id: int
+    name: str
+    description: Optional[str]
+    student_count: int
+    school_id: Optional[str]
+    school_name: Optional[str]
+    organization_id: Optional[str]
+    has_school_link: bool  # 是否有任何 ClassroomSchool（含停用）
+    active_school_ids: FrozenSet[uuid.UUID]
+    active_organization_ids: FrozenSet[uuid.UUID]
+    recent_students: Tuple[RecentStudent, ...]
+
+
+@dataclass(frozen=True)
+class TeacherDashboardSummary:
+    """一位教師的儀表板摘要"""
+
+    teacher_id: int
+    organization: Optional[Dict[str, str]]  # OrganizationInfo 欄位
+    schools: Tuple[Dict[str, str], ...]  # SchoolInfo 欄位
+    roles: Tuple[str, ...]
+    member_school_ids: FrozenSet[uuid.UUID]  # 有效 TeacherSchool
+    member_organization_ids: FrozenSet[uuid.UUID]  # 有效 TeacherOrganization
+    classrooms: Tuple[ClassroomEntry, ...]
+
+    def has_school(self, school_id) -> bool:
+        return _as_uuid(school_id) in self.member_school_ids
+
+    def has_organization(self, organization_id) -> bool:
+        return _as_uuid(organization_id) in self.member_organization_ids
+
+    def classrooms_for(
+        self,
+        mode: Optional[str] = None,
+        school_id: Optional[str] = None,
+        organization_id: Optional[str] = None,
+    ) -> List[ClassroomEntry]:
+        """
+        依 mode 篩選班級（呼叫端需先確認 school / organization 權限）
+
+        - personal：沒有連結任何學校的班級
+        - school：連結到該學校（有效連結）的班級
+        - organization：連結到該機構下學校的班級
+        - 未指定：全部班級
+        """
+        if mode == "personal":
+            return [c for c in self.classrooms if not c.has_school_link]
+        if mode == "school" and school_id:
+            target = _as_uuid(school_id)
+            return [c for c in self.classrooms if target in c.active_school_ids]
+        if mode == "organization" and organization_id:
+            target = _as_uuid(organization_id)
+            return [c for c in self.classrooms if target in c.active_organization_ids]
+        return list(self.classrooms)
+
+
+def load_teacher_dashboard_summary(
+    db: Session, teacher_id: int
+) -> TeacherDashboardSummary:
+    """從資料庫重建摘要（不經快取）"""
+    # 機構（與原本相同：取第一個有效的 TeacherOrganization）
+    org_rows = (
+        db.query(
+            TeacherOrganization.organization_id,
+            TeacherOrganization.role,
+            Organization.name,
+            Organization.display_name,
+            Organization.is_active,
+        )
+        .outerjoin(
+            Organization, Organization.id == TeacherOrganization.organization_id
+        )
+        .filter(
+            TeacherOrganization.teacher_id == teacher_id,
+            TeacherOrganization.is_active.is_(True),
+        )
+        .all()
+    )
+
+    organization = None
+    roles: Set[str] = set()
+    if org_rows:
+        first = org_rows[0]
+        roles.add(first.role)
+        if first.name is not None and first.is_active:
+            organization = {
+                "id": str(first.organization_id),
+                "name": first.display_name or first.name,
+                "type": "organization",
+            }
+
+    school_rows = (
+        db.query(
+            TeacherSchool.school_id,
+            TeacherSchool.roles,
+            School.name,
+            School.display_name,
+            School.is_active,
+        )
+        .outerjoin(School, School.id == TeacherSchool.school_id)
+        .filter(
+            TeacherSchool.teacher_id == teacher_id,
+            TeacherSchool.is_active.is_(True),
+        )
+        .all()
+    )
+
+    schools = []
+    for row in school_rows:
+        if row.name is not None and row.is_active:
+            schools.append(
+                {"id": str(row.school_id), "name": row.display_name or row.name}
+            )
+            if row.roles:
+                roles.update(row.roles)
+
+    classrooms = _load_classrooms(db, teacher_id)
+
+    return TeacherDashboardSummary(
+        teacher_id=teacher_id,
+        organization=organization,
+        schools=tuple(schools),
+        roles=tuple(sorted(roles)),
+        member_school_ids=frozenset(_as_uuid(r.school_id) for r in school_rows),
+        member_organization_ids=frozenset(
+            _as_uuid(r.organization_id) for r in org_rows
+        ),
+        classrooms=classrooms,
+    )
+
+
+def _load_classrooms(db: Session, teacher_id: int) -> Tuple[ClassroomEntry, ...]:
+    classroom_rows = (
+        db.query(Classroom.id, Classroom.name, Classroom.description)
+        .filter(
+            Classroom.teacher_id == teacher_id,
+            Classroom.is_active.is_(True),  # Filter out soft-deleted classrooms
+        )
+        .order_by(Classroom.id)
+        .all()
+    )
+    if not classroom_rows:
+        return ()
+    classroom_ids = [row.id for row in classroom_rows]
+
+    # 有效學生數 + 每班前 N 位學生（一個查詢，不載入整個班級）
+    ranked = (
+        db.query(
+            ClassroomStudent.classroom_id.label("classroom_id"),
+            Student.id.label("student_id"),
+            Student.name.label("name"),
+            Student.email.label("email"),
+            func.row_number()
+            .over(
+                partition_by=ClassroomStudent.classroom_id,
+                order_by=ClassroomStudent.id,
+            )
+            .label("row_rank"),
+            func.count()
+            .over(partition_by=ClassroomStudent.classroom_id)
+            .label("student_count"),
+        )
+        .join(Student, Student.id == ClassroomStudent.student_id)
+        .filter(
+            ClassroomStudent.classroom_id.in_(classroom_ids),
+            ClassroomStudent.is_active.is_(True),
+            Student.is_active.is_(True),
+        )
+        .subquery()
+    )
+    student_counts: Dict[int, int] = {}
+    recent: Dict[int, List[RecentStudent]] = {}
+    for row in (
+        db.query(ranked)
+        .filter(ranked.c.row_rank <= RECENT_STUDENTS_PER_CLASSROOM)
+        .order_by(ranked.c.classroom_id, ranked.c.row_rank)
+    ):
+        student_counts[row.classroom_id] = row.student_count
+        recent.setdefault(row.classroom_id, []).append(
+            RecentStudent(id=row.student_id, name=row.name, email=row.email)
+        )
+
+    links: Dict[int, List[Any]] = {}
+    for row in (
+        db.query(
+            ClassroomSchool.classroom_id,
+            ClassroomSchool.school_id,
+            ClassroomSchool.is_active,
+            School.id.label("linked_school_id"),
+            School.name.label("school_name"),
+            School.display_name.label("school_display_name"),
+            Organization.id.label("organization_id"),
+        )
+        .outerjoin(School, School.id == ClassroomSchool.school_id)
+        .outerjoin(Organization, Organization.id == School.organization_id)
+        .filter(ClassroomSchool.classroom_id.in_(classroom_ids))
+        .order_by(ClassroomSchool.id)
+    ):
+        links.setdefault(row.classroom_id, []).append(row)
+
+    entries = []
+    for classroom in classroom_rows:
+        classroom_links = links.get(classroom.id, [])
+        active_links = [link for link in classroom_links if link.is_active]
+
+        # Get the first active classroom_school record
+        school_id = school_name = organization_id = None
+        active = active_links[0] if active_links else None
+        if active is not None and active.linked_school_id is not None:
+            school_id = str(active.linked_school_id)
+            school_name = active.school_display_name or active.school_name
+            if active.organization_id is not None:
+                organization_id = str(active.organization_id)
+
+        entries.append(
+            ClassroomEntry(
+                id=classroom.id,
+                name=classroom.name,
+                description=classroom.description,
+                student_count=student_counts.get(classroom.id, 0),
+                school_id=school_id,
+                school_name=school_name,
+                organization_id=organization_id,
+                has_school_link=bool(classroom_links),
+                active_school_ids=frozenset(
+                    _as_uuid(link.school_id) for link in active_links
+                ),
+                active_organization_ids=frozenset(
+                    _as_uuid(link.organization_id)
+                    for link in active_links
+                    if link.organization_id is not None
+                ),
+                recent_students=tuple(recent.get(classroom.id, ())),
+            )
+        )
+    return tuple(entries)
+
+
+class TeacherDashboardCache:
+    """每位教師的儀表板摘要快取（TTL + LRU），依班級 / 學校 / 機構反查失效"""
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        loader: Callable[[Session, int], TeacherDashboardSummary] = (
+            load_teacher_dashboard_summary
+        ),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            ttl_seconds: 摘要有效秒數（TEACHER_DASHBOARD_TTL_SECONDS，0 = 不快取）
+            max_entries: 最多快取的教師數（TEACHER_DASHBOARD_MAX_ENTRIES）
+            loader: 重建摘要的函式（測試用）
+            clock: 取得目前時間的函式（測試用）
+        """
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.getenv("TEACHER_DASHBOARD_TTL_SECONDS", "60"))
+        )
+        self.max_entries = max_entries or int(
+            os.getenv("TEACHER_DASHBOARD_MAX_ENTRIES", "2000")
+        )
+        self._loader = loader
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[float, TeacherDashboardSummary]]" = (
+            OrderedDict()
+        )
+        # 反查索引：班級 / 學校 / 機構 → 快取中引用它的教師
+        self._by_classroom: Dict[int, int] = {}
+        self._by_school: Dict[uuid.UUID, Set[int]] = {}
+        self._by_organization: Dict[uuid.UUID, Set[int]] = {}
+        # 每次失效 +1；重建期間有失效發生時不寫入快取（避免存入過期摘要）
+        self._epoch = 0
+
+        # 統計
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get(self, db: Session, teacher_id: int) -> TeacherDashboardSummary:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(teacher_id)
+            if entry and now - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(teacher_id)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+            epoch = self._epoch
+
+        summary = self._loader(db, teacher_id)
+        if self.ttl_seconds <= 0:
+            return summary
+
+        with self._lock:
+            if self._epoch != epoch:
+                return summary
+            self._remove(teacher_id)
+            self._entries[teacher_id] = (now, summary)
+            self._index(summary)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._remove(evicted)
+        return summary
+
+    def _index(self, summary: TeacherDashboardSummary):
+        """呼叫端需持有 self._lock"""
+        teacher_id = summary.teacher_id
+        school_ids = set(summary.member_school_ids)
+        organization_ids = set(summary.member_organization_ids)
+        for classroom in summary.classrooms:
+            self._by_classroom[classroom.id] = teacher_id
+            school_ids.update(classroom.active_school_ids)
+            organization_ids.update(classroom.active_organization_ids)
+        for school_id in school_ids:
+            self._by_school.setdefault(school_id, set()).add(teacher_id)
+        for organization_id in organization_ids:
+            self._by_organization.setdefault(organization_id, set()).add(teacher_id)
+
+    def _remove(self, teacher_id: int):
+        """從快取與反查索引移除教師（呼叫端需持有 self._lock）"""
+        entry = self._entries.pop(teacher_id, None)
+        if entry is None:
+            return
+        summary = entry[1]
+        for classroom in summary.classrooms:
+            if self._by_classroom.get(classroom.id) == teacher_id:
+                del self._by_classroom[classroom.id]
+        for index in (self._by_school, self._by_organization):
+            for key in [k for k, teachers in index.items() if teacher_id in teachers]:
+                index[key].discard(teacher_id)
+                if not index[key]:
+                    del index[key]
+
+    def invalidate_teachers(self, teacher_ids: Iterable[int]):
+        with self._lock:
+            self._epoch += 1
+            self._invalidations += 1
+            for teacher_id in teacher_ids:
+                self._remove(teacher_id)
+
+    def invalidate(
+        self,
+        teacher_ids: Iterable[int] = (),
+        classroom_ids: Iterable[int] = (),
+        school_ids: Iterable[Any] = (),
+        organization_ids: Iterable[Any] = (),
+    ):
+        """依變更的班級 / 學校 / 機構找出受影響的教師並丟棄其摘要"""
+        with self._lock:
+            affected = set(teacher_ids)
+            for classroom_id in classroom_ids:
+                teacher_id = self._by_classroom.get(classroom_id)
+                if teacher_id is not None:
+                    affected.add(teacher_id)
+            for school_id in school_ids:
+                affected.update(self._by_school.get(_as_uuid(school_id), ()))
+            for organization_id in organization_ids:
+                affected.update(
+                    self._by_organization.get(_as_uuid(organization_id), ())
+                )
+        self.invalidate_teachers(affected)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._by_classroom.clear()
+            self._by_school.clear()
+            self._by_organization.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+            }
+
+
+# ----------------------------------------------------------------------
+# 全域實例與寫入端失效
+# ----------------------------------------------------------------------
+
+_cache: Optional[TeacherDashboardCache] = None
+
+
+def get_teacher_dashboard_cache() -> TeacherDashboardCache:
+    global _cache
+    if _cache is None:
+        _cache = TeacherDashboardCache()
+    return _cache
+
+
+def get_teacher_dashboard_summary(
+    db: Session, teacher_id: int
+) -> TeacherDashboardSummary:
+    return get_teacher_dashboard_cache().get(db, teacher_id)
+
+
+def get_teacher_dashboard_stats() -> Dict[str, Any]:
+    return _cache.get_stats() if _cache else {"entries": 0}
+
+
+def _record(target, kind: str, *keys):
+    session = object_session(target)
+    if session is None:
+        return
+    pending = session.info.setdefault(_PENDING_INVALIDATIONS_KEY, set())
+    for key in keys:
+        if key is not None:
+            pending.add((kind, key))
+
+
+def _previous_values(target, attribute: str) -> List[Any]:
+    """屬性在本次 flush 前的值（例如班級換了教師）"""
+    history = inspect(target).attrs[attribute].history
+    return list(history.deleted or ())
+
+
+@event.listens_for(Teacher, "after_insert")
+@event.listens_for(Teacher, "after_delete")
+def _teacher_changed(mapper, connection, target):
+    _record(target, "teacher", target.id)
+
+
+@event.listens_for(TeacherOrganization, "after_insert")
+@event.listens_for(TeacherOrganization, "after_update")
+@event.listens_for(TeacherOrganization, "after_delete")
+@event.listens_for(TeacherSchool, "after_insert")
+@event.listens_for(TeacherSchool, "after_update")
+@event.listens_for(TeacherSchool, "after_delete")
+def _membership_changed(mapper, connection, target):
+    _record(
+        target,
+        "teacher",
+        target.teacher_id,
+        *_previous_values(target, "teacher_id"),
+    )
+
+
+@event.listens_for(Classroom, "after_insert")
+@event.listens_for(Classroom, "after_update")
+@event.listens_for(Classroom, "after_delete")
+def _classroom_changed(mapper, connection, target):
+    _record(
+        target,
+        "teacher",
+        target.teacher_id,
+        *_previous_values(target, "teacher_id"),
+    )
+    _record(target, "classroom", target.id)
+
+
+@event.listens_for(ClassroomStudent, "after_insert")
+@event.listens_for(ClassroomStudent, "after_update")
+@event.listens_for(ClassroomStudent, "after_delete")
+@event.listens_for(ClassroomSchool, "after_insert")
+@event.listens_for(ClassroomSchool, "after_update")
+@event.listens_for(ClassroomSchool, "after_delete")
+def _classroom_link_changed(mapper, connection, target):
+    _record(
+        target,
+        "classroom",
+        target.classroom_id,
+        *_previous_values(target, "classroom_id"),
+    )
+
+
+@event.listens_for(School, "after_update")
+@event.listens_for(School, "after_delete")
+def _school_changed(mapper, connection, target):
+    _record(target, "school", target.id)
+
+
+@event.listens_for(Organization, "after_update")
+@event.listens_for(Organization, "after_delete")
+def _organization_changed(mapper, connection, target):
+    _record(target, "organization", target.id)
+
+
+@event.listens_for(Student, "after_update")
+def _student_changed(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in _STUDENT_FIELDS):
+        return
+    classroom_ids = connection.execute(
+        select(ClassroomStudent.classroom_id).where(
+            ClassroomStudent.student_id == target.id
+        )
+    ).scalars()
+    _record(target, "classroom", *classroom_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    pending = session.info.pop(_PENDING_INVALIDATIONS_KEY, ())
+    if not pending or _cache is None:
+        return
+    keys: Dict[str, List[Any]] = {}
+    for kind, key in pending:
+        keys.setdefault(kind, []).append(key)
+    _cache.invalidate(
+        teacher_ids=keys.get("teacher", ()),
+        classroom_ids=keys.get("classroom", ()),
+        school_ids=keys.get("school", ()),
+        organization_ids=keys.get("organization", ()),
+    )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop(_PENDING_INVALIDATIONS_KEY, None)
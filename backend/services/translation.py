@@ -9,10 +9,17 @@ import json as json_module
 import asyncio
 import logging
 from pathlib import Path
-from typing import List, Dict, Optional  # noqa: F401
+from typing import Any, Awaitable, Callable, List, Dict, Optional  # noqa: F401
 from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 from utils.http_client import get_http_client
+from services.translation_cache import (
+    MODE_BATCH,
+    MODE_POS,
+    MODE_TEXT,
+    TranslationCache,
+    normalize_text,
+)
 
 # 載入文法規則（按 CEFR 級別）
 _grammar_rules_path = Path(__file__).parent.parent / "config" / "grammar_by_level.json"
@@ -24,12 +31,31 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
+class BatchResultError(ValueError):
+    """LLM 回傳的批次結果無法對應到輸入（數量不符），可對半切分重試"""
+
+
+# 對半切分重試只處理「這一批的回應有問題」的錯誤；
+# 連線 / HTTP / 認證錯誤切小也不會成功，重試只會放大請求數
+SPLITTABLE_ERRORS = (BatchResultError, json_module.JSONDecodeError)
+
+
 class TranslationService:
-    def __init__(self):
+    def __init__(self, cache: Optional[TranslationCache] = None):
         self.use_vertex_ai = os.getenv("USE_VERTEX_AI", "false").lower() == "true"
         self.client = None  # OpenAI client (lazy init)
         self.vertex_ai = None  # Vertex AI service (lazy init)
         self.model = "gpt-4o-mini"  # OpenAI model (for fallback)
+        # 翻譯快取（記憶體 LRU + translation_cache_entries）
+        self.cache = cache or TranslationCache()
+        # 批次翻譯分批設定
+        self.chunk_token_budget = int(
+            os.getenv("TRANSLATION_CHUNK_TOKEN_BUDGET", "400")
+        )
+        self.chunk_max_items = int(os.getenv("TRANSLATION_CHUNK_MAX_ITEMS", "25"))
+        self.llm_concurrency = int(os.getenv("TRANSLATION_LLM_CONCURRENCY", "4"))
+        self._llm_semaphore: Optional[asyncio.Semaphore] = None
+        self._llm_semaphore_loop = None
 
     def _ensure_client(self):
         """Lazy initialization of AI client (OpenAI or Vertex AI)"""
@@ -52,9 +78,17 @@ class TranslationService:
                 )
                 logger.info("Using OpenAI for translation")
 
+    def get_cache_stats(self) -> Dict[str, any]:
+        """翻譯快取統計（命中率、大小、prompt 版本）"""
+        return self.cache.get_stats()
+
+    def clear_cache(self):
+        """清空記憶體快取與統計"""
+        self.cache.clear()
+
     async def translate_text(self, text: str, target_lang: str = "zh-TW") -> str:
         """
-        翻譯單一文本
+        翻譯單一文本（先查翻譯快取）
 
         Args:
             text: 要翻譯的文本
@@ -63,107 +97,117 @@ class TranslationService:
         Returns:
             翻譯後的文本
         """
+        cached = await self.cache.lookup([text], target_lang, MODE_TEXT)
+        if cached:
+            return next(iter(cached.values()))
+
         self._ensure_client()
 
         try:
-            # 根據目標語言設定 prompt
-            if target_lang == "zh-TW":
-                prompt = (
-                    f"請將以下英文單字翻譯成繁體中文：{text}\n\n"
-                    f"規則：\n"
-                    f"1. 只有當該字有多個明確不同的常見字義時，才提供多個翻譯（最多3個），以編號列出。\n"
-                    f"2. 簡單的字只需要1個翻譯即可。\n"
-                    f"3. 每個翻譯前必須加上詞性縮寫，格式：(詞性.) 翻譯\n"
-                    f"4. 只回覆翻譯結果，不要加任何說明。\n"
-                    f"詞性縮寫：n. v. adj. adv. prep. conj. interj. pron. det. aux.\n"
-                    f"範例（多字義）：\n"
-                    f"1. (v.) 識別\n"
-                    f"2. (v.) 認同\n"
-                    f"範例（單字義）：\n"
-                    f"(n.) 蘋果"
-                )
-            elif target_lang == "en":
-                # 英英釋義
-                prompt = (
-                    f"Provide English definitions for the word: {text}\n\n"
-                    f"RULES:\n"
-                    f'1. NEVER use the word "{text}" (or any of its forms) in the definition.\n'
-                    f"2. Each definition MUST be 15 words or fewer.\n"
-                    f"3. Only provide multiple definitions if the word has truly "
-                    f"distinct meanings. Simple words need only 1. Max 3.\n"
-                    f"4. Include POS abbreviation and follow this starter by part of speech:\n"
-                    f'   - Noun: "(n.) a/an ..."\n'
-                    f'   - Verb: "(v.) to ..."\n'
-                    f'   - Adjective: "(adj.) describing ..."\n'
-                    f'   - Adverb: "(adv.) in a way that ..."\n'
-                    f'   - Preposition: "(prep.) indicating ..."\n'
-                    f'   - Conjunction: "(conj.) connecting ..."\n'
-                    f'   - Interjection: "(interj.) expressing ..."\n'
-                    f"5. Start with lowercase after POS abbreviation. Do NOT end with a period.\n"
-                    f"Example for 'apple': 1. (n.) a round fruit with red or green skin\n"
-                    f"Only return the numbered definitions, no other text."
-                )
-            elif target_lang in ("ja", "ko"):
-                lang_label = "日文" if target_lang == "ja" else "韓文"
-                example_single = "りんご" if target_lang == "ja" else "사과"
-                example_multi_1 = "識別する" if target_lang == "ja" else "식별하다"
-                example_multi_2 = "同一視する" if target_lang == "ja" else "동일시하다"
-                prompt = (
-                    f"請將以下英文單字翻譯成{lang_label}：{text}\n\n"
-                    f"規則：\n"
-                    f"1. 只有當該字有多個明確不同的常見字義時，才提供多個翻譯（最多3個），以編號列出。\n"
-                    f"2. 簡單的字只需要1個翻譯即可。\n"
-                    f"3. 每個翻譯前必須加上詞性縮寫，格式：(詞性.) 翻譯\n"
-                    f"4. 只回覆翻譯結果，不要加任何說明。\n"
-                    f"詞性縮寫：n. v. adj. adv. prep. conj. interj. pron. det. aux.\n"
-                    f"範例（多字義）：\n"
-                    f"1. (v.) {example_multi_1}\n"
-                    f"2. (v.) {example_multi_2}\n"
-                    f"範例（單字義）：\n"
-                    f"(n.) {example_single}"
-                )
-            else:
-                prompt = (
-                    f"Please translate the following text to {target_lang}, "
-                    f"only return the translation without any explanation:\n{text}"
-                )
+            translation = await self._translate_text_llm(text, target_lang)
+        except Exception as e:
+            logger.error("Translation error: %s", e)
+            # 如果翻譯失敗，返回原文（不寫入快取）
+            return text
 
-            system_instruction = (
-                "You are a professional translator. Only provide the "
-                "translation without any explanation. "
-                "CRITICAL: When translating to Chinese, you MUST use Traditional Chinese (繁體中文), "
-                "NOT Simplified Chinese."
+        await self.cache.store({text: translation}, target_lang, MODE_TEXT)
+        return translation
+
+    async def _translate_text_llm(self, text: str, target_lang: str) -> str:
+        """呼叫 LLM 翻譯單一文本（失敗時拋出例外）"""
+        # 根據目標語言設定 prompt
+        if target_lang == "zh-TW":
+            prompt = (
+                f"請將以下英文單字翻譯成繁體中文：{text}\n\n"
+                f"規則：\n"
+                f"1. 只有當該字有多個明確不同的常見字義時，才提供多個翻譯（最多3個），以編號列出。\n"
+                f"2. 簡單的字只需要1個翻譯即可。\n"
+                f"3. 每個翻譯前必須加上詞性縮寫，格式：(詞性.) 翻譯\n"
+                f"4. 只回覆翻譯結果，不要加任何說明。\n"
+                f"詞性縮寫：n. v. adj. adv. prep. conj. interj. pron. det. aux.\n"
+                f"範例（多字義）：\n"
+                f"1. (v.) 識別\n"
+                f"2. (v.) 認同\n"
+                f"範例（單字義）：\n"
+                f"(n.) 蘋果"
+            )
+        elif target_lang == "en":
+            # 英英釋義
+            prompt = (
+                f"Provide English definitions for the word: {text}\n\n"
+                f"RULES:\n"
+                f'1. NEVER use the word "{text}" (or any of its forms) in the definition.\n'
+                f"2. Each definition MUST be 15 words or fewer.\n"
+                f"3. Only provide multiple definitions if the word has truly "
+                f"distinct meanings. Simple words need only 1. Max 3.\n"
+                f"4. Include POS abbreviation and follow this starter by part of speech:\n"
+                f'   - Noun: "(n.) a/an ..."\n'
+                f'   - Verb: "(v.) to ..."\n'
+                f'   - Adjective: "(adj.) describing ..."\n'
+                f'   - Adverb: "(adv.) in a way that ..."\n'
+                f'   - Preposition: "(prep.) indicating ..."\n'
+                f'   - Conjunction: "(conj.) connecting ..."\n'
+                f'   - Interjection: "(interj.) expressing ..."\n'
+                f"5. Start with lowercase after POS abbreviation. Do NOT end with a period.\n"
+                f"Example for 'apple': 1. (n.) a round fruit with red or green skin\n"
+                f"Only return the numbered definitions, no other text."
+            )
+        elif target_lang in ("ja", "ko"):
+            lang_label = "日文" if target_lang == "ja" else "韓文"
+            example_single = "りんご" if target_lang == "ja" else "사과"
+            example_multi_1 = "識別する" if target_lang == "ja" else "식별하다"
+            example_multi_2 = "同一視する" if target_lang == "ja" else "동일시하다"
+            prompt = (
+                f"請將以下英文單字翻譯成{lang_label}：{text}\n\n"
+                f"規則：\n"
+                f"1. 只有當該字有多個明確不同的常見字義時，才提供多個翻譯（最多3個），以編號列出。\n"
+                f"2. 簡單的字只需要1個翻譯即可。\n"
+                f"3. 每個翻譯前必須加上詞性縮寫，格式：(詞性.) 翻譯\n"
+                f"4. 只回覆翻譯結果，不要加任何說明。\n"
+                f"詞性縮寫：n. v. adj. adv. prep. conj. interj. pron. det. aux.\n"
+                f"範例（多字義）：\n"
+                f"1. (v.) {example_multi_1}\n"
+                f"2. (v.) {example_multi_2}\n"
+                f"範例（單字義）：\n"
+                f"(n.) {example_single}"
+            )
+        else:
+            prompt = (
+                f"Please translate the following text to {target_lang}, "
+                f"only return the translation without any explanation:\n{text}"
             )
 
-            # 英英釋義需要更多 tokens（最多 3 個定義 + 詞性標記）
-            token_limit = 200 if target_lang == "en" else 100
+        system_instruction = (
+            "You are a professional translator. Only provide the "
+            "translation without any explanation. "
+            "CRITICAL: When translating to Chinese, you MUST use Traditional Chinese (繁體中文), "
+            "NOT Simplified Chinese."
+        )
 
-            # Use Vertex AI or OpenAI based on configuration
-            if self.use_vertex_ai:
-                result = await self.vertex_ai.generate_text(
-                    prompt=prompt,
-                    model_type="flash",
-                    max_tokens=token_limit,
-                    temperature=0.3,
-                    system_instruction=system_instruction,
-                )
-                return result.strip()
-            else:
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_instruction},
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.3,  # 降低隨機性以獲得更一致的翻譯
-                    max_tokens=token_limit,
-                )
-                return response.choices[0].message.content.strip()
+        # 英英釋義需要更多 tokens（最多 3 個定義 + 詞性標記）
+        token_limit = 200 if target_lang == "en" else 100
 
-        except Exception as e:
-            logger.error("Translation error: %s", e)
-            # 如果翻譯失敗，返回原文
-            return text
+        # Use Vertex AI or OpenAI based on configuration
+        if self.use_vertex_ai:
+            result = await self.vertex_ai.generate_text(
+                prompt=prompt,
+                model_type="flash",
+                max_tokens=token_limit,
+                temperature=0.3,
+                system_instruction=system_instruction,
+            )
+            return result.strip()
+        else:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_instruction},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.3,  # 降低隨機性以獲得更一致的翻譯
+                max_tokens=token_limit,
+            )
+            return response.choices[0].message.content.strip()
 
     async def translate_with_pos(
         self, text: str, target_lang: str = "zh-TW"
@@ -178,13 +222,32 @@ class TranslationService:
         Returns:
             包含 translation 和 parts_of_speech 的字典
         """
+        cached = await self.cache.lookup([text], target_lang, MODE_POS)
+        if cached:
+            return dict(next(iter(cached.values())))
+
         self._ensure_client()
-        import json
 
         try:
-            # 建立 prompt 要求同時翻譯和辨識詞性
-            if target_lang == "zh-TW":
-                prompt = f"""請分析以下英文單字，提供：
+            result = await self._translate_with_pos_llm(text, target_lang)
+        except Exception as e:
+            logger.error("Translate with POS error: %s", e)
+            # Fallback: 只返回翻譯（不寫入快取）
+            translation = await self.translate_text(text, target_lang)
+            return {"translation": translation, "parts_of_speech": []}
+
+        await self.cache.store({text: result}, target_lang, MODE_POS)
+        return result
+
+    async def _translate_with_pos_llm(
+        self, text: str, target_lang: str
+    ) -> Dict[str, any]:
+        """呼叫 LLM 翻譯單字並辨識詞性（失敗時拋出例外）"""
+        import json
+
+        # 建立 prompt 要求同時翻譯和辨識詞性
+        if target_lang == "zh-TW":
+            prompt = f"""請分析以下英文單字，提供：
 1. 繁體中文翻譯
 2. 詞性（必須列出所有常見用法的詞性）
 
@@ -205,8 +268,8 @@ pron. (代名詞), prep. (介系詞), conj. (連接詞), interj. (感嘆詞),
 det. (限定詞), aux. (助動詞)
 
 只回覆 JSON，不要其他文字。"""
-            else:
-                prompt = f"""Analyze the following English word and provide:
+        else:
+            prompt = f"""Analyze the following English word and provide:
 1. English definition(s) — only provide multiple if the word has truly distinct \
 meanings (max 3), numbered in a single string
 2. Parts of speech (MUST list ALL common usages)
@@ -238,55 +301,50 @@ det. (determiner), aux. (auxiliary)
 
 Only reply with JSON, no other text."""
 
-            system_instruction = (
-                "You are a professional linguist specializing in English grammar. "
-                "When identifying parts of speech, you MUST list ALL common usages - "
-                "many English words function as multiple parts of speech. "
-                "CRITICAL: When translating to Chinese, you MUST use Traditional Chinese (繁體中文), "
-                "NOT Simplified Chinese. Always respond with valid JSON only."
-            )
+        system_instruction = (
+            "You are a professional linguist specializing in English grammar. "
+            "When identifying parts of speech, you MUST list ALL common usages - "
+            "many English words function as multiple parts of speech. "
+            "CRITICAL: When translating to Chinese, you MUST use Traditional Chinese (繁體中文), "
+            "NOT Simplified Chinese. Always respond with valid JSON only."
+        )
 
-            # Use Vertex AI or OpenAI based on configuration
-            if self.use_vertex_ai:
-                result = await self.vertex_ai.generate_json(
-                    prompt=prompt,
-                    model_type="flash",
-                    max_tokens=200,
-                    temperature=0.2,
-                    system_instruction=system_instruction,
-                )
-            else:
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_instruction},
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.2,  # Lower temperature for more consistent POS detection
-                    max_tokens=200,
-                )
+        # Use Vertex AI or OpenAI based on configuration
+        if self.use_vertex_ai:
+            result = await self.vertex_ai.generate_json(
+                prompt=prompt,
+                model_type="flash",
+                max_tokens=200,
+                temperature=0.2,
+                system_instruction=system_instruction,
+            )
+        else:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_instruction},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.2,  # Lower temperature for more consistent POS detection
+                max_tokens=200,
+            )
 
-                # 解析 JSON 回應
-                import re
+            # 解析 JSON 回應
+            import re
 
-                content = response.choices[0].message.content.strip()
-                # 移除可能的 markdown 代碼塊標記
-                content = re.sub(r"^```json\s*", "", content)
-                content = re.sub(r"\s*```$", "", content)
-                content = content.strip()
+            content = response.choices[0].message.content.strip()
+            # 移除可能的 markdown 代碼塊標記
+            content = re.sub(r"^```json\s*", "", content)
+            content = re.sub(r"\s*```$", "", content)
+            content = content.strip()
 
-                result = json.loads(content)
+            result = json.loads(content)
 
-            # 確保返回正確的結構
-            return {
-                "translation": result.get("translation", text),
-                "parts_of_speech": result.get("parts_of_speech", []),
-            }
-        except Exception as e:
-            logger.error("Translate with POS error: %s", e)
-            # Fallback: 只返回翻譯
-            translation = await self.translate_text(text, target_lang)
-            return {"translation": translation, "parts_of_speech": []}
+        # 確保返回正確的結構
+        return {
+            "translation": result.get("translation", text),
+            "parts_of_speech": result.get("parts_of_speech", []),
+        }
 
     async def batch_translate(
         self, texts: List[str], target_lang: str = "zh-TW"
@@ -294,23 +352,124 @@ Only reply with JSON, no other text."""
         """
         批次翻譯多個文本（使用 JSON 格式確保穩定快速）
 
+        未命中快取的文本依 token 預算分批、並發送出；失敗的批次對半重試。
+
         Args:
             texts: 要翻譯的文本列表
             target_lang: 目標語言（預設為繁體中文）
 
         Returns:
-            翻譯後的文本列表
+            翻譯後的文本列表（失敗的項目返回原文）
         """
-        self._ensure_client()
+        cached = await self.cache.lookup(texts, target_lang, MODE_BATCH)
+
+        # 只把未命中的部分（去除重複）送給 LLM
+        pending = list(
+            dict.fromkeys(
+                normalized
+                for normalized in (normalize_text(text) for text in texts)
+                if normalized and normalized not in cached
+            )
+        )
+        if pending:
+            self._ensure_client()
+            translated = await self._translate_in_chunks(
+                pending, target_lang, self._batch_translate_llm
+            )
+            if len(translated) < len(pending):
+                logger.error(
+                    "Batch translation failed for %d/%d items, returning originals",
+                    len(pending) - len(translated),
+                    len(pending),
+                )
+            await self.cache.store(translated, target_lang, MODE_BATCH)
+            cached.update(translated)
+
+        return [cached.get(normalize_text(text), text) for text in texts]
+
+    def _get_llm_semaphore(self) -> asyncio.Semaphore:
+        """同時進行的批次 LLM 請求上限（依 event loop 建立）"""
+        loop = asyncio.get_running_loop()
+        if self._llm_semaphore is None or self._llm_semaphore_loop is not loop:
+            self._llm_semaphore = asyncio.Semaphore(self.llm_concurrency)
+            self._llm_semaphore_loop = loop
+        return self._llm_semaphore
+
+    def _split_chunks(self, texts: List[str]) -> List[List[str]]:
+        """依估計的 token 數與項目數上限切分批次"""
+        chunks: List[List[str]] = []
+        current: List[str] = []
+        current_tokens = 0
+        for text in texts:
+            # 英文約 4 個字元 1 個 token，另加 JSON 引號與逗號
+            tokens = len(text) // 4 + 2
+            if current and (
+                current_tokens + tokens > self.chunk_token_budget
+                or len(current) >= self.chunk_max_items
+            ):
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _translate_in_chunks(
+        self,
+        texts: List[str],
+        target_lang: str,
+        llm_func: Callable[[List[str], str], Awaitable[List[Any]]],
+    ) -> Dict[str, Any]:
+        """
+        分批並發呼叫 LLM，回傳 文字 → 結果
 
-        try:
-            # 使用 JSON 格式以確保解析穩定性
-            import json
+        - 每批依 token 預算切分，受 TRANSLATION_LLM_CONCURRENCY 限制並發
+        - 某批回應有問題（JSON 錯誤、數量不符）時對半切分重試，只重試失敗的部分
+        - 其他錯誤（連線、HTTP、認證）不切分也不重試
+        - 失敗的項目不會出現在結果中，由呼叫端決定 fallback
+        """
+        results: Dict[str, Any] = {}
+
+        async def run(chunk: List[str]):
+            try:
+                async with self._get_llm_semaphore():
+                    translations = await llm_func(chunk, target_lang)
+            except SPLITTABLE_ERRORS as e:
+                if len(chunk) == 1:
+                    logger.warning("Translation failed for %r: %s", chunk[0], e)
+                    return
+                logger.warning(
+                    "Translation chunk of %d failed (%s), retrying in halves",
+                    len(chunk),
+                    e,
+                )
+                middle = len(chunk) // 2
+                await asyncio.gather(run(chunk[:middle]), run(chunk[middle:]))
+                return
+            except Exception as e:
+                logger.warning(
+                    "Translation chunk of %d failed (%s), not retrying", len(chunk), e
+                )
+                return
+            results.update(zip(chunk, translations))
+
+        await asyncio.gather(*(run(chunk) for chunk in self._split_chunks(texts)))
+        return results
 
-            texts_json = json.dumps(texts, ensure_ascii=False)
+    async def _batch_translate_llm(
+        self, texts: List[str], target_lang: str
+    ) -> List[str]:
+        """呼叫 LLM 批次翻譯（失敗或數量不符時拋出例外）"""
+        content = None
+
+        # 使用 JSON 格式以確保解析穩定性
+        import json
 
-            if target_lang == "zh-TW":
-                prompt = f"""請將以下 JSON 陣列中的英文翻譯成繁體中文。
+        texts_json = json.dumps(texts, ensure_ascii=False)
+
+        if target_lang == "zh-TW":
+            prompt = f"""請將以下 JSON 陣列中的英文翻譯成繁體中文。
 直接返回 JSON 陣列格式，每個翻譯對應一個項目。
 只返回 JSON 陣列，不要任何其他文字或說明。
 為兼容舊版測試，可使用 '---' 分隔多個翻譯（同樣需保持項目數量一致）。
@@ -318,8 +477,8 @@ Only reply with JSON, no other text."""
 輸入: {texts_json}
 
 要求: 返回格式必須是 ["翻譯1", "翻譯2", ...]"""
-            elif target_lang == "en":
-                prompt = f"""Provide English definitions for the following words.
+        elif target_lang == "en":
+            prompt = f"""Provide English definitions for the following words.
 Return as a JSON array with each definition as one item.
 
 RULES:
@@ -342,8 +501,8 @@ Input: {texts_json}
 
 Required: Return format must be ["1. (n.) definition...", "1. (v.) definition...", ...]
 Only return the JSON array, no other text."""
-            else:
-                prompt = f"""Please translate the following JSON array to {target_lang}.
+        else:
+            prompt = f"""Please translate the following JSON array to {target_lang}.
 Return as a JSON array with each translation as one item.
 Only return the JSON array, no other text.
 
@@ -351,96 +510,75 @@ Input: {texts_json}
 
 Required: Return format must be ["translation1", "translation2", ...]"""
 
-            system_instruction = (
-                "You are a professional translator. Always return results "
-                "as a valid JSON array with the exact same number of items as input. "
-                "Return ONLY the JSON array, no markdown, no explanation. "
-                "CRITICAL: When translating to Chinese, you MUST use Traditional Chinese (繁體中文), "
-                "NOT Simplified Chinese."
-            )
+        system_instruction = (
+            "You are a professional translator. Always return results "
+            "as a valid JSON array with the exact same number of items as input. "
+            "Return ONLY the JSON array, no markdown, no explanation. "
+            "CRITICAL: When translating to Chinese, you MUST use Traditional Chinese (繁體中文), "
+            "NOT Simplified Chinese."
+        )
 
-            # Use Vertex AI or OpenAI based on configuration
-            if self.use_vertex_ai:
-                translations = await self.vertex_ai.generate_json(
-                    prompt=prompt,
-                    model_type="flash",
-                    max_tokens=3500,
-                    temperature=0.3,
-                    system_instruction=system_instruction,
-                )
-                # Ensure it's a list
-                if isinstance(translations, str):
-                    translations = translations.split("---")
-            else:
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_instruction},
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.3,
-                    max_tokens=3500,  # 提高上限以支持更多句子的批次翻译
-                )
+        # Use Vertex AI or OpenAI based on configuration
+        if self.use_vertex_ai:
+            translations = await self.vertex_ai.generate_json(
+                prompt=prompt,
+                model_type="flash",
+                max_tokens=3500,
+                temperature=0.3,
+                system_instruction=system_instruction,
+            )
+            # Ensure it's a list
+            if isinstance(translations, str):
+                translations = translations.split("---")
+        else:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_instruction},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.3,
+                max_tokens=3500,  # 提高上限以支持更多句子的批次翻译
+            )
 
-                # 解析 JSON 回應
-                import re
+            # 解析 JSON 回應
+            import re
 
-                content = response.choices[0].message.content.strip()
+            content = response.choices[0].message.content.strip()
 
-                # 移除可能的 markdown 代碼塊標記
-                content = re.sub(r"^```json\s*", "", content)
-                content = re.sub(r"\s*```$", "", content)
-                content = content.strip()
+            # 移除可能的 markdown 代碼塊標記
+            content = re.sub(r"^```json\s*", "", content)
+            content = re.sub(r"\s*```$", "", content)
+            content = content.strip()
 
-                # Try JSON parse; handle legacy separator when JSON decode fails
-                try:
-                    translations = json.loads(content)
-                except Exception:
-                    # If not JSON, fall back to separator or raw string
-                    if "---" in content:
-                        translations = [
-                            seg.strip() for seg in content.split("---") if seg.strip()
-                        ]
-                    else:
-                        translations = [content.strip()] if content else []
-                if isinstance(translations, str):
-                    translations = translations.split("---")
-
-            # 確保返回的翻譯數量與輸入相同
-            if len(translations) != len(texts):
-                # Try manual split on separator if present
-                if isinstance(content, str) and "---" in content:
-                    manual = [
+            # Try JSON parse; handle legacy separator when JSON decode fails
+            try:
+                translations = json.loads(content)
+            except Exception:
+                # If not JSON, fall back to separator or raw string
+                if "---" in content:
+                    translations = [
                         seg.strip() for seg in content.split("---") if seg.strip()
                     ]
-                    if len(manual) == len(texts):
-                        translations = manual
-                    else:
-                        logger.warning(
-                            "Batch translation count mismatch "
-                            "(expected %d, got %d), "
-                            "falling back to individual translation.",
-                            len(texts),
-                            len(translations),
-                        )
-                        return texts
                 else:
-                    logger.warning(
-                        "Batch translation count mismatch "
-                        "(expected %d, got %d), "
-                        "falling back to individual translation.",
-                        len(texts),
-                        len(translations),
-                    )
-                    return texts
+                    translations = [content.strip()] if content else []
+            if isinstance(translations, str):
+                translations = translations.split("---")
+
+        # 確保返回的翻譯數量與輸入相同
+        if len(translations) != len(texts):
+            # Try manual split on separator if present
+            if isinstance(content, str) and "---" in content:
+                manual = [seg.strip() for seg in content.split("---") if seg.strip()]
+                if len(manual) == len(texts):
+                    translations = manual
+            if len(translations) != len(texts):
+                raise BatchResultError(
+                    f"Batch translation count mismatch "
+                    f"(expected {len(texts)}, got {len(translations)})"
+                )
 
-            return translations
-        except Exception as e:
-            logger.error(
-                "Batch translation error: %s. Falling back to individual translation.",
-                e,
-            )
-            return texts
+        return translations
 
     async def batch_translate_with_pos(
         self, texts: List[str], target_lang: str = "zh-TW"
@@ -448,6 +586,8 @@ Required: Return format must be ["translation1", "translation2", ...]"""
         """
         批次翻譯多個單字並辨識詞性
 
+        與 batch_translate 相同分批並發；批次仍失敗的單字改用 translate_with_pos 逐個處理。
+
         Args:
             texts: 要翻譯的單字列表
             target_lang: 目標語言（預設為繁體中文）
@@ -455,14 +595,53 @@ Required: Return format must be ["translation1", "translation2", ...]"""
         Returns:
             包含 translation 和 parts_of_speech 的字典列表
         """
-        self._ensure_client()
+        cached = await self.cache.lookup(texts, target_lang, MODE_POS)
+
+        # 只把未命中的部分（去除重複）送給 LLM
+        pending = list(
+            dict.fromkeys(
+                normalized
+                for normalized in (normalize_text(text) for text in texts)
+                if normalized and normalized not in cached
+            )
+        )
+        if pending:
+            self._ensure_client()
+            results = await self._translate_in_chunks(
+                pending, target_lang, self._batch_translate_with_pos_llm
+            )
+            await self.cache.store(results, target_lang, MODE_POS)
+            cached.update(results)
+
+            # Fallback: 批次仍失敗的單字逐個處理（成功的項目各自寫入快取）
+            failed = [text for text in pending if text not in results]
+            if failed:
+                logger.error(
+                    "Batch translate with POS failed for %d items. Falling back.",
+                    len(failed),
+                )
+                fallback = await asyncio.gather(
+                    *(self.translate_with_pos(text, target_lang) for text in failed)
+                )
+                cached.update(zip(failed, fallback))
+
+        return [
+            dict(cached[normalize_text(text)])
+            if normalize_text(text) in cached
+            else {"translation": text, "parts_of_speech": []}
+            for text in texts
+        ]
+
+    async def _batch_translate_with_pos_llm(
+        self, texts: List[str], target_lang: str
+    ) -> List[Dict[str, any]]:
+        """呼叫 LLM 批次翻譯並辨識詞性（失敗或數量不符時拋出例外）"""
         import json
 
-        try:
-            texts_json = json.dumps(texts, ensure_ascii=False)
+        texts_json = json.dumps(texts, ensure_ascii=False)
 
-            if target_lang == "zh-TW":
-                prompt = f"""請分析以下英文單字列表，為每個單字提供：
+        if target_lang == "zh-TW":
+            prompt = f"""請分析以下英文單字列表，為每個單字提供：
 1. 繁體中文翻譯
 2. 詞性（必須列出所有常見用法的詞性）
 
@@ -483,8 +662,8 @@ pron. (代名詞), prep. (介系詞), conj. (連接詞), interj. (感嘆詞),
 det. (限定詞), aux. (助動詞)
 
 只回覆 JSON 陣列，不要其他文字。"""
-            else:
-                prompt = f"""Analyze the following English words and provide for each:
+        else:
+            prompt = f"""Analyze the following English words and provide for each:
 1. English definition(s) — only provide multiple if the word has truly distinct \
 meanings (max 3), numbered in a single string
 2. Parts of speech (MUST list ALL common usages)
@@ -517,62 +696,51 @@ det. (determiner), aux. (auxiliary)
 
 Only reply with JSON array, no other text."""
 
-            system_instruction = (
-                "You are a professional linguist specializing in English grammar. "
-                "When identifying parts of speech, you MUST list ALL common usages - "
-                "many English words function as multiple parts of speech. "
-                "CRITICAL: When translating to Chinese, you MUST use Traditional Chinese (繁體中文), "
-                "NOT Simplified Chinese. Always respond with valid JSON array only."
-            )
+        system_instruction = (
+            "You are a professional linguist specializing in English grammar. "
+            "When identifying parts of speech, you MUST list ALL common usages - "
+            "many English words function as multiple parts of speech. "
+            "CRITICAL: When translating to Chinese, you MUST use Traditional Chinese (繁體中文), "
+            "NOT Simplified Chinese. Always respond with valid JSON array only."
+        )
 
-            # Use Vertex AI or OpenAI based on configuration
-            if self.use_vertex_ai:
-                results = await self.vertex_ai.generate_json(
-                    prompt=prompt,
-                    model_type="flash",
-                    max_tokens=2000,
-                    temperature=0.2,
-                    system_instruction=system_instruction,
-                )
-            else:
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_instruction},
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.2,  # Lower temperature for more consistent POS detection
-                    max_tokens=2000,
-                )
+        # Use Vertex AI or OpenAI based on configuration
+        if self.use_vertex_ai:
+            results = await self.vertex_ai.generate_json(
+                prompt=prompt,
+                model_type="flash",
+                max_tokens=2000,
+                temperature=0.2,
+                system_instruction=system_instruction,
+            )
+        else:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_instruction},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.2,  # Lower temperature for more consistent POS detection
+                max_tokens=2000,
+            )
 
-                # 解析 JSON 回應
-                import re
+            # 解析 JSON 回應
+            import re
 
-                content = response.choices[0].message.content.strip()
-                content = re.sub(r"^```json\s*", "", content)
-                content = re.sub(r"\s*```$", "", content)
-                content = content.strip()
+            content = response.choices[0].message.content.strip()
+            content = re.sub(r"^```json\s*", "", content)
+            content = re.sub(r"\s*```$", "", content)
+            content = content.strip()
 
-                results = json.loads(content)
+            results = json.loads(content)
 
-            # 確保返回數量正確
-            if len(results) != len(texts):
-                logger.warning(
-                    "Expected %d results, got %d. Falling back.",
-                    len(texts),
-                    len(results),
-                )
-                # Fallback: 逐個處理
-                tasks = [self.translate_with_pos(text, target_lang) for text in texts]
-                results = await asyncio.gather(*tasks)
+        # 確保返回數量正確
+        if len(results) != len(texts):
+            raise BatchResultError(
+                f"Expected {len(texts)} results, got {len(results)}"
+            )
 
-            return results
-        except Exception as e:
-            logger.error("Batch translate with POS error: %s. Falling back.", e)
-            # Fallback: 逐個處理
-            tasks = [self.translate_with_pos(text, target_lang) for text in texts]
-            results = await asyncio.gather(*tasks)
-            return results
+        return results
 
     async def generate_sentences(
         self,
@@ -0,0 +1,274 @@
+"""
+翻譯快取（兩層）
+
+TranslationService 的 LLM 翻譯結果以 (正規化文字, 目標語言, 模式, prompt 版本) 為 key 快取：
+- 第一層：記憶體 LRU（cache_key → 結果），查詢 O(1)、不經網路
+- 第二層：資料庫 translation_cache_entries，跨程序 / 重新部署保留，一次查詢整批 key
+- 兩層都查不到時才呼叫 LLM（由 TranslationService 處理），且只送出未命中的部分
+
+prompt 修改時調高 TRANSLATION_PROMPT_VERSION，版本號是 key 的一部分，
+舊版本的項目不會再被讀到（可用 purge_stale_versions() 清除）。
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from models import TranslationCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# prompt 內容修改時 +1，讓舊的翻譯結果失效
+TRANSLATION_PROMPT_VERSION = 1
+
+# 翻譯模式（不同 prompt 產生的結果格式不同，不能共用）
+MODE_TEXT = "text"  # translate_text：含詞性、多字義的單字翻譯
+MODE_BATCH = "batch"  # batch_translate：批次翻譯
+MODE_POS = "pos"  # translate_with_pos / batch_translate_with_pos
+
+
+def normalize_text(text: str) -> str:
+    """去除前後空白並合併連續空白（保留大小寫，例如 US / us 意思不同）"""
+    return " ".join(text.split())
+
+
+class TranslationCache:
+    """記憶體 LRU + 持久化資料表的翻譯快取"""
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        session_factory: Optional[Callable] = None,
+        prompt_version: Optional[int] = None,
+        persist: Optional[bool] = None,
+    ):
+        """
+        Args:
+            max_size: LRU 最多保留的項目數
+            session_factory: 建立 DB session 的函式（None 表示使用預設 SessionLocal）
+            prompt_version: prompt 版本（None 表示使用 TRANSLATION_PROMPT_VERSION）
+            persist: 是否使用資料庫層（None 表示依 TRANSLATION_CACHE_PERSIST）
+        """
+        self.max_size = max_size or int(os.getenv("TRANSLATION_CACHE_SIZE", "5000"))
+        self.prompt_version = (
+            prompt_version
+            if prompt_version is not None
+            else int(
+                os.getenv("TRANSLATION_PROMPT_VERSION", str(TRANSLATION_PROMPT_VERSION))
+            )
+        )
+        self.persist_enabled = (
+            persist
+            if persist is not None
+            else os.getenv("TRANSLATION_CACHE_PERSIST", "true").lower() == "true"
+        )
+        self._session_factory = session_factory
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 統計
+        self._hits = 0
+        self._db_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._persist_failures = 0
+
+    def _get_session(self):
+        if self._session_factory is None:
+            from database import get_session_local
+
+            self._session_factory = get_session_local()
+        return self._session_factory()
+
+    def make_key(self, text: str, target_lang: str, mode: str) -> str:
+        raw = f"{self.prompt_version}|{mode}|{target_lang}|{normalize_text(text)}"
+        return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    # 記憶體 LRU
+    # ------------------------------------------------------------------
+
+    def _get_local(self, cache_key: str) -> Optional[Any]:
+        with self._lock:
+            if cache_key not in self._entries:
+                return None
+            self._entries.move_to_end(cache_key)
+            return self._entries[cache_key]
+
+    def _put_local(self, cache_key: str, value: Any):
+        with self._lock:
+            self._entries[cache_key] = value
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 資料庫層（同步 DB 操作，由 lookup / store 放在 executor 中執行）
+    # ------------------------------------------------------------------
+
+    def _load_many(self, cache_keys: List[str]) -> Dict[str, Any]:
+        db = None
+        try:
+            db = self._get_session()
+            rows = (
+                db.query(TranslationCacheEntry.cache_key, TranslationCacheEntry.result)
+                .filter(TranslationCacheEntry.cache_key.in_(cache_keys))
+                .all()
+            )
+            return {cache_key: result for cache_key, result in rows}
+        except Exception as e:
+            logger.warning(f"Translation cache lookup failed: {e}")
+            return {}
+        finally:
+            if db is not None:
+                db.close()
+
+    def _store_many(self, rows: List[Dict[str, Any]]) -> bool:
+        """寫入 translation_cache_entries（已存在的 key 略過）"""
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        db = None
+        try:
+            db = self._get_session()
+            insert = (
+                pg_insert
+                if db.get_bind().dialect.name == "postgresql"
+                else sqlite_insert
+            )
+            db.execute(
+                insert(TranslationCacheEntry)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["cache_key"])
+            )
+            db.commit()
+            return True
+        except Exception as e:
+            if db is not None:
+                db.rollback()
+            self._persist_failures += 1
+            logger.warning(f"Translation cache write failed: {e}")
+            return False
+        finally:
+            if db is not None:
+                db.close()
+
+    def purge_stale_versions(self) -> int:
+        """刪除其他 prompt 版本的項目（同步）"""
+        db = self._get_session()
+        try:
+            deleted = (
+                db.query(TranslationCacheEntry)
+                .filter(TranslationCacheEntry.prompt_version != self.prompt_version)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            logger.info(f"Purged {deleted} stale translation cache entries")
+            return deleted
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    # 批次查詢 / 寫入
+    # ------------------------------------------------------------------
+
+    async def lookup(
+        self, texts: Iterable[str], target_lang: str, mode: str
+    ) -> Dict[str, Any]:
+        """
+        批次查詢快取（LRU → 資料庫，資料庫只查一次）
+
+        Returns:
+            正規化文字 → 快取結果；未命中的文字不會出現在結果中
+        """
+        keys: Dict[str, str] = {}
+        for text in texts:
+            normalized = normalize_text(text)
+            if normalized and normalized not in keys:
+                keys[normalized] = self.make_key(normalized, target_lang, mode)
+
+        found: Dict[str, Any] = {}
+        missing: Dict[str, str] = {}
+        for normalized, cache_key in keys.items():
+            value = self._get_local(cache_key)
+            if value is None:
+                missing[cache_key] = normalized
+            else:
+                found[normalized] = value
+        self._hits += len(found)
+
+        if missing and self.persist_enabled:
+            loop = asyncio.get_event_loop()
+            stored = await loop.run_in_executor(None, self._load_many, list(missing))
+            for cache_key, value in stored.items():
+                self._put_local(cache_key, value)
+                found[missing.pop(cache_key)] = value
+            self._db_hits += len(stored)
+
+        self._misses += len(missing)
+        return found
+
+    async def store(self, results: Dict[str, Any], target_lang: str, mode: str):
+        """寫入快取（文字 → 結果），同時寫入 LRU 與資料庫"""
+        rows = []
+        for text, value in results.items():
+            normalized = normalize_text(text)
+            if not normalized or value is None:
+                continue
+            cache_key = self.make_key(normalized, target_lang, mode)
+            self._put_local(cache_key, value)
+            rows.append(
+                {
+                    "cache_key": cache_key,
+                    "mode": mode,
+                    "target_lang": target_lang,
+                    "prompt_version": self.prompt_version,
+                    "source_text": normalized,
+                    "result": value,
+                }
+            )
+
+        if rows and self.persist_enabled:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._store_many, rows)
+
+    def clear(self):
+        """清空 LRU 與統計（資料庫層不受影響）"""
+        with self._lock:
+            self._entries.clear()
+        self._hits = 0
+        self._db_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # ------------------------------------------------------------------
+    # 監控
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self._hits + self._db_hits + self._misses
+        return {
+            "cache_size": size,
+            "cache_maxsize": self.max_size,
+            "prompt_version": self.prompt_version,
+            "persist_enabled": self.persist_enabled,
+            "cache_hits": self._hits,
+            "cache_db_hits": self._db_hits,
+            "cache_misses": self._misses,
+            "cache_evictions": self._evictions,
+            "persist_failures": self._persist_failures,
+            "hit_rate_percent": (
+                round((self._hits + self._db_hits) / lookups * 100, 2) if lookups else 0
+            ),
+        }
@@ -7,11 +7,14 @@ import tempfile
 import os
 import hashlib
 import logging
-from typing import Optional, Dict  # noqa: F401
+from typing import Optional, Dict, List, Tuple  # noqa: F401
 from google.cloud import storage
 from datetime import datetime  # noqa: F401
 import azure.cognitiveservices.speech as speechsdk
 
+from core.thread_pool import get_tts_thread_pool
+from services.tts_cache_index import TTSCacheIndex
+
 logger = logging.getLogger(__name__)
 
 
@@ -55,6 +58,15 @@ class TTSService:
         self._cache_hits = 0
         self._cache_misses = 0
 
+        # 快取鍵索引（記憶體 LRU + tts_cache_entries 清單），命中時不需查 GCS
+        self.cache_index = TTSCacheIndex()
+
+        # 批次生成：每個語音重用 SpeechConfig；相同 cache key 共用進行中的生成
+        self.batch_concurrency = int(os.getenv("TTS_BATCH_CONCURRENCY", "8"))
+        self._speech_configs: Dict[str, speechsdk.SpeechConfig] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._coalesced_requests = 0
+
     def _get_storage_client(self):
         """延遲初始化 GCS client（使用與 audio_upload.py 相同的認證邏輯）"""
         if not self.storage_client:
@@ -162,6 +174,74 @@ class TTSService:
             logger.warning(f"Error checking cache: {e}")
             return None
 
+    def _remember_cached_audio(self, cache_key: str, url: str):
+        """
+        記錄已存在的快取音檔到索引
+        GCS 音檔同時寫入持久化清單（背景執行，不阻塞請求）
+        """
+        self.cache_index.put(cache_key, url)
+        if self.use_gcs:
+            loop = asyncio.get_event_loop()
+            loop.run_in_executor(None, self.cache_index.persist, cache_key, url)
+
+    def _find_cached_audio_url(self, cache_key: str) -> Optional[str]:
+        """索引未命中時：先查持久化清單（主鍵查詢），沒有才檢查 GCS"""
+        if self.use_gcs:
+            cached_url = self.cache_index.lookup(cache_key)
+            if cached_url:
+                return cached_url
+        return self._get_cached_audio_url(cache_key)
+
+    async def _lookup_cached_audio_url(self, cache_key: str) -> Optional[str]:
+        """
+        兩層查詢：先查記憶體索引（O(1)、不經網路），再查持久化清單，最後才查 GCS
+        清單與 GCS 檢查在 executor 中執行，避免阻塞 event loop
+        """
+        cached_url = self.cache_index.get(cache_key)
+        if cached_url:
+            return cached_url
+
+        loop = asyncio.get_event_loop()
+        cached_url = await loop.run_in_executor(
+            None, self._find_cached_audio_url, cache_key
+        )
+        # 清單命中時 lookup 已放回索引，只有 GCS 找到的才需要記錄
+        if cached_url and cache_key not in self.cache_index:
+            self._remember_cached_audio(cache_key, cached_url)
+        return cached_url
+
+    def warm_up_cache_index(self) -> int:
+        """從持久化清單預熱快取索引（同步，應用程式啟動時在 executor 中呼叫）"""
+        if not self.use_gcs:
+            return 0
+        return self.cache_index.warm_up()
+
+    def _get_speech_config(self, voice: str) -> speechsdk.SpeechConfig:
+        """取得（並重用）指定語音的 SpeechConfig"""
+        speech_config = self._speech_configs.get(voice)
+        if speech_config is None:
+            speech_config = speechsdk.SpeechConfig(
+                subscription=self.azure_speech_key, region=self.azure_speech_region
+            )
+            speech_config.speech_synthesis_voice_name = voice
+            self._speech_configs[voice] = speech_config
+        return speech_config
+
+    def _synthesize_to_file(self, text: str, voice: str, file_path: str):
+        """呼叫 Azure TTS 並寫入檔案（同步，在 TTS 線程池中執行）"""
+        audio_config = speechsdk.audio.AudioOutputConfig(filename=file_path)
+        synthesizer = speechsdk.SpeechSynthesizer(
+            speech_config=self._get_speech_config(voice), audio_config=audio_config
+        )
+        return synthesizer.speak_text(text)
+
+    def _upload_to_gcs(self, file_path: str, filename: str):
+        """上傳音檔到 GCS（同步，在 TTS 線程池中執行）"""
+        client = self._get_storage_client()
+        bucket = client.bucket(self.bucket_name)
+        blob = bucket.blob(f"tts/{filename}")
+        blob.upload_from_filename(file_path)
+
     async def generate_tts(
         self,
         text: str,
@@ -173,6 +253,9 @@ class TTSService:
         生成 TTS 音檔並上傳到 GCS (使用 Azure Speech Service)
         Implements caching to reduce API costs and improve performance
 
+        相同參數的請求若正在生成中（可能來自其他使用者），
+        會等待同一個結果而不重複呼叫 Azure（single-flight）
+
         Args:
             text: 要轉換的文字
             voice: 語音名稱
@@ -182,12 +265,38 @@ class TTSService:
         Returns:
             音檔 GCS URL
         """
+        cache_key = self._generate_cache_key(text, voice, rate, volume)
+        loop = asyncio.get_running_loop()
+
+        task = self._inflight.get(cache_key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            self._coalesced_requests += 1
+            result = await asyncio.shield(task)
+            # 共用進行中的生成結果，等同於省下一次 Azure 呼叫
+            self._cache_hits += 1
+            return result
+
+        task = loop.create_task(
+            self._generate_tts_uncoalesced(text, voice, rate, volume, cache_key)
+        )
+        self._inflight[cache_key] = task
+        task.add_done_callback(lambda t: self._finish_inflight(cache_key, t))
+        # shield：呼叫端取消時不中斷生成，其他等待者與快取仍可取得結果
+        return await asyncio.shield(task)
+
+    def _finish_inflight(self, cache_key: str, task: asyncio.Task):
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+        if not task.cancelled():
+            # 取出例外，避免所有呼叫端都已取消時出現 "exception was never retrieved"
+            task.exception()
+
+    async def _generate_tts_uncoalesced(
+        self, text: str, voice: str, rate: str, volume: str, cache_key: str
+    ) -> str:
         try:
-            # Generate cache key
-            cache_key = self._generate_cache_key(text, voice, rate, volume)
-
-            # Check if audio already exists in GCS
-            cached_url = self._get_cached_audio_url(cache_key)
+            # Check cache index first, then GCS
+            cached_url = await self._lookup_cached_audio_url(cache_key)
             if cached_url:
                 self._cache_hits += 1
                 logger.info(
@@ -210,12 +319,6 @@ class TTSService:
                     "Please configure Azure Speech Service credentials."
                 )
 
-            # 配置 Azure Speech
-            speech_config = speechsdk.SpeechConfig(
-                subscription=self.azure_speech_key, region=self.azure_speech_region
-            )
-            speech_config.speech_synthesis_voice_name = voice
-
             # Use cache key as filename for deterministic naming
             filename = f"cached_{cache_key}.mp3"
 
@@ -225,28 +328,25 @@ class TTSService:
             tmp_file.close()  # 關閉文件句柄，但保留文件
 
             try:
-                # 配置音檔輸出
-                audio_config = speechsdk.audio.AudioOutputConfig(filename=tmp_file_path)
-                synthesizer = speechsdk.SpeechSynthesizer(
-                    speech_config=speech_config, audio_config=audio_config
+                # 生成 TTS（同步操作，在 TTS 專用線程池中執行，線程數即並發上限）
+                loop = asyncio.get_running_loop()
+                tts_pool = get_tts_thread_pool()
+                result = await loop.run_in_executor(
+                    tts_pool, self._synthesize_to_file, text, voice, tmp_file_path
                 )
 
-                # 生成 TTS（同步操作，需在 executor 中執行）
-                loop = asyncio.get_event_loop()
-                # 直接傳遞方法調用，不需要 lambda
-                result = await loop.run_in_executor(None, synthesizer.speak_text, text)
-
                 # 檢查結果
                 if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
                     if self.use_gcs:
                         # 上傳到 GCS
-                        client = self._get_storage_client()
-                        bucket = client.bucket(self.bucket_name)
-                        blob = bucket.blob(f"tts/{filename}")
-                        blob.upload_from_filename(tmp_file_path)
+                        await loop.run_in_executor(
+                            tts_pool, self._upload_to_gcs, tmp_file_path, filename
+                        )
 
                         # 返回公開 URL (bucket 已設定為 public，無需 make_public())
-                        return f"https://storage.googleapis.com/{self.bucket_name}/tts/{filename}"
+                        audio_url = f"https://storage.googleapis.com/{self.bucket_name}/tts/{filename}"
+                        self._remember_cached_audio(cache_key, audio_url)
+                        return audio_url
                     else:
                         # 本地儲存
                         import shutil
@@ -281,13 +381,65 @@ class TTSService:
         except Exception as e:
             raise Exception(f"TTS generation failed: {str(e)}")
 
+    async def batch_generate_tts_detailed(
+        self,
+        texts: list[str],
+        voice: str = "en-US-JennyNeural",
+        rate: str = "+0%",
+        volume: str = "+0%",
+    ) -> Tuple[List[Optional[str]], Dict[int, str]]:
+        """
+        批次生成 TTS，回傳部分結果
+
+        - 相同文字只生成一次（同一批次內的重複項目共用結果）
+        - 同時進行的項目數受 TTS_BATCH_CONCURRENCY 限制
+        - 單一項目失敗不影響其他項目
+
+        Returns:
+            (音檔 URL 列表（失敗項目為 None）, {失敗項目 index: 錯誤訊息})
+        """
+        indices_by_text: Dict[str, List[int]] = {}
+        for index, text in enumerate(texts):
+            indices_by_text.setdefault(text, []).append(index)
+        unique_texts = list(indices_by_text)
+
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def generate_one(text: str) -> str:
+            async with semaphore:
+                return await self.generate_tts(text, voice, rate, volume)
+
+        results = await asyncio.gather(
+            *[generate_one(text) for text in unique_texts], return_exceptions=True
+        )
+
+        audio_urls: List[Optional[str]] = [None] * len(texts)
+        errors: Dict[int, str] = {}
+        for text, result in zip(unique_texts, results):
+            indices = indices_by_text[text]
+            if isinstance(result, BaseException):
+                for index in indices:
+                    errors[index] = str(result)
+                continue
+            for index in indices:
+                audio_urls[index] = result
+            # 重複項目沒有呼叫 Azure，計為快取命中
+            self._cache_hits += len(indices) - 1
+
+        if errors:
+            logger.warning(
+                f"Batch TTS: {len(errors)} out of {len(texts)} failed. "
+                f"First error: {next(iter(errors.values()))}"
+            )
+        return audio_urls, errors
+
     async def batch_generate_tts(
         self,
         texts: list[str],
         voice: str = "en-US-JennyNeural",
         rate: str = "+0%",
         volume: str = "+0%",
-    ) -> list[str]:
+    ) -> List[Optional[str]]:
         """
         批次生成 TTS
 
@@ -298,24 +450,23 @@ class TTSService:
             volume: 音量調整
 
         Returns:
-            音檔 URL 列表
-        """
-        tasks = [self.generate_tts(text, voice, rate, volume) for text in texts]
+            音檔 URL 列表（與 texts 順序相同，失敗的項目為 None）
 
-        # 使用 return_exceptions=True 來捕獲個別任務的錯誤
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        Raises:
+            Exception: 所有項目都失敗時
+        """
+        audio_urls, errors = await self.batch_generate_tts_detailed(
+            texts, voice, rate, volume
+        )
 
-        # 檢查是否有錯誤
-        errors = [r for r in results if isinstance(r, Exception)]
-        if errors:
-            # 如果有錯誤，拋出第一個錯誤（包含更多上下文）
+        if texts and len(errors) == len(texts):
             error_msg = (
                 f"Batch TTS generation failed: {len(errors)} out of {len(texts)} "
-                f"failed. First error: {str(errors[0])}"
+                f"failed. First error: {errors[0]}"
             )
             raise Exception(error_msg)
 
-        return results
+        return audio_urls
 
     async def get_available_voices(self, language: str = "en") -> list[dict]:
         """
@@ -397,12 +548,17 @@ class TTSService:
             "estimated_cost_savings_usd": round(
                 self._cache_hits * 0.016, 2
             ),  # Azure TTS ~$16/1M chars, avg ~1000 chars
+            # index_hits: 不需查 GCS 的命中；index_misses: 需要 GCS 檢查的次數
+            "coalesced_requests": self._coalesced_requests,
+            **self.cache_index.get_stats(),
         }
 
     def clear_cache(self):
-        """Clear the cache statistics (GCS files remain for persistence)"""
+        """Clear the cache statistics (GCS files and index entries remain)"""
         self._cache_hits = 0
         self._cache_misses = 0
+        self._coalesced_requests = 0
+        self.cache_index.reset_stats()
         logger.info("TTS cache statistics cleared")
 
 
@@ -0,0 +1,192 @@
+"""
+TTS 快取索引（兩層）
+
+在 GCS blob.exists() 之前加一層快取鍵索引：
+- 第一層：記憶體 LRU（cache_key → URL），查詢 O(1)、不經網路
+- 第二層：資料庫清單 tts_cache_entries，跨程序 / 重新部署保留；
+  啟動時預熱到 LRU，LRU 未命中時以主鍵查詢（lookup），找到後放回 LRU
+- 兩層都查不到時才回到 GCS 檢查（由 TTSService 處理）
+
+GCS 上的 tts/cached_*.mp3 由 cache key 決定檔名且不會被刪除，
+因此索引中的項目不需要過期。
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from models import TTSCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+class TTSCacheIndex:
+    """記憶體 LRU + 持久化清單的 TTS 快取索引"""
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        session_factory: Optional[Callable] = None,
+    ):
+        """
+        Args:
+            max_size: LRU 最多保留的 key 數量
+            session_factory: 建立 DB session 的函式（None 表示使用預設 SessionLocal）
+        """
+        self.max_size = max_size or int(os.getenv("TTS_CACHE_INDEX_SIZE", "10000"))
+        self._session_factory = session_factory
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 統計
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._warmed_up = 0
+        self._manifest_hits = 0
+        self._persist_failures = 0
+
+    def _get_session(self):
+        if self._session_factory is None:
+            from database import get_session_local
+
+            self._session_factory = get_session_local()
+        return self._session_factory()
+
+    # ------------------------------------------------------------------
+    # 記憶體 LRU
+    # ------------------------------------------------------------------
+
+    def get(self, cache_key: str) -> Optional[str]:
+        """查詢 LRU（不經網路），命中時回傳 URL"""
+        with self._lock:
+            url = self._entries.get(cache_key)
+            if url is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self._hits += 1
+            return url
+
+    def put(self, cache_key: str, url: str):
+        """放入 LRU（超過上限時淘汰最久未使用的項目）"""
+        with self._lock:
+            self._entries[cache_key] = url
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def __contains__(self, cache_key: str) -> bool:
+        with self._lock:
+            return cache_key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 持久化清單（同步 DB 操作，呼叫端需放在 executor 中執行）
+    # ------------------------------------------------------------------
+
+    def persist(self, cache_key: str, url: str) -> bool:
+        """把 key 寫入 tts_cache_entries（已存在則略過）"""
+        db = None
+        try:
+            db = self._get_session()
+            if db.get(TTSCacheEntry, cache_key) is None:
+                db.add(TTSCacheEntry(cache_key=cache_key, url=url))
+                db.commit()
+            return True
+        except IntegrityError:
+            # 多個 instance 同時寫入同一個 key 時會撞主鍵：清單中已有此 key，視為成功
+            db.rollback()
+            return True
+        except Exception as e:
+            if db is not None:
+                db.rollback()
+            self._persist_failures += 1
+            logger.warning(f"TTS cache manifest write failed for {cache_key}: {e}")
+            return False
+        finally:
+            if db is not None:
+                db.close()
+
+    def lookup(self, cache_key: str) -> Optional[str]:
+        """LRU 未命中時以主鍵查詢清單，找到時放回 LRU 並回傳 URL"""
+        db = None
+        try:
+            db = self._get_session()
+            entry = db.get(TTSCacheEntry, cache_key)
+            url = entry.url if entry is not None else None
+        except Exception as e:
+            logger.warning(f"TTS cache manifest lookup failed for {cache_key}: {e}")
+            return None
+        finally:
+            if db is not None:
+                db.close()
+
+        if url is None:
+            return None
+        self.put(cache_key, url)
+        self._manifest_hits += 1
+        return url
+
+    def warm_up(self, limit: Optional[int] = None) -> int:
+        """
+        從 tts_cache_entries 載入最近的項目到 LRU（應用程式啟動時呼叫）
+
+        Returns:
+            int: 載入的項目數
+        """
+        limit = limit or self.max_size
+        db = None
+        try:
+            db = self._get_session()
+            rows = (
+                db.query(TTSCacheEntry.cache_key, TTSCacheEntry.url)
+                .order_by(TTSCacheEntry.created_at.desc())
+                .limit(limit)
+                .all()
+            )
+        except Exception as e:
+            logger.warning(f"TTS cache index warm-up skipped: {e}")
+            return 0
+        finally:
+            if db is not None:
+                db.close()
+
+        # 由舊到新放入，讓最新的項目位於 LRU 尾端
+        for cache_key, url in reversed(rows):
+            self.put(cache_key, url)
+        self._warmed_up = len(rows)
+        logger.info(f"✅ TTS cache index warmed up with {len(rows)} entries")
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # 監控
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "index_size": size,
+            "index_max_size": self.max_size,
+            "index_hits": self._hits,
+            "index_misses": self._misses,
+            "index_evictions": self._evictions,
+            "index_warmed_up": self._warmed_up,
+            "index_manifest_hits": self._manifest_hits,
+            "index_persist_failures": self._persist_failures,
+        }
+
+    def reset_stats(self):
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._manifest_hits = 0
@@ -5,6 +5,7 @@ Vertex AI (Gemini) Service
 支援功能：
 - 文字生成（翻譯、例句生成等）
 - JSON 格式輸出（詞性分析、干擾選項等）
+- 非同步呼叫經過 services.llm_cache 快取與合併，並記錄延遲與 token 數
 
 Model 對應：
 - gpt-4o-mini → gemini-2.5-flash（快速、高效能）
@@ -15,20 +16,70 @@ import os
 import json
 import re
 import logging
-from typing import Optional, Literal
+from typing import Any, Dict, Optional, Literal
+
+from services.llm_cache import Completion, CompletionCache, get_llm_cache
 
 logger = logging.getLogger(__name__)
 
+FLASH_MODEL_NAME = "gemini-2.5-flash"
+PRO_MODEL_NAME = "gemini-2.5-flash"  # 統一使用 flash
+
+
+def _extract_json_block(content: str, open_char: str, close_char: str) -> str:
+    """從 open_char 開始找到對應的結束括號，回傳完整的 JSON 區塊"""
+    bracket_count = 0
+    for i, char in enumerate(content):
+        if char == open_char:
+            bracket_count += 1
+        elif char == close_char:
+            bracket_count -= 1
+            if bracket_count == 0:
+                return content[: i + 1]
+    return content
+
+
+def parse_json_response(text: str) -> Any:
+    """
+    解析模型回傳的 JSON 文字
+
+    移除可能的前綴文字和 markdown 代碼塊標記，仍無法解析時從第一個 [ 或 { 開始擷取。
+    無法解析時拋出 json.JSONDecodeError。
+    """
+    content = text.strip()
+
+    # 處理 "Here is the JSON requested:\n```json" 等情況
+    content = re.sub(r"^.*?```json\s*", "", content, flags=re.DOTALL)
+    content = re.sub(r"^.*?```\s*", "", content, flags=re.DOTALL)
+    content = re.sub(r"\s*```$", "", content)
+    content = content.strip()
+
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        # 尋找 JSON 陣列或物件的起始位置
+        array_start = content.find("[")
+        object_start = content.find("{")
+
+        if array_start >= 0 and (object_start < 0 or array_start < object_start):
+            return json.loads(_extract_json_block(content[array_start:], "[", "]"))
+        elif object_start >= 0:
+            return json.loads(_extract_json_block(content[object_start:], "{", "}"))
+        raise
+
 
 class VertexAIService:
     """Vertex AI (Gemini) 服務封裝"""
 
-    def __init__(self):
+    def __init__(self, completion_cache: Optional[CompletionCache] = None):
         self.project_id = os.getenv("VERTEX_AI_PROJECT_ID", "duotopia-472708")
         self.location = os.getenv("VERTEX_AI_LOCATION", "us-central1")
         self._initialized = False
         self._flash_model = None  # gemini-2.5-flash
         self._pro_model = None  # gemini-2.5-flash (統一使用)
+        self.completion_cache = (
+            completion_cache if completion_cache is not None else get_llm_cache()
+        )
 
     def _ensure_initialized(self):
         """Lazy initialization of Vertex AI"""
@@ -52,7 +103,7 @@ class VertexAIService:
         if self._flash_model is None:
             from vertexai.generative_models import GenerativeModel
 
-            self._flash_model = GenerativeModel("gemini-2.5-flash")
+            self._flash_model = GenerativeModel(FLASH_MODEL_NAME)
         return self._flash_model
 
     def get_pro_model(self):
@@ -61,9 +112,55 @@ class VertexAIService:
         if self._pro_model is None:
             from vertexai.generative_models import GenerativeModel
 
-            self._pro_model = GenerativeModel("gemini-2.5-flash")
+            self._pro_model = GenerativeModel(PRO_MODEL_NAME)
         return self._pro_model
 
+    async def _generate(
+        self,
+        prompt: str,
+        model_type: Literal["flash", "pro"],
+        config_params: Dict[str, Any],
+        system_instruction: Optional[str],
+        cache: Optional[bool],
+        validate=None,
+    ) -> str:
+        """
+        呼叫 generate_content_async（經過完成結果快取），回傳原始文字
+
+        validate 會在寫入快取前檢查回應，拋出例外的回應不會被快取。
+        """
+        from vertexai.generative_models import GenerationConfig
+
+        model = (
+            self.get_flash_model() if model_type == "flash" else self.get_pro_model()
+        )
+        model_name = FLASH_MODEL_NAME if model_type == "flash" else PRO_MODEL_NAME
+
+        # 如果有系統指令，將其加入到 prompt 中
+        full_prompt = prompt
+        if system_instruction:
+            full_prompt = f"{system_instruction}\n\n{prompt}"
+
+        async def produce() -> Completion:
+            response = await model.generate_content_async(
+                full_prompt,
+                generation_config=GenerationConfig(**config_params),
+            )
+            text = response.text
+            if validate is not None:
+                validate(text)
+            usage = getattr(response, "usage_metadata", None)
+            return Completion(
+                text=text,
+                prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+                completion_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+            )
+
+        completion = await self.completion_cache.complete(
+            model_name, full_prompt, config_params, produce, cache=cache
+        )
+        return completion.text
+
     async def generate_text(
         self,
         prompt: str,
@@ -71,6 +168,7 @@ class VertexAIService:
         max_tokens: int = 1000,
         temperature: float = 0.7,
         system_instruction: Optional[str] = None,
+        cache: Optional[bool] = None,
     ) -> str:
         """
         統一的文字生成介面
@@ -81,34 +179,20 @@ class VertexAIService:
             max_tokens: 最大輸出 token 數
             temperature: 溫度參數 (0-1)
             system_instruction: 系統指令（可選）
+            cache: 是否使用完成結果快取（None 依溫度判斷，高溫度不快取）
 
         Returns:
             生成的文字
         """
-        from vertexai.generative_models import GenerationConfig
-
-        model = (
-            self.get_flash_model() if model_type == "flash" else self.get_pro_model()
-        )
-
-        config = GenerationConfig(
-            max_output_tokens=max_tokens,
-            temperature=temperature,
-        )
-
-        # 如果有系統指令，將其加入到 prompt 中
-        full_prompt = prompt
-        if system_instruction:
-            full_prompt = f"{system_instruction}\n\n{prompt}"
+        config_params = {"max_output_tokens": max_tokens, "temperature": temperature}
 
         try:
             logger.info(f"Vertex AI generate_text: calling model (type={model_type})")
-            response = await model.generate_content_async(
-                full_prompt,
-                generation_config=config,
+            text = await self._generate(
+                prompt, model_type, config_params, system_instruction, cache
             )
             logger.info("Vertex AI generate_text: response received")
-            return response.text
+            return text
         except Exception as e:
             logger.error(f"Vertex AI generation failed: {e}", exc_info=True)
             raise
@@ -120,6 +204,7 @@ class VertexAIService:
         max_tokens: int = 1000,
         temperature: float = 0.3,
         system_instruction: Optional[str] = None,
+        cache: Optional[bool] = None,
     ) -> dict:
         """
         生成 JSON 格式的回應
@@ -130,90 +215,42 @@ class VertexAIService:
             max_tokens: 最大輸出 token 數
             temperature: 溫度參數
             system_instruction: 系統指令
+            cache: 是否使用完成結果快取（None 依溫度判斷，高溫度不快取）
 
         Returns:
-            解析後的 JSON dict
+            解析後的 JSON dict（每次呼叫都是新的物件，可以安全修改）
         """
-        from vertexai.generative_models import GenerationConfig
-
-        model = (
-            self.get_flash_model() if model_type == "flash" else self.get_pro_model()
-        )
-
-        config = GenerationConfig(
-            max_output_tokens=max_tokens,
-            temperature=temperature,
-            response_mime_type="application/json",  # 強制 JSON 輸出
-        )
-
-        full_prompt = prompt
-        if system_instruction:
-            full_prompt = f"{system_instruction}\n\n{prompt}"
+        config_params = {
+            "max_output_tokens": max_tokens,
+            "temperature": temperature,
+            "response_mime_type": "application/json",  # 強制 JSON 輸出
+        }
 
+        content = None
         try:
             logger.info(f"Vertex AI generate_json: calling model (type={model_type})")
-            response = await model.generate_content_async(
-                full_prompt,
-                generation_config=config,
+            content = await self._generate(
+                prompt,
+                model_type,
+                config_params,
+                system_instruction,
+                cache,
+                validate=parse_json_response,
             )
             logger.info("Vertex AI generate_json: response received")
-
-            content = response.text.strip()
-
-            # 移除可能的前綴文字和 markdown 代碼塊標記
-            # 處理 "Here is the JSON requested:\n```json" 等情況
-            content = re.sub(r"^.*?```json\s*", "", content, flags=re.DOTALL)
-            content = re.sub(r"^.*?```\s*", "", content, flags=re.DOTALL)
-            content = re.sub(r"\s*```$", "", content)
-            content = content.strip()
-
-            # 如果清理後仍然無法解析，嘗試找到第一個 [ 或 {
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                # 尋找 JSON 陣列或物件的起始位置
-                array_start = content.find("[")
-                object_start = content.find("{")
-
-                if array_start >= 0 and (
-                    object_start < 0 or array_start < object_start
-                ):
-                    # JSON 陣列
-                    json_content = content[array_start:]
-                    # 找到對應的結束括號
-                    bracket_count = 0
-                    for i, char in enumerate(json_content):
-                        if char == "[":
-                            bracket_count += 1
-                        elif char == "]":
-                            bracket_count -= 1
-                            if bracket_count == 0:
-                                json_content = json_content[: i + 1]
-                                break
-                    return json.loads(json_content)
-                elif object_start >= 0:
-                    # JSON 物件
-                    json_content = content[object_start:]
-                    bracket_count = 0
-                    for i, char in enumerate(json_content):
-                        if char == "{":
-                            bracket_count += 1
-                        elif char == "}":
-                            bracket_count -= 1
-                            if bracket_count == 0:
-                                json_content = json_content[: i + 1]
-                                break
-                    return json.loads(json_content)
-                else:
-                    raise
+            return parse_json_response(content)
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON from Vertex AI response: {e}")
-            logger.error(f"Raw response: {response.text if response else 'None'}")
+            logger.error(f"Raw response: {e.doc if content is None else content}")
             raise
         except Exception as e:
             logger.error(f"Vertex AI JSON generation failed: {e}", exc_info=True)
             raise
 
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """完成結果快取與呼叫延遲 / token 統計"""
+        return self.completion_cache.get_stats()
+
     def generate_text_sync(
         self,
         prompt: str,
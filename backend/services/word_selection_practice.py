@@ -0,0 +1,561 @@
+"""
+單字選擇練習的回合引擎（word pool 快取 + 下一回合預取）
+
+每一回合開始原本都要：兩次 COUNT(DISTINCT) 算總字數、get_words_for_practice()、
+再查一次 ContentItem 取干擾項；老師預覽與 demo 則每回合重新載入整份作業的單字。
+
+- WordPool：每個 Assignment 的單字、干擾項候選（整份作業的翻譯）、預存干擾項，
+  TTL + LRU 快取；學生、老師預覽、demo 共用
+- 每個 StudentAssignment 快取總字數，並在送出一回合後於背景預先計算下一回合
+- ContentItem / AssignmentContent 經 ORM 變更並 commit 後，相關 pool 與回合立即失效；
+  set-based 更新等繞過 ORM 的變更由 TTL 兜底
+
+預取的正確性：get_words_for_practice() 依階段排序（未練習 → 到期複習 → 未到期）。
+本回合的單字作答後 next_review_at 都會在未來（進入第 3 階段），
+因此「排除本回合單字後取前 N 個第 1、2 階段單字」就是下一回合會選出的單字。
+取用預取結果前會確認本回合單字都已作答；不符合時改為同步計算。
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.orm import Session, object_session
+
+from models import AssignmentContent, ContentItem
+
+logger = logging.getLogger(__name__)
+
+# get_words_for_practice() 的 priority_score：第 1 階段 100、第 2 階段 50~100、第 3 階段 < 50
+_DUE_PRIORITY = 50
+
+_PENDING_INVALIDATIONS_KEY = "word_practice_invalidations"
+
+
+@dataclass(frozen=True)
+class WordPool:
+    """一份作業的單字與干擾項候選"""
+
+    assignment_id: Optional[int]
+    words: Tuple[Dict[str, Any], ...]  # 依 order_index 排序
+    content_ids: FrozenSet[int]
+    distractors: Dict[int, Any]  # content_item_id → 預存干擾項
+    translations: Tuple[str, ...]  # 去重後（不分大小寫）的所有翻譯
+
+    @property
+    def total_words(self) -> int:
+        return len(self.words)
+
+    def build_options(
+        self, word: Dict[str, Any], use_stored_distractors: bool = True
+    ) -> List[str]:
+        """正確答案 + 3 個干擾項，打亂順序"""
+        correct_answer = word.get("translation") or ""
+        stored = (
+            self.distractors.get(word["content_item_id"])
+            if use_stored_distractors
+            else None
+        )
+
+        if isinstance(stored, list) and len(stored) >= 3:
+            # 使用已儲存的干擾項（來自同作業其他單字翻譯）
+            final_distractors = list(stored[:3])
+        else:
+            # 從作業其他單字的翻譯隨機取
+            key = correct_answer.lower().strip()
+            sample = random.sample(self.translations, min(4, len(self.translations)))
+            final_distractors = [t for t in sample if t.lower().strip() != key][:3]
+
+        # Fallback for small word sets
+        for j in range(3 - len(final_distractors)):
+            final_distractors.append(f"選項{chr(65 + j)}")
+
+        options = [correct_answer] + final_distractors
+        random.shuffle(options)
+        return options
+
+    def preview_round(
+        self, exclude_ids: Set[int], round_size: int, shuffle: bool
+    ) -> List[Dict[str, Any]]:
+        """老師預覽 / demo 的回合：排除已練習單字，剩餘不足一回合時重新開始 (#379)"""
+        remaining = [w for w in self.words if w["content_item_id"] not in exclude_ids]
+        if len(remaining) < round_size:
+            remaining = list(self.words)
+        if shuffle:
+            random.shuffle(remaining)
+        return remaining[:round_size]
+
+
+@dataclass
+class _Prefetched:
+    """背景預先算好的下一回合"""
+
+    after_ids: FrozenSet[int]  # 預取時排除的本回合單字
+    words: List[Dict[str, Any]]
+    complete: bool  # 是否全部來自第 1、2 階段（可直接當作下一回合）
+    created_at: float
+
+
+@dataclass
+class _RoundState:
+    """一個 StudentAssignment 的回合狀態"""
+
+    assignment_id: int
+    total_words: Optional[int] = None
+    total_loaded_at: float = 0.0
+    generation: int = 0  # 每送出一回合 +1，過期的預取結果直接丟棄
+    prefetched: Optional[_Prefetched] = None
+    prefetching: bool = False
+
+
+@dataclass
+class PracticeRound:
+    """一回合的單字（尚未加上選項）"""
+
+    words: List[Dict[str, Any]]
+    prefetched: bool = False
+    served_ids: FrozenSet[int] = field(default_factory=frozenset)
+
+
+def _row_to_word(row) -> Dict[str, Any]:
+    return {
+        "content_item_id": row.content_item_id,
+        "text": row.text,
+        "translation": row.translation or "",
+        "audio_url": row.audio_url,
+        "image_url": getattr(row, "image_url", None),
+        "memory_strength": float(row.memory_strength) if row.memory_strength else 0,
+    }
+
+
+class PracticeSessionEngine:
+    """單字選擇練習的 word pool 快取與回合預取"""
+
+    def __init__(
+        self,
+        round_size: Optional[int] = None,
+        pool_ttl_seconds: Optional[float] = None,
+        round_ttl_seconds: Optional[float] = None,
+        max_pools: Optional[int] = None,
+        max_sessions: Optional[int] = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            round_size: 每回合單字數（WORD_PRACTICE_ROUND_SIZE）
+            pool_ttl_seconds: word pool 與總字數的有效秒數（WORD_PRACTICE_POOL_TTL_SECONDS）
+            round_ttl_seconds: 預取回合的有效秒數（WORD_PRACTICE_ROUND_TTL_SECONDS）
+            max_pools: 最多快取的作業數（WORD_PRACTICE_MAX_POOLS）
+            max_sessions: 最多保留回合狀態的 StudentAssignment 數（WORD_PRACTICE_MAX_SESSIONS）
+            session_factory: 背景預取使用的 session factory（預設為 database 的 SessionLocal）
+            clock: 取得目前時間的函式（測試用）
+        """
+        self.round_size = round_size or int(os.getenv("WORD_PRACTICE_ROUND_SIZE", "10"))
+        self.pool_ttl_seconds = (
+            pool_ttl_seconds
+            if pool_ttl_seconds is not None
+            else float(os.getenv("WORD_PRACTICE_POOL_TTL_SECONDS", "300"))
+        )
+        self.round_ttl_seconds = (
+            round_ttl_seconds
+            if round_ttl_seconds is not None
+            else float(os.getenv("WORD_PRACTICE_ROUND_TTL_SECONDS", "1800"))
+        )
+        self.max_pools = max_pools or int(os.getenv("WORD_PRACTICE_MAX_POOLS", "500"))
+        self.max_sessions = max_sessions or int(
+            os.getenv("WORD_PRACTICE_MAX_SESSIONS", "5000")
+        )
+        self._session_factory = session_factory
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pools: "OrderedDict[int, Tuple[float, WordPool]]" = OrderedDict()
+        self._content_index: Dict[int, Set[int]] = {}  # content_id → assignment_ids
+        self._sessions: "OrderedDict[int, _RoundState]" = OrderedDict()
+
+        # 統計
+        self._pool_hits = 0
+        self._pool_misses = 0
+        self._round_hits = 0
+        self._round_misses = 0
+        self._prefetch_discarded = 0
+        self._invalidations = 0
+
+    # ------------------------------------------------------------------
+    # Word pool（每個 Assignment）
+    # ------------------------------------------------------------------
+
+    def get_pool(self, db: Session, assignment_id: Optional[int]) -> WordPool:
+        """取得作業的 word pool（快取未命中時載入）"""
+        if assignment_id is None:
+            return WordPool(None, (), frozenset(), {}, ())
+
+        now = self._clock()
+        with self._lock:
+            entry = self._pools.get(assignment_id)
+            if entry and now - entry[0] < self.pool_ttl_seconds:
+                self._pools.move_to_end(assignment_id)
+                self._pool_hits += 1
+                return entry[1]
+            self._pool_misses += 1
+
+        pool = self._load_pool(db, assignment_id)
+
+        with self._lock:
+            self._pools[assignment_id] = (now, pool)
+            self._pools.move_to_end(assignment_id)
+            for content_id in pool.content_ids:
+                self._content_index.setdefault(content_id, set()).add(assignment_id)
+            while len(self._pools) > self.max_pools:
+                evicted, _ = self._pools.popitem(last=False)
+                self._drop_from_index(evicted)
+        return pool
+
+    def _load_pool(self, db: Session, assignment_id: int) -> WordPool:
+        content_ids = frozenset(
+            content_id
+            for (content_id,) in db.query(AssignmentContent.content_id).filter(
+                AssignmentContent.assignment_id == assignment_id
+            )
+        )
+        items = (
+            db.query(ContentItem)
+            .filter(ContentItem.content_id.in_(content_ids))
+            .order_by(ContentItem.order_index)
+            .all()
+            if content_ids
+            else []
+        )
+
+        words = []
+        distractors = {}
+        translations: Dict[str, str] = {}
+        for item in items:
+            words.append(
+                {
+                    "content_item_id": item.id,
+                    "text": item.text,
+                    "translation": item.translation or "",
+                    "audio_url": item.audio_url,
+                    "image_url": item.image_url,
+                    "memory_strength": 0,
+                }
+            )
+            if item.distractors:
+                distractors[item.id] = item.distractors
+            if item.translation:
+                translations.setdefault(
+                    item.translation.lower().strip(), item.translation
+                )
+
+        return WordPool(
+            assignment_id=assignment_id,
+            words=tuple(words),
+            content_ids=content_ids,
+            distractors=distractors,
+            translations=tuple(translations.values()),
+        )
+
+    def _drop_from_index(self, assignment_id: int):
+        for assignment_ids in self._content_index.values():
+            assignment_ids.discard(assignment_id)
+
+    def invalidate_assignment(self, assignment_id: int):
+        """作業內容變更：丟棄 pool 與該作業所有學生的回合狀態"""
+        with self._lock:
+            self._invalidations += 1
+            if self._pools.pop(assignment_id, None):
+                self._drop_from_index(assignment_id)
+            for state in self._sessions.values():
+                if state.assignment_id == assignment_id:
+                    state.total_words = None
+                    state.prefetched = None
+                    state.generation += 1
+
+    def invalidate_content(self, content_id: int):
+        """單字變更：丟棄包含此內容的作業"""
+        with self._lock:
+            assignment_ids = list(self._content_index.pop(content_id, ()))
+        for assignment_id in assignment_ids:
+            self.invalidate_assignment(assignment_id)
+
+    # ------------------------------------------------------------------
+    # 學生回合（每個 StudentAssignment）
+    # ------------------------------------------------------------------
+
+    def _state(self, student_assignment_id: int, assignment_id: int) -> _RoundState:
+        """呼叫端需持有 self._lock"""
+        state = self._sessions.get(student_assignment_id)
+        if state is None or state.assignment_id != assignment_id:
+            state = _RoundState(assignment_id=assignment_id)
+            self._sessions[student_assignment_id] = state
+        self._sessions.move_to_end(student_assignment_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return state
+
+    def total_words(self, db: Session, student_assignment) -> int:
+        """作業總字數（依學生的內容進度；尚無進度時依作業內容）"""
+        sa_id = student_assignment.id
+        assignment_id = student_assignment.assignment_id
+        now = self._clock()
+        with self._lock:
+            state = self._state(sa_id, assignment_id)
+            if (
+                state.total_words is not None
+                and now - state.total_loaded_at < self.pool_ttl_seconds
+            ):
+                return state.total_words
+
+        total = db.execute(
+            text(
+                """
+                SELECT COUNT(DISTINCT ci.id) as total_count
+                FROM student_content_progress scp
+                JOIN content_items ci ON ci.content_id = scp.content_id
+                WHERE scp.student_assignment_id = :sa_id
+                """
+            ),
+            {"sa_id": sa_id},
+        ).scalar()
+        if not total and assignment_id:
+            # Fallback if no progress records yet
+            total = self.get_pool(db, assignment_id).total_words
+
+        with self._lock:
+            state = self._state(sa_id, assignment_id)
+            state.total_words = int(total or 0)
+            state.total_loaded_at = now
+        return int(total or 0)
+
+    def _select_words(
+        self, db: Session, student_assignment_id: int, exclude_ids: FrozenSet[int]
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        呼叫 get_words_for_practice() 並排除指定單字
+
+        Returns:
+            (單字, 是否全部來自第 1、2 階段)
+        """
+        rows = db.execute(
+            text("SELECT * FROM get_words_for_practice(:sa_id, :limit_count)"),
+            {
+                "sa_id": student_assignment_id,
+                "limit_count": self.round_size + len(exclude_ids),
+            },
+        ).fetchall()
+        picked = [r for r in rows if r.content_item_id not in exclude_ids][
+            : self.round_size
+        ]
+        complete = len(picked) == self.round_size and all(
+            float(r.priority_score or 0) >= _DUE_PRIORITY for r in picked
+        )
+        return [_row_to_word(r) for r in picked], complete
+
+    def _round_answered(
+        self, db: Session, student_assignment_id: int, content_item_ids: FrozenSet[int]
+    ) -> bool:
+        """上一回合的單字是否都已作答（都進入第 3 階段）"""
+        if not content_item_ids:
+            return True
+        answered = db.execute(
+            text(
+                """
+                SELECT COUNT(*) FROM user_word_progress
+                WHERE student_assignment_id = :sa_id
+                    AND content_item_id IN :ids
+                    AND next_review_at > NOW()
+                """
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"sa_id": student_assignment_id, "ids": list(content_item_ids)},
+        ).scalar()
+        return answered == len(content_item_ids)
+
+    def next_round(self, db: Session, student_assignment) -> PracticeRound:
+        """
+        取得下一回合的單字
+
+        預取結果有效時直接使用，否則同步呼叫 get_words_for_practice()；
+        沒有任何練習資料時退回作業的前 N 個單字。
+        """
+        sa_id = student_assignment.id
+        assignment_id = student_assignment.assignment_id
+        now = self._clock()
+
+        with self._lock:
+            state = self._state(sa_id, assignment_id)
+            prefetched = state.prefetched
+            state.prefetched = None
+            state.generation += 1
+
+        words = None
+        used_prefetch = False
+        if (
+            prefetched is not None
+            and prefetched.complete
+            and now - prefetched.created_at < self.round_ttl_seconds
+        ):
+            if self._round_answered(db, sa_id, prefetched.after_ids):
+                words = prefetched.words
+                used_prefetch = True
+            else:
+                with self._lock:
+                    self._prefetch_discarded += 1
+
+        if words is None:
+            words, _ = self._select_words(db, sa_id, frozenset())
+            if not words and assignment_id:
+                pool = self.get_pool(db, assignment_id)
+                words = [dict(w) for w in pool.words[: self.round_size]]
+
+        with self._lock:
+            if used_prefetch:
+                self._round_hits += 1
+            else:
+                self._round_misses += 1
+
+        return PracticeRound(
+            words=words,
+            prefetched=used_prefetch,
+            served_ids=frozenset(w["content_item_id"] for w in words),
+        )
+
+    def schedule_prefetch(
+        self, student_assignment_id: int, assignment_id: int, served_ids: FrozenSet[int]
+    ) -> Optional[asyncio.Future]:
+        """在背景計算下一回合（學生作答本回合時進行）"""
+        with self._lock:
+            state = self._state(student_assignment_id, assignment_id)
+            if state.prefetching:
+                return None
+            state.prefetching = True
+            generation = state.generation
+
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(
+            None,
+            self.prefetch,
+            student_assignment_id,
+            assignment_id,
+            served_ids,
+            generation,
+        )
+
+    def prefetch(
+        self,
+        student_assignment_id: int,
+        assignment_id: int,
+        served_ids: FrozenSet[int],
+        generation: int,
+    ) -> bool:
+        """同步計算下一回合並存入回合狀態；結果過期（已送出新回合）時丟棄"""
+        db = self._new_session()
+        try:
+            words, complete = self._select_words(db, student_assignment_id, served_ids)
+        except Exception as e:
+            logger.warning(
+                f"Word practice prefetch failed for {student_assignment_id}: {e}"
+            )
+            return False
+        finally:
+            db.close()
+            with self._lock:
+                state = self._sessions.get(student_assignment_id)
+                if state is not None:
+                    state.prefetching = False
+
+        with self._lock:
+            state = self._sessions.get(student_assignment_id)
+            if state is None or state.generation != generation:
+                self._prefetch_discarded += 1
+                return False
+            state.prefetched = _Prefetched(
+                after_ids=served_ids,
+                words=words,
+                complete=complete,
+                created_at=self._clock(),
+            )
+        return True
+
+    def _new_session(self) -> Session:
+        if self._session_factory is None:
+            from database import get_session_local
+
+            self._session_factory = get_session_local()
+        return self._session_factory()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pools": len(self._pools),
+                "sessions": len(self._sessions),
+                "pool_hits": self._pool_hits,
+                "pool_misses": self._pool_misses,
+                "round_hits": self._round_hits,
+                "round_misses": self._round_misses,
+                "prefetch_discarded": self._prefetch_discarded,
+                "invalidations": self._invalidations,
+            }
+
+
+# ----------------------------------------------------------------------
+# 全域實例與內容變更失效
+# ----------------------------------------------------------------------
+
+_engine: Optional[PracticeSessionEngine] = None
+
+
+def get_word_practice_engine() -> PracticeSessionEngine:
+    global _engine
+    if _engine is None:
+        _engine = PracticeSessionEngine()
+    return _engine
+
+
+def get_word_practice_stats() -> Dict[str, Any]:
+    return _engine.get_stats() if _engine else {"pools": 0, "sessions": 0}
+
+
+def _record_change(kind: str, key: Optional[int], target):
+    session = object_session(target)
+    if session is None or key is None:
+        return
+    session.info.setdefault(_PENDING_INVALIDATIONS_KEY, set()).add((kind, key))
+
+
+@event.listens_for(ContentItem, "after_insert")
+@event.listens_for(ContentItem, "after_update")
+@event.listens_for(ContentItem, "after_delete")
+def _content_item_changed(mapper, connection, target):
+    _record_change("content", target.content_id, target)
+
+
+@event.listens_for(AssignmentContent, "after_insert")
+@event.listens_for(AssignmentContent, "after_update")
+@event.listens_for(AssignmentContent, "after_delete")
+def _assignment_content_changed(mapper, connection, target):
+    _record_change("assignment", target.assignment_id, target)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    pending: Sequence = session.info.pop(_PENDING_INVALIDATIONS_KEY, ())
+    if not pending or _engine is None:
+        return
+    for kind, key in pending:
+        if kind == "content":
+            _engine.invalidate_content(key)
+        else:
+            _engine.invalidate_assignment(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop(_PENDING_INVALIDATIONS_KEY, None)
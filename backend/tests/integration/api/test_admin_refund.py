@@ -13,7 +13,7 @@ import pytest
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.orm import Session
 from fastapi.testclient import TestClient
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 from models import (
     Teacher,
     SubscriptionPeriod,
@@ -169,7 +169,9 @@ def test_admin_refund_full_success(
     teacher, period, transaction = teacher_with_paid_subscription
 
     # Mock TapPay refund API
-    with patch("services.tappay_service.TapPayService.refund") as mock_refund:
+    with patch(
+        "services.tappay_service.TapPayService.refund_async", new_callable=AsyncMock
+    ) as mock_refund:
         mock_refund.return_value = {
             "status": 0,
             "msg": "Success",
@@ -208,7 +210,9 @@ def test_admin_refund_partial_success(
     """測試 Admin 部分退款成功"""
     teacher, period, transaction = teacher_with_paid_subscription
 
-    with patch("services.tappay_service.TapPayService.refund") as mock_refund:
+    with patch(
+        "services.tappay_service.TapPayService.refund_async", new_callable=AsyncMock
+    ) as mock_refund:
         mock_refund.return_value = {
             "status": 0,
             "msg": "Success",
@@ -248,7 +252,9 @@ def test_admin_refund_records_in_period_metadata(
     """測試退款會記錄在 period metadata 中"""
     teacher, period, transaction = teacher_with_paid_subscription
 
-    with patch("services.tappay_service.TapPayService.refund") as mock_refund:
+    with patch(
+        "services.tappay_service.TapPayService.refund_async", new_callable=AsyncMock
+    ) as mock_refund:
         mock_refund.return_value = {"status": 0, "msg": "Success"}
 
         # 使用 admin_headers fixture
@@ -334,7 +340,9 @@ def test_refund_tappay_api_failure(
     """測試 TapPay API 失敗時的處理"""
     teacher, period, transaction = teacher_with_paid_subscription
 
-    with patch("services.tappay_service.TapPayService.refund") as mock_refund:
+    with patch(
+        "services.tappay_service.TapPayService.refund_async", new_callable=AsyncMock
+    ) as mock_refund:
         # Mock TapPay 退款失敗
         mock_refund.return_value = {"status": -1, "msg": "Refund failed"}
 
@@ -36,7 +36,7 @@ from unittest.mock import AsyncMock
 
 
 def setup_async_httpx_mock(mock_httpx: MagicMock):
-    """Helper to setup async httpx client mock correctly"""
+    """Helper to setup the shared async httpx client mock correctly"""
     mock_response = MagicMock()
     mock_response.content = b"fake_audio_data"
     mock_client_instance = MagicMock()
@@ -303,9 +303,9 @@ def test_complete_grading_all_items_have_scores(
 # ============================================================================
 # TEST 2: Some Items Missing AI Scores - Trigger Assessment
 # ============================================================================
-@patch("routers.speech_assessment.convert_audio_to_wav")
+@patch("routers.speech_assessment.decode_audio")
 @patch("routers.speech_assessment.assess_pronunciation")
-@patch("httpx.AsyncClient")
+@patch("services.grading_pipeline.get_http_client")
 def test_complete_grading_trigger_missing_assessments(
     mock_httpx: MagicMock,
     mock_assess: MagicMock,
@@ -417,9 +417,9 @@ def test_complete_grading_trigger_missing_assessments(
 # ============================================================================
 # TEST 3: Mixed Scenario - Some Missing Recordings, Some Missing Scores
 # ============================================================================
-@patch("routers.speech_assessment.convert_audio_to_wav")
+@patch("routers.speech_assessment.decode_audio")
 @patch("routers.speech_assessment.assess_pronunciation")
-@patch("httpx.AsyncClient")
+@patch("services.grading_pipeline.get_http_client")
 def test_complete_grading_mixed_scenario(
     mock_httpx: MagicMock,
     mock_assess: MagicMock,
@@ -698,9 +698,9 @@ def test_assignment_feedback_generation(
 # ============================================================================
 # TEST 6: Batch Processing with Multiple Students
 # ============================================================================
-@patch("routers.speech_assessment.convert_audio_to_wav")
+@patch("routers.speech_assessment.decode_audio")
 @patch("routers.speech_assessment.assess_pronunciation")
-@patch("httpx.AsyncClient")
+@patch("services.grading_pipeline.get_http_client")
 def test_batch_grading_multiple_students_complete_workflow(
     mock_httpx: MagicMock,
     mock_assess: MagicMock,
@@ -874,9 +874,9 @@ def test_batch_grading_multiple_students_complete_workflow(
 # ============================================================================
 # TEST 7: Error Handling - AI Assessment Failure
 # ============================================================================
-@patch("routers.speech_assessment.convert_audio_to_wav")
+@patch("routers.speech_assessment.decode_audio")
 @patch("routers.speech_assessment.assess_pronunciation")
-@patch("httpx.AsyncClient")
+@patch("services.grading_pipeline.get_http_client")
 def test_batch_grading_ai_assessment_failure_graceful(
     mock_httpx: MagicMock,
     mock_assess: MagicMock,
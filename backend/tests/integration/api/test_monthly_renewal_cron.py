@@ -7,7 +7,7 @@ import pytest
 from datetime import date
 from freezegun import freeze_time
 from sqlalchemy.orm import Session
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 from models import (
     Teacher,
@@ -212,8 +212,8 @@ class TestMonthlyRenewalCron:
         db = setup_test_data
 
         # Mock TapPay 扣款成功
-        mock_tappay = Mock()
-        mock_tappay.pay_by_token.return_value = {
+        mock_tappay = Mock(pay_by_token_async=AsyncMock())
+        mock_tappay.pay_by_token_async.return_value = {
             "status": 0,  # 成功
             "rec_trade_id": "REC123456",
             "card_secret": {
@@ -281,8 +281,8 @@ class TestMonthlyRenewalCron:
         assert teacher.card_token == "new_token_123"
 
         # Then: TapPay 被正確呼叫
-        mock_tappay.pay_by_token.assert_called_once()
-        call_args = mock_tappay.pay_by_token.call_args[1]
+        mock_tappay.pay_by_token_async.assert_called_once()
+        call_args = mock_tappay.pay_by_token_async.call_args[1]
         assert call_args["amount"] == 299
         assert call_args["card_key"] == "card_key_123"
 
@@ -301,8 +301,8 @@ class TestMonthlyRenewalCron:
         db = setup_test_data
 
         # Mock TapPay
-        mock_tappay = Mock()
-        mock_tappay.pay_by_token.return_value = {
+        mock_tappay = Mock(pay_by_token_async=AsyncMock())
+        mock_tappay.pay_by_token_async.return_value = {
             "status": 0,
             "rec_trade_id": "REC123456",
         }
@@ -340,7 +340,7 @@ class TestMonthlyRenewalCron:
         )
 
         # Then: 扣款 599 元
-        call_args = mock_tappay.pay_by_token.call_args[1]
+        call_args = mock_tappay.pay_by_token_async.call_args[1]
         assert call_args["amount"] == 599
 
         # Then: 新訂閱配額 6000
@@ -373,8 +373,8 @@ class TestMonthlyRenewalCron:
         db = setup_test_data
 
         # Mock TapPay 扣款失敗
-        mock_tappay = Mock()
-        mock_tappay.pay_by_token.return_value = {
+        mock_tappay = Mock(pay_by_token_async=AsyncMock())
+        mock_tappay.pay_by_token_async.return_value = {
             "status": -1,  # 失敗
             "msg": "餘額不足",
         }
@@ -444,7 +444,7 @@ class TestMonthlyRenewalCron:
         """
         db = setup_test_data
 
-        mock_tappay = Mock()
+        mock_tappay = Mock(pay_by_token_async=AsyncMock())
         mock_tappay_class.return_value = mock_tappay
 
         teacher = Teacher(
@@ -495,7 +495,7 @@ class TestMonthlyRenewalCron:
         # Then: 跳過，不扣款
         assert response.json()["skipped"] == 1
         assert response.json()["auto_renewed"] == 0
-        mock_tappay.pay_by_token.assert_not_called()
+        mock_tappay.pay_by_token_async.assert_not_called()
 
     @freeze_time("2025-12-01 02:00:00")
     @patch("routers.cron.TapPayService")
@@ -511,8 +511,11 @@ class TestMonthlyRenewalCron:
         """
         db = setup_test_data
 
-        mock_tappay = Mock()
-        mock_tappay.pay_by_token.return_value = {"status": 0, "rec_trade_id": "REC123"}
+        mock_tappay = Mock(pay_by_token_async=AsyncMock())
+        mock_tappay.pay_by_token_async.return_value = {
+            "status": 0,
+            "rec_trade_id": "REC123",
+        }
         mock_tappay_class.return_value = mock_tappay
 
         teacher = Teacher(
@@ -558,7 +561,7 @@ class TestMonthlyRenewalCron:
         assert response2.json()["auto_renewed"] == 0
 
         # Then: TapPay 只被呼叫一次
-        assert mock_tappay.pay_by_token.call_count == 1
+        assert mock_tappay.pay_by_token_async.call_count == 1
 
     # ============================================
     # 階段 2: 檢查 2 - 防錯誤扣款 + 關閉 auto_renew
@@ -578,7 +581,7 @@ class TestMonthlyRenewalCron:
         """
         db = setup_test_data
 
-        mock_tappay = Mock()
+        mock_tappay = Mock(pay_by_token_async=AsyncMock())
         mock_tappay_class.return_value = mock_tappay
 
         teacher = Teacher(
@@ -610,7 +613,7 @@ class TestMonthlyRenewalCron:
         assert response.json()["auto_renew_disabled"] == 1
 
         # Then: 不扣款
-        mock_tappay.pay_by_token.assert_not_called()
+        mock_tappay.pay_by_token_async.assert_not_called()
 
     @freeze_time("2025-12-01 02:00:00")
     @patch("routers.cron.TapPayService")
@@ -626,7 +629,7 @@ class TestMonthlyRenewalCron:
         """
         db = setup_test_data
 
-        mock_tappay = Mock()
+        mock_tappay = Mock(pay_by_token_async=AsyncMock())
         mock_tappay_class.return_value = mock_tappay
 
         # Given: 11/20 註冊並綁卡的新用戶
@@ -861,8 +864,8 @@ class TestMonthlyRenewalCron:
         """
         db = setup_test_data
 
-        mock_tappay = Mock()
-        mock_tappay.pay_by_token.return_value = {
+        mock_tappay = Mock(pay_by_token_async=AsyncMock())
+        mock_tappay.pay_by_token_async.return_value = {
             "status": 0,
             "rec_trade_id": "REC123",
         }
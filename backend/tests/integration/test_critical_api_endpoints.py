@@ -92,7 +92,7 @@ class TestAuthenticationEndpoints:
     def test_teacher_login_endpoint(self, test_client):
         """測試教師登入 API"""
         # 先創建測試教師（模擬註冊）
-        with patch("routers.auth.get_password_hash") as mock_hash:
+        with patch("routers.auth.get_password_hash_async") as mock_hash:
             mock_hash.return_value = "hashed_password"
 
             register_data = {
@@ -107,7 +107,7 @@ class TestAuthenticationEndpoints:
             assert register_response.status_code in [200, 201]
 
         # 測試登入
-        with patch("routers.auth.verify_password") as mock_verify:
+        with patch("routers.auth.verify_password_async") as mock_verify:
             mock_verify.return_value = True
 
             login_data = {"email": "teacher@test.com", "password": "testpass123"}
@@ -143,7 +143,7 @@ class TestPublicEndpoints:
     def test_teacher_validation_endpoint(self, test_client):
         """測試教師驗證端點"""
         # 先創建測試教師
-        with patch("routers.auth.get_password_hash") as mock_hash:
+        with patch("routers.auth.get_password_hash_async") as mock_hash:
             mock_hash.return_value = "hashed_password"
 
             register_data = {
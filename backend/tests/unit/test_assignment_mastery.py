@@ -0,0 +1,315 @@
+"""
+作業熟練度彙總（services.assignment_mastery）測試
+
+以假的 session 驗證：
+- get_assignment_mastery 呼叫 read_assignment_mastery()
+- reconcile 依 student_assignment_id 分批、每批 commit、統計被修正的列
+
+PL/pgSQL 函式與 trigger 只存在於 PostgreSQL（migration 20260421_1000），
+設定 TEST_POSTGRES_URL 時另外在真實資料庫上驗證（每個測試結束後 rollback）：
+- 一連串 update_memory_strength() 增量更新後，彙總與 calculate_assignment_mastery()
+  全量計算的結果一致
+- 內容 / 作答紀錄變動時 trigger 標記 stale，讀取與 reconcile 會重算修正
+"""
+
+import os
+import pathlib
+import subprocess
+import uuid
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from models import (
+    Assignment,
+    Classroom,
+    Content,
+    ContentItem,
+    ContentType,
+    Lesson,
+    Program,
+    Student,
+    StudentAssignment,
+    StudentContentProgress,
+    Teacher,
+)
+from services.assignment_mastery import (
+    get_assignment_mastery,
+    reconcile_assignment_mastery,
+)
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def _row(sa_id, strength_sum=1.5, practiced=3, mastered=1, total=10, stale=False):
+    return SimpleNamespace(
+        student_assignment_id=sa_id,
+        strength_sum=strength_sum,
+        practiced_words=practiced,
+        words_mastered=mastered,
+        total_words=total,
+        stale=stale,
+    )
+
+
+class FakeSession:
+    """回應 reconcile 用到的三種 SQL：COUNT、分批查詢、refresh"""
+
+    def __init__(self, rows, refreshed):
+        self.rows = sorted(rows, key=lambda r: r.student_assignment_id)
+        self.refreshed = refreshed
+        self.refresh_calls = []
+        self.commits = 0
+
+    def execute(self, statement, params):
+        sql = str(statement)
+        result = MagicMock()
+        if "COUNT(*)" in sql:
+            result.scalar.return_value = len(self.rows)
+        elif "refresh_assignment_mastery" in sql:
+            self.refresh_calls.append(params["sa_id"])
+            result.fetchone.return_value = self.refreshed[params["sa_id"]]
+        else:
+            batch = [
+                r for r in self.rows if r.student_assignment_id > params["last_id"]
+            ][: params["limit"]]
+            result.fetchall.return_value = batch
+        return result
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_get_assignment_mastery_reads_aggregate():
+    db = MagicMock()
+    get_assignment_mastery(db, 42)
+
+    statement, params = db.execute.call_args[0]
+    assert "read_assignment_mastery" in str(statement)
+    assert params == {"sa_id": 42}
+
+
+def test_reconcile_batches_and_counts_repairs():
+    rows = [_row(1), _row(2), _row(3, stale=True), _row(4), _row(5)]
+    refreshed = {
+        1: _row(1),  # 一致
+        2: _row(2, strength_sum=1.9),  # strength 漂移
+        3: _row(3),  # stale 一律算修正
+        4: _row(4, total=12),  # 內容變動
+        5: _row(5),
+    }
+    db = FakeSession(rows, refreshed)
+    progress = []
+
+    stats = reconcile_assignment_mastery(db, batch_size=2, on_progress=progress.append)
+
+    assert stats == {"checked": 5, "repaired": 3}
+    assert db.refresh_calls == [1, 2, 3, 4, 5]
+    assert db.commits == 3
+    assert progress[-1] == 100.0
+
+
+def test_reconcile_nothing_to_do():
+    db = FakeSession([], {})
+
+    assert reconcile_assignment_mastery(db) == {"checked": 0, "repaired": 0}
+    assert db.commits == 0
+
+
+# ---------------------------------------------------------------------------
+# PostgreSQL：migration 20260421_1000 的函式與 trigger
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture(scope="module")
+def pg_engine():
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL not set (PL/pgSQL functions need PostgreSQL)")
+
+    env = os.environ.copy()
+    env.pop("STAGING_SUPABASE_POOLER_URL", None)
+    env["DATABASE_URL"] = TEST_POSTGRES_URL
+    env["SKIP_MIGRATION_VALIDATION"] = "true"
+    result = subprocess.run(
+        ["alembic", "upgrade", "head"],
+        env=env,
+        capture_output=True,
+        text=True,
+        cwd=pathlib.Path(__file__).resolve().parents[2],
+    )
+    assert result.returncode == 0, result.stderr
+
+    engine = create_engine(TEST_POSTGRES_URL)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_session(pg_engine):
+    """整個測試在一個 transaction 內，reconcile 的 commit 只釋放 savepoint"""
+    connection = pg_engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+
+def _make_student_assignment(db, words=4, target_proficiency=80):
+    teacher = Teacher(
+        email=f"mastery-{uuid.uuid4().hex[:8]}@duotopia.com", password_hash="x", name="T"
+    )
+    db.add(teacher)
+    db.flush()
+    classroom = Classroom(name="C", teacher_id=teacher.id)
+    db.add(classroom)
+    db.flush()
+    program = Program(name="P", teacher_id=teacher.id, classroom_id=classroom.id)
+    db.add(program)
+    db.flush()
+    lesson = Lesson(program_id=program.id, name="L")
+    db.add(lesson)
+    db.flush()
+    content = Content(
+        lesson_id=lesson.id, type=ContentType.EXAMPLE_SENTENCES, title="V"
+    )
+    db.add(content)
+    db.flush()
+    items = [
+        ContentItem(content_id=content.id, order_index=i, text=f"word{i}")
+        for i in range(words)
+    ]
+    db.add_all(items)
+    assignment = Assignment(
+        title="Vocab",
+        classroom_id=classroom.id,
+        teacher_id=teacher.id,
+        due_date=datetime.utcnow() + timedelta(days=7),
+        target_proficiency=target_proficiency,
+    )
+    student = Student(name="S", password_hash="x", birthdate=date(2012, 1, 1))
+    db.add_all([assignment, student])
+    db.flush()
+    student_assignment = StudentAssignment(
+        assignment_id=assignment.id,
+        student_id=student.id,
+        classroom_id=classroom.id,
+        title="Vocab",
+    )
+    db.add(student_assignment)
+    db.flush()
+    db.add(
+        StudentContentProgress(
+            student_assignment_id=student_assignment.id, content_id=content.id
+        )
+    )
+    db.flush()
+    return student_assignment.id, content, [item.id for item in items]
+
+
+def _answer(db, sa_id, item_id, is_correct):
+    db.execute(
+        text("SELECT * FROM update_memory_strength(:sa_id, :item_id, :correct)"),
+        {"sa_id": sa_id, "item_id": item_id, "correct": is_correct},
+    )
+
+
+def _full(db, sa_id):
+    return db.execute(
+        text("SELECT * FROM calculate_assignment_mastery(:sa_id)"), {"sa_id": sa_id}
+    ).fetchone()
+
+
+def _aggregate(db, sa_id):
+    return db.execute(
+        text("SELECT * FROM assignment_mastery WHERE student_assignment_id = :sa_id"),
+        {"sa_id": sa_id},
+    ).fetchone()
+
+
+def _assert_matches_full(db, sa_id):
+    incremental = get_assignment_mastery(db, sa_id)
+    full = _full(db, sa_id)
+    assert float(incremental.current_mastery) == pytest.approx(
+        float(full.current_mastery), abs=1e-6
+    )
+    assert incremental.target_mastery == full.target_mastery
+    assert incremental.achieved == full.achieved
+    assert incremental.words_mastered == full.words_mastered
+    assert incremental.total_words == full.total_words
+
+
+def test_incremental_updates_match_full_calculation(pg_session):
+    db = pg_session
+    sa_id, _, items = _make_student_assignment(db)
+
+    # 第一次讀取建立彙總列，之後只靠 update_memory_strength 的差值更新
+    _assert_matches_full(db, sa_id)
+
+    # 新單字、答對跨過精熟門檻、答錯掉回門檻以下、全部單字都練習過
+    answers = [
+        (items[0], True),
+        (items[1], False),
+        (items[0], True),
+        (items[2], True),
+        (items[0], False),
+        (items[1], True),
+        (items[1], True),
+        (items[3], True),
+        (items[3], True),
+        (items[2], False),
+    ]
+    for item_id, is_correct in answers:
+        _answer(db, sa_id, item_id, is_correct)
+        _assert_matches_full(db, sa_id)
+
+    aggregate = _aggregate(db, sa_id)
+    assert aggregate.stale is False
+    assert aggregate.practiced_words == 4
+
+
+def test_triggers_mark_stale_and_reconcile_repairs(pg_session):
+    db = pg_session
+    sa_id, content, items = _make_student_assignment(db)
+    get_assignment_mastery(db, sa_id)
+    _answer(db, sa_id, items[0], True)
+    _answer(db, sa_id, items[1], True)
+    assert _aggregate(db, sa_id).stale is False
+
+    # 新增單字：content_items trigger 標記 stale，讀取時重算
+    db.add(ContentItem(content_id=content.id, order_index=9, text="extra"))
+    db.flush()
+    assert _aggregate(db, sa_id).stale is True
+    _assert_matches_full(db, sa_id)
+    assert _aggregate(db, sa_id).total_words == 5
+
+    # 刪除作答紀錄：user_word_progress trigger 標記 stale
+    db.execute(
+        text(
+            "DELETE FROM user_word_progress "
+            "WHERE student_assignment_id = :sa_id AND content_item_id = :item_id"
+        ),
+        {"sa_id": sa_id, "item_id": items[0]},
+    )
+    assert _aggregate(db, sa_id).stale is True
+
+    # trigger 以外的漂移：由 reconcile 以全量重算修正
+    db.execute(
+        text(
+            "UPDATE assignment_mastery SET strength_sum = 9, stale = FALSE "
+            "WHERE student_assignment_id = :sa_id"
+        ),
+        {"sa_id": sa_id},
+    )
+    stats = reconcile_assignment_mastery(db, max_age=timedelta(0))
+
+    assert stats["repaired"] >= 1
+    aggregate = _aggregate(db, sa_id)
+    assert aggregate.stale is False
+    assert aggregate.practiced_words == 1
+    _assert_matches_full(db, sa_id)
@@ -0,0 +1,262 @@
+"""
+Assignment fan-out (set-based) 測試
+
+驗證 fan_out_student_assignments 建立的 StudentAssignment /
+StudentContentProgress / StudentItemProgress 與原本逐筆 db.add 的結果一致，
+且 SQL 語句數不隨班級人數增加
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import (
+    Assignment,
+    AssignmentContent,
+    AssignmentStatus,
+    Classroom,
+    Content,
+    ContentItem,
+    ContentType,
+    Lesson,
+    Program,
+    Student,
+    StudentAssignment,
+    StudentContentProgress,
+    StudentItemProgress,
+    Teacher,
+)
+from services.assignment_progress_service import (
+    fan_out_student_assignments,
+    materialize_student_progress,
+)
+
+
+@pytest.fixture
+def db_session():
+    """獨立的 in-memory SQLite（以目前的 models 建立 schema）"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _make_assignment(db, student_count: int, items_per_content=(3, 2)):
+    teacher = Teacher(
+        email="fanout@duotopia.com",
+        password_hash="x",
+        name="Fan-out Teacher",
+        is_active=True,
+    )
+    db.add(teacher)
+    db.flush()
+
+    classroom = Classroom(name="Fan-out Class", teacher_id=teacher.id)
+    db.add(classroom)
+    db.flush()
+
+    students = [
+        Student(
+            name=f"Student {i}",
+            password_hash="x",
+            birthdate=date(2012, 1, 1),
+        )
+        for i in range(student_count)
+    ]
+    db.add_all(students)
+
+    program = Program(name="P", teacher_id=teacher.id, classroom_id=classroom.id)
+    db.add(program)
+    db.flush()
+    lesson = Lesson(program_id=program.id, name="L")
+    db.add(lesson)
+    db.flush()
+
+    assignment = Assignment(
+        title="Fan-out",
+        description="desc",
+        classroom_id=classroom.id,
+        teacher_id=teacher.id,
+        due_date=datetime.utcnow() + timedelta(days=7),
+    )
+    db.add(assignment)
+    db.flush()
+
+    for idx, item_count in enumerate(items_per_content, 1):
+        content = Content(
+            lesson_id=lesson.id, type=ContentType.EXAMPLE_SENTENCES, title=f"C{idx}"
+        )
+        db.add(content)
+        db.flush()
+        db.add_all(
+            ContentItem(content_id=content.id, order_index=i, text=f"s{i}")
+            for i in range(item_count)
+        )
+        db.add(
+            AssignmentContent(
+                assignment_id=assignment.id, content_id=content.id, order_index=idx
+            )
+        )
+    db.flush()
+    return assignment, [s.id for s in students]
+
+
+class TestFanOut:
+    def test_creates_all_progress_rows(self, db_session):
+        assignment, student_ids = _make_assignment(db_session, student_count=4)
+
+        counts = fan_out_student_assignments(assignment, student_ids, db_session)
+        db_session.commit()
+
+        assert counts == {
+            "student_assignments": 4,
+            "content_progress": 8,
+            "item_progress": 20,
+        }
+
+        sa = (
+            db_session.query(StudentAssignment)
+            .filter_by(assignment_id=assignment.id, student_id=student_ids[0])
+            .one()
+        )
+        assert sa.status == AssignmentStatus.NOT_STARTED
+        assert sa.title == "Fan-out"
+        assert sa.instructions == "desc"
+        assert sa.classroom_id == assignment.classroom_id
+
+        content_progress = (
+            db_session.query(StudentContentProgress)
+            .filter_by(student_assignment_id=sa.id)
+            .order_by(StudentContentProgress.order_index)
+            .all()
+        )
+        assert [p.is_locked for p in content_progress] == [False, True]
+        assert all(p.status == AssignmentStatus.NOT_STARTED for p in content_progress)
+
+        item_progress = (
+            db_session.query(StudentItemProgress)
+            .filter_by(student_assignment_id=sa.id)
+            .all()
+        )
+        assert len(item_progress) == 5
+        item = item_progress[0]
+        assert item.status == "NOT_STARTED"
+        assert item.review_status == "PENDING"
+        assert item.attempts == 0
+        assert item.timeout_ended is False
+
+    def test_skips_students_already_assigned(self, db_session):
+        assignment, student_ids = _make_assignment(db_session, student_count=3)
+        fan_out_student_assignments(assignment, student_ids[:2], db_session)
+
+        counts = fan_out_student_assignments(assignment, student_ids, db_session)
+
+        assert counts["student_assignments"] == 1
+        assert counts["item_progress"] == 5
+        assert (
+            db_session.query(StudentItemProgress).count() == 15
+        ), "existing students must not get duplicate progress rows"
+
+        # 全部都已指派時什麼都不做
+        assert fan_out_student_assignments(assignment, student_ids, db_session) == {
+            "student_assignments": 0,
+            "content_progress": 0,
+            "item_progress": 0,
+        }
+
+    @pytest.mark.parametrize("student_count", [5, 40])
+    def test_statement_count_independent_of_class_size(self, db_session, student_count):
+        assignment, student_ids = _make_assignment(db_session, student_count)
+        engine = db_session.get_bind()
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            fan_out_student_assignments(assignment, student_ids, db_session)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        # existing 查詢 + 游標 + StudentAssignment INSERT + 兩個 INSERT ... SELECT
+        # （SQLite 的 insertmanyvalues 可能把大量 INSERT 分批）
+        inserts_per_sa = [s for s in statements if "INTO student_assignments" in s]
+        assert len(statements) - len(inserts_per_sa) == 4
+        assert len(inserts_per_sa) <= 2
+
+
+class TestMaterializeStudentProgress:
+    def _student_assignment(self, db):
+        assignment, student_ids = _make_assignment(db, student_count=1)
+        student_assignment = StudentAssignment(
+            assignment_id=assignment.id,
+            student_id=student_ids[0],
+            classroom_id=assignment.classroom_id,
+            title=assignment.title,
+        )
+        db.add(student_assignment)
+        db.flush()
+        return student_assignment
+
+    def test_creates_missing_rows_once(self, db_session):
+        student_assignment = self._student_assignment(db_session)
+
+        first = materialize_student_progress(student_assignment, db_session)
+        second = materialize_student_progress(student_assignment, db_session)
+
+        assert first == {"content_progress": 2, "item_progress": 5}
+        assert second == {"content_progress": 0, "item_progress": 0}
+        assert db_session.query(StudentContentProgress).count() == 2
+        assert db_session.query(StudentItemProgress).count() == 5
+
+    def test_fills_only_missing_items(self, db_session):
+        student_assignment = self._student_assignment(db_session)
+        item = db_session.query(ContentItem).first()
+        db_session.add(
+            StudentItemProgress(
+                student_assignment_id=student_assignment.id,
+                content_item_id=item.id,
+                status="COMPLETED",
+            )
+        )
+        db_session.flush()
+
+        counts = materialize_student_progress(student_assignment, db_session)
+
+        assert counts["item_progress"] == 4
+        kept = (
+            db_session.query(StudentItemProgress)
+            .filter_by(content_item_id=item.id)
+            .one()
+        )
+        assert kept.status == "COMPLETED"
+
+    def test_complete_assignment_costs_single_query(self, db_session):
+        student_assignment = self._student_assignment(db_session)
+        materialize_student_progress(student_assignment, db_session)
+        db_session.flush()
+
+        engine = db_session.get_bind()
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            materialize_student_progress(student_assignment, db_session)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        assert len(statements) == 1
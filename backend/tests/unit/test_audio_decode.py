@@ -0,0 +1,82 @@
+"""
+Single-decode audio pipeline unit tests
+
+Tests for DecodedAudio / decode_audio used by /api/speech/assess
+"""
+
+import wave
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+
+def _make_wav(seconds: float, frame_rate: int = 44100, channels: int = 2) -> bytes:
+    """Build a silent WAV file in memory (no ffmpeg needed)"""
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(frame_rate)
+        wav.writeframes(b"\x00\x00" * channels * int(frame_rate * seconds))
+    return buffer.getvalue()
+
+
+class TestDecodedAudio:
+    """Test the decoded audio object shared by quota, deduction and Azure"""
+
+    def test_duration_from_pcm_length(self):
+        from routers.speech_assessment import DecodedAudio
+
+        decoded = DecodedAudio(b"\x00" * 16000 * 2 * 3)
+        assert decoded.duration_seconds == pytest.approx(3.0)
+
+    def test_wav_data_is_valid_wav(self):
+        from routers.speech_assessment import DecodedAudio
+
+        pcm = b"\x01\x00" * 16000
+        decoded = DecodedAudio(pcm)
+
+        assert len(decoded.wav_header) == 44
+        with wave.open(BytesIO(decoded.wav_data), "rb") as wav:
+            assert wav.getframerate() == 16000
+            assert wav.getnchannels() == 1
+            assert wav.getsampwidth() == 2
+            assert wav.readframes(wav.getnframes()) == pcm
+
+
+class TestDecodeAudio:
+    """Test decode_audio normalizes to 16kHz mono 16bit"""
+
+    def test_decode_wav_resamples_to_16k_mono(self):
+        from routers.speech_assessment import decode_audio
+
+        decoded = decode_audio(_make_wav(2.0), "audio/wav")
+
+        assert decoded.sample_rate == 16000
+        assert decoded.channels == 1
+        assert decoded.duration_seconds == pytest.approx(2.0, abs=0.01)
+        assert decoded.source_size_bytes == len(_make_wav(2.0))
+
+    def test_convert_audio_to_wav_uses_single_decode(self):
+        from routers import speech_assessment
+
+        with patch.object(
+            speech_assessment, "decode_audio", wraps=speech_assessment.decode_audio
+        ) as spy:
+            wav_data = speech_assessment.convert_audio_to_wav(
+                _make_wav(1.0), "audio/wav"
+            )
+
+        assert spy.call_count == 1
+        assert wav_data[:4] == b"RIFF"
+
+    def test_decode_invalid_audio_raises_400(self):
+        from routers.speech_assessment import decode_audio
+
+        with pytest.raises(HTTPException) as exc_info:
+            decode_audio(b"not audio", "audio/wav")
+
+        assert exc_info.value.status_code == 400
+        assert "Audio format conversion failed" in exc_info.value.detail
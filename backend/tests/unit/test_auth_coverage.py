@@ -6,14 +6,20 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
+import asyncio  # noqa: E402
 import pytest  # noqa: E402
 from unittest.mock import Mock  # noqa: E402
-from datetime import datetime, timedelta  # noqa: E402
+from datetime import date, datetime, timedelta  # noqa: E402
 from jose import jwt  # noqa: E402
 from fastapi import HTTPException  # noqa: E402
+import auth as auth_module  # noqa: E402
 from auth import (  # noqa: E402
     verify_password,
     get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
+    get_password_hashes_async,
+    get_default_password_hashes,
     create_access_token,
     verify_token,
     authenticate_teacher,
@@ -58,6 +64,72 @@ class TestPasswordFunctions:
         assert verify_password("not_empty", hashed) is False
 
 
+class TestAsyncPasswordFunctions:
+    """線程池版本的密碼函數測試"""
+
+    @pytest.mark.asyncio
+    async def test_hash_and_verify_async(self):
+        """測試 async 雜湊與驗證"""
+        hashed = await get_password_hash_async("async_password")
+
+        assert await verify_password_async("async_password", hashed) is True
+        assert await verify_password_async("wrong_password", hashed) is False
+
+    @pytest.mark.asyncio
+    async def test_batch_hashes_use_distinct_salts(self):
+        """測試批次雜湊：順序對應輸入，相同密碼也使用不同 salt"""
+        passwords = ["20120101", "20120101", "20130202"]
+        hashes = await get_password_hashes_async(passwords)
+
+        assert len(hashes) == 3
+        assert hashes[0] != hashes[1]
+        for password, hashed in zip(passwords, hashes):
+            assert verify_password(password, hashed) is True
+
+    @pytest.mark.asyncio
+    async def test_default_password_hashes_salted_per_student(self):
+        """測試批次匯入的預設密碼：依輸入順序回傳，相同生日也各自使用不同的 salt"""
+        birthdates = [date(2012, 1, 1), date(2013, 2, 2), date(2012, 1, 1)]
+
+        hashes = await get_default_password_hashes(birthdates)
+
+        assert len(hashes) == 3
+        assert hashes[0] != hashes[2]
+        assert verify_password("20120101", hashes[0]) is True
+        assert verify_password("20130202", hashes[1]) is True
+        assert verify_password("20120101", hashes[2]) is True
+
+    @pytest.mark.asyncio
+    async def test_event_loop_not_blocked(self):
+        """測試 bcrypt 執行期間 event loop 仍可處理其他工作"""
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        try:
+            await get_password_hashes_async(["password"] * 4)
+        finally:
+            task.cancel()
+
+        assert ticks > 0
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_full(self, monkeypatch):
+        """測試等待中的工作超過上限時回 503"""
+        monkeypatch.setattr(auth_module, "PASSWORD_HASH_MAX_PENDING", 0)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await verify_password_async("password", get_password_hash("password"))
+
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers["Retry-After"] == "1"
+
+
 class TestTokenFunctions:
     """Token 相關函數測試"""
 
@@ -0,0 +1,197 @@
+"""
+Azure Speech Adaptive Admission Controller Unit Tests
+
+使用模擬的 Azure 後端（類似 tests/benchmarks/benchmark_azure_rate_limit.py）
+驗證 AIMD 上限調整、快速拒絕與 Retry-After、以及監控統計
+"""
+
+import asyncio
+
+import pytest
+
+from core.azure_admission import (
+    AdaptiveAdmissionController,
+    AdmissionRejectedError,
+)
+
+
+class SimulatedRateLimitError(Exception):
+    """模擬 Azure 429"""
+
+
+class SimulatedAzureBackend:
+    """
+    模擬 Azure Speech：超過 capacity 個並發時回傳 429，
+    並發越高延遲越長
+    """
+
+    def __init__(self, capacity: int, base_delay: float = 0.01):
+        self.capacity = capacity
+        self.base_delay = base_delay
+        self.active = 0
+        self.max_active = 0
+        self.rate_limited = 0
+
+    async def assess(self):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if self.active > self.capacity:
+                self.rate_limited += 1
+                raise SimulatedRateLimitError("429 Too Many Requests")
+            await asyncio.sleep(self.base_delay * (1 + self.active / self.capacity))
+            return {"pronunciation_score": 85}
+        finally:
+            self.active -= 1
+
+
+def _controller(**kwargs):
+    kwargs.setdefault(
+        "is_rate_limit_error", lambda e: isinstance(e, SimulatedRateLimitError)
+    )
+    return AdaptiveAdmissionController(**kwargs)
+
+
+class TestAIMDLimit:
+    @pytest.mark.asyncio
+    async def test_limit_decreases_on_429_and_converges(self):
+        """Azure 只撐得住 6 個並發時，上限應降到 6 附近"""
+        backend = SimulatedAzureBackend(capacity=6)
+        controller = _controller(initial_limit=18, max_limit=18, min_limit=2)
+
+        async def call():
+            try:
+                async with controller:
+                    await backend.assess()
+            except SimulatedRateLimitError:
+                pass
+
+        for _ in range(10):
+            await asyncio.gather(*[call() for _ in range(30)])
+
+        assert controller.limit < 18
+        assert controller.get_stats()["rate_limited"] > 0
+
+        # 收斂之後不應再觸發大量 429
+        backend.rate_limited = 0
+        await asyncio.gather(*[call() for _ in range(30)])
+        assert backend.rate_limited <= 3
+
+    @pytest.mark.asyncio
+    async def test_limit_increases_when_healthy(self):
+        """延遲正常時上限應逐步回升，但不超過 max_limit"""
+        controller = _controller(initial_limit=4, max_limit=10, min_limit=2)
+
+        async def call():
+            async with controller:
+                await asyncio.sleep(0.001)
+
+        for _ in range(20):
+            await asyncio.gather(*[call() for _ in range(10)])
+
+        assert controller.limit == 10
+
+    @pytest.mark.asyncio
+    async def test_slow_responses_shrink_limit(self):
+        controller = _controller(
+            initial_limit=10, max_limit=10, min_limit=2, latency_target=0.01
+        )
+
+        async def slow_call():
+            async with controller:
+                await asyncio.sleep(0.03)
+
+        await asyncio.gather(*[slow_call() for _ in range(10)])
+
+        assert controller.limit < 10
+        assert controller.get_stats()["slow_or_timeout"] == 10
+
+    def test_max_limit_capped_by_speech_thread_pool(self, monkeypatch):
+        monkeypatch.setenv("SPEECH_THREAD_POOL_SIZE", "8")
+        controller = AdaptiveAdmissionController(max_limit=18)
+        assert controller.max_limit == 8
+
+
+class TestBoundedWait:
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_full(self):
+        controller = _controller(initial_limit=2, max_limit=2, max_queue=3)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller:
+                await release.wait()
+
+        holders = [asyncio.create_task(hold()) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        assert controller.in_flight == 2
+        assert controller.queue_length == 3
+
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            await controller.acquire()
+        assert exc_info.value.retry_after >= 1
+        assert exc_info.value.queue_length == 3
+
+        release.set()
+        await asyncio.gather(*holders)
+        assert controller.in_flight == 0
+        assert controller.get_stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rejects_after_max_wait(self):
+        controller = _controller(initial_limit=2, max_limit=2, max_wait=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller:
+                await release.wait()
+
+        holders = [asyncio.create_task(hold()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(AdmissionRejectedError):
+            async with controller:
+                pass
+
+        assert controller.queue_length == 0
+        release.set()
+        await asyncio.gather(*holders)
+        assert controller.available == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        controller = _controller(initial_limit=1, max_limit=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller:
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        release.set()
+        await holder
+        assert controller.in_flight == 0
+        assert controller.available == 1
+
+
+class TestStats:
+    @pytest.mark.asyncio
+    async def test_thread_pool_stats_publish_admission_state(self):
+        from core.thread_pool import get_thread_pool_stats
+        from routers.speech_assessment import _get_azure_speech_semaphore
+
+        controller = _get_azure_speech_semaphore()
+        async with controller:
+            stats = get_thread_pool_stats()["azure_speech_admission"]
+
+        assert stats["initialized"] is True
+        assert stats["limit"] == controller.limit
+        assert stats["in_flight"] == 1
+        assert "queue_length" in stats
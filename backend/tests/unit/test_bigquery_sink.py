@@ -0,0 +1,156 @@
+"""
+BigQuery 背景批次寫入（BigQuerySink）測試
+
+使用本地 FakeBigQueryClient 取代真正的 BigQuery
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from services.bigquery_sink import BigQuerySink
+
+
+class FakeBigQueryClient:
+    """記錄 insert_rows_json 呼叫的假 client"""
+
+    def __init__(self, fail=False, delay=0.0):
+        self.batches = []
+        self.fail = fail
+        self.delay = delay
+        self.caller_threads = set()
+
+    def insert_rows_json(self, table_id, rows):
+        self.caller_threads.add(threading.current_thread().name)
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("BigQuery unavailable")
+        self.batches.append((table_id, list(rows)))
+        return []
+
+    @property
+    def rows(self):
+        return [row for _, batch in self.batches for row in batch]
+
+
+def _wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestBigQuerySink:
+    def test_flush_by_batch_size(self):
+        client = FakeBigQueryClient()
+        sink = BigQuerySink("p.d.t", lambda: client, batch_size=5, flush_interval=30.0)
+
+        for i in range(10):
+            assert sink.enqueue({"n": i}) is True
+
+        assert _wait_until(lambda: len(client.rows) == 10)
+        assert [len(batch) for _, batch in client.batches] == [5, 5]
+        sink.shutdown()
+
+    def test_flush_by_interval(self):
+        client = FakeBigQueryClient()
+        sink = BigQuerySink(
+            "p.d.t", lambda: client, batch_size=100, flush_interval=0.05
+        )
+
+        sink.enqueue({"n": 1})
+
+        assert _wait_until(lambda: len(client.rows) == 1)
+        sink.shutdown()
+
+    def test_insert_runs_off_caller_thread(self):
+        client = FakeBigQueryClient()
+        sink = BigQuerySink("p.d.t", lambda: client, batch_size=1, flush_interval=0.05)
+
+        sink.enqueue({"n": 1})
+        sink.shutdown()
+
+        assert threading.current_thread().name not in client.caller_threads
+
+    def test_shutdown_drains_queue(self):
+        client = FakeBigQueryClient()
+        sink = BigQuerySink(
+            "p.d.t", lambda: client, batch_size=1000, flush_interval=30.0
+        )
+
+        for i in range(25):
+            sink.enqueue({"n": i})
+        sink.shutdown()
+
+        assert sorted(row["n"] for row in client.rows) == list(range(25))
+        assert sink.get_stats()["queue_depth"] == 0
+
+    def test_drops_when_queue_full(self):
+        client = FakeBigQueryClient(delay=0.5)
+        sink = BigQuerySink(
+            "p.d.t",
+            lambda: client,
+            max_queue_size=2,
+            batch_size=1,
+            flush_interval=0.01,
+        )
+
+        results = [sink.enqueue({"n": i}) for i in range(10)]
+
+        stats = sink.get_stats()
+        assert results.count(False) == stats["dropped"]
+        assert stats["dropped"] > 0
+        sink.shutdown(timeout=5.0)
+
+    def test_spills_to_disk_and_replays(self, tmp_path):
+        client = FakeBigQueryClient(fail=True)
+        sink = BigQuerySink(
+            "p.d.t",
+            lambda: client,
+            batch_size=10,
+            flush_interval=0.01,
+            spill_dir=str(tmp_path),
+        )
+
+        sink.enqueue({"n": 1})
+        assert _wait_until(lambda: sink.get_stats()["spilled"] == 1)
+        assert os.path.exists(sink.spill_path)
+
+        # BigQuery 恢復後，溢寫的資料會被重新送出
+        client.fail = False
+        sink.enqueue({"n": 2})
+        assert _wait_until(lambda: sorted(r["n"] for r in client.rows) == [1, 2])
+        assert sink.get_stats()["replayed"] == 1
+        sink.shutdown()
+
+    def test_client_unavailable_counts_failures(self):
+        sink = BigQuerySink("p.d.t", lambda: None, batch_size=1, flush_interval=0.01)
+
+        sink.enqueue({"n": 1})
+        assert _wait_until(lambda: sink.get_stats()["failed_rows"] == 1)
+        sink.shutdown()
+
+
+class TestBigQueryLoggerUsesSink:
+    @pytest.mark.asyncio
+    async def test_log_audio_error_enqueues_without_insert(self):
+        from unittest.mock import MagicMock
+
+        from services.bigquery_logger import BigQueryLogger
+
+        logger = BigQueryLogger()
+        sink = MagicMock()
+        sink.enqueue.return_value = True
+        logger._sink = sink
+
+        result = await logger.log_audio_error({"error_type": "api_timeout"})
+
+        assert result is True
+        row = sink.enqueue.call_args[0][0]
+        assert row["error_type"] == "api_timeout"
+        assert "timestamp" in row
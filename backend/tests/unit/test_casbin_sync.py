@@ -0,0 +1,198 @@
+"""
+Casbin 角色增量同步（services.casbin_sync）與決策快取測試
+
+驗證：
+- sync_from_database 只增刪差異，不動 p rules
+- 增量同步只重算 watermark 之後有變更的教師（新增、停用、角色變更）
+- check_permission 的結果被快取，角色變更時只清除該教師
+- NOTIFY payload 略過本 instance 發出的通知
+"""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import Organization, School, Teacher, TeacherOrganization, TeacherSchool
+from services.casbin_service import CasbinService
+from services.casbin_sync import INSTANCE_ID, CasbinRoleSync, parse_notification
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def casbin():
+    service = CasbinService()
+
+    def clear_roles():
+        rules = service.enforcer.get_grouping_policy()
+        if rules:
+            service.enforcer.remove_grouping_policies(rules)
+
+    clear_roles()
+    yield service
+    clear_roles()
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def org_data(session_factory):
+    db = session_factory()
+    teachers = [
+        Teacher(name=f"T{i}", email=f"t{i}@example.com", password_hash="x")
+        for i in range(3)
+    ]
+    org = Organization(name="Org")
+    db.add_all(teachers + [org])
+    db.flush()
+    school = School(organization_id=org.id, name="School")
+    db.add(school)
+    db.flush()
+    db.add_all(
+        [
+            TeacherOrganization(
+                teacher_id=teachers[0].id,
+                organization_id=org.id,
+                role="org_owner",
+                created_at=T0,
+            ),
+            TeacherSchool(
+                teacher_id=teachers[1].id,
+                school_id=school.id,
+                roles=["school_admin", "teacher"],
+                created_at=T0 - timedelta(hours=1),
+            ),
+        ]
+    )
+    db.commit()
+    data = {
+        "teacher_ids": [t.id for t in teachers],
+        "org_domain": f"org-{org.id}",
+        "school_domain": f"school-{school.id}",
+        "org_id": org.id,
+        "school_id": school.id,
+    }
+    db.close()
+    return data
+
+
+def _roles(casbin, teacher_id):
+    return sorted(casbin.get_all_roles_for_user(teacher_id))
+
+
+class TestCasbinRoleSync:
+    def test_full_sync_applies_only_differences(
+        self, casbin, session_factory, org_data
+    ):
+        t0, t1, t2 = org_data["teacher_ids"]
+        casbin.add_role_for_user(t2, "org_admin", org_data["org_domain"])  # 已不存在
+        policy_count = len(casbin.enforcer.get_policy())
+
+        with patch.object(
+            casbin.enforcer,
+            "add_grouping_policies",
+            wraps=casbin.enforcer.add_grouping_policies,
+        ) as add_many:
+            CasbinRoleSync(session_factory, casbin).full_sync()
+
+        add_many.assert_called_once()
+        assert _roles(casbin, t0) == [("org_owner", org_data["org_domain"])]
+        assert _roles(casbin, t1) == [
+            ("school_admin", org_data["school_domain"]),
+            ("teacher", org_data["school_domain"]),
+        ]
+        assert _roles(casbin, t2) == []
+        assert len(casbin.enforcer.get_policy()) == policy_count
+
+    def test_incremental_sync_picks_up_changes(self, casbin, session_factory, org_data):
+        t0, t1, t2 = org_data["teacher_ids"]
+        sync = CasbinRoleSync(session_factory, casbin, overlap_seconds=0)
+        sync.full_sync()
+        assert sync.watermark == T0
+
+        # watermark 邊界（>=）的資料列會重算一次，t1 較早不受影響
+        db = session_factory()
+        db.add(
+            TeacherOrganization(
+                teacher_id=t2,
+                organization_id=org_data["org_id"],
+                role="org_admin",
+                created_at=T0 + timedelta(minutes=1),
+            )
+        )
+        owner = db.query(TeacherOrganization).filter_by(teacher_id=t0).one()
+        owner.is_active = False
+        owner.updated_at = T0 + timedelta(minutes=2)
+        db.commit()
+        db.close()
+
+        with patch.object(
+            casbin, "sync_teachers", wraps=casbin.sync_teachers
+        ) as sync_teachers:
+            assert sync.sync_changes() == 2
+
+        assert set(sync_teachers.call_args[0][0]) == {t0, t2}
+        assert _roles(casbin, t0) == []
+        assert _roles(casbin, t2) == [("org_admin", org_data["org_domain"])]
+        assert len(_roles(casbin, t1)) == 2  # 未變更的教師不受影響
+        assert sync.watermark == T0 + timedelta(minutes=2)
+        # 沒有新的變更：只重算 watermark 邊界上的 t0
+        assert sync.sync_changes() == 1
+        assert _roles(casbin, t2) == [("org_admin", org_data["org_domain"])]
+
+    def test_role_change_in_existing_row(self, casbin, session_factory, org_data):
+        _, t1, _ = org_data["teacher_ids"]
+        sync = CasbinRoleSync(session_factory, casbin, overlap_seconds=0)
+        sync.full_sync()
+
+        db = session_factory()
+        membership = db.query(TeacherSchool).filter_by(teacher_id=t1).one()
+        membership.roles = ["teacher"]
+        membership.updated_at = T0 + timedelta(minutes=5)
+        db.commit()
+        db.close()
+
+        sync.sync_changes()
+
+        assert _roles(casbin, t1) == [("teacher", org_data["school_domain"])]
+
+
+class TestDecisionCache:
+    def test_check_permission_is_cached_until_roles_change(self, casbin):
+        casbin.add_role_for_user(1, "org_owner", "org-a")
+        casbin.add_role_for_user(2, "org_owner", "org-a")
+
+        with patch.object(
+            casbin.enforcer, "enforce", wraps=casbin.enforcer.enforce
+        ) as enforce:
+            for _ in range(3):
+                assert casbin.check_permission(1, "org-a", "manage_schools", "write")
+                assert casbin.check_permission(2, "org-a", "manage_schools", "write")
+            assert enforce.call_count == 2
+
+            casbin.delete_role_for_user(1, "org_owner", "org-a")
+
+            assert not casbin.check_permission(1, "org-a", "manage_schools", "write")
+            assert casbin.check_permission(2, "org-a", "manage_schools", "write")
+            assert enforce.call_count == 3
+
+
+def test_parse_notification():
+    assert parse_notification("other-host:1|3,5") == [3, 5]
+    assert parse_notification(f"{INSTANCE_ID}|3,5") == []
+    assert parse_notification("other-host:1|") == []
@@ -0,0 +1,270 @@
+"""
+Email outbox（services.email_outbox）測試
+
+以本地 SMTP stub server 取代真正的 SMTP provider，驗證：
+- EMAIL_OUTBOX_ENABLED=true 時 EmailService 只寫入 outbox，不在 request 中連線 SMTP
+- sender 以同一條連線連續寄出多封郵件
+- 4xx 暫時性錯誤排入重試、5xx 永久錯誤標記為 failed
+- server 關閉閒置連線時自動重新連線
+- token bucket 限制寄送速率
+"""
+
+import socket
+import socketserver
+import threading
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import EmailOutboxMessage
+from services import email_outbox
+from services.email_outbox import (
+    EmailOutboxSender,
+    SMTPConnectionPool,
+    TokenBucket,
+    enqueue_email,
+)
+from services.email_service import EmailService
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """只支援寄信所需指令的 SMTP server（不支援 STARTTLS / AUTH）"""
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        stub = self.server.stub
+        with stub.lock:
+            stub.connections += 1
+            stub.open_sockets.append(self.connection)
+        self.reply("220 localhost ESMTP stub")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip().strip("<>")
+                rejection = stub.rejections.get(address)
+                if rejection:
+                    self.reply(rejection)
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with stub.lock:
+                    stub.delivered.extend(recipients)
+                self.reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPStub:
+    """在背景線程執行的本地 SMTP server，記錄連線數與收件者"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.delivered = []
+        self.rejections = {}
+        self.open_sockets = []
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def drop_connections(self):
+        """模擬 server 關閉閒置連線"""
+        with self.lock:
+            sockets, self.open_sockets = self.open_sockets, []
+        for sock in sockets:
+            sock.shutdown(socket.SHUT_RDWR)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def smtp_stub():
+    stub = SMTPStub()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    # executor 中的 session 需要各自的連線，使用檔案型 SQLite
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'outbox.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    EmailOutboxMessage.__table__.create(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(email_outbox, "_get_session_factory", lambda: factory)
+    yield factory
+    engine.dispose()
+
+
+def _pool(stub, **kwargs):
+    kwargs.setdefault("size", 1)
+    return SMTPConnectionPool(
+        host="127.0.0.1",
+        port=stub.port,
+        user="",
+        password="",
+        use_tls=False,
+        rate_limiter=TokenBucket(0),
+        **kwargs,
+    )
+
+
+def _queue(service: EmailService, recipients):
+    for address in recipients:
+        assert service.send_email(address, "通知", "<p>Hello</p>") is True
+
+
+@pytest.fixture
+def outbox_service(monkeypatch, session_factory):
+    monkeypatch.setenv("EMAIL_OUTBOX_ENABLED", "true")
+    service = EmailService()
+    service.smtp_user = "user@test.com"
+    service.smtp_password = "password"
+    return service
+
+
+class TestEmailOutbox:
+    def test_send_email_only_enqueues(self, outbox_service, session_factory):
+        with patch("smtplib.SMTP") as mock_smtp:
+            _queue(outbox_service, ["a@example.com"])
+
+        mock_smtp.assert_not_called()
+        db = session_factory()
+        message = db.query(EmailOutboxMessage).one()
+        assert message.status == "queued"
+        assert message.to_email == "a@example.com"
+        assert message.from_email == outbox_service.from_email
+        assert "Subject:" in message.raw_message
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_batch_reuses_one_connection(
+        self, outbox_service, session_factory, smtp_stub
+    ):
+        recipients = [f"user{i}@example.com" for i in range(5)]
+        _queue(outbox_service, recipients)
+        sender = EmailOutboxSender(session_factory, smtp_pool=_pool(smtp_stub))
+
+        assert await sender.run_once() == 5
+
+        assert smtp_stub.connections == 1
+        assert sorted(smtp_stub.delivered) == sorted(recipients)
+        db = session_factory()
+        statuses = {m.status for m in db.query(EmailOutboxMessage)}
+        assert statuses == {"sent"}
+        db.close()
+        assert sender.get_stats()["smtp"]["messages_sent"] == 5
+
+    @pytest.mark.asyncio
+    async def test_transient_and_permanent_failures(
+        self, outbox_service, session_factory, smtp_stub
+    ):
+        smtp_stub.rejections = {
+            "busy@example.com": "451 Try again later",
+            "gone@example.com": "550 No such user",
+        }
+        _queue(
+            outbox_service, ["busy@example.com", "gone@example.com", "ok@example.com"]
+        )
+        sender = EmailOutboxSender(
+            session_factory, smtp_pool=_pool(smtp_stub), retry_base_seconds=60
+        )
+
+        await sender.run_once()
+
+        db = session_factory()
+        messages = {m.to_email: m for m in db.query(EmailOutboxMessage)}
+        assert messages["ok@example.com"].status == "sent"
+        assert messages["gone@example.com"].status == "failed"
+        busy = messages["busy@example.com"]
+        assert busy.status == "queued"
+        assert busy.attempts == 1
+        assert "451" in busy.last_error
+        next_attempt = busy.next_attempt_at.replace(tzinfo=timezone.utc)
+        assert next_attempt > datetime.now(timezone.utc)
+        db.close()
+
+        # 還沒到重試時間：不會再被領取
+        assert await sender.run_once() == 0
+        # 失敗沒有拖垮連線
+        assert smtp_stub.connections == 1
+
+    @pytest.mark.asyncio
+    async def test_reconnects_after_server_drops_idle_connection(
+        self, outbox_service, session_factory, smtp_stub
+    ):
+        sender = EmailOutboxSender(session_factory, smtp_pool=_pool(smtp_stub))
+        _queue(outbox_service, ["first@example.com"])
+        await sender.run_once()
+
+        smtp_stub.drop_connections()
+        _queue(outbox_service, ["second@example.com"])
+        await sender.run_once()
+
+        assert smtp_stub.delivered == ["first@example.com", "second@example.com"]
+        assert smtp_stub.connections == 2
+
+    def test_enqueue_uses_callers_session(self, session_factory):
+        from email.mime.text import MIMEText
+
+        msg = MIMEText("hi")
+        msg["Subject"] = "Test"
+        msg["From"] = "Duotopia <noreply@duotopia.com>"
+        msg["To"] = "teacher@example.com"
+        db = session_factory()
+
+        entry = enqueue_email(msg, db=db)
+
+        assert entry.from_email == "noreply@duotopia.com"
+        assert db.query(EmailOutboxMessage).count() == 1
+        db.close()
+
+
+class TestTokenBucket:
+    def test_waits_when_rate_exceeded(self):
+        now = [0.0]
+        slept = []
+
+        def sleep(seconds):
+            slept.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(2, burst=2, clock=lambda: now[0], sleep=sleep)
+
+        for _ in range(4):
+            bucket.acquire()
+
+        # 前 2 封用掉 burst，之後每封等 0.5 秒
+        assert slept == [0.5, 0.5]
+        assert bucket.waited_seconds == pytest.approx(1.0)
@@ -0,0 +1,237 @@
+"""
+全局 Rate Limiter（middleware.global_rate_limiter）測試
+
+驗證：
+- 近似滑動窗口：每個 key 固定大小狀態，上一窗口的計數按比例衰減
+- 複合 key：同一個 NAT IP 後面的不同登入用戶各自計算
+- 登入依 提交的帳號 + IP 計算；X-Forwarded-For 只信任代理追加的條目
+- Redis 後端（mock）與出錯時降級到記憶體
+- 路由類別統計與被限制最多的 key
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from auth import create_access_token
+from middleware.global_rate_limiter import (
+    GlobalRateLimiter,
+    MemoryRateLimitBackend,
+    RedisRateLimitBackend,
+    enforce_login_rate_limit,
+    global_rate_limit_middleware,
+)
+
+
+def make_request(path="/api/teachers/me", ip="10.0.0.1", token=None, forwarded=None):
+    headers = [(b"x-forwarded-for", (forwarded or ip).encode())]
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "headers": headers,
+            "query_string": b"",
+            "client": (ip, 1234),
+            "server": ("testserver", 80),
+            "scheme": "http",
+        }
+    )
+
+
+class TestMemoryBackend:
+    def test_limit_within_window(self):
+        backend = MemoryRateLimitBackend()
+        results = [backend.hit("k", 3, 60, 120.0)[0] for _ in range(5)]
+        assert results == [True, True, True, False, False]
+
+    def test_previous_window_decays(self):
+        backend = MemoryRateLimitBackend()
+        for _ in range(10):
+            backend.hit("k", 10, 60, 60.0)
+
+        # 下一個窗口剛開始：上一窗口的 10 次全部計入
+        assert backend.hit("k", 10, 60, 120.0)[0] is False
+        # 下一個窗口過了一半：估計值 10 × 0.5 = 5
+        allowed, estimated = backend.hit("k", 10, 60, 150.0)
+        assert allowed is True
+        assert estimated == pytest.approx(5.0)
+        # 跨過兩個窗口後歸零
+        assert backend.hit("k", 10, 60, 300.0) == (True, 0)
+
+    def test_state_is_fixed_size_and_cleaned(self):
+        backend = MemoryRateLimitBackend()
+        for i in range(1000):
+            backend.hit("k", 10_000, 60, 60.0 + i * 0.01)
+        backend.hit("other", 10, 10, 60.0)
+
+        assert len(backend._windows["k"]) == 4
+        assert backend.cleanup(90.0) == 1  # 10 秒窗口的 key 已過期
+        assert backend.cleanup(500.0) == 1
+        assert len(backend) == 0
+
+
+class TestCompositeKeys:
+    @pytest.mark.asyncio
+    async def test_students_behind_nat_are_independent(self):
+        limiter = GlobalRateLimiter(enabled=True)
+        tokens = [
+            create_access_token({"sub": str(i), "type": "student"}) for i in (1, 2)
+        ]
+
+        for _ in range(3):
+            allowed, _ = await limiter.check_rate_limit(
+                make_request(token=tokens[0]), max_requests=3
+            )
+            assert allowed
+        allowed, info = await limiter.check_rate_limit(
+            make_request(token=tokens[0]), max_requests=3
+        )
+        assert allowed is False
+        assert info["retry_after"] > 0
+
+        # 同 IP 的另一位學生不受影響
+        allowed, _ = await limiter.check_rate_limit(
+            make_request(token=tokens[1]), max_requests=3
+        )
+        assert allowed is True
+
+    def test_key_includes_route_class_ip_and_user(self):
+        limiter = GlobalRateLimiter(enabled=True)
+        token = create_access_token({"sub": "7", "type": "teacher"})
+
+        assert (
+            limiter.build_key(make_request("/api/speech/assess", token=token), "speech")
+            == "speech|10.0.0.1|teacher:7"
+        )
+        # 無效 token 視為未登入
+        assert limiter.build_key(make_request(token="bogus"), "default").endswith(
+            "|anonymous"
+        )
+        assert GlobalRateLimiter.classify_route("/api/auth/teacher/login")[0] == "auth"
+        assert GlobalRateLimiter.classify_route("/api/programs")[0] == "default"
+
+
+class TestClientIp:
+    def test_uses_entry_appended_by_trusted_proxy(self):
+        # 客戶端自己送了偽造的 X-Forwarded-For，Cloud Run 在右邊追加真實 IP
+        request = make_request(forwarded="1.2.3.4, 203.0.113.9")
+
+        assert GlobalRateLimiter(enabled=True).get_client_ip(request) == "203.0.113.9"
+        assert (
+            GlobalRateLimiter(enabled=True, trusted_hops=2).get_client_ip(request)
+            == "1.2.3.4"
+        )
+        # 不信任 X-Forwarded-For 時使用連線 IP
+        assert (
+            GlobalRateLimiter(enabled=True, trusted_hops=0).get_client_ip(request)
+            == "10.0.0.1"
+        )
+
+
+class TestLoginAttempts:
+    @pytest.mark.asyncio
+    async def test_login_keyed_by_account_and_ip(self):
+        limiter = GlobalRateLimiter(enabled=True)
+        request = make_request("/api/auth/teacher/login")
+
+        with patch("middleware.global_rate_limiter.LOGIN_MAX_ATTEMPTS", 2):
+            results = [
+                (await limiter.check_login_attempt(request, "email:a@x.com"))[0]
+                for _ in range(3)
+            ]
+            # 同一個學校 IP 的其他帳號不受影響
+            other, _ = await limiter.check_login_attempt(request, "email:b@x.com")
+
+        assert results == [True, True, False]
+        assert other is True
+        assert limiter.get_stats()["top_limited_keys"] == [
+            {"key": "login|10.0.0.1|email:a@x.com", "limited": 1}
+        ]
+
+    @pytest.mark.asyncio
+    async def test_enforce_raises_429(self):
+        limiter = GlobalRateLimiter(enabled=True)
+        request = make_request("/api/auth/student/login")
+
+        with patch(
+            "middleware.global_rate_limiter.get_global_rate_limiter",
+            return_value=limiter,
+        ), patch("middleware.global_rate_limiter.LOGIN_MAX_ATTEMPTS", 1):
+            await enforce_login_rate_limit(request, "student:1")
+            with pytest.raises(HTTPException) as exc_info:
+                await enforce_login_rate_limit(request, "student:1")
+
+        assert exc_info.value.status_code == 429
+        assert "Retry-After" in exc_info.value.headers
+
+
+class TestRedisBackend:
+    def test_redis_counts_with_previous_window(self):
+        redis_client = MagicMock()
+        pipe = redis_client.pipeline.return_value
+        pipe.execute.return_value = [4, True, b"10"]
+        backend = RedisRateLimitBackend(redis_client)
+
+        # 估計值 10 × 0.5 + 3 = 8 < 10
+        assert backend.hit("k", 10, 60, 150.0) == (True, 8.0)
+        pipe.incr.assert_called_with("ratelimit:global|k|2")
+        pipe.get.assert_called_with("ratelimit:global|k|1")
+        redis_client.decr.assert_not_called()
+
+        # 超限時撤回計數
+        pipe.execute.return_value = [9, True, b"10"]
+        assert backend.hit("k", 10, 60, 150.0)[0] is False
+        redis_client.decr.assert_called_once_with("ratelimit:global|k|2")
+
+    @pytest.mark.asyncio
+    async def test_redis_error_falls_back_to_memory(self):
+        redis_client = MagicMock()
+        redis_client.pipeline.side_effect = ConnectionError("down")
+        limiter = GlobalRateLimiter(redis_client, enabled=True)
+        assert limiter.backend.name == "redis"
+
+        allowed, _ = await limiter.check_rate_limit(make_request())
+
+        assert allowed is True
+        assert limiter.get_stats()["backend_errors"] == 1
+        assert len(limiter.memory_backend) == 1
+
+
+class TestMiddleware:
+    def test_returns_429_and_reports_stats(self):
+        limiter = GlobalRateLimiter(enabled=True)
+        app = FastAPI()
+        app.middleware("http")(global_rate_limit_middleware)
+
+        @app.get("/api/auth/ping")
+        def ping():
+            return {"ok": True}
+
+        @app.get("/health")
+        def health():
+            return {"ok": True}
+
+        with patch(
+            "middleware.global_rate_limiter.get_global_rate_limiter",
+            return_value=limiter,
+        ), patch(
+            "middleware.global_rate_limiter.ROUTE_CLASSES",
+            [("/api/auth/", "auth", 2, 60)],
+        ):
+            client = TestClient(app)
+            statuses = [client.get("/api/auth/ping").status_code for _ in range(3)]
+            health_statuses = {client.get("/health").status_code for _ in range(5)}
+
+        assert statuses == [200, 200, 429]
+        assert health_statuses == {200}
+        stats = limiter.get_stats()
+        assert stats["routes"] == {"auth": {"allowed": 2, "limited": 1}}
+        assert stats["top_limited_keys"] == [
+            {"key": "auth|testclient|anonymous", "limited": 1}
+        ]
@@ -0,0 +1,322 @@
+"""
+批次批改 AI 評估管線（GradingPipeline）測試
+
+以假的下載 / 解碼 / Azure 評估取代外部服務，驗證：
+- 題目並發處理且受 concurrency 限制
+- 單題失敗不影響其他題目，並回報每題進度
+- Azure 並發控制器拒絕時會重試
+- 評估結果以一次 bulk UPDATE 寫回，session 中的物件同步更新
+- 批次批改在評估期間不保留資料庫交易，評估完成後寫回分數與評語
+"""
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.azure_admission import AdmissionRejectedError
+from database import Base
+from models import (
+    Assignment,
+    AssignmentStatus,
+    Classroom,
+    Content,
+    ContentItem,
+    ContentType,
+    Lesson,
+    Program,
+    Student,
+    StudentAssignment,
+    StudentItemProgress,
+    Teacher,
+)
+from routers import speech_assessment
+from routers.assignments import grading
+from routers.assignments.validators import BatchGradingRequest
+from services.grading_pipeline import GradingPipeline, _recording_content_type
+
+
+class FakeAzure:
+    """記錄最大並發數的假 assess_pronunciation"""
+
+    def __init__(self, delay: float = 0.05, fail_texts=()):
+        self.delay = delay
+        self.fail_texts = set(fail_texts)
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, decoded_audio, reference_text):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if reference_text in self.fail_texts:
+                raise RuntimeError("Azure assessment failed")
+            return {
+                "accuracy_score": 80.0,
+                "fluency_score": 85.0,
+                "pronunciation_score": 90.0,
+                "completeness_score": 95.0,
+                "recognized_text": reference_text,
+            }
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def fake_azure(monkeypatch):
+    fake = FakeAzure()
+
+    async def fake_download(self, recording_url):
+        return b"audio"
+
+    monkeypatch.setattr(GradingPipeline, "_download", fake_download)
+    monkeypatch.setattr(speech_assessment, "decode_audio", lambda data, ct: data)
+    monkeypatch.setattr(speech_assessment, "assess_pronunciation", fake)
+    return fake
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _items(count: int):
+    items = [
+        SimpleNamespace(
+            id=i,
+            student_assignment_id=i % 3,
+            content_item_id=i,
+            recording_url=f"https://storage.googleapis.com/b/recording_{i}.webm",
+        )
+        for i in range(count)
+    ]
+    content_items = {
+        i: SimpleNamespace(id=i, text=f"sentence {i}") for i in range(count)
+    }
+    return items, content_items
+
+
+class TestAssessItems:
+    @pytest.mark.asyncio
+    async def test_items_assessed_concurrently_with_cap(self, fake_azure):
+        items, content_items = _items(12)
+        pipeline = GradingPipeline(concurrency=4)
+
+        results = await pipeline.assess_items(items, content_items)
+
+        assert sorted(results) == list(range(12))
+        assert fake_azure.max_active > 1
+        assert fake_azure.max_active <= 4
+
+    @pytest.mark.asyncio
+    async def test_failed_item_does_not_discard_others(self, fake_azure):
+        fake_azure.fail_texts = {"sentence 1"}
+        items, content_items = _items(4)
+        del content_items[2]  # 找不到 ContentItem 也視為失敗
+        progress = []
+
+        results = await GradingPipeline(concurrency=4).assess_items(
+            items,
+            content_items,
+            on_item_done=lambda item, ok: progress.append((item.id, ok)),
+        )
+
+        assert sorted(results) == [0, 3]
+        assert sorted(progress) == [(0, True), (1, False), (2, False), (3, True)]
+
+    @pytest.mark.asyncio
+    async def test_admission_rejection_is_retried(self, fake_azure, monkeypatch):
+        rejections = []
+
+        class RejectOnce:
+            async def __aenter__(self):
+                if not rejections:
+                    rejections.append(True)
+                    raise AdmissionRejectedError("busy", retry_after=0)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        monkeypatch.setattr(
+            speech_assessment, "_get_azure_speech_semaphore", lambda: RejectOnce()
+        )
+        items, content_items = _items(1)
+
+        results = await GradingPipeline(admission_retries=1).assess_items(
+            items, content_items
+        )
+
+        assert rejections == [True]
+        assert results[0]["recognized_text"] == "sentence 0"
+
+
+class TestApplyResults:
+    def test_single_bulk_update(self, db_session):
+        items = [
+            StudentItemProgress(
+                student_assignment_id=1,
+                content_item_id=i,
+                recording_url=f"https://example.com/r{i}.webm",
+            )
+            for i in range(5)
+        ]
+        db_session.add_all(items)
+        db_session.flush()
+
+        results = {
+            item.id: {
+                "accuracy_score": 70 + i,
+                "fluency_score": 80,
+                "pronunciation_score": 90,
+                "completeness_score": 100,
+                "recognized_text": f"text {i}",
+            }
+            for i, item in enumerate(items[:4])
+        }
+
+        engine = db_session.get_bind()
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            updated = GradingPipeline.apply_results(items, results, db_session)
+            # session 中的物件已同步更新，讀取屬性不會再查詢
+            assert float(items[1].accuracy_score) == 71
+            assert items[1].transcription == "text 1"
+            assert items[4].ai_assessed_at is None
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        assert updated == 4
+        assert len(statements) == 1
+        assert statements[0].startswith("UPDATE student_item_progress")
+
+        db_session.commit()
+        db_session.expire_all()
+        assessed = (
+            db_session.query(StudentItemProgress)
+            .filter(StudentItemProgress.ai_assessed_at.isnot(None))
+            .count()
+        )
+        assert assessed == 4
+
+
+class TestRunBatchGrade:
+    @pytest.fixture
+    def assignment(self, db_session):
+        db = db_session
+        teacher = Teacher(email="grade@duotopia.com", password_hash="x", name="T")
+        db.add(teacher)
+        db.flush()
+        classroom = Classroom(name="C", teacher_id=teacher.id)
+        db.add(classroom)
+        db.flush()
+        program = Program(name="P", teacher_id=teacher.id, classroom_id=classroom.id)
+        db.add(program)
+        db.flush()
+        lesson = Lesson(program_id=program.id, name="L")
+        db.add(lesson)
+        db.flush()
+        content = Content(
+            lesson_id=lesson.id, type=ContentType.EXAMPLE_SENTENCES, title="R"
+        )
+        assignment = Assignment(
+            title="Read",
+            classroom_id=classroom.id,
+            teacher_id=teacher.id,
+            due_date=datetime.utcnow() + timedelta(days=7),
+        )
+        student = Student(name="S", password_hash="x", birthdate=date(2012, 1, 1))
+        db.add_all([content, assignment, student])
+        db.flush()
+        student_assignment = StudentAssignment(
+            assignment_id=assignment.id,
+            student_id=student.id,
+            classroom_id=classroom.id,
+            title="Read",
+            status=AssignmentStatus.SUBMITTED,
+        )
+        db.add(student_assignment)
+        db.flush()
+        for i in range(3):
+            item = ContentItem(content_id=content.id, order_index=i, text=f"s {i}")
+            db.add(item)
+            db.flush()
+            db.add(
+                StudentItemProgress(
+                    student_assignment_id=student_assignment.id,
+                    content_item_id=item.id,
+                    recording_url=f"https://example.com/r{i}.webm",
+                )
+            )
+        db.commit()
+        return assignment
+
+    @pytest.mark.asyncio
+    async def test_no_transaction_held_during_assessment(
+        self, db_session, assignment, fake_azure, monkeypatch
+    ):
+        pipeline = GradingPipeline(concurrency=2)
+        assess_items = pipeline.assess_items
+        in_transaction = []
+
+        async def tracking_assess_items(*args, **kwargs):
+            in_transaction.append(db_session.in_transaction())
+            return await assess_items(*args, **kwargs)
+
+        pipeline.assess_items = tracking_assess_items
+        monkeypatch.setattr(grading, "get_grading_pipeline", lambda: pipeline)
+
+        response = await grading.run_batch_grade(
+            assignment.id,
+            BatchGradingRequest(classroom_id=assignment.classroom_id),
+            assignment.teacher_id,
+            db_session,
+        )
+
+        assert in_transaction == [False]
+        result = response.results[0]
+        assert result.assessed_items == 3
+        assert result.total_score == 87.5
+
+        db_session.expire_all()
+        items = db_session.query(StudentItemProgress).all()
+        assert all(item.ai_assessed_at is not None for item in items)
+        assert all(item.teacher_feedback for item in items)
+        assert db_session.query(StudentAssignment).one().score == 87.5
+
+
+@pytest.mark.parametrize(
+    "url,content_type",
+    [
+        ("https://x/recording_1.webm", "audio/webm"),
+        ("https://x/recording_1.mp4?sig=abc", "audio/mp4"),
+        ("https://x/recording_1.mp3", "audio/mpeg"),
+        ("https://x/recording_1", "audio/webm"),
+    ],
+)
+def test_recording_content_type(url, content_type):
+    assert _recording_content_type(url) == content_type
@@ -0,0 +1,264 @@
+"""
+背景工作佇列（services.job_queue）測試
+
+以 in-memory SQLite 的 background_jobs 資料表驗證：
+- idempotency_key 去重（依建立者與 job type 區隔、失敗的 job 可重試）
+- worker 領取、執行、記錄結果與進度
+- 失敗時的指數退避重試、4xx 不重試
+- 並發類別上限與 lease 過期回收
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import BackgroundJob
+from routers.jobs import prefers_async
+from services import job_queue
+from services.job_queue import JobWorkerPool, enqueue_job, register_job
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    BackgroundJob.__table__.create(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """每個測試使用獨立的 job 註冊表"""
+    monkeypatch.setattr(job_queue, "_registry", {})
+    monkeypatch.setattr(job_queue, "_worker_pool", None)
+    return job_queue._registry
+
+
+def _pool(session_factory, **kwargs) -> JobWorkerPool:
+    kwargs.setdefault("retry_base_seconds", 0)
+    return JobWorkerPool(session_factory=session_factory, **kwargs)
+
+
+def _load(session_factory, job_id) -> BackgroundJob:
+    db = session_factory()
+    try:
+        return db.get(BackgroundJob, job_id)
+    finally:
+        db.close()
+
+
+class TestEnqueue:
+    def test_idempotency_key_returns_existing_job(self, session_factory, registry):
+        register_job("noop")(lambda ctx: None)
+        db = session_factory()
+
+        first = enqueue_job(db, "noop", idempotency_key="k1")
+        second = enqueue_job(db, "noop", idempotency_key="k1")
+        third = enqueue_job(db, "noop", idempotency_key="k2")
+
+        assert first.id == second.id
+        assert third.id != first.id
+        assert db.query(BackgroundJob).count() == 2
+        db.close()
+
+    def test_idempotency_key_scoped_by_owner_and_job_type(
+        self, session_factory, registry
+    ):
+        register_job("noop")(lambda ctx: None)
+        register_job("other")(lambda ctx: None)
+        db = session_factory()
+
+        mine = enqueue_job(db, "noop", idempotency_key="k", created_by="teacher:1")
+        theirs = enqueue_job(db, "noop", idempotency_key="k", created_by="teacher:2")
+        other_type = enqueue_job(
+            db, "other", idempotency_key="k", created_by="teacher:1"
+        )
+
+        assert len({mine.id, theirs.id, other_type.id}) == 3
+        db.close()
+
+    def test_failed_job_releases_idempotency_key(self, session_factory, registry):
+        register_job("noop")(lambda ctx: None)
+        db = session_factory()
+
+        first = enqueue_job(db, "noop", idempotency_key="daily", created_by="cron")
+        first.status = "failed"
+        db.commit()
+
+        retry = enqueue_job(db, "noop", idempotency_key="daily", created_by="cron")
+        assert retry.id != first.id
+        assert retry.status == "queued"
+        again = enqueue_job(db, "noop", idempotency_key="daily", created_by="cron")
+        assert again.id == retry.id
+        db.close()
+
+    def test_unknown_job_type_rejected(self, session_factory, registry):
+        with pytest.raises(ValueError):
+            enqueue_job(session_factory(), "missing")
+
+
+class TestWorkerPool:
+    @pytest.mark.asyncio
+    async def test_runs_job_and_records_result(self, session_factory, registry):
+        @register_job("add")
+        async def add(ctx):
+            ctx.set_progress(50)
+            return {"sum": ctx.payload["a"] + ctx.payload["b"]}
+
+        job = enqueue_job(session_factory(), "add", payload={"a": 1, "b": 2})
+
+        assert await _pool(session_factory).run_once() == 1
+
+        done = _load(session_factory, job.id)
+        assert done.status == "succeeded"
+        assert done.result == {"sum": 3}
+        assert done.progress == 100
+        assert done.attempts == 1
+        assert done.finished_at is not None
+
+    @pytest.mark.asyncio
+    async def test_failed_job_is_retried_then_succeeds(self, session_factory, registry):
+        calls = []
+
+        @register_job("flaky", max_attempts=3)
+        async def flaky(ctx):
+            calls.append(ctx.attempt)
+            if len(calls) < 2:
+                raise RuntimeError("temporary")
+            return {"ok": True}
+
+        job = enqueue_job(session_factory(), "flaky")
+        pool = _pool(session_factory)
+
+        await pool.run_once()
+        retried = _load(session_factory, job.id)
+        assert retried.status == "queued"
+        assert "temporary" in retried.error
+
+        await pool.run_once()
+        assert calls == [1, 2]
+        assert _load(session_factory, job.id).status == "succeeded"
+
+    @pytest.mark.asyncio
+    async def test_backoff_delays_next_attempt(self, session_factory, registry):
+        @register_job("broken")
+        async def broken(ctx):
+            raise RuntimeError("boom")
+
+        job = enqueue_job(session_factory(), "broken")
+        pool = _pool(session_factory, retry_base_seconds=60)
+
+        await pool.run_once()
+
+        # run_after 已延後，立即再領取不會拿到
+        assert await pool.run_once() == 0
+        assert _load(session_factory, job.id).attempts == 1
+
+    @pytest.mark.asyncio
+    async def test_client_error_is_not_retried(self, session_factory, registry):
+        @register_job("not_found", max_attempts=3)
+        async def not_found(ctx):
+            raise HTTPException(status_code=404, detail="Template not found")
+
+        job = enqueue_job(session_factory(), "not_found")
+
+        await _pool(session_factory).run_once()
+
+        failed = _load(session_factory, job.id)
+        assert failed.status == "failed"
+        assert failed.attempts == 1
+        assert "Template not found" in failed.error
+
+    @pytest.mark.asyncio
+    async def test_concurrency_class_limit(self, session_factory, registry):
+        active = 0
+        max_active = 0
+
+        @register_job("slow", concurrency_class="billing")
+        async def slow(ctx):
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        for _ in range(3):
+            enqueue_job(session_factory(), "slow")
+        pool = _pool(session_factory, concurrency={"billing": 1})
+
+        # 每輪最多領取一個 billing 工作
+        assert await pool.run_once() == 1
+        assert await pool.run_once() == 1
+        assert await pool.run_once() == 1
+        assert max_active == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_requeued(self, session_factory, registry):
+        @register_job("renew")
+        async def renew(ctx):
+            return {"attempt": ctx.attempt}
+
+        job = enqueue_job(session_factory(), "renew")
+        db = session_factory()
+        stale = db.get(BackgroundJob, job.id)
+        stale.status = "running"
+        stale.attempts = 1
+        stale.locked_by = "dead-instance:1"
+        stale.locked_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        db.commit()
+        db.close()
+
+        pool = _pool(session_factory, lease_seconds=60)
+        assert await pool.run_once() == 1
+
+        done = _load(session_factory, job.id)
+        assert done.status == "succeeded"
+        assert done.result == {"attempt": 2}
+        assert pool.get_stats()["recovered"] == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_after_last_attempt_fails(
+        self, session_factory, registry
+    ):
+        @register_job("crashy", max_attempts=2)
+        async def crashy(ctx):
+            return {}
+
+        job = enqueue_job(session_factory(), "crashy")
+        db = session_factory()
+        stale = db.get(BackgroundJob, job.id)
+        stale.status = "running"
+        stale.attempts = 2
+        stale.locked_by = "dead-instance:1"
+        stale.locked_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        db.commit()
+        db.close()
+
+        pool = _pool(session_factory, lease_seconds=60)
+        assert await pool.run_once() == 0
+
+        done = _load(session_factory, job.id)
+        assert done.status == "failed"
+        assert pool.get_stats()["recovered"] == 0
+
+
+@pytest.mark.parametrize(
+    "header,expected",
+    [
+        (None, False),
+        ("respond-async", True),
+        ("return=minimal, respond-async", True),
+        ("return=representation", False),
+    ],
+)
+def test_prefers_async(header, expected):
+    assert prefers_async(header) is expected
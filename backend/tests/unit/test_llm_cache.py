@@ -0,0 +1,233 @@
+"""
+LLM 完成結果快取（services.llm_cache）測試
+
+以假的 producer / 假的 Gemini model 取代實際 LLM 呼叫，驗證：
+- key 包含 model、prompt 與生成參數，TTL 過期與 LRU 淘汰
+- 相同 key 的並發請求只呼叫一次 LLM，發起者被取消時其他等待者仍取得結果
+- 高溫度呼叫預設不快取、失敗結果不快取
+- VertexAIService.generate_json 每次回傳新的物件，並記錄 token 數
+"""
+
+import asyncio
+import json
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from services.llm_cache import Completion, CompletionCache
+from services.vertex_ai import VertexAIService
+
+
+class FakeProducer:
+    """記錄呼叫次數的假 LLM 呼叫"""
+
+    def __init__(self, text: str = "ok", delay: float = 0.0, error=None):
+        self.text = text
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self) -> Completion:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return Completion(text=self.text, prompt_tokens=10, completion_tokens=5)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+CONFIG = {"max_output_tokens": 100, "temperature": 0.2}
+
+
+class TestCompletionCache:
+    @pytest.mark.asyncio
+    async def test_identical_call_hits_cache(self):
+        cache = CompletionCache(max_size=10, ttl_seconds=60, enabled=True)
+        producer = FakeProducer("answer")
+
+        first = await cache.complete("m", "prompt", CONFIG, producer)
+        second = await cache.complete("m", "prompt", dict(CONFIG), producer)
+
+        assert first.text == second.text == "answer"
+        assert producer.calls == 1
+        stats = cache.get_stats()
+        assert stats["cache_hits"] == 1
+        assert stats["llm_calls"] == 1
+        assert stats["prompt_tokens"] == 10
+        assert stats["completion_tokens"] == 5
+
+    @pytest.mark.asyncio
+    async def test_key_includes_model_prompt_and_config(self):
+        cache = CompletionCache(max_size=10, ttl_seconds=60, enabled=True)
+        producer = FakeProducer()
+
+        await cache.complete("m", "prompt", CONFIG, producer)
+        await cache.complete("other", "prompt", CONFIG, producer)
+        await cache.complete("m", "prompt 2", CONFIG, producer)
+        await cache.complete(
+            "m", "prompt", {**CONFIG, "max_output_tokens": 50}, producer
+        )
+
+        assert producer.calls == 4
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_calls_are_coalesced(self):
+        cache = CompletionCache(max_size=10, ttl_seconds=60, enabled=True)
+        producer = FakeProducer("shared", delay=0.02)
+
+        results = await asyncio.gather(
+            *[cache.complete("m", "prompt", CONFIG, producer) for _ in range(5)]
+        )
+
+        assert [r.text for r in results] == ["shared"] * 5
+        assert producer.calls == 1
+        assert cache.get_stats()["cache_coalesced"] == 4
+
+    @pytest.mark.asyncio
+    async def test_failure_is_shared_and_not_cached(self):
+        cache = CompletionCache(max_size=10, ttl_seconds=60, enabled=True)
+        failing = FakeProducer(delay=0.01, error=RuntimeError("quota"))
+
+        results = await asyncio.gather(
+            *[cache.complete("m", "prompt", CONFIG, failing) for _ in range(3)],
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert failing.calls == 1
+        assert len(cache) == 0
+
+        producer = FakeProducer("recovered")
+        assert (await cache.complete("m", "prompt", CONFIG, producer)).text == (
+            "recovered"
+        )
+        assert cache.get_stats()["llm_errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_owner_does_not_cancel_waiters(self):
+        cache = CompletionCache(max_size=10, ttl_seconds=60, enabled=True)
+        producer = FakeProducer("shared", delay=0.05)
+
+        owner = asyncio.ensure_future(cache.complete("m", "prompt", CONFIG, producer))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.complete("m", "prompt", CONFIG, producer))
+        await asyncio.sleep(0)
+        owner.cancel()
+
+        assert (await waiter).text == "shared"
+        assert owner.cancelled()
+        assert producer.calls == 1
+        # 發起者取消後呼叫仍完成並寫入快取
+        assert len(cache) == 1
+
+    @pytest.mark.asyncio
+    async def test_high_temperature_bypasses_cache(self):
+        cache = CompletionCache(
+            max_size=10, ttl_seconds=60, max_temperature=0.5, enabled=True
+        )
+        producer = FakeProducer()
+        creative = {**CONFIG, "temperature": 0.8}
+
+        await cache.complete("m", "prompt", creative, producer)
+        await cache.complete("m", "prompt", creative, producer)
+        # 明確指定時覆蓋溫度判斷
+        await cache.complete("m", "prompt", CONFIG, producer, cache=False)
+        await cache.complete("m", "prompt", creative, producer, cache=True)
+        await cache.complete("m", "prompt", creative, producer, cache=True)
+
+        assert producer.calls == 4
+        assert cache.get_stats()["cache_bypassed"] == 3
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry_and_lru_eviction(self):
+        clock = FakeClock()
+        cache = CompletionCache(max_size=2, ttl_seconds=60, enabled=True, clock=clock)
+        producer = FakeProducer()
+
+        await cache.complete("m", "a", CONFIG, producer)
+        clock.now = 61
+        await cache.complete("m", "a", CONFIG, producer)
+        assert producer.calls == 2
+        assert cache.get_stats()["cache_expired"] == 1
+
+        await cache.complete("m", "b", CONFIG, producer)
+        await cache.complete("m", "c", CONFIG, producer)
+        assert len(cache) == 2
+        assert cache.get_stats()["cache_evictions"] == 1
+
+
+class FakeModel:
+    """模擬 GenerativeModel.generate_content_async"""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls += 1
+        return SimpleNamespace(
+            text=json.dumps(self.payload),
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=42, candidates_token_count=7
+            ),
+        )
+
+
+class TestVertexAIServiceCaching:
+    @pytest.fixture
+    def service(self, monkeypatch):
+        # 不依賴實際的 vertexai 套件（其他測試可能替換了 google.cloud 模組）
+        monkeypatch.setitem(
+            sys.modules,
+            "vertexai.generative_models",
+            SimpleNamespace(GenerationConfig=dict),
+        )
+        service = VertexAIService(
+            completion_cache=CompletionCache(max_size=10, ttl_seconds=60, enabled=True)
+        )
+        service.model = FakeModel([{"word": "apple", "distractors": ["a", "b"]}])
+        service.get_flash_model = lambda: service.model
+        return service
+
+    @pytest.mark.asyncio
+    async def test_generate_json_cached_and_returns_fresh_objects(self, service):
+        first = await service.generate_json("distractors", temperature=0.2)
+        first[0]["distractors"].append("mutated")
+
+        second = await service.generate_json("distractors", temperature=0.2)
+
+        assert second == [{"word": "apple", "distractors": ["a", "b"]}]
+        assert service.model.calls == 1
+        stats = service.get_cache_stats()
+        assert stats["prompt_tokens"] == 42
+        assert stats["completion_tokens"] == 7
+
+    @pytest.mark.asyncio
+    async def test_system_instruction_is_part_of_key(self, service):
+        await service.generate_json("p", temperature=0.2, system_instruction="A")
+        await service.generate_json("p", temperature=0.2, system_instruction="B")
+
+        assert service.model.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_invalid_json_is_not_cached(self, service):
+        service.model.generate_content_async = _returning_text("not json")
+
+        with pytest.raises(json.JSONDecodeError):
+            await service.generate_json("p", temperature=0.2)
+        assert len(service.completion_cache) == 0
+
+
+def _returning_text(text):
+    async def generate_content_async(prompt, generation_config=None):
+        return SimpleNamespace(text=text, usage_metadata=None)
+
+    return generate_content_async
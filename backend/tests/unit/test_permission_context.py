@@ -0,0 +1,221 @@
+"""
+Request-scoped 權限快取（utils.permissions.PermissionContext）測試
+
+驗證：
+- 多個 content 的 Content → Lesson → Program 權限鏈以固定查詢數解析
+- 個人 / 組織 / 學校教材的判斷與原本逐筆 helper 規則一致
+- 同一 request 內 Casbin 檢查與決策只做一次
+- commit 後清除快取，讀到新的成員資格
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import (
+    Content,
+    Lesson,
+    Organization,
+    Program,
+    School,
+    Teacher,
+    TeacherOrganization,
+    TeacherSchool,
+)
+from utils.permissions import (
+    check_school_student_permission,
+    get_permission_context,
+    has_content_permission,
+    has_manage_materials_permission,
+    has_program_permission,
+    has_school_materials_permission,
+)
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def casbin():
+    service = MagicMock()
+    service.check_permission.return_value = False
+    with patch("utils.permissions.get_casbin_service", return_value=service):
+        yield service
+
+
+@pytest.fixture
+def materials(db_session):
+    """個人、組織、學校教材各一份，每份 1 個 lesson / 3 個 content"""
+    db = db_session
+    teacher = Teacher(name="T", email="t@example.com", password_hash="x")
+    other = Teacher(name="O", email="o@example.com", password_hash="x")
+    db.add_all([teacher, other])
+    org = Organization(name="Org")
+    db.add(org)
+    db.flush()
+    school = School(organization_id=org.id, name="School")
+    db.add(school)
+    db.flush()
+
+    programs = {
+        "personal": Program(name="Mine", teacher_id=teacher.id),
+        "others": Program(name="Theirs", teacher_id=other.id),
+        "org": Program(name="Org", teacher_id=other.id, organization_id=org.id),
+        "school": Program(name="School", teacher_id=other.id, school_id=school.id),
+    }
+    db.add_all(programs.values())
+    db.flush()
+    contents = {}
+    for key, program in programs.items():
+        lesson = Lesson(name=f"{key} lesson", program_id=program.id)
+        db.add(lesson)
+        db.flush()
+        contents[key] = []
+        for i in range(3):
+            content = Content(title=f"{key} {i}", lesson_id=lesson.id)
+            db.add(content)
+            db.flush()
+            contents[key].append(content.id)
+    db.commit()
+    return {
+        "teacher": teacher,
+        "org": org,
+        "school": school,
+        "programs": programs,
+        "contents": contents,
+    }
+
+
+def _count_queries(db):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return statements, lambda: event.remove(
+        engine, "before_cursor_execute", before_cursor_execute
+    )
+
+
+class TestPermissionContext:
+    def test_batched_content_chain(self, db_session, materials, casbin):
+        teacher, contents = materials["teacher"], materials["contents"]
+        db_session.add(
+            TeacherSchool(
+                teacher_id=teacher.id,
+                school_id=materials["school"].id,
+                roles=["school_admin"],
+            )
+        )
+        db_session.commit()
+        teacher_id = teacher.id
+        all_ids = [i for ids in contents.values() for i in ids]
+
+        statements, stop = _count_queries(db_session)
+        try:
+            decisions = get_permission_context(
+                db_session, teacher_id
+            ).content_permissions(all_ids + [999999])
+        finally:
+            stop()
+
+        # 權限鏈 1 + 學校 1 + 組織成員 1 + 學校成員 1
+        assert len(statements) == 4
+        assert decisions[999999] is False
+        assert {i: decisions[i] for i in contents["personal"]} == dict.fromkeys(
+            contents["personal"], True
+        )
+        assert not any(decisions[i] for i in contents["others"])
+        assert not any(decisions[i] for i in contents["org"])
+        assert all(decisions[i] for i in contents["school"])
+
+    def test_decisions_are_memoized_for_the_request(
+        self, db_session, materials, casbin
+    ):
+        teacher, org = materials["teacher"], materials["org"]
+        db_session.add(
+            TeacherOrganization(
+                teacher_id=teacher.id, organization_id=org.id, role="org_admin"
+            )
+        )
+        db_session.commit()
+        casbin.check_permission.return_value = True
+        teacher_id, org_id = teacher.id, org.id
+        program_id = materials["programs"]["org"].id
+
+        assert has_program_permission(db_session, program_id, teacher_id) is True
+        statements, stop = _count_queries(db_session)
+        try:
+            for content_id in materials["contents"]["org"]:
+                assert has_content_permission(db_session, content_id, teacher_id)
+            assert has_program_permission(db_session, program_id, teacher_id)
+            assert has_manage_materials_permission(teacher_id, org_id, db_session)
+        finally:
+            stop()
+
+        # 每個 content 只查權限鏈；成員資格與 Casbin 結果沿用
+        assert len(statements) == 3
+        casbin.check_permission.assert_called_once()
+
+    def test_read_action_allows_any_org_member(self, db_session, materials, casbin):
+        teacher, org = materials["teacher"], materials["org"]
+        db_session.add(
+            TeacherOrganization(
+                teacher_id=teacher.id, organization_id=org.id, role="teacher"
+            )
+        )
+        db_session.commit()
+        program_id = materials["programs"]["org"].id
+
+        assert has_program_permission(db_session, program_id, teacher.id, "read")
+        assert not has_program_permission(db_session, program_id, teacher.id, "write")
+
+    def test_commit_clears_context(self, db_session, materials, casbin):
+        teacher, school = materials["teacher"], materials["school"]
+
+        assert not has_school_materials_permission(teacher.id, school.id, db_session)
+        assert not check_school_student_permission(teacher.id, school.id, db_session)
+
+        db_session.add(
+            TeacherSchool(
+                teacher_id=teacher.id, school_id=school.id, roles=["school_admin"]
+            )
+        )
+        db_session.commit()
+
+        assert has_school_materials_permission(teacher.id, school.id, db_session)
+        assert check_school_student_permission(teacher.id, school.id, db_session)
+
+    def test_org_owner_manages_school_without_casbin(
+        self, db_session, materials, casbin
+    ):
+        teacher, org = materials["teacher"], materials["org"]
+        db_session.add(
+            TeacherOrganization(
+                teacher_id=teacher.id, organization_id=org.id, role="org_owner"
+            )
+        )
+        db_session.commit()
+
+        assert has_school_materials_permission(
+            teacher.id, str(materials["school"].id), db_session
+        )
+        assert not has_school_materials_permission(teacher.id, "not-a-uuid", db_session)
+        casbin.check_permission.assert_not_called()
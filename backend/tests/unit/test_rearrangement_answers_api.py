@@ -0,0 +1,150 @@
+"""
+學生例句重組批次作答 API（submit_rearrangement_answers）測試
+
+驗證：
+- micro-batch 依 start_position / applied_count 接續計分
+- 重送的批次（包括只有答錯點選的批次）回 409，不會重複計分
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import (
+    Assignment,
+    Classroom,
+    Content,
+    ContentItem,
+    ContentType,
+    Lesson,
+    Program,
+    Student,
+    StudentAssignment,
+    StudentItemProgress,
+    Teacher,
+)
+from routers.students.assignments import submit_rearrangement_answers
+from routers.students.validators import RearrangementBatchAnswerRequest
+from services.rearrangement_service import issue_answer_key
+
+SENTENCE = "I like to eat apples"
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def question(db_session):
+    """一位學生的作業與一題例句重組，回傳 (student_id, student_assignment_id, token)"""
+    db = db_session
+    teacher = Teacher(email="rearrange@duotopia.com", password_hash="x", name="T")
+    db.add(teacher)
+    db.flush()
+    classroom = Classroom(name="C", teacher_id=teacher.id)
+    db.add(classroom)
+    db.flush()
+    program = Program(name="P", teacher_id=teacher.id, classroom_id=classroom.id)
+    db.add(program)
+    db.flush()
+    lesson = Lesson(program_id=program.id, name="L")
+    db.add(lesson)
+    db.flush()
+    content = Content(
+        lesson_id=lesson.id, type=ContentType.EXAMPLE_SENTENCES, title="R"
+    )
+    db.add(content)
+    db.flush()
+    item = ContentItem(content_id=content.id, order_index=0, text=SENTENCE)
+    assignment = Assignment(
+        title="Rearrange",
+        classroom_id=classroom.id,
+        teacher_id=teacher.id,
+        due_date=datetime.utcnow() + timedelta(days=7),
+    )
+    student = Student(name="S", password_hash="x", birthdate=date(2012, 1, 1))
+    db.add_all([item, assignment, student])
+    db.flush()
+    student_assignment = StudentAssignment(
+        assignment_id=assignment.id,
+        student_id=student.id,
+        classroom_id=classroom.id,
+        title="Rearrange",
+    )
+    db.add(student_assignment)
+    db.commit()
+
+    token = issue_answer_key(
+        f"student:{student_assignment.id}", item.id, SENTENCE, None, 1
+    )
+    return student.id, student_assignment.id, token
+
+
+def _submit(db, question, selections, start_position=0, applied_count=0):
+    student_id, sa_id, token = question
+    request = RearrangementBatchAnswerRequest(
+        answer_token=token,
+        selections=selections,
+        start_position=start_position,
+        applied_count=applied_count,
+    )
+    return submit_rearrangement_answers(sa_id, request, {"sub": str(student_id)}, db)
+
+
+def _progress(db):
+    return db.query(StudentItemProgress).one()
+
+
+@pytest.mark.asyncio
+async def test_micro_batches_continue(db_session, question):
+    first = await _submit(db_session, question, ["I", "to"])
+    assert first.correct_word_count == 1
+    assert first.error_count == 1
+
+    second = await _submit(
+        db_session, question, ["like", "to"], start_position=1, applied_count=2
+    )
+    assert second.correct_word_count == 3
+    assert second.error_count == 1
+    assert len(_progress(db_session).rearrangement_data["selections"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_resent_wrong_only_batch_not_counted_twice(db_session, question):
+    await _submit(db_session, question, ["like", "to"])
+    assert _progress(db_session).error_count == 2
+
+    # 只有答錯點選：已答對字數沒變，但已計分的點選數已經不同
+    with pytest.raises(HTTPException) as exc_info:
+        await _submit(db_session, question, ["like", "to"])
+
+    assert exc_info.value.status_code == 409
+    progress = _progress(db_session)
+    assert progress.error_count == 2
+    assert len(progress.rearrangement_data["selections"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_resent_batch_rejected(db_session, question):
+    await _submit(db_session, question, ["I", "like"])
+
+    with pytest.raises(HTTPException) as exc_info:
+        await _submit(db_session, question, ["I", "like"])
+
+    assert exc_info.value.status_code == 409
+    assert _progress(db_session).correct_word_count == 2
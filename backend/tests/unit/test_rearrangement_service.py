@@ -0,0 +1,137 @@
+"""
+例句重組批次作答（services.rearrangement_service）測試
+
+驗證：
+- answer key 簽發 / 驗證與 scope 檢查
+- 批次評分與逐字 API 的計分規則一致（max_errors、points_per_word、保底分）
+- micro-batch 從既有進度接續
+"""
+
+from datetime import timedelta
+
+import pytest
+
+from services.rearrangement_service import (
+    InvalidAnswerKey,
+    default_max_errors,
+    issue_answer_key,
+    read_answer_key,
+    score_selections,
+    to_response,
+)
+
+SENTENCE = "I like to eat apples"
+WORDS = SENTENCE.split()
+
+
+class TestAnswerKey:
+    def test_round_trip(self):
+        token = issue_answer_key("student:7", 42, f"  {SENTENCE} ", None, 4)
+        key = read_answer_key(token, "student:7")
+
+        assert key.content_item_id == 42
+        assert key.words == WORDS
+        assert key.max_errors == 3
+        assert key.total_items == 4
+
+    def test_scope_mismatch_rejected(self):
+        token = issue_answer_key("student:7", 42, SENTENCE, None, 4)
+        with pytest.raises(InvalidAnswerKey):
+            read_answer_key(token, "student:8")
+
+    def test_tampered_token_rejected(self):
+        token = issue_answer_key("demo:1", 42, SENTENCE, None, 4)
+        with pytest.raises(InvalidAnswerKey):
+            read_answer_key(token[:-2] + "xx", "demo:1")
+
+    def test_expired_token_rejected(self):
+        token = issue_answer_key(
+            "demo:1", 42, SENTENCE, None, 4, ttl=timedelta(seconds=-1)
+        )
+        with pytest.raises(InvalidAnswerKey):
+            read_answer_key(token, "demo:1")
+
+    def test_configured_max_errors_kept(self):
+        token = issue_answer_key("demo:1", 42, SENTENCE, 7, 4)
+        assert read_answer_key(token, "demo:1").max_errors == 7
+
+    def test_default_max_errors(self):
+        assert default_max_errors(10) == 3
+        assert default_max_errors(11) == 5
+
+
+class TestScoreSelections:
+    def test_all_correct(self):
+        result = score_selections(WORDS, 3, WORDS)
+
+        assert result.completed
+        assert not result.challenge_failed
+        assert result.correct_word_count == 5
+        assert result.error_count == 0
+        assert result.expected_score == 100.0
+        assert [s["position"] for s in result.selections] == [0, 1, 2, 3, 4]
+
+    def test_errors_deduct_points_per_word(self):
+        # 5 個字 → 每個錯誤扣 20 分
+        result = score_selections(WORDS, 3, ["I", "to", "like", "to", "eat"])
+
+        assert result.error_count == 1
+        assert result.correct_word_count == 4
+        assert result.expected_score == 80.0
+        assert not result.completed
+        wrong = result.selections[1]
+        assert wrong["is_correct"] is False
+        assert wrong["correct"] == "like"
+
+    def test_stops_at_max_errors(self):
+        result = score_selections(WORDS, 2, ["x", "y", "I", "like"])
+
+        assert result.challenge_failed
+        assert result.error_count == 2
+        assert result.correct_word_count == 0
+        assert len(result.selections) == 2
+
+    def test_extra_selections_after_completion_ignored(self):
+        result = score_selections(WORDS, 3, WORDS + ["extra"])
+
+        assert result.completed
+        assert len(result.selections) == 5
+
+    def test_completion_floor(self):
+        # 3 個錯誤 × 20 分後只剩 40 分；總題數 2 題時保底 50 分
+        result = score_selections(WORDS, 5, ["x", "x", "x"] + WORDS, total_items=2)
+
+        assert result.completed
+        assert result.expected_score == 50.0
+
+    def test_micro_batches_continue_from_progress(self):
+        first = score_selections(WORDS, 3, ["I", "eat", "like"])
+        second = score_selections(
+            WORDS,
+            3,
+            ["to", "eat", "apples"],
+            correct_word_count=first.correct_word_count,
+            error_count=first.error_count,
+        )
+        whole = score_selections(
+            WORDS, 3, ["I", "eat", "like", "to", "eat", "apples"]
+        )
+
+        assert second.completed
+        assert second.error_count == whole.error_count == 1
+        assert second.expected_score == whole.expected_score
+        assert [s["position"] for s in second.selections] == [2, 3, 4]
+
+    def test_invalid_start_position(self):
+        with pytest.raises(ValueError):
+            score_selections(WORDS, 3, ["I"], correct_word_count=6)
+
+    def test_response_reveals_correct_word_only_on_errors(self):
+        token = issue_answer_key("demo:1", 42, SENTENCE, None, 1)
+        key = read_answer_key(token, "demo:1")
+        response = to_response(key, score_selections(key.words, 3, ["I", "to"]))
+
+        assert response["content_item_id"] == 42
+        assert response["results"][0]["correct_word"] is None
+        assert response["results"][1]["correct_word"] == "like"
+        assert response["total_word_count"] == 5
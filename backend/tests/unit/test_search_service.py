@@ -0,0 +1,173 @@
+"""
+學校搜尋（services.search_service）測試
+
+SQLite 沒有 pg_trgm，驗證退回的排序規則：
+- 完全相符 > 前綴相符 > 包含
+- 中文姓名前綴
+- 使用者輸入的 % _ 以字面比對
+- 只搜尋該學校（有效關聯）的學生 / 教師 / 班級
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import (
+    Classroom,
+    ClassroomSchool,
+    Organization,
+    School,
+    Student,
+    StudentSchool,
+    Teacher,
+    TeacherSchool,
+)
+from services.search_service import (
+    normalize_search_term,
+    search_classrooms,
+    search_school,
+    search_students,
+    search_teachers,
+)
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def schools(db_session):
+    db = db_session
+    org = Organization(name="Org")
+    db.add(org)
+    db.flush()
+    school = School(organization_id=org.id, name="School A")
+    other = School(organization_id=org.id, name="School B")
+    db.add_all([school, other])
+    db.flush()
+    return school, other
+
+
+def _add_student(db, school, name, number=None, email=None, active=True):
+    student = Student(
+        name=name,
+        password_hash="hashed",
+        birthdate=date(2015, 1, 1),
+        student_number=number,
+        email=email,
+    )
+    db.add(student)
+    db.flush()
+    db.add(StudentSchool(student_id=student.id, school_id=school.id, is_active=active))
+    return student
+
+
+class TestSearchService:
+    def test_ranks_exact_then_prefix_then_contains(self, db_session, schools):
+        school, _ = schools
+        contains = _add_student(db_session, school, "Alice Lin")
+        prefix = _add_student(db_session, school, "Linda")
+        exact = _add_student(db_session, school, "Lin")
+        _add_student(db_session, school, "Bob")
+        db_session.commit()
+
+        results = search_students(db_session, school.id, "lin")
+
+        assert [s.id for s in results] == [exact.id, prefix.id, contains.id]
+
+    def test_chinese_name_prefix(self, db_session, schools):
+        school, _ = schools
+        _add_student(db_session, school, "陳王明")
+        wang = _add_student(db_session, school, "王小明")
+        wang2 = _add_student(db_session, school, "王大同")
+        _add_student(db_session, school, "李小華")
+        db_session.commit()
+
+        assert [s.name for s in search_students(db_session, school.id, "王小")] == ["王小明"]
+        results = search_students(db_session, school.id, "王")
+        assert [s.id for s in results][:2] == [wang.id, wang2.id]
+        assert len(results) == 3
+
+    def test_matches_student_number_and_email(self, db_session, schools):
+        school, _ = schools
+        by_number = _add_student(db_session, school, "Amy", number="A1001")
+        by_email = _add_student(
+            db_session, school, "Ben", email="a1001.parent@example.com"
+        )
+        db_session.commit()
+
+        results = search_students(db_session, school.id, "A1001")
+
+        assert [s.id for s in results] == [by_number.id, by_email.id]
+
+    def test_wildcards_are_literal(self, db_session, schools):
+        school, _ = schools
+        _add_student(db_session, school, "Student 100")
+        literal = _add_student(db_session, school, "Student 100%")
+        underscore = _add_student(db_session, school, "a_b")
+        _add_student(db_session, school, "axb")
+        db_session.commit()
+
+        assert search_students(db_session, school.id, "100%") == [literal]
+        assert search_students(db_session, school.id, "a_b") == [underscore]
+
+    def test_scoped_to_school(self, db_session, schools):
+        school, other = schools
+        mine = _add_student(db_session, school, "Chen")
+        _add_student(db_session, other, "Chen Other")
+        _add_student(db_session, school, "Chen Removed", active=False)
+
+        teacher = Teacher(
+            name="Chen Teacher", email="chen@example.com", password_hash="x"
+        )
+        outsider = Teacher(
+            name="Chen Outside", email="out@example.com", password_hash="x"
+        )
+        db_session.add_all([teacher, outsider])
+        db_session.flush()
+        db_session.add(
+            TeacherSchool(teacher_id=teacher.id, school_id=school.id, roles=[])
+        )
+
+        classroom = Classroom(name="Chen 班")
+        closed = Classroom(name="Chen 舊班", is_active=False)
+        db_session.add_all([classroom, closed])
+        db_session.flush()
+        db_session.add_all(
+            [
+                ClassroomSchool(classroom_id=classroom.id, school_id=school.id),
+                ClassroomSchool(classroom_id=closed.id, school_id=school.id),
+            ]
+        )
+        db_session.commit()
+
+        assert search_students(db_session, school.id, "chen") == [mine]
+        assert search_teachers(db_session, school.id, "chen") == [teacher]
+        assert search_classrooms(db_session, school.id, "chen") == [classroom]
+
+        only_students = search_school(db_session, school.id, "chen", types=["students"])
+        assert only_students.students == [mine]
+        assert only_students.teachers == []
+        assert only_students.classrooms == []
+
+    def test_blank_term_returns_nothing(self, db_session, schools):
+        school, _ = schools
+        _add_student(db_session, school, "Anyone")
+        db_session.commit()
+
+        assert normalize_search_term("  王   小明 ") == "王 小明"
+        assert search_students(db_session, school.id, "   ") == []
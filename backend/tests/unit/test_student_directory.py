@@ -0,0 +1,211 @@
+"""
+學生名單批次查詢（services.student_directory）測試
+
+驗證：
+- 一頁學生名單固定 3 個查詢（學生 / 所屬學校 / 所屬班級），不隨頁面大小增加
+- keyset 分頁依序取完所有學生，沒有重複或遺漏
+- 所屬學校與班級（含班級所屬學校）與原本逐筆查詢的結果一致
+- 總數快取，學生加入學校後可清除
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import (
+    Classroom,
+    ClassroomSchool,
+    ClassroomStudent,
+    Organization,
+    School,
+    Student,
+    StudentSchool,
+)
+from services import student_directory
+from services.student_directory import (
+    StudentDirectoryFilters,
+    build_student_responses,
+    invalidate_school_student_count,
+    list_classroom_students,
+    list_school_students,
+)
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    student_directory._count_cache.clear()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def school_data(db_session):
+    """一所學校、兩個班級、12 位學生（前 8 位在 A 班，前 4 位同時在 B 班）"""
+    db = db_session
+    org = Organization(name="Org")
+    db.add(org)
+    db.flush()
+    school = School(organization_id=org.id, name="School A")
+    other_school = School(organization_id=org.id, name="School B")
+    db.add_all([school, other_school])
+    db.flush()
+
+    class_a = Classroom(name="Class A")
+    class_b = Classroom(name="Class B")
+    db.add_all([class_a, class_b])
+    db.flush()
+    db.add_all(
+        [
+            ClassroomSchool(classroom_id=class_a.id, school_id=school.id),
+            ClassroomSchool(classroom_id=class_b.id, school_id=other_school.id),
+        ]
+    )
+
+    students = []
+    for i in range(12):
+        student = Student(
+            name=f"Student {i}",
+            password_hash="hashed",
+            birthdate=date(2015, 1, 1),
+            student_number=f"S{i:03d}",
+        )
+        db.add(student)
+        db.flush()
+        students.append(student)
+        db.add(StudentSchool(student_id=student.id, school_id=school.id))
+        if i < 8:
+            db.add(ClassroomStudent(classroom_id=class_a.id, student_id=student.id))
+        if i < 4:
+            db.add(StudentSchool(student_id=student.id, school_id=other_school.id))
+            db.add(ClassroomStudent(classroom_id=class_b.id, student_id=student.id))
+    db.commit()
+    return {
+        "school": school,
+        "other_school": other_school,
+        "class_a": class_a,
+        "class_b": class_b,
+        "students": students,
+    }
+
+
+def _count_queries(db):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return statements, lambda: event.remove(
+        engine, "before_cursor_execute", before_cursor_execute
+    )
+
+
+class TestStudentDirectory:
+    def test_page_uses_constant_query_count(self, db_session, school_data):
+        school = school_data["school"]
+        # 先暖好總數快取，只計算名單本身的查詢
+        list_school_students(db_session, school.id, limit=2)
+
+        statements, stop = _count_queries(db_session)
+        try:
+            page = list_school_students(db_session, school.id, limit=12)
+        finally:
+            stop()
+
+        assert len(page.students) == 12
+        assert len(statements) == 3
+
+    def test_keyset_pagination_covers_all_students(self, db_session, school_data):
+        school = school_data["school"]
+        seen = []
+        cursor = None
+        while True:
+            page = list_school_students(db_session, school.id, limit=5, cursor=cursor)
+            seen.extend(s["id"] for s in page.students)
+            assert page.total == 12
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+
+        assert seen == sorted(s.id for s in school_data["students"])
+
+    def test_memberships(self, db_session, school_data):
+        first, last = school_data["students"][0], school_data["students"][-1]
+        school, other = school_data["school"], school_data["other_school"]
+
+        first_row, last_row = build_student_responses(db_session, [first, last])
+
+        assert first_row["schools"] == [
+            {"id": str(school.id), "name": "School A"},
+            {"id": str(other.id), "name": "School B"},
+        ]
+        assert first_row["classrooms"] == [
+            {
+                "id": school_data["class_a"].id,
+                "name": "Class A",
+                "school_id": str(school.id),
+            },
+            {
+                "id": school_data["class_b"].id,
+                "name": "Class B",
+                "school_id": str(other.id),
+            },
+        ]
+        assert last_row["schools"] == [{"id": str(school.id), "name": "School A"}]
+        assert last_row["classrooms"] == []
+
+    def test_filters(self, db_session, school_data):
+        school = school_data["school"]
+
+        unassigned = list_school_students(
+            db_session, school.id, StudentDirectoryFilters(unassigned=True)
+        )
+        in_class = list_school_students(
+            db_session,
+            school.id,
+            StudentDirectoryFilters(classroom_id=school_data["class_a"].id),
+        )
+        searched = list_school_students(
+            db_session, school.id, StudentDirectoryFilters(search="S01")
+        )
+
+        assert unassigned.total == 4
+        assert in_class.total == 8
+        assert [s["student_number"] for s in searched.students] == [
+            "S010",
+            "S011",
+        ]
+
+    def test_classroom_students(self, db_session, school_data):
+        rows = list_classroom_students(db_session, school_data["class_b"].id)
+
+        assert [r["id"] for r in rows] == [s.id for s in school_data["students"][:4]]
+
+    def test_total_is_cached_until_invalidated(self, db_session, school_data):
+        school = school_data["school"]
+        assert list_school_students(db_session, school.id).total == 12
+
+        student = Student(
+            name="New", password_hash="hashed", birthdate=date(2015, 1, 1)
+        )
+        db_session.add(student)
+        db_session.flush()
+        db_session.add(StudentSchool(student_id=student.id, school_id=school.id))
+        db_session.commit()
+
+        assert list_school_students(db_session, school.id).total == 12
+        invalidate_school_student_count(school.id)
+        assert list_school_students(db_session, school.id).total == 13
@@ -0,0 +1,289 @@
+"""
+每月自動續訂引擎（services.subscription_renewal）測試
+
+以假的 TapPay（*_async）取代外部服務，驗證：
+- 過期訂閱以一個 UPDATE 標記
+- 扣款受 concurrency 限制，成功後寫入新訂閱週期與 succeeded checkpoint
+- 重新執行時已完成的教師不會再次扣款
+- 中斷在扣款途中的紀錄先以訂單編號查詢，已扣款則補完訂閱而不重新扣款
+- 扣款逾時但 TapPay 已成功扣款時視為成功
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import RenewalAttempt, SubscriptionPeriod, Teacher
+from services.subscription_renewal import RenewalEngine
+
+# 台北時間 2025-12-01 10:00
+RUN_AT = datetime(2025, 12, 1, 2, 0, tzinfo=timezone.utc)
+
+
+class FakeTapPay:
+    """記錄扣款與最大並發數的假 TapPay 服务"""
+
+    def __init__(self, delay: float = 0.0, pay_result=None, records=None):
+        self.delay = delay
+        self.pay_result = pay_result
+        # order_number → TapPay Record API 的 trade_records
+        self.records = records or {}
+        self.charges = []
+        self.queries = []
+        self.active = 0
+        self.max_active = 0
+
+    async def pay_by_token_async(self, **kwargs):
+        self.charges.append(kwargs["order_number"])
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if self.pay_result is not None:
+            return dict(self.pay_result)
+        return {
+            "status": 0,
+            "rec_trade_id": f"REC_{kwargs['order_number']}",
+            "card_secret": {"card_token": "refreshed_token"},
+        }
+
+    async def find_transaction_by_order_number_async(self, order_number):
+        self.queries.append(order_number)
+        return {"status": 0, "trade_records": self.records.get(order_number, [])}
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # executor 中的 session 需要各自的連線，使用檔案型 SQLite
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'renewal.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _add_teacher(db, index: int, card: bool = True, last_month: bool = True):
+    teacher = Teacher(
+        name=f"Teacher {index}",
+        email=f"teacher{index}@example.com",
+        password_hash="hashed",
+        email_verified=True,
+        is_active=True,
+        subscription_auto_renew=True,
+        card_key="card_key" if card else None,
+        card_token="card_token" if card else None,
+    )
+    db.add(teacher)
+    db.flush()
+    if last_month:
+        db.add(
+            SubscriptionPeriod(
+                teacher_id=teacher.id,
+                plan_name="Tutor Teachers",
+                start_date=date(2025, 11, 1),
+                end_date=date(2025, 11, 30),
+                payment_method="auto_renew",
+                status="active",
+                amount_paid=299,
+                quota_total=2000,
+            )
+        )
+    return teacher
+
+
+def _engine(session_factory, tappay, emails=None, **kwargs):
+    sent = emails if emails is not None else []
+    return RenewalEngine(
+        session_factory,
+        tappay,
+        email_sender=lambda **kw: sent.append(kw["teacher_email"]),
+        now=RUN_AT,
+        **kwargs,
+    )
+
+
+class TestRenewalEngine:
+    @pytest.mark.asyncio
+    async def test_renews_in_batches_with_bounded_concurrency(self, session_factory):
+        db = session_factory()
+        teachers = [_add_teacher(db, i) for i in range(7)]
+        _add_teacher(db, 100, card=False)
+        _add_teacher(db, 101, last_month=False)
+        db.commit()
+        tappay = FakeTapPay(delay=0.02)
+        emails = []
+
+        results = await _engine(
+            session_factory, tappay, emails, concurrency=3, batch_size=4
+        ).run()
+
+        assert results["marked_expired"] == 8  # 11 月的訂閱全部過期
+        assert results["auto_renewed"] == 7
+        assert results["skipped"] == 1
+        assert results["auto_renew_disabled"] == 1
+        assert tappay.max_active == 3
+        assert sorted(emails) == sorted(t.email for t in teachers)
+
+        db.expire_all()
+        attempts = db.query(RenewalAttempt).all()
+        assert len(attempts) == 7
+        assert {a.status for a in attempts} == {"succeeded"}
+        current = db.query(SubscriptionPeriod).filter(
+            SubscriptionPeriod.start_date == datetime(2025, 12, 1)
+        )
+        assert current.count() == 7
+        assert db.get(Teacher, teachers[0].id).card_token == "refreshed_token"
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_second_run_does_not_charge_again(self, session_factory):
+        db = session_factory()
+        _add_teacher(db, 1)
+        db.commit()
+        db.close()
+        tappay = FakeTapPay()
+
+        await _engine(session_factory, tappay).run()
+        results = await _engine(session_factory, tappay).run()
+
+        assert results["auto_renewed"] == 0
+        assert results["skipped"] == 1
+        assert len(tappay.charges) == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_charge_is_not_retried_in_same_month(self, session_factory):
+        db = session_factory()
+        _add_teacher(db, 1)
+        db.commit()
+        db.close()
+        tappay = FakeTapPay(pay_result={"status": 10003, "msg": "Card Error"})
+
+        first = await _engine(session_factory, tappay).run()
+        second = await _engine(session_factory, tappay).run()
+
+        assert first["renewal_failed"] == 1
+        assert second["already_processed"] == 1
+        assert len(tappay.charges) == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_charging_attempt_is_reconciled(self, session_factory):
+        db = session_factory()
+        teacher = _add_teacher(db, 1)
+        db.flush()
+        order_number = f"RENEWAL_{teacher.id}_20251201"
+        db.add(
+            RenewalAttempt(
+                teacher_id=teacher.id,
+                renewal_month="2025-12",
+                order_number=order_number,
+                status="charging",
+                plan_name="Tutor Teachers",
+                amount=299,
+                run_id="crashed-run",
+                updated_at=RUN_AT - timedelta(hours=1),
+            )
+        )
+        db.commit()
+        tappay = FakeTapPay(
+            records={
+                order_number: [
+                    {
+                        "order_number": order_number,
+                        "record_status": 1,
+                        "rec_trade_id": "REC_PAID",
+                    }
+                ]
+            }
+        )
+
+        results = await _engine(session_factory, tappay).run()
+
+        assert tappay.charges == []
+        assert tappay.queries == [order_number]
+        assert results["auto_renewed"] == 1
+        assert results["reconciled"] == 1
+        db.expire_all()
+        attempt = db.query(RenewalAttempt).one()
+        assert attempt.status == "succeeded"
+        assert attempt.rec_trade_id == "REC_PAID"
+        period = (
+            db.query(SubscriptionPeriod)
+            .filter(SubscriptionPeriod.start_date == datetime(2025, 12, 1))
+            .one()
+        )
+        assert period.payment_id == "REC_PAID"
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_recent_charging_attempt_is_left_alone(self, session_factory):
+        db = session_factory()
+        teacher = _add_teacher(db, 1)
+        db.flush()
+        db.add(
+            RenewalAttempt(
+                teacher_id=teacher.id,
+                renewal_month="2025-12",
+                order_number=f"RENEWAL_{teacher.id}_20251201",
+                status="charging",
+                run_id="other-run",
+                updated_at=RUN_AT,
+            )
+        )
+        db.commit()
+        db.close()
+        tappay = FakeTapPay()
+
+        results = await _engine(session_factory, tappay).run()
+
+        assert results["skipped"] == 1
+        assert tappay.charges == []
+        assert tappay.queries == []
+
+    @pytest.mark.asyncio
+    async def test_timed_out_charge_checks_order_before_failing(self, session_factory):
+        db = session_factory()
+        teacher = _add_teacher(db, 1)
+        db.commit()
+        order_number = f"RENEWAL_{teacher.id}_20251201"
+        db.close()
+        tappay = FakeTapPay(
+            pay_result={"status": -1, "error": "API_REQUEST_FAILED"},
+            records={
+                order_number: [
+                    {
+                        "order_number": order_number,
+                        "record_status": 0,
+                        "rec_trade_id": "REC_LATE",
+                    }
+                ]
+            },
+        )
+
+        results = await _engine(session_factory, tappay).run()
+
+        assert results["auto_renewed"] == 1
+        assert results["renewal_failed"] == 0
+        assert tappay.queries == [order_number]
+
+    @pytest.mark.asyncio
+    async def test_not_first_of_month_is_skipped(self, session_factory):
+        tappay = FakeTapPay()
+        engine = RenewalEngine(
+            session_factory,
+            tappay,
+            email_sender=lambda **kw: None,
+            now=datetime(2025, 12, 2, 2, 0, tzinfo=timezone.utc),
+        )
+
+        results = await engine.run()
+
+        assert results["status"] == "skipped"
+        assert tappay.charges == []
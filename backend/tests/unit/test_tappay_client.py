@@ -0,0 +1,259 @@
+"""
+TapPay 非同步 client（services.tappay_client）測試
+
+以 httpx.MockTransport 作為本地 TapPay stub server，驗證：
+- *_async 方法送出與同步版本相同格式的請求，TAPPAY_API_BASE_URL 可指向 stub
+- 相同訂單重複送出回傳第一次的結果、並發的相同請求只送出一次，
+  發起者被取消時其他等待者仍取得結果
+- 退款只有帶相同 request_id 時才去重
+- 請求未送出的連線錯誤會重試；付款逾時不重試，查詢遇到 5xx 會重試
+- 並發上限與每個 endpoint 的延遲統計
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from services.tappay_client import TapPayClient
+from services.tappay_einvoice_service import TapPayEInvoiceService
+from services.tappay_service import TapPayService
+
+STUB_URL = "http://tappay-stub.local"
+
+
+class TapPayStub:
+    """記錄收到的請求，依路徑回傳固定回應的 stub server"""
+
+    def __init__(self, delay: float = 0.0, failures=None):
+        self.delay = delay
+        # 路徑 → 依序拋出的例外或回傳的狀態碼
+        self.failures = failures or {}
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            pending = self.failures.get(request.url.path)
+            if pending:
+                failure = pending.pop(0)
+                if isinstance(failure, Exception):
+                    raise failure
+                return httpx.Response(failure, json={"status": -1})
+            return httpx.Response(
+                200,
+                json={
+                    "status": 0,
+                    "msg": "Success",
+                    "rec_trade_id": f"REC_{len(self.requests)}",
+                },
+            )
+        finally:
+            self.active -= 1
+
+    def paths(self):
+        return [request.url.path for request in self.requests]
+
+
+@pytest.fixture
+def stub():
+    return TapPayStub()
+
+
+@pytest.fixture
+def make_service(monkeypatch):
+    monkeypatch.setenv("TAPPAY_API_BASE_URL", STUB_URL)
+
+    def make(stub, **client_kwargs):
+        client_kwargs.setdefault("retry_base_seconds", 0)
+        client = TapPayClient(
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(stub)),
+            **client_kwargs,
+        )
+        return TapPayService(client=client)
+
+    return make
+
+
+def _pay(service, order_number="ORDER_1", prime="prime_1"):
+    return service.process_payment_async(
+        prime=prime,
+        amount=230,
+        details={"item_name": "Test Subscription"},
+        cardholder={"name": "Test User", "email": "test@example.com"},
+        order_number=order_number,
+    )
+
+
+class TestTapPayServiceAsync:
+    @pytest.mark.asyncio
+    async def test_request_shape_matches_sync_version(self, stub, make_service):
+        service = make_service(stub)
+
+        result = await _pay(service)
+
+        assert result["status"] == 0
+        request = stub.requests[0]
+        assert str(request.url) == f"{STUB_URL}/tpc/payment/pay-by-prime"
+        payload = json.loads(request.content)
+        assert payload == service._build_prime_payload(
+            "prime_1",
+            230,
+            {"item_name": "Test Subscription"},
+            {"name": "Test User", "email": "test@example.com"},
+            "ORDER_1",
+            False,
+        )
+
+    @pytest.mark.asyncio
+    async def test_repeated_order_returns_stored_result(self, stub, make_service):
+        service = make_service(stub)
+
+        first = await _pay(service)
+        retry = await _pay(service)
+        other = await _pay(service, order_number="ORDER_2")
+
+        assert retry == first
+        assert other["rec_trade_id"] != first["rec_trade_id"]
+        assert len(stub.requests) == 2
+        stats = service.client.get_stats()["endpoints"]["pay-by-prime"]
+        assert stats["calls"] == 2
+        assert stats["idempotent_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_orders_are_sent_once(self, make_service):
+        stub = TapPayStub(delay=0.02)
+        service = make_service(stub)
+
+        results = await asyncio.gather(*[_pay(service) for _ in range(3)])
+
+        assert len(stub.requests) == 1
+        assert results[0] == results[1] == results[2]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_owner_does_not_cancel_waiters(self, make_service):
+        stub = TapPayStub(delay=0.05)
+        service = make_service(stub)
+
+        owner = asyncio.ensure_future(_pay(service))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(_pay(service))
+        await asyncio.sleep(0)
+        owner.cancel()
+
+        result = await waiter
+        assert result["status"] == 0
+        assert owner.cancelled()
+        assert len(stub.requests) == 1
+        # 發起者取消後付款仍完成並記住結果，重送相同訂單不會再扣款
+        assert await _pay(service) == result
+        assert len(stub.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_refund_without_request_id_is_always_sent(self, stub, make_service):
+        service = make_service(stub)
+
+        first = await service.refund_async("REC_1", amount=100)
+        second = await service.refund_async("REC_1", amount=100)
+
+        # 相同金額的第二次部分退款是新的退款，不能回傳第一次的結果
+        assert first["rec_trade_id"] != second["rec_trade_id"]
+        assert len(stub.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_refund_with_same_request_id_is_sent_once(self, stub, make_service):
+        service = make_service(stub)
+
+        first = await service.refund_async("REC_1", amount=100, request_id="r-1")
+        retry = await service.refund_async("REC_1", amount=100, request_id="r-1")
+        other = await service.refund_async("REC_1", amount=100, request_id="r-2")
+
+        assert retry == first
+        assert other["rec_trade_id"] != first["rec_trade_id"]
+        assert len(stub.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_connect_error_is_retried(self, make_service):
+        path = "/tpc/payment/pay-by-token"
+        stub = TapPayStub(failures={path: [httpx.ConnectError("refused")]})
+        service = make_service(stub)
+
+        result = await service.pay_by_token_async(
+            card_key="key",
+            card_token="token",
+            amount=299,
+            details="Monthly Renewal",
+            cardholder={"name": "Teacher"},
+            order_number="RENEWAL_1_20260401",
+        )
+
+        assert result["status"] == 0
+        assert stub.paths() == [path, path]
+        assert service.client.get_stats()["endpoints"]["pay-by-token"]["retries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_payment_timeout_is_not_retried(self, make_service):
+        path = "/tpc/payment/pay-by-prime"
+        stub = TapPayStub(failures={path: [httpx.ReadTimeout("slow")]})
+        service = make_service(stub)
+
+        result = await _pay(service)
+
+        assert result["status"] == -1
+        assert result["error"] == "API_REQUEST_FAILED"
+        assert len(stub.requests) == 1
+
+        # 失敗結果不會被記住，相同訂單可以再送一次
+        assert (await _pay(service))["status"] == 0
+        assert len(stub.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_query_retries_server_errors(self, make_service):
+        path = "/tpc/transaction/query"
+        stub = TapPayStub(failures={path: [503, 502]})
+        service = make_service(stub)
+
+        result = await service.query_transaction_async("REC_1")
+
+        assert result["status"] == 0
+        assert len(stub.requests) == 3
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self, make_service):
+        stub = TapPayStub(delay=0.02)
+        service = make_service(stub, max_concurrency=2)
+
+        await asyncio.gather(
+            *[_pay(service, order_number=f"ORDER_{i}") for i in range(6)]
+        )
+
+        assert len(stub.requests) == 6
+        assert stub.max_active == 2
+
+
+class TestTapPayEInvoiceServiceAsync:
+    @pytest.mark.asyncio
+    async def test_query_invoice_uses_get_with_params(self, stub, monkeypatch):
+        monkeypatch.setenv("TAPPAY_API_BASE_URL", STUB_URL)
+        monkeypatch.setenv("TAPPAY_PARTNER_KEY", "partner_key")
+        monkeypatch.setenv("TAPPAY_MERCHANT_ID", "merchant_id")
+        service = TapPayEInvoiceService(
+            client=TapPayClient(
+                http_client=httpx.AsyncClient(transport=httpx.MockTransport(stub))
+            )
+        )
+
+        result = await service.query_invoice_async("INV_1")
+
+        assert result["status"] == 0
+        request = stub.requests[0]
+        assert request.method == "GET"
+        assert request.url.path == "/tpc/einvoice/query"
+        assert request.url.params["rec_invoice_id"] == "INV_1"
+        assert request.url.params["partner_key"] == "partner_key"
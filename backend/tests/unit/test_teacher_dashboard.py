@@ -0,0 +1,239 @@
+"""
+教師儀表板摘要（services.teacher_dashboard）測試
+
+驗證：
+- 摘要內容與原本 endpoint 相同（學生數只算有效選課的有效學生、前 3 位學生、
+  班級所屬學校 / 機構、mode 篩選）
+- 摘要依教師快取，選課 / 學生 / 學校變更 commit 後失效，rollback 不影響快取
+"""
+
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import services.teacher_dashboard as dashboard
+from database import Base
+from models import (
+    Classroom,
+    ClassroomSchool,
+    ClassroomStudent,
+    Organization,
+    School,
+    Student,
+    Teacher,
+    TeacherSchool,
+)
+from services.teacher_dashboard import (
+    TeacherDashboardCache,
+    load_teacher_dashboard_summary,
+)
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """測試用快取，同時設為全域實例（接收 commit 後的失效事件）"""
+    instance = TeacherDashboardCache(ttl_seconds=60)
+    monkeypatch.setattr(dashboard, "_cache", instance)
+    return instance
+
+
+def _student(db, name, is_active=True):
+    student = Student(
+        name=name,
+        password_hash="x",
+        birthdate=date(2012, 1, 1),
+        is_active=is_active,
+    )
+    db.add(student)
+    db.flush()
+    return student
+
+
+def _make_teacher(db):
+    """
+    一位教師：
+    - 個人班級：5 位有效學生 + 1 位停用學生 + 1 筆停用選課
+    - 學校班級：2 位學生，連結到機構下的學校
+    """
+    teacher = Teacher(email="dash@duotopia.com", password_hash="x", name="T")
+    db.add(teacher)
+    db.flush()
+
+    org = Organization(id=uuid.uuid4(), name="Org", is_active=True)
+    db.add(org)
+    db.flush()
+    school = School(
+        id=uuid.uuid4(),
+        organization_id=org.id,
+        name="School",
+        display_name="Display School",
+        is_active=True,
+    )
+    db.add(school)
+    db.flush()
+    db.add(
+        TeacherSchool(
+            teacher_id=teacher.id,
+            school_id=school.id,
+            roles=["teacher"],
+            is_active=True,
+        )
+    )
+
+    personal = Classroom(name="Personal", teacher_id=teacher.id, is_active=True)
+    school_class = Classroom(name="School Class", teacher_id=teacher.id, is_active=True)
+    deleted = Classroom(name="Deleted", teacher_id=teacher.id, is_active=False)
+    db.add_all([personal, school_class, deleted])
+    db.flush()
+    db.add(ClassroomSchool(classroom_id=school_class.id, school_id=school.id))
+
+    for i in range(5):
+        student = _student(db, f"P{i}")
+        db.add(ClassroomStudent(classroom_id=personal.id, student_id=student.id))
+    inactive = _student(db, "Inactive", is_active=False)
+    db.add(ClassroomStudent(classroom_id=personal.id, student_id=inactive.id))
+    removed = _student(db, "Removed")
+    db.add(
+        ClassroomStudent(
+            classroom_id=personal.id, student_id=removed.id, is_active=False
+        )
+    )
+    for i in range(2):
+        student = _student(db, f"S{i}")
+        db.add(ClassroomStudent(classroom_id=school_class.id, student_id=student.id))
+
+    db.commit()
+    return teacher, personal, school_class, school, org
+
+
+class TestSummary:
+    def test_summary_contents(self, db_session):
+        teacher, personal, school_class, school, org = _make_teacher(db_session)
+
+        summary = load_teacher_dashboard_summary(db_session, teacher.id)
+
+        assert [c.name for c in summary.classrooms] == ["Personal", "School Class"]
+        first, second = summary.classrooms
+        assert first.student_count == 5
+        assert [s.name for s in first.recent_students] == ["P0", "P1", "P2"]
+        assert first.school_id is None
+        assert second.student_count == 2
+        assert second.school_id == str(school.id)
+        assert second.school_name == "Display School"
+        assert second.organization_id == str(org.id)
+
+        assert summary.schools == ({"id": str(school.id), "name": "Display School"},)
+        assert summary.roles == ("teacher",)
+        assert summary.organization is None
+
+    def test_mode_filtering(self, db_session):
+        teacher, _, _, school, org = _make_teacher(db_session)
+        summary = load_teacher_dashboard_summary(db_session, teacher.id)
+
+        assert [c.name for c in summary.classrooms_for("personal")] == ["Personal"]
+        assert [
+            c.name for c in summary.classrooms_for("school", school_id=str(school.id))
+        ] == ["School Class"]
+        assert [
+            c.name
+            for c in summary.classrooms_for("organization", organization_id=str(org.id))
+        ] == ["School Class"]
+        assert len(summary.classrooms_for()) == 2
+
+        assert summary.has_school(str(school.id))
+        assert not summary.has_school(str(uuid.uuid4()))
+        assert not summary.has_school("not-a-uuid")
+        assert not summary.has_organization(str(org.id))
+
+
+class TestCache:
+    def test_cached_until_enrollment_changes(self, db_session, cache):
+        teacher, personal, _, _, _ = _make_teacher(db_session)
+
+        summary = cache.get(db_session, teacher.id)
+        assert cache.get(db_session, teacher.id) is summary
+        assert cache.get_stats()["hits"] == 1
+
+        student = _student(db_session, "New")
+        db_session.add(
+            ClassroomStudent(classroom_id=personal.id, student_id=student.id)
+        )
+        db_session.flush()
+        # commit 前仍使用原本的摘要
+        assert cache.get(db_session, teacher.id) is summary
+
+        db_session.commit()
+        assert cache.get(db_session, teacher.id).classrooms[0].student_count == 6
+
+    def test_student_rename_invalidates(self, db_session, cache):
+        teacher, _, _, _, _ = _make_teacher(db_session)
+        cache.get(db_session, teacher.id)
+
+        student = db_session.query(Student).filter_by(name="P0").one()
+        student.name = "Renamed"
+        db_session.commit()
+
+        recent = cache.get(db_session, teacher.id).classrooms[0].recent_students
+        assert recent[0].name == "Renamed"
+
+    def test_school_rename_invalidates(self, db_session, cache):
+        teacher, _, _, school, _ = _make_teacher(db_session)
+        cache.get(db_session, teacher.id)
+
+        school.display_name = "New Name"
+        db_session.commit()
+
+        summary = cache.get(db_session, teacher.id)
+        assert summary.classrooms[1].school_name == "New Name"
+        assert summary.schools[0]["name"] == "New Name"
+
+    def test_rollback_keeps_cache(self, db_session, cache):
+        teacher, personal, _, _, _ = _make_teacher(db_session)
+        summary = cache.get(db_session, teacher.id)
+
+        personal.name = "Changed"
+        db_session.flush()
+        db_session.rollback()
+
+        assert cache.get(db_session, teacher.id) is summary
+
+    def test_ttl_expiry(self, db_session):
+        now = [0.0]
+        cache = TeacherDashboardCache(ttl_seconds=60, clock=lambda: now[0])
+        teacher, _, _, _, _ = _make_teacher(db_session)
+
+        summary = cache.get(db_session, teacher.id)
+        now[0] = 61.0
+        assert cache.get(db_session, teacher.id) is not summary
+
+    def test_invalidation_during_load_not_cached(self, db_session):
+        cache = TeacherDashboardCache(ttl_seconds=60)
+
+        def loader(db, teacher_id):
+            # 重建期間發生的失效：結果不寫入快取
+            cache.invalidate(classroom_ids=[1])
+            return load_teacher_dashboard_summary(db, teacher_id)
+
+        cache._loader = loader
+        teacher, _, _, _, _ = _make_teacher(db_session)
+
+        cache.get(db_session, teacher.id)
+        assert cache.get_stats()["entries"] == 0
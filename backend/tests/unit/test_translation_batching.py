@@ -0,0 +1,131 @@
+"""
+批次翻譯分批引擎（TranslationService._translate_in_chunks）測試
+
+以假的 _batch_translate_llm / _batch_translate_with_pos_llm 取代 LLM，驗證：
+- 依 token 預算與項目數上限切分批次，結果依原順序組回
+- 批次並發數受 TRANSLATION_LLM_CONCURRENCY 限制
+- 數量不符的批次只重試失敗的部分，單一項目失敗時保留原文 / 逐個 fallback
+- 連線等其他錯誤不切分重試
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from services.translation import BatchResultError, TranslationService
+from services.translation_cache import TranslationCache
+
+
+class FakeBatchLLM:
+    """記錄每次呼叫與最大並發數的假批次 LLM"""
+
+    def __init__(self, fail_when=None, delay: float = 0.01, error=None):
+        self.fail_when = fail_when or (lambda chunk: False)
+        self.error = error or BatchResultError("Batch translation count mismatch")
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, texts, target_lang):
+        self.calls.append(list(texts))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail_when(texts):
+                raise self.error
+            return [f"{text}-{target_lang}" for text in texts]
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def service():
+    service = TranslationService(cache=TranslationCache(persist=False))
+    service._ensure_client = lambda: None
+    service.chunk_max_items = 10
+    service.chunk_token_budget = 1000
+    service.llm_concurrency = 2
+    return service
+
+
+def test_split_chunks_respects_token_budget(service):
+    service.chunk_token_budget = 10
+    texts = ["a" * 40, "b", "c", "d" * 40]
+
+    chunks = service._split_chunks(texts)
+
+    # 超過預算的單一項目自成一批
+    assert chunks == [["a" * 40], ["b", "c"], ["d" * 40]]
+
+
+@pytest.mark.asyncio
+async def test_chunks_run_concurrently_and_keep_order(service):
+    fake = FakeBatchLLM()
+    service._batch_translate_llm = fake
+    words = [f"word{i}" for i in range(35)]
+
+    result = await service.batch_translate(words, "zh-TW")
+
+    assert result == [f"word{i}-zh-TW" for i in range(35)]
+    assert [len(call) for call in fake.calls] == [10, 10, 10, 5]
+    assert fake.max_active == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_is_bisected(service):
+    fake = FakeBatchLLM(fail_when=lambda chunk: "bad" in chunk)
+    service._batch_translate_llm = fake
+    words = [f"word{i}" for i in range(8)] + ["bad"] + ["ok"]
+
+    result = await service.batch_translate(words, "zh-TW")
+
+    # 只有失敗的項目保留原文，其他照常翻譯
+    assert result[:8] == [f"word{i}-zh-TW" for i in range(8)]
+    assert result[8] == "bad"
+    assert result[9] == "ok-zh-TW"
+    # 一次完整批次 + 對半重試，不會逐一重送所有項目
+    assert len(fake.calls) <= 1 + 2 * 4
+    assert ["bad"] in fake.calls
+
+
+@pytest.mark.asyncio
+async def test_transport_error_is_not_bisected(service):
+    fake = FakeBatchLLM(
+        fail_when=lambda chunk: True, error=httpx.ConnectError("refused")
+    )
+    service._batch_translate_llm = fake
+    words = [f"word{i}" for i in range(20)]
+
+    result = await service.batch_translate(words, "zh-TW")
+
+    # 每批只送一次，失敗的項目保留原文
+    assert result == words
+    assert [len(call) for call in fake.calls] == [10, 10]
+
+
+@pytest.mark.asyncio
+async def test_pos_items_fall_back_individually(service):
+    async def fake_pos_batch(texts, target_lang):
+        if "bad" in texts:
+            raise BatchResultError("Expected 2 results, got 1")
+        return [{"translation": t, "parts_of_speech": ["n."]} for t in texts]
+
+    fallback_calls = []
+
+    async def fake_translate_with_pos(text, target_lang="zh-TW"):
+        fallback_calls.append(text)
+        return {"translation": f"{text}!", "parts_of_speech": []}
+
+    service._batch_translate_with_pos_llm = fake_pos_batch
+    service.translate_with_pos = fake_translate_with_pos
+
+    result = await service.batch_translate_with_pos(["good", "bad"], "zh-TW")
+
+    assert result == [
+        {"translation": "good", "parts_of_speech": ["n."]},
+        {"translation": "bad!", "parts_of_speech": []},
+    ]
+    assert fallback_calls == ["bad"]
@@ -0,0 +1,183 @@
+"""
+翻譯快取（services.translation_cache）測試
+
+以 in-memory SQLite 的 translation_cache_entries 資料表驗證：
+- LRU 與資料庫兩層查詢，資料庫一批只查一次
+- key 包含目標語言、模式與 prompt 版本，版本調高後舊項目失效
+- TranslationService 批次翻譯只把未命中的部分送給 LLM，失敗結果不寫入快取
+"""
+
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import TranslationCacheEntry
+from services.translation import TranslationService
+from services.translation_cache import (
+    MODE_BATCH,
+    MODE_POS,
+    MODE_TEXT,
+    TranslationCache,
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    TranslationCacheEntry.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+def _count_statements(engine):
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    return statements, lambda: event.remove(
+        engine, "before_cursor_execute", count_statement
+    )
+
+
+class TestTranslationCache:
+    @pytest.mark.asyncio
+    async def test_store_then_lookup_hits_lru(self, session_factory):
+        cache = TranslationCache(session_factory=session_factory)
+        await cache.store({"apple": "(n.) 蘋果"}, "zh-TW", MODE_TEXT)
+
+        found = await cache.lookup(["  apple ", "happy"], "zh-TW", MODE_TEXT)
+
+        assert found == {"apple": "(n.) 蘋果"}
+        stats = cache.get_stats()
+        assert stats["cache_hits"] == 1
+        assert stats["cache_misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_key_includes_lang_and_mode(self, session_factory):
+        cache = TranslationCache(session_factory=session_factory)
+        await cache.store({"apple": "蘋果"}, "zh-TW", MODE_BATCH)
+
+        assert await cache.lookup(["apple"], "ja", MODE_BATCH) == {}
+        assert await cache.lookup(["apple"], "zh-TW", MODE_TEXT) == {}
+        assert await cache.lookup(["apple"], "zh-TW", MODE_BATCH) == {"apple": "蘋果"}
+
+    @pytest.mark.asyncio
+    async def test_persisted_entries_shared_across_instances(
+        self, engine, session_factory
+    ):
+        writer = TranslationCache(session_factory=session_factory)
+        await writer.store(
+            {
+                "apple": {"translation": "蘋果", "parts_of_speech": ["n."]},
+                "run": {"translation": "跑", "parts_of_speech": ["v.", "n."]},
+            },
+            "zh-TW",
+            MODE_POS,
+        )
+
+        reader = TranslationCache(session_factory=session_factory)
+        statements, stop = _count_statements(engine)
+        try:
+            found = await reader.lookup(["apple", "run", "happy"], "zh-TW", MODE_POS)
+        finally:
+            stop()
+
+        assert found["run"] == {"translation": "跑", "parts_of_speech": ["v.", "n."]}
+        assert set(found) == {"apple", "run"}
+        assert len(statements) == 1
+        assert reader.get_stats()["cache_db_hits"] == 2
+
+        # 第二次查詢已在 LRU 中，不再查資料庫
+        statements, stop = _count_statements(engine)
+        try:
+            await reader.lookup(["apple", "run"], "zh-TW", MODE_POS)
+        finally:
+            stop()
+        assert statements == []
+
+    @pytest.mark.asyncio
+    async def test_prompt_version_bump_invalidates(self, session_factory):
+        old = TranslationCache(session_factory=session_factory, prompt_version=1)
+        await old.store({"apple": "蘋果"}, "zh-TW", MODE_TEXT)
+
+        new = TranslationCache(session_factory=session_factory, prompt_version=2)
+        assert await new.lookup(["apple"], "zh-TW", MODE_TEXT) == {}
+
+        assert new.purge_stale_versions() == 1
+        assert session_factory().query(TranslationCacheEntry).count() == 0
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        cache = TranslationCache(max_size=2, persist=False)
+        await cache.store({"a": "1", "b": "2", "c": "3"}, "zh-TW", MODE_TEXT)
+
+        assert len(cache) == 2
+        assert await cache.lookup(["a"], "zh-TW", MODE_TEXT) == {}
+        assert cache.get_stats()["cache_evictions"] == 1
+
+
+class TestTranslationServiceCaching:
+    @pytest.fixture
+    def service(self, session_factory):
+        return TranslationService(
+            cache=TranslationCache(session_factory=session_factory)
+        )
+
+    @pytest.mark.asyncio
+    async def test_batch_translate_only_sends_uncached_subset(self, service):
+        await service.cache.store({"apple": "蘋果"}, "zh-TW", MODE_BATCH)
+        service._ensure_client = lambda: None
+        service._batch_translate_llm = AsyncMock(return_value=["快樂", "增加"])
+
+        result = await service.batch_translate(
+            ["apple", "happy", "increase", "happy"], "zh-TW"
+        )
+
+        assert result == ["蘋果", "快樂", "增加", "快樂"]
+        service._batch_translate_llm.assert_awaited_once_with(
+            ["happy", "increase"], "zh-TW"
+        )
+
+        # 全部命中時不呼叫 LLM
+        service._batch_translate_llm.reset_mock()
+        assert await service.batch_translate(["happy", "apple"], "zh-TW") == [
+            "快樂",
+            "蘋果",
+        ]
+        service._batch_translate_llm.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_not_cached(self, service):
+        service._ensure_client = lambda: None
+        service._batch_translate_llm = AsyncMock(side_effect=ValueError("mismatch"))
+
+        result = await service.batch_translate(["apple", "happy"], "zh-TW")
+
+        assert result == ["apple", "happy"]
+        assert await service.cache.lookup(["apple"], "zh-TW", MODE_BATCH) == {}
+
+    @pytest.mark.asyncio
+    async def test_translate_text_cached_after_success(self, service):
+        service._ensure_client = lambda: None
+        service._translate_text_llm = AsyncMock(
+            side_effect=[RuntimeError("LLM down"), "(n.) 蘋果"]
+        )
+
+        assert await service.translate_text("apple") == "apple"
+        assert await service.translate_text("apple") == "(n.) 蘋果"
+        assert await service.translate_text("apple") == "(n.) 蘋果"
+        assert service._translate_text_llm.await_count == 2
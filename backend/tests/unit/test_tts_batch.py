@@ -0,0 +1,155 @@
+"""
+批次 TTS 測試：去重、single-flight、並發上限與部分結果
+
+以假的合成函式取代 Azure（在 TTS 線程池中執行），GCS 上傳以 mock 取代
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from azure.cognitiveservices.speech import ResultReason
+
+from services.tts import TTSService
+
+
+class FakeSynthesizer:
+    """記錄呼叫次數與最大並發數的假 Azure TTS"""
+
+    def __init__(self, delay: float = 0.05, fail_texts=()):
+        self.delay = delay
+        self.fail_texts = set(fail_texts)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text, voice, file_path):
+        with self._lock:
+            self.calls.append(text)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if text in self.fail_texts:
+                raise RuntimeError("Azure TTS failed: ResultReason.Canceled")
+            result = MagicMock()
+            result.reason = ResultReason.SynthesizingAudioCompleted
+            return result
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = TTSService()
+    service.azure_speech_key = "test_key"
+    service.use_gcs = True
+
+    mock_blob = MagicMock()
+    mock_blob.exists.return_value = False
+    mock_client = MagicMock()
+    mock_client.bucket.return_value.blob.return_value = mock_blob
+    service.storage_client = mock_client
+
+    monkeypatch.setattr(service, "_upload_to_gcs", MagicMock())
+    monkeypatch.setattr(service.cache_index, "persist", MagicMock())
+    return service
+
+
+def _use_fake(service, monkeypatch, **kwargs) -> FakeSynthesizer:
+    fake = FakeSynthesizer(**kwargs)
+    monkeypatch.setattr(service, "_synthesize_to_file", fake)
+    return fake
+
+
+class TestBatchDedup:
+    @pytest.mark.asyncio
+    async def test_identical_texts_synthesized_once(self, service, monkeypatch):
+        fake = _use_fake(service, monkeypatch)
+
+        urls = await service.batch_generate_tts(["apple", "book", "apple", "apple"])
+
+        assert sorted(fake.calls) == ["apple", "book"]
+        assert urls[0] == urls[2] == urls[3]
+        assert urls[0] != urls[1]
+
+        stats = service.get_cache_stats()
+        assert stats["cache_misses"] == 2
+        assert stats["cache_hits"] == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self, service, monkeypatch):
+        fake = _use_fake(service, monkeypatch)
+        service.batch_concurrency = 2
+
+        await service.batch_generate_tts([f"word {i}" for i in range(6)])
+
+        assert len(fake.calls) == 6
+        assert fake.max_active <= 2
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_synthesis(self, service, monkeypatch):
+        fake = _use_fake(service, monkeypatch)
+
+        urls = await asyncio.gather(*[service.generate_tts("hello") for _ in range(5)])
+
+        assert fake.calls == ["hello"]
+        assert len(set(urls)) == 1
+        assert service.get_cache_stats()["coalesced_requests"] == 4
+        assert service._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_others(self, service, monkeypatch):
+        _use_fake(service, monkeypatch, delay=0.1)
+
+        first = asyncio.create_task(service.generate_tts("hello"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(service.generate_tts("hello"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        url = await second
+        assert "cached_" in url
+
+
+class TestPartialResults:
+    @pytest.mark.asyncio
+    async def test_failed_item_does_not_discard_others(self, service, monkeypatch):
+        _use_fake(service, monkeypatch, fail_texts={"bad"})
+
+        urls, errors = await service.batch_generate_tts_detailed(
+            ["good", "bad", "also good", "bad"]
+        )
+
+        assert urls[0] and urls[2]
+        assert urls[1] is None and urls[3] is None
+        assert sorted(errors) == [1, 3]
+        assert "TTS generation failed" in errors[1]
+
+        # batch_generate_tts 回傳部分結果而不是拋出例外
+        assert (await service.batch_generate_tts(["good", "bad"]))[1] is None
+
+    @pytest.mark.asyncio
+    async def test_all_failed_raises(self, service, monkeypatch):
+        _use_fake(service, monkeypatch, fail_texts={"bad"})
+
+        with pytest.raises(Exception) as exc_info:
+            await service.batch_generate_tts(["bad", "bad"])
+
+        assert "Batch TTS generation failed" in str(exc_info.value)
+
+
+class TestSpeechConfigReuse:
+    def test_speech_config_reused_per_voice(self, service):
+        config1 = service._get_speech_config("en-US-JennyNeural")
+        config2 = service._get_speech_config("en-US-JennyNeural")
+        config3 = service._get_speech_config("en-GB-RyanNeural")
+
+        assert config1 is config2
+        assert config1 is not config3
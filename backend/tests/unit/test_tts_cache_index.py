@@ -0,0 +1,169 @@
+"""
+TTS 快取索引（TTSCacheIndex）測試
+
+記憶體 LRU、tts_cache_entries 持久化清單（預熱、未命中時查詢、並發寫入），
+以及 TTSService 在索引或清單命中時不再呼叫 GCS blob.exists()
+"""
+
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import TTSCacheEntry
+from services.tts import TTSService
+from services.tts_cache_index import TTSCacheIndex
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    TTSCacheEntry.__table__.create(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+class TestTTSCacheIndexLRU:
+    def test_get_miss_then_hit(self):
+        index = TTSCacheIndex(max_size=10)
+
+        assert index.get("a" * 32) is None
+        index.put("a" * 32, "https://example.com/a.mp3")
+        assert index.get("a" * 32) == "https://example.com/a.mp3"
+
+        stats = index.get_stats()
+        assert stats["index_hits"] == 1
+        assert stats["index_misses"] == 1
+        assert stats["index_size"] == 1
+
+    def test_evicts_least_recently_used(self):
+        index = TTSCacheIndex(max_size=2)
+        index.put("k1", "u1")
+        index.put("k2", "u2")
+        index.get("k1")  # k1 變成最近使用
+        index.put("k3", "u3")
+
+        assert "k1" in index
+        assert "k2" not in index
+        assert "k3" in index
+        assert index.get_stats()["index_evictions"] == 1
+
+
+class TestTTSCacheManifest:
+    def test_persist_and_warm_up(self, session_factory):
+        writer = TTSCacheIndex(session_factory=session_factory)
+        assert writer.persist("k1", "https://storage.googleapis.com/b/tts/k1.mp3")
+        # 重複寫入同一個 key 不會失敗
+        assert writer.persist("k1", "https://storage.googleapis.com/b/tts/k1.mp3")
+        assert writer.persist("k2", "https://storage.googleapis.com/b/tts/k2.mp3")
+
+        # 模擬重新啟動：新的索引從清單預熱
+        reader = TTSCacheIndex(session_factory=session_factory)
+        assert reader.warm_up() == 2
+        assert reader.get("k1") == "https://storage.googleapis.com/b/tts/k1.mp3"
+        assert reader.get_stats()["index_warmed_up"] == 2
+
+    def test_warm_up_respects_limit(self, session_factory):
+        writer = TTSCacheIndex(session_factory=session_factory)
+        for i in range(5):
+            writer.persist(f"k{i}", f"u{i}")
+
+        reader = TTSCacheIndex(max_size=3, session_factory=session_factory)
+        assert reader.warm_up() == 3
+        assert len(reader) == 3
+
+    def test_concurrent_insert_counts_as_success(self, session_factory):
+        TTSCacheIndex(session_factory=session_factory).persist("k1", "u1")
+
+        def racing_session():
+            # 檢查時還不存在，另一個 instance 在 INSERT 前先寫入
+            db = session_factory()
+            db.get = lambda *args, **kwargs: None
+            return db
+
+        index = TTSCacheIndex(session_factory=racing_session)
+        assert index.persist("k1", "u1")
+        assert index.get_stats()["index_persist_failures"] == 0
+
+    def test_lookup_on_miss_fills_lru(self, session_factory):
+        TTSCacheIndex(session_factory=session_factory).persist("k1", "u1")
+        index = TTSCacheIndex(session_factory=session_factory)
+
+        assert index.lookup("k1") == "u1"
+        assert index.lookup("missing") is None
+        assert index.get("k1") == "u1"
+        assert index.get_stats()["index_manifest_hits"] == 1
+
+    def test_warm_up_without_table_is_noop(self):
+        engine = create_engine("sqlite://")
+        index = TTSCacheIndex(session_factory=sessionmaker(bind=engine))
+
+        assert index.warm_up() == 0
+        assert len(index) == 0
+
+
+class TestTTSServiceUsesIndex:
+    @pytest.fixture
+    def service(self):
+        service = TTSService()
+        mock_blob = MagicMock()
+        mock_blob.exists.return_value = True
+        mock_client = MagicMock()
+        mock_client.bucket.return_value.blob.return_value = mock_blob
+        service.storage_client = mock_client
+        return service
+
+    @pytest.mark.asyncio
+    async def test_gcs_checked_only_on_first_lookup(self, service):
+        mock_blob = service.storage_client.bucket.return_value.blob.return_value
+
+        urls = [
+            await service.generate_tts("hello", "en-US-JennyNeural", "+0%", "+0%")
+            for _ in range(5)
+        ]
+
+        assert len(set(urls)) == 1
+        assert mock_blob.exists.call_count == 1
+
+        stats = service.get_cache_stats()
+        assert stats["cache_hits"] == 5
+        assert stats["index_hits"] == 4
+        assert stats["index_misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_index_hit_skips_gcs_entirely(self, service):
+        key = service._generate_cache_key("hi", "en-US-JennyNeural", "+0%", "+0%")
+        service.cache_index.put(key, f"https://storage.googleapis.com/b/tts/{key}.mp3")
+
+        url = await service.generate_tts("hi", "en-US-JennyNeural", "+0%", "+0%")
+
+        assert key in url
+        service.storage_client.bucket.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_manifest_hit_skips_gcs(self, service, session_factory):
+        service.use_gcs = True
+        service.cache_index = TTSCacheIndex(session_factory=session_factory)
+        key = service._generate_cache_key("hi", "en-US-JennyNeural", "+0%", "+0%")
+        TTSCacheIndex(session_factory=session_factory).persist(key, f"u/{key}.mp3")
+
+        url = await service.generate_tts("hi", "en-US-JennyNeural", "+0%", "+0%")
+
+        assert url == f"u/{key}.mp3"
+        service.storage_client.bucket.assert_not_called()
+        assert key in service.cache_index
+
+    def test_clear_cache_keeps_index_entries(self, service):
+        service.cache_index.put("k", "u")
+        service.cache_index.get("k")
+
+        service.clear_cache()
+
+        assert "k" in service.cache_index
+        assert service.get_cache_stats()["index_hits"] == 0
@@ -0,0 +1,267 @@
+"""
+單字選擇回合引擎（services.word_selection_practice）測試
+
+驗證：
+- word pool 依作業快取，ORM 變更 commit 後失效
+- 選項包含正確答案與 3 個干擾項（預存干擾項優先）
+- 預取的下一回合在上一回合都作答後才會被使用，過期的預取結果會丟棄
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import services.word_selection_practice as practice
+from database import Base
+from models import (
+    Assignment,
+    AssignmentContent,
+    Classroom,
+    Content,
+    ContentItem,
+    ContentType,
+    Lesson,
+    Program,
+    Teacher,
+)
+from services.word_selection_practice import PracticeSessionEngine
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """測試用引擎，同時設為全域實例（接收 commit 後的失效事件）"""
+    instance = PracticeSessionEngine(round_size=3, pool_ttl_seconds=300)
+    monkeypatch.setattr(practice, "_engine", instance)
+    return instance
+
+
+def _make_assignment(db, words):
+    teacher = Teacher(email="ws@duotopia.com", password_hash="x", name="T")
+    db.add(teacher)
+    db.flush()
+    classroom = Classroom(name="C", teacher_id=teacher.id)
+    db.add(classroom)
+    db.flush()
+    program = Program(name="P", teacher_id=teacher.id, classroom_id=classroom.id)
+    db.add(program)
+    db.flush()
+    lesson = Lesson(program_id=program.id, name="L")
+    db.add(lesson)
+    db.flush()
+    content = Content(
+        lesson_id=lesson.id, type=ContentType.EXAMPLE_SENTENCES, title="V"
+    )
+    db.add(content)
+    db.flush()
+    assignment = Assignment(
+        title="Vocab",
+        classroom_id=classroom.id,
+        teacher_id=teacher.id,
+        due_date=datetime.utcnow() + timedelta(days=7),
+    )
+    db.add(assignment)
+    db.flush()
+    db.add(
+        AssignmentContent(
+            assignment_id=assignment.id, content_id=content.id, order_index=1
+        )
+    )
+    for i, (word, translation, distractors) in enumerate(words):
+        db.add(
+            ContentItem(
+                content_id=content.id,
+                order_index=i,
+                text=word,
+                translation=translation,
+                distractors=distractors,
+            )
+        )
+    db.commit()
+    return assignment, content
+
+
+WORDS = [
+    ("apple", "蘋果", None),
+    ("banana", "香蕉", ["橘子", "葡萄", "西瓜"]),
+    ("cat", "貓", None),
+    ("dog", "狗", None),
+    ("egg", "蛋", None),
+]
+
+
+class TestWordPool:
+    def test_pool_cached_per_assignment(self, db_session, engine):
+        assignment, _ = _make_assignment(db_session, WORDS)
+
+        pool = engine.get_pool(db_session, assignment.id)
+        assert [w["text"] for w in pool.words] == [w for w, _, _ in WORDS]
+        assert pool.total_words == 5
+
+        assert engine.get_pool(db_session, assignment.id) is pool
+        stats = engine.get_stats()
+        assert stats["pool_hits"] == 1
+        assert stats["pool_misses"] == 1
+
+    def test_content_change_invalidates_after_commit(self, db_session, engine):
+        assignment, content = _make_assignment(db_session, WORDS)
+        pool = engine.get_pool(db_session, assignment.id)
+
+        db_session.add(
+            ContentItem(
+                content_id=content.id, order_index=9, text="fig", translation="無花果"
+            )
+        )
+        db_session.flush()
+        # commit 前仍使用原本的 pool
+        assert engine.get_pool(db_session, assignment.id) is pool
+
+        db_session.commit()
+        assert engine.get_pool(db_session, assignment.id).total_words == 6
+
+    def test_rollback_keeps_pool(self, db_session, engine):
+        assignment, content = _make_assignment(db_session, WORDS)
+        pool = engine.get_pool(db_session, assignment.id)
+
+        db_session.add(ContentItem(content_id=content.id, order_index=9, text="fig"))
+        db_session.flush()
+        db_session.rollback()
+
+        assert engine.get_pool(db_session, assignment.id) is pool
+
+    def test_options(self, db_session, engine):
+        assignment, _ = _make_assignment(db_session, WORDS)
+        pool = engine.get_pool(db_session, assignment.id)
+        apple, banana = pool.words[0], pool.words[1]
+
+        options = pool.build_options(apple)
+        assert len(options) == 4
+        assert "蘋果" in options
+        assert len(set(options)) == 4
+
+        # 預存干擾項優先；demo 不使用預存干擾項
+        assert sorted(pool.build_options(banana)) == sorted(
+            ["香蕉", "橘子", "葡萄", "西瓜"]
+        )
+        assert "橘子" not in pool.build_options(banana, use_stored_distractors=False)
+
+    def test_small_word_set_padded(self, db_session, engine):
+        assignment, _ = _make_assignment(db_session, [("apple", "蘋果", None)])
+        pool = engine.get_pool(db_session, assignment.id)
+
+        options = pool.build_options(pool.words[0])
+        assert sorted(options) == sorted(["蘋果", "選項A", "選項B", "選項C"])
+
+    def test_preview_round_excludes_and_restarts(self, db_session, engine):
+        assignment, _ = _make_assignment(db_session, WORDS)
+        pool = engine.get_pool(db_session, assignment.id)
+        first_ids = {w["content_item_id"] for w in pool.words[:2]}
+
+        round_words = pool.preview_round(first_ids, 3, shuffle=False)
+        assert [w["text"] for w in round_words] == ["cat", "dog", "egg"]
+
+        # 剩餘不足一回合時從頭開始
+        all_but_one = {w["content_item_id"] for w in pool.words[:3]}
+        round_words = pool.preview_round(all_but_one, 3, shuffle=False)
+        assert [w["text"] for w in round_words] == ["apple", "banana", "cat"]
+
+
+def _word(item_id):
+    return {"content_item_id": item_id, "text": f"w{item_id}", "translation": "t"}
+
+
+class TestRounds:
+    @pytest.fixture
+    def rounds(self, monkeypatch):
+        instance = PracticeSessionEngine(
+            round_size=2, session_factory=lambda: SimpleNamespace(close=lambda: None)
+        )
+        calls = []
+        answered = {"value": True}
+
+        def select_words(db, sa_id, exclude_ids):
+            calls.append(set(exclude_ids))
+            ids = [i for i in (1, 2, 3, 4, 5) if i not in exclude_ids][:2]
+            return [_word(i) for i in ids], len(ids) == 2
+
+        monkeypatch.setattr(instance, "_select_words", select_words)
+        monkeypatch.setattr(
+            instance, "_round_answered", lambda db, sa_id, ids: answered["value"]
+        )
+        return instance, calls, answered
+
+    def _sa(self):
+        return SimpleNamespace(id=7, assignment_id=3)
+
+    def test_prefetched_round_used_after_answers(self, rounds):
+        instance, calls, _ = rounds
+        sa = self._sa()
+
+        first = instance.next_round(None, sa)
+        assert not first.prefetched
+        assert first.served_ids == {1, 2}
+
+        state = instance._sessions[sa.id]
+        assert instance.prefetch(
+            sa.id, sa.assignment_id, first.served_ids, state.generation
+        )
+        assert calls[-1] == {1, 2}
+
+        second = instance.next_round(None, sa)
+        assert second.prefetched
+        assert second.served_ids == {3, 4}
+        assert instance.get_stats()["round_hits"] == 1
+
+    def test_prefetch_discarded_when_round_not_answered(self, rounds):
+        instance, calls, answered = rounds
+        sa = self._sa()
+        first = instance.next_round(None, sa)
+        state = instance._sessions[sa.id]
+        instance.prefetch(sa.id, sa.assignment_id, first.served_ids, state.generation)
+
+        answered["value"] = False
+        second = instance.next_round(None, sa)
+
+        assert not second.prefetched
+        assert second.served_ids == {1, 2}
+        assert instance.get_stats()["prefetch_discarded"] == 1
+
+    def test_stale_prefetch_dropped(self, rounds):
+        instance, _, _ = rounds
+        sa = self._sa()
+        first = instance.next_round(None, sa)
+        generation = instance._sessions[sa.id].generation
+
+        instance.next_round(None, sa)  # 新回合已送出
+        assert not instance.prefetch(
+            sa.id, sa.assignment_id, first.served_ids, generation
+        )
+        assert instance._sessions[sa.id].prefetched is None
+
+    def test_invalidate_assignment_drops_prefetch(self, rounds):
+        instance, _, _ = rounds
+        sa = self._sa()
+        first = instance.next_round(None, sa)
+        state = instance._sessions[sa.id]
+        instance.prefetch(sa.id, sa.assignment_id, first.served_ids, state.generation)
+
+        instance.invalidate_assignment(sa.assignment_id)
+
+        assert not instance.next_round(None, sa).prefetched
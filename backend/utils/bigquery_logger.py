@@ -11,6 +11,8 @@ from typing import Optional, Dict
 from google.cloud import bigquery
 import logging
 
+from services.bigquery_sink import BigQuerySink, get_bigquery_sink
+
 logger = logging.getLogger(__name__)
 
 
@@ -152,16 +154,14 @@ class BigQueryTransactionLogger:
                 else None,
             }
 
-            # 寫入 BigQuery
-            errors = self.client.insert_rows_json(self.table_ref, [row])
-
-            if errors:
-                logger.error(f"Failed to insert row to BigQuery: {errors}")
+            # 放入背景 sink，由 sink 批次寫入 BigQuery（不阻塞付款流程）
+            if not self._get_sink().enqueue(row):
+                logger.error(
+                    f"BigQuery sink full, dropped transaction log: {transaction_id}"
+                )
                 return False
 
-            logger.info(
-                f"Successfully logged transaction to BigQuery: {transaction_id}"
-            )
+            logger.info(f"Queued transaction log for BigQuery: {transaction_id}")
             return True
 
         except Exception as e:
@@ -169,6 +169,9 @@ class BigQueryTransactionLogger:
             logger.error(traceback.format_exc())
             return False
 
+    def _get_sink(self) -> BigQuerySink:
+        return get_bigquery_sink(self.table_ref, lambda: self.client)
+
     def _sanitize_headers(self, headers: Optional[Dict]) -> Dict:
         """移除敏感資訊（如 Authorization token）"""
         if not headers:
@@ -4,10 +4,17 @@ Unified permission checking utilities for Programs, Lessons, and Contents
 Supports both:
 1. Teacher-owned programs (teacher_id)
 2. Organization-owned programs (organization_id + user role)
+
+The has_*_permission helpers share a request-scoped PermissionContext
+(see get_permission_context): memberships are loaded once per request and
+Content → Lesson → Program ownership is resolved in one joined query.
 """
 
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
 import uuid
 
 from services.casbin_service import get_casbin_service
@@ -17,6 +24,7 @@ from models import (
     Lesson,
     Content,
     TeacherOrganization,
+    TeacherSchool,
     Student,
     StudentSchool,
     ClassroomSchool,
@@ -24,6 +32,248 @@ from models import (
 )
 
 
+# ============ Request-scoped permission context ============
+
+_CONTEXT_KEY = "permission_contexts"
+
+
+def _as_uuid(value) -> Optional[uuid.UUID]:
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def _parse_roles(roles) -> List[str]:
+    """TeacherSchool.roles: list (PostgreSQL JSONB) or JSON string (SQLite)"""
+    if not roles:
+        return []
+    if isinstance(roles, str):
+        try:
+            roles = json.loads(roles)
+        except json.JSONDecodeError:
+            return []
+    return list(roles) if isinstance(roles, (list, tuple)) else []
+
+
+class PermissionContext:
+    """
+    One teacher's authorization state for the current request.
+
+    - Organization / school memberships: one query each, loaded on first use
+    - School → organization lookups and Casbin manage_materials checks: memoized
+    - program / lesson / content decisions: the ownership chain for many ids is
+      resolved with one joined query, and every decision is memoized
+
+    Use get_permission_context() instead of constructing this directly. The
+    context lives in Session.info and is dropped on commit / rollback, so
+    membership changes made by the request itself are picked up.
+    """
+
+    def __init__(self, db: Session, teacher_id: int):
+        self.db = db
+        self.teacher_id = teacher_id
+        self._org_roles: Optional[Dict[uuid.UUID, str]] = None
+        self._school_roles: Optional[Dict[uuid.UUID, List[str]]] = None
+        # school_id → organization_id（None = school not found）
+        self._school_orgs: Dict[uuid.UUID, Optional[uuid.UUID]] = {}
+        self._manage_org: Dict[uuid.UUID, bool] = {}
+        self._decisions: Dict[Tuple[str, int, str], bool] = {}
+
+    # ---------- memberships ----------
+
+    @property
+    def org_roles(self) -> Dict[uuid.UUID, str]:
+        """Active organization memberships: organization_id → role"""
+        if self._org_roles is None:
+            rows = (
+                self.db.query(
+                    TeacherOrganization.organization_id, TeacherOrganization.role
+                )
+                .filter(
+                    TeacherOrganization.teacher_id == self.teacher_id,
+                    TeacherOrganization.is_active.is_(True),
+                )
+                .all()
+            )
+            self._org_roles = {org_id: role for org_id, role in rows}
+        return self._org_roles
+
+    @property
+    def school_roles(self) -> Dict[uuid.UUID, List[str]]:
+        """Active school memberships: school_id → roles"""
+        if self._school_roles is None:
+            rows = (
+                self.db.query(TeacherSchool.school_id, TeacherSchool.roles)
+                .filter(
+                    TeacherSchool.teacher_id == self.teacher_id,
+                    TeacherSchool.is_active.is_(True),
+                )
+                .all()
+            )
+            self._school_roles = {
+                school_id: _parse_roles(roles) for school_id, roles in rows
+            }
+        return self._school_roles
+
+    def _load_school_orgs(self, school_ids: Iterable[uuid.UUID]):
+        missing = {
+            school_id
+            for school_id in school_ids
+            if school_id is not None and school_id not in self._school_orgs
+        }
+        if not missing:
+            return
+        rows = (
+            self.db.query(School.id, School.organization_id)
+            .filter(School.id.in_(missing))
+            .all()
+        )
+        found = dict(rows)
+        for school_id in missing:
+            self._school_orgs[school_id] = found.get(school_id)
+
+    # ---------- organization / school materials ----------
+
+    def can_read_org_materials(self, org_id) -> bool:
+        """Any active member of the organization can read its materials"""
+        return _as_uuid(org_id) in self.org_roles
+
+    def can_manage_org_materials(self, org_id) -> bool:
+        """org_owner, or org member with Casbin manage_materials permission"""
+        org_id = _as_uuid(org_id)
+        if org_id not in self._manage_org:
+            role = self.org_roles.get(org_id)
+            if role is None:
+                allowed = False
+            elif role == "org_owner":
+                allowed = True
+            else:
+                allowed = get_casbin_service().check_permission(
+                    teacher_id=self.teacher_id,
+                    domain=f"org-{org_id}",
+                    resource="manage_materials",
+                    action="write",
+                )
+            self._manage_org[org_id] = allowed
+        return self._manage_org[org_id]
+
+    def can_manage_school_materials(self, school_id) -> bool:
+        """school_admin in the school, or manage_materials in its organization"""
+        school_id = _as_uuid(school_id)
+        self._load_school_orgs([school_id])
+        org_id = self._school_orgs.get(school_id)
+        if org_id is None:
+            return False
+        if "school_admin" in self.school_roles.get(school_id, []):
+            return True
+        return self.can_manage_org_materials(org_id)
+
+    def can_manage_school_students(self, school_id) -> bool:
+        """school_admin in the school, or org_owner / org_admin of its organization"""
+        school_id = _as_uuid(school_id)
+        self._load_school_orgs([school_id])
+        org_id = self._school_orgs.get(school_id)
+        if org_id is None:
+            return False
+        if "school_admin" in self.school_roles.get(school_id, []):
+            return True
+        return self.org_roles.get(org_id) in ("org_owner", "org_admin")
+
+    # ---------- program / lesson / content ----------
+
+    def _owner_allows(
+        self,
+        owner_teacher_id: Optional[int],
+        organization_id: Optional[uuid.UUID],
+        school_id: Optional[uuid.UUID],
+        action: str,
+    ) -> bool:
+        # Teacher-owned (personal materials)
+        if owner_teacher_id and organization_id is None and school_id is None:
+            return owner_teacher_id == self.teacher_id
+
+        # Organization-owned
+        if organization_id and school_id is None:
+            if action == "read":
+                return self.can_read_org_materials(organization_id)
+            return self.can_manage_org_materials(organization_id)
+
+        # School-owned
+        if school_id:
+            return self.can_manage_school_materials(school_id)
+
+        return False
+
+    def _resolve(self, kind: str, ids: Iterable[int], action: str) -> Dict[int, bool]:
+        ids = list(dict.fromkeys(ids))
+        missing = [i for i in ids if (kind, i, action) not in self._decisions]
+        if missing:
+            if kind == "program":
+                key = Program.id
+                query = self.db.query(key, *_PROGRAM_OWNER)
+            elif kind == "lesson":
+                key = Lesson.id
+                query = self.db.query(key, *_PROGRAM_OWNER).join(
+                    Program, Program.id == Lesson.program_id
+                )
+            else:
+                key = Content.id
+                query = (
+                    self.db.query(key, *_PROGRAM_OWNER)
+                    .join(Lesson, Lesson.id == Content.lesson_id)
+                    .join(Program, Program.id == Lesson.program_id)
+                )
+            owners = {
+                row[0]: tuple(row[1:]) for row in query.filter(key.in_(missing)).all()
+            }
+            self._load_school_orgs(owner[2] for owner in owners.values())
+            for i in missing:
+                owner = owners.get(i)
+                self._decisions[(kind, i, action)] = owner is not None and (
+                    self._owner_allows(*owner, action)
+                )
+        return {i: self._decisions[(kind, i, action)] for i in ids}
+
+    def program_permissions(
+        self, program_ids: Iterable[int], action: str = "write"
+    ) -> Dict[int, bool]:
+        """program_id → allowed (unknown ids are False)"""
+        return self._resolve("program", program_ids, action)
+
+    def lesson_permissions(
+        self, lesson_ids: Iterable[int], action: str = "write"
+    ) -> Dict[int, bool]:
+        """lesson_id → allowed, via the lesson's program"""
+        return self._resolve("lesson", lesson_ids, action)
+
+    def content_permissions(
+        self, content_ids: Iterable[int], action: str = "write"
+    ) -> Dict[int, bool]:
+        """content_id → allowed, via content → lesson → program"""
+        return self._resolve("content", content_ids, action)
+
+
+_PROGRAM_OWNER = (Program.teacher_id, Program.organization_id, Program.school_id)
+
+
+def get_permission_context(db: Session, teacher_id: int) -> PermissionContext:
+    """The teacher's PermissionContext for this request (one per Session)"""
+    contexts = db.info.setdefault(_CONTEXT_KEY, {})
+    context = contexts.get(teacher_id)
+    if context is None:
+        context = contexts[teacher_id] = PermissionContext(db, teacher_id)
+    return context
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _clear_permission_contexts(session):
+    session.info.pop(_CONTEXT_KEY, None)
+
+
 def has_manage_materials_permission(
     teacher_id: int, org_id: uuid.UUID, db: Session
 ) -> bool:
@@ -35,29 +285,7 @@ def has_manage_materials_permission(
     - org_admin: Needs explicit manage_materials permission via Casbin
     - teacher: No permission
     """
-    membership = (
-        db.query(TeacherOrganization)
-        .filter(
-            TeacherOrganization.teacher_id == teacher_id,
-            TeacherOrganization.organization_id == org_id,
-            TeacherOrganization.is_active.is_(True),
-        )
-        .first()
-    )
-
-    if not membership:
-        return False
-
-    if membership.role == "org_owner":
-        return True
-
-    casbin = get_casbin_service()
-    return casbin.check_permission(
-        teacher_id=teacher_id,
-        domain=f"org-{org_id}",
-        resource="manage_materials",
-        action="write",
-    )
+    return get_permission_context(db, teacher_id).can_manage_org_materials(org_id)
 
 
 def has_read_org_materials_permission(
@@ -91,51 +319,7 @@ def has_school_materials_permission(teacher_id: int, school_id, db: Session) ->
     - org-level manage_materials permission: Has permission
     - Otherwise: No permission
     """
-    from models import School, TeacherSchool
-    from sqlalchemy import inspect
-
-    school = db.query(School).filter(School.id == school_id).first()
-    if not school:
-        return False
-
-    # Check school_admin role
-    # Support both PostgreSQL (JSONB) and SQLite (JSON/text) by checking in Python
-    membership = (
-        db.query(TeacherSchool)
-        .filter(
-            TeacherSchool.teacher_id == teacher_id,
-            TeacherSchool.school_id == school_id,
-            TeacherSchool.is_active.is_(True),
-        )
-        .first()
-    )
-
-    has_school_admin = False
-    if membership and membership.roles:
-        # Check if 'school_admin' is in the roles array
-        # roles can be a list or JSON string depending on DB
-        if isinstance(membership.roles, list):
-            has_school_admin = "school_admin" in membership.roles
-        else:
-            # For JSON string (SQLite), parse it
-            import json
-
-            try:
-                roles_list = (
-                    json.loads(membership.roles)
-                    if isinstance(membership.roles, str)
-                    else membership.roles
-                )
-                has_school_admin = "school_admin" in roles_list
-            except (json.JSONDecodeError, TypeError):
-                has_school_admin = False
-
-    # Check org-level permission
-    has_org_permission = has_manage_materials_permission(
-        teacher_id, school.organization_id, db
-    )
-
-    return has_school_admin or has_org_permission
+    return get_permission_context(db, teacher_id).can_manage_school_materials(school_id)
 
 
 def has_program_permission(
@@ -146,31 +330,9 @@ def has_program_permission(
 
     Supports teacher-owned, organization-owned, and school-owned programs.
     """
-    program = db.query(Program).filter(Program.id == program_id).first()
-    if not program:
-        return False
-
-    # Teacher-owned (personal materials)
-    if (
-        program.teacher_id
-        and program.organization_id is None
-        and program.school_id is None
-    ):
-        return program.teacher_id == teacher_id
-
-    # Organization-owned
-    if program.organization_id and program.school_id is None:
-        if action == "read":
-            return has_read_org_materials_permission(
-                teacher_id, program.organization_id, db
-            )
-        return has_manage_materials_permission(teacher_id, program.organization_id, db)
-
-    # School-owned
-    if program.school_id:
-        return has_school_materials_permission(teacher_id, program.school_id, db)
-
-    return False
+    return get_permission_context(db, teacher_id).program_permissions(
+        [program_id], action
+    )[program_id]
 
 
 def has_lesson_permission(
@@ -179,11 +341,9 @@ def has_lesson_permission(
     """
     Check if teacher can perform action on lesson.
     """
-    lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
-    if not lesson:
-        return False
-
-    return has_program_permission(db, lesson.program_id, teacher_id, action)
+    return get_permission_context(db, teacher_id).lesson_permissions(
+        [lesson_id], action
+    )[lesson_id]
 
 
 def has_content_permission(
@@ -192,11 +352,9 @@ def has_content_permission(
     """
     Check if teacher can perform action on content.
     """
-    content = db.query(Content).filter(Content.id == content_id).first()
-    if not content:
-        return False
-
-    return has_lesson_permission(db, content.lesson_id, teacher_id, action)
+    return get_permission_context(db, teacher_id).content_permissions(
+        [content_id], action
+    )[content_id]
 
 
 def check_program_access(
@@ -375,58 +533,7 @@ def check_school_student_permission(
     - org_owner or org_admin role in the organization: Has permission
     - Otherwise: No permission
     """
-    from models import School, TeacherSchool, TeacherOrganization
-
-    school = db.query(School).filter(School.id == school_id).first()
-    if not school:
-        return False
-
-    # Check school_admin role
-    membership = (
-        db.query(TeacherSchool)
-        .filter(
-            TeacherSchool.teacher_id == teacher_id,
-            TeacherSchool.school_id == school_id,
-            TeacherSchool.is_active.is_(True),
-        )
-        .first()
-    )
-
-    has_school_admin = False
-    if membership and membership.roles:
-        if isinstance(membership.roles, list):
-            has_school_admin = "school_admin" in membership.roles
-        else:
-            import json
-
-            try:
-                roles_list = (
-                    json.loads(membership.roles)
-                    if isinstance(membership.roles, str)
-                    else membership.roles
-                )
-                has_school_admin = "school_admin" in roles_list
-            except (json.JSONDecodeError, TypeError):
-                has_school_admin = False
-
-    if has_school_admin:
-        return True
-
-    # Check org_owner/org_admin role
-    org_membership = (
-        db.query(TeacherOrganization)
-        .filter(
-            TeacherOrganization.teacher_id == teacher_id,
-            TeacherOrganization.organization_id == school.organization_id,
-            TeacherOrganization.is_active.is_(True),
-        )
-        .first()
-    )
-
-    if org_membership and org_membership.role in ["org_owner", "org_admin"]:
-        return True
-
-    return False
+    return get_permission_context(db, teacher_id).can_manage_school_students(school_id)
 
 
 def check_student_in_school(student_id: int, school_id: uuid.UUID, db: Session) -> bool:
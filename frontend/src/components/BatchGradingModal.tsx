@@ -61,10 +61,7 @@ export default function BatchGradingModal({
 }: BatchGradingModalProps) {
   const { t } = useTranslation();
   const [loading, setLoading] = useState(false);
-  const [progress, setProgress] = useState<{
-    current: number;
-    total: number;
-  } | null>(null);
+  const [progress, setProgress] = useState<number | null>(null);
   const [results, setResults] = useState<BatchGradingResult[] | null>(null);
   const [teacherDecisions, setTeacherDecisions] = useState<
     Record<number, TeacherDecision>
@@ -84,21 +81,20 @@ export default function BatchGradingModal({
 
   const handleStartGrading = async () => {
     setLoading(true);
-    setProgress({ current: 0, total: 0 });
+    setProgress(0);
 
     try {
-      const response = await apiClient.post<BatchGradingResponse>(
+      // 批改在背景工作中執行，輪詢進度直到完成
+      const response = await apiClient.runJob<BatchGradingResponse>(
         `/api/teachers/assignments/${assignmentId}/batch-grade`,
         {
           classroom_id: classroomId,
         },
+        setProgress,
       );
 
       setResults(response.results);
-      setProgress({
-        current: response.total_students,
-        total: response.total_students,
-      });
+      setProgress(100);
 
       // Initialize all students' decisions to null (pending)
       const initialDecisions: Record<number, TeacherDecision> = {};
@@ -205,14 +201,11 @@ export default function BatchGradingModal({
 
         <div className="space-y-4">
           {/* Progress Section */}
-          {loading && progress && (
+          {loading && progress !== null && (
             <div className="flex items-center gap-3 p-3 sm:p-4 bg-blue-50 dark:bg-blue-900/20 rounded-lg">
               <Loader2 className="h-4 w-4 sm:h-5 sm:w-5 animate-spin text-blue-600 flex-shrink-0" />
               <span className="font-medium text-sm sm:text-base text-blue-900 dark:text-blue-300">
-                {t("batchGrading.progress", {
-                  current: progress.current,
-                  total: progress.total,
-                })}
+                {t("batchGrading.progressPercent", { percent: progress })}
               </span>
             </div>
           )}
@@ -2329,12 +2329,14 @@ export default function VocabularySetPanel({
             newRows[i].text.trim() &&
             !newRows[i].audioUrl
           ) {
-            const audioUrl = (result as { audio_urls: string[] }).audio_urls[
-              audioIndex
-            ];
-            newRows[i].audioUrl = audioUrl.startsWith("http")
-              ? audioUrl
-              : `${import.meta.env.VITE_API_URL}${audioUrl}`;
+            const audioUrl = (result as { audio_urls: (string | null)[] })
+              .audio_urls[audioIndex];
+            // 生成失敗的項目為 null，保留原狀讓老師重試
+            if (audioUrl) {
+              newRows[i].audioUrl = audioUrl.startsWith("http")
+                ? audioUrl
+                : `${import.meta.env.VITE_API_URL}${audioUrl}`;
+            }
             audioIndex++;
           }
         }
@@ -2394,13 +2396,15 @@ export default function VocabularySetPanel({
             newRows[i].text.trim() &&
             !newRows[i].audioUrl
           ) {
-            const audioUrl = (result as { audio_urls: string[] }).audio_urls[
-              audioIndex
-            ];
-            // 如果是相對路徑，加上 API base URL
-            newRows[i].audioUrl = audioUrl.startsWith("http")
-              ? audioUrl
-              : `${import.meta.env.VITE_API_URL}${audioUrl}`;
+            const audioUrl = (result as { audio_urls: (string | null)[] })
+              .audio_urls[audioIndex];
+            // 生成失敗的項目為 null，保留原狀讓老師重試
+            if (audioUrl) {
+              // 如果是相對路徑，加上 API base URL
+              newRows[i].audioUrl = audioUrl.startsWith("http")
+                ? audioUrl
+                : `${import.meta.env.VITE_API_URL}${audioUrl}`;
+            }
             audioIndex++;
           }
         }
@@ -2996,17 +3000,18 @@ export default function VocabularySetPanel({
               typeof ttsResult === "object" &&
               "audio_urls" in ttsResult
             ) {
-              const audioUrls = (ttsResult as { audio_urls: string[] })
-                .audio_urls;
-              newItems = newItems.map((item, i) => ({
-                ...item,
-                audioUrl: audioUrls[i]?.startsWith("http")
-                  ? audioUrls[i]
-                  : `${import.meta.env.VITE_API_URL}${audioUrls[i]}`,
-                audio_url: audioUrls[i]?.startsWith("http")
-                  ? audioUrls[i]
-                  : `${import.meta.env.VITE_API_URL}${audioUrls[i]}`,
-              }));
+              const audioUrls = (
+                ttsResult as { audio_urls: (string | null)[] }
+              ).audio_urls;
+              newItems = newItems.map((item, i) => {
+                const audioUrl = audioUrls[i];
+                // 生成失敗的項目為 null，保留原狀
+                if (!audioUrl) return item;
+                const fullUrl = audioUrl.startsWith("http")
+                  ? audioUrl
+                  : `${import.meta.env.VITE_API_URL}${audioUrl}`;
+                return { ...item, audioUrl: fullUrl, audio_url: fullUrl };
+              });
             }
           }
 
@@ -1,5 +1,8 @@
 import { API_URL } from "@/config/api";
 import { useTeacherAuthStore } from "@/stores/teacherAuthStore";
+import type { BackgroundJob } from "@/lib/api";
+
+const JOB_POLL_INTERVAL_MS = 1000;
 
 export type ProgramCopyTargetScope = "classroom" | "teacher" | "school";
 
@@ -32,6 +35,8 @@ export function useProgramCopy() {
       headers: {
         "Content-Type": "application/json",
         Authorization: `Bearer ${token}`,
+        // 大型課程的複製在背景工作中執行（202 + job id）
+        Prefer: "respond-async",
       },
       body: JSON.stringify({
         target_scope: targetScope,
@@ -45,7 +50,27 @@ export function useProgramCopy() {
       throw new Error(errorData.detail || "Failed to copy program");
     }
 
-    return response.json();
+    if (response.status !== 202) {
+      return response.json();
+    }
+
+    let job: BackgroundJob = await response.json();
+    const statusUrl = `${API_URL}${job.status_url ?? `/api/jobs/${job.job_id}`}`;
+    while (job.status === "queued" || job.status === "running") {
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      const statusResponse = await fetch(statusUrl, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (!statusResponse.ok) {
+        throw new Error("Failed to check copy status");
+      }
+      job = await statusResponse.json();
+    }
+
+    if (job.status === "failed") {
+      throw new Error(job.error || "Failed to copy program");
+    }
+    return job.result;
   };
 
   return { copyProgram };
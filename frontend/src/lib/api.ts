@@ -11,6 +11,21 @@ import { useTeacherAuthStore } from "@/stores/teacherAuthStore";
 // 🔐 Security: Only enable debug logs in development
 const DEBUG = false; // 暫時關閉以便追蹤其他問題
 
+/**
+ * 背景工作狀態（GET /api/jobs/{job_id}）
+ */
+export interface BackgroundJob<T = unknown> {
+  job_id: string;
+  job_type: string;
+  status: "queued" | "running" | "succeeded" | "failed";
+  progress: number;
+  attempts: number;
+  max_attempts: number;
+  result: T | null;
+  error: string | null;
+  status_url?: string;
+}
+
 /**
  * Custom API Error class for better error handling
  */
@@ -294,6 +309,42 @@ class ApiClient {
     });
   }
 
+  // ============ Background Jobs ============
+  /**
+   * 以背景工作執行長時間的 POST（Prefer: respond-async）
+   * 伺服器回傳 202 + job id 時輪詢 /api/jobs/{id} 直到完成，回傳 job result；
+   * 伺服器直接回傳結果時原樣回傳。
+   */
+  async runJob<T>(
+    endpoint: string,
+    data?: unknown,
+    onProgress?: (percent: number) => void,
+    pollIntervalMs = 2000,
+  ): Promise<T> {
+    const accepted = await this.request<BackgroundJob<T> | T>(endpoint, {
+      method: "POST",
+      body: data ? JSON.stringify(data) : undefined,
+      headers: { Prefer: "respond-async" },
+    });
+    if (!accepted || typeof accepted !== "object" || !("job_id" in accepted)) {
+      return accepted as T;
+    }
+
+    let job = accepted as BackgroundJob<T>;
+    const statusUrl = job.status_url ?? `/api/jobs/${job.job_id}`;
+    while (job.status === "queued" || job.status === "running") {
+      onProgress?.(job.progress);
+      await new Promise((resolve) => setTimeout(resolve, pollIntervalMs));
+      job = await this.get<BackgroundJob<T>>(statusUrl);
+    }
+
+    if (job.status === "failed") {
+      throw new ApiError(500, job.error || "Background job failed", job);
+    }
+    onProgress?.(100);
+    return job.result as T;
+  }
+
   getCurrentUser() {
     const userStr = localStorage.getItem("user");
     return userStr ? JSON.parse(userStr) : null;